@@ -175,7 +175,7 @@ def get_token_decimals(token_id: str) -> int:
 
 
 def get_tokens(wallet, category_id_filter=""):
-    tok_utxos = wallet.get_utxos(tokens_only=True)
+    tok_utxos = wallet.get_token_utxos(category_id_filter or None)
     config = SimpleConfig()  # Locally scoped config for token metadata instantiation
     token_meta = ConcreteTokenMeta(config)
 
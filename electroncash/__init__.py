@@ -1,15 +1,47 @@
 from .version import PACKAGE_VERSION
-from .util import format_satoshis, print_msg, print_error, set_verbosity
-from .wallet import Synchronizer, Wallet
-from .storage import WalletStorage
-from .network import Network, pick_random_server
-from .interface import Connection, Interface
-from .simple_config import SimpleConfig, get_config, set_config
-from . import bitcoin
-from . import transaction
-from . import daemon
-from .transaction import Transaction
-from .plugins import BasePlugin
-from .commands import Commands, known_commands
-from . import address
-from . import cashacct  # has a side-effect: registers itself with ScriptOut protocol system
+
+# The names below used to be imported here eagerly, which meant that importing
+# *anything* from this package pulled in the entire library (wallet, network,
+# protobuf, dnspython, requests, ...). They are now imported on first access
+# (PEP 562), so that e.g. forwarding a command to a running daemon stays fast.
+# Note that cashacct has a side-effect when imported: it registers itself with
+# the ScriptOut protocol system. wallet.py imports it, so it is always
+# registered by the time there is a wallet.
+_lazy_attrs = {
+    'format_satoshis': 'util',
+    'print_msg': 'util',
+    'print_error': 'util',
+    'set_verbosity': 'util',
+    'Synchronizer': 'wallet',
+    'Wallet': 'wallet',
+    'WalletStorage': 'storage',
+    'Network': 'network',
+    'pick_random_server': 'network',
+    'Connection': 'interface',
+    'Interface': 'interface',
+    'SimpleConfig': 'simple_config',
+    'get_config': 'simple_config',
+    'set_config': 'simple_config',
+    'Transaction': 'transaction',
+    'BasePlugin': 'plugins',
+    'Commands': 'commands',
+    'known_commands': 'commands',
+}
+
+_lazy_modules = {'bitcoin', 'transaction', 'daemon', 'address', 'cashacct'}
+
+
+def __getattr__(name):
+    import importlib
+    if name in _lazy_modules:
+        return importlib.import_module('.' + name, __name__)
+    modname = _lazy_attrs.get(name)
+    if modname is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module('.' + modname, __name__), name)
+    globals()[name] = value  # subsequent lookups don't come through here
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attrs) | _lazy_modules)
@@ -25,6 +25,7 @@
 
 import hashlib
 import struct
+import threading
 from collections import namedtuple
 from typing import Union
 
@@ -348,9 +349,33 @@ class ScriptOutput(namedtuple("ScriptAddressTuple", "script")):
         return __class__.find_protocol_class(script)(script)
 
 
+# Address instances are interned: constructing an Address equal to one that
+# already exists returns the existing instance, so that the encodings it has
+# cached are shared by all. Ideally this would be a weak-value table, but tuple
+# subclasses cannot be weakly referenced, so instead the tables are bounded,
+# and start over when full.
+_INTERN_MAX = 100_000
+_interned = dict()  # (cls, hash, kind) -> Address
+_from_string_cache = dict()  # (cls, string, net) -> Address
+_intern_lock = threading.Lock()
+
+
+def _bounded_put(table, key, value):
+    """Puts key -> value in table unless already there, returning the value
+    in table."""
+    if len(table) >= _INTERN_MAX:
+        with _intern_lock:
+            if len(table) >= _INTERN_MAX:
+                table.clear()
+    return table.setdefault(key, value)
+
+
 class Address(namedtuple("AddressTuple", "hash kind")):
     """A namedtuple for easy comparison and unique hashing.
-    Note that member .hash may be 20 or 32 bytes (it may be either a hash160 or a hash256 for P2SH32)."""
+    Note that member .hash may be 20 or 32 bytes (it may be either a hash160 or a hash256 for P2SH32).
+
+    Instances are interned and immutable, and cache their string encodings
+    and scripthash."""
 
     # Address kinds
     ADDR_P2PKH = cashaddr.PUBKEY_TYPE  # 0 (cashaddr.TOKEN_PUBKEY_TYPE also gets flattened down to this one here)
@@ -368,11 +393,27 @@ class Address(namedtuple("AddressTuple", "hash kind")):
 
     def __new__(cls, addr_hash, kind):
         addr_hash = to_bytes(addr_hash)
-        ret = super().__new__(cls, addr_hash, kind)
-        ret._addr2str_cache = [None] * cls._NUM_FMTS
-        ret._check_sanity()
+        key = (cls, addr_hash, kind)
+        ret = _interned.get(key)
+        if ret is None:
+            ret = super().__new__(cls, addr_hash, kind)
+            ret._addr2str_cache = [None] * cls._NUM_FMTS
+            ret._addr2str_cache_net = networks.net
+            ret._script = ret._scripthash_hex = None
+            ret._check_sanity()
+            ret = _bounded_put(_interned, key, ret)
         return ret
 
+    def __reduce__(self):
+        # Without the cached encodings, and so that unpickling interns
+        return self.__class__, (self.hash, self.kind)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def _check_sanity(self):
         assert self.kind in (self.ADDR_P2PKH, self.ADDR_P2SH), f"Unknown kind: {self.kind}"
         hlen = len(self.hash)
@@ -431,10 +472,23 @@ class Address(namedtuple("AddressTuple", "hash kind")):
     def from_string(cls, string, *, net=None):
         """Construct from an address string."""
         if net is None: net = networks.net
+        try:
+            ret = _from_string_cache.get((cls, string, net))
+        except TypeError:
+            raise AddressError('invalid address: {!r}'.format(string))
+        if ret is None:
+            ret = _bounded_put(_from_string_cache, (cls, string, net), cls._from_string(string, net))
+        return ret
 
+    @classmethod
+    def _from_string(cls, string, net):
         # First, try cashaddr decode
         try:
-            return cls.from_cashaddr_string(string, net=net)
+            ret, ca_type = cls.from_cashaddr_string(string, net=net, return_ca_type=True)
+            if ca_type == ret.kind and string.islower() and ':' not in string:
+                # The string is as to_string() would make it
+                ret._seed_string_cache(cls.FMT_CASHADDR, string, net)
+            return ret
         except AddressError as e:
             cashaddr_exc = AddressError(f'invalid address: {string} (' + str(e) + ')')
 
@@ -457,9 +511,12 @@ class Address(namedtuple("AddressTuple", "hash kind")):
             raise AddressError(f'invalid address: {string} (unknown version byte: {verbyte})')
 
         try:
-            return cls(addr_hash, kind)
+            ret = cls(addr_hash, kind)
         except AssertionError as e:
             raise AddressError(f'invalid address: {string} (' + str(e) + ')')
+        # Base58Check has only one encoding of the same data
+        ret._seed_string_cache(cls.FMT_LEGACY, string, net)
+        return ret
 
     @classmethod
     def is_valid(cls, string, *, net=None):
@@ -474,7 +531,12 @@ class Address(namedtuple("AddressTuple", "hash kind")):
     def from_strings(cls, strings, *, net=None):
         """Construct a list from an iterable of strings."""
         if net is None: net = networks.net
-        return [cls.from_string(string, net=net) for string in strings]
+        get = _from_string_cache.get
+        ret = []
+        for string in strings:
+            addr = get((cls, string, net)) if isinstance(string, str) else None
+            ret.append(addr or cls.from_string(string, net=net))
+        return ret
 
     @classmethod
     def from_pubkey(cls, pubkey):
@@ -505,7 +567,14 @@ class Address(namedtuple("AddressTuple", "hash kind")):
     def to_strings(cls, fmt, addrs, *, net=None):
         """Construct a list of strings from an iterable of Address objects."""
         if net is None: net = networks.net
-        return [addr.to_string(fmt, net=net) for addr in addrs]
+        if not isinstance(fmt, int) or not 0 <= fmt < cls._NUM_FMTS:
+            raise AddressError('unrecognized format')
+        ret = []
+        for addr in addrs:
+            # Inlined cache lookup of to_string
+            text = addr._addr2str_cache[fmt] if addr._addr2str_cache_net is net else None
+            ret.append(text or addr.to_string(fmt, net=net))
+        return ret
 
     @staticmethod
     def is_legacy(address: str, net=None) -> bool:
@@ -555,6 +624,10 @@ class Address(namedtuple("AddressTuple", "hash kind")):
         cacheable = net is networks.net
         cached = None
         if cacheable:
+            if self._addr2str_cache_net is not net:
+                # The network changed since we cached
+                self._addr2str_cache = [None] * self._NUM_FMTS
+                self._addr2str_cache_net = net
             try:
                 cached = self._addr2str_cache[fmt]
                 if cached:
@@ -590,6 +663,11 @@ class Address(namedtuple("AddressTuple", "hash kind")):
             if cached and cacheable:
                 self._addr2str_cache[fmt] = cached
 
+    def _seed_string_cache(self, fmt, string, net):
+        """Caches string, which must be what to_string(fmt, net=net) returns."""
+        if net is networks.net and self._addr2str_cache_net is net:
+            self._addr2str_cache[fmt] = string
+
     def to_token_string(self, *, net=None):
         """Return a (prefix-less) string that is the "token-aware" representation of this address. These addresses
         are encoded with cashaddr type 2 or 3 (as opposed to 0 or 1 for non-token-aware addresses)."""
@@ -631,11 +709,15 @@ class Address(namedtuple("AddressTuple", "hash kind")):
 
     def to_script(self):
         """Return a binary script to pay to the address."""
-        self._check_sanity()
-        if self.kind == self.ADDR_P2PKH:
-            return Script.P2PKH_script(self.hash)
-        else:
-            return Script.P2SH_script(self.hash)
+        script = self._script
+        if script is None:
+            self._check_sanity()
+            if self.kind == self.ADDR_P2PKH:
+                script = Script.P2PKH_script(self.hash)
+            else:
+                script = Script.P2SH_script(self.hash)
+            self._script = script
+        return script
 
     def to_script_hex(self):
         """Return a script to pay to the address as a hex string."""
@@ -647,7 +729,10 @@ class Address(namedtuple("AddressTuple", "hash kind")):
 
     def to_scripthash_hex(self):
         """Like other bitcoin hashes this is reversed when written in hex."""
-        return hash_to_hex_str(self.to_scripthash())
+        sh = self._scripthash_hex
+        if sh is None:
+            sh = self._scripthash_hex = hash_to_hex_str(self.to_scripthash())
+        return sh
 
     def __str__(self):
         return self.to_ui_string()
@@ -0,0 +1,22 @@
+""" Performance benchmarks for the wallet hot paths.
+
+Run them with
+
+    python -m electroncash.benchmarks --scale medium --output results.json
+
+and later, to catch regressions,
+
+    python -m electroncash.benchmarks --scale medium --baseline results.json
+
+which exits with status 1 if any benchmark got slower than --threshold times
+its baseline. The wallets benchmarked are synthetic (see synthetic.py) and
+deterministic for a given --seed, so results are comparable between runs on
+the same machine.
+
+Wallet sync is timed separately, against a local server replaying a fixed
+chain (see sync.py and replay_server.py):
+
+    python -m electroncash.benchmarks.sync --scale medium --latency 0.05 """
+
+from .suite import BENCHMARKS, SCALES, compare, run
+from .synthetic import make_headers, make_wallet
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" A local server speaking enough of the ElectrumX protocol to sync a wallet
+from a fixed dataset, for measuring sync performance offline and without the
+noise of a live server.
+
+The dataset is a chain of headers plus the transactions and scripthash
+histories of one or more wallets. It is either synthetic (see
+ReplayDataset.synthetic()) or loaded from a JSON file, which may have been
+recorded from anywhere:
+
+    {"version": 1,
+     "headers": "<hex of all headers from height 0 on>",
+     "txs": {"<txid>": ["<raw tx hex>", <height>, <position in block>], ...},
+     "history": {"<scripthash>": [["<txid>", <height>], ...], ...},
+     "wallet": {"xpub": "...", "gap_limit": 20}}
+
+The merkle roots of the headers must match the transactions at each height.
+Only regtest is supported: proof of work is not checked there, and its
+checkpoint is low enough (height 100) for a dataset to extend past it.
+
+The server can also be run by itself, e.g. to point a GUI at it:
+
+    python -m electroncash.benchmarks.replay_server --scale medium --port 50001
+    ./electron-cash --regtest --oneserver --server 127.0.0.1:50001:t
+"""
+
+import argparse
+import hashlib
+import json
+import queue
+import socketserver
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .. import util
+from ..bitcoin import Hash, hash_decode, hash_encode
+
+HEADER_SIZE = 80
+MAX_CHUNK_SIZE = 2016
+FIRST_TX_HEIGHT = 200  # comfortably past the regtest checkpoint
+SERVER_VERSION = 'ElectronCash ReplayServer 1.0'
+PROTOCOL_VERSION = '1.4'
+
+# JSON-RPC error codes, as used by ElectrumX
+BAD_REQUEST = 1
+DAEMON_ERROR = 2
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def merkle_branch_and_root(hashes: List[bytes], index: int) -> Tuple[List[bytes], bytes]:
+    ''' Returns the merkle branch of hashes[index], and the root. The hashes
+    are in binary, internal byte order. '''
+    if not hashes:
+        raise ValueError('no hashes')
+    branch = []
+    level = list(hashes)
+    while len(level) > 1:
+        if len(level) & 1:
+            level.append(level[-1])
+        branch.append(level[index ^ 1])
+        level = [Hash(level[i] + level[i + 1]) for i in range(0, len(level), 2)]
+        index >>= 1
+    return branch, level[0]
+
+
+def scripthash_status(history: List[Tuple[str, int]]) -> Optional[str]:
+    ''' The status of a scripthash with the given history, as sent by
+    blockchain.scripthash.subscribe '''
+    if not history:
+        return None
+    status = ''.join(f'{tx_hash}:{height:d}:' for tx_hash, height in history)
+    return hashlib.sha256(status.encode('ascii')).hexdigest()
+
+
+class ReplayDataset:
+
+    def __init__(self, headers: bytes, txs: Dict[str, Tuple[str, int, int]],
+                 history: Dict[str, List[Tuple[str, int]]], wallet: Optional[dict] = None):
+        if not headers or len(headers) % HEADER_SIZE:
+            raise ValueError('headers must be a whole number of 80 byte headers')
+        self.headers = headers
+        self.txs = txs  # txid -> (raw hex, height, position in block)
+        self.history = history  # scripthash -> [(txid, height)], in chain order
+        self.wallet = wallet or {}  # what the sync harness needs to know to make the wallet
+        self.blocks = defaultdict(list)  # height -> [txid], in position order
+        for txid, (_raw, height, pos) in sorted(txs.items(), key=lambda kv: kv[1][1:]):
+            self.blocks[height].append(txid)
+        self._header_hashes = [Hash(headers[i:i + HEADER_SIZE]) for i in range(0, len(headers), HEADER_SIZE)]
+        self._utxos = None
+
+    @property
+    def tip(self) -> int:
+        return len(self.headers) // HEADER_SIZE - 1
+
+    def header(self, height) -> bytes:
+        return self.headers[height * HEADER_SIZE:(height + 1) * HEADER_SIZE]
+
+    def header_proof(self, height, cp_height) -> Tuple[List[str], str]:
+        ''' The merkle branch and root of the header at height in the tree
+        of all headers up to cp_height, in hex as ElectrumX sends them '''
+        branch, root = merkle_branch_and_root(self._header_hashes[:cp_height + 1], height)
+        return [hash_encode(h) for h in branch], hash_encode(root)
+
+    def tx_merkle(self, txid) -> dict:
+        _raw, height, pos = self.txs[txid]
+        branch, _root = merkle_branch_and_root([hash_decode(h) for h in self.blocks[height]], pos)
+        return {'block_height': height, 'merkle': [hash_encode(h) for h in branch], 'pos': pos}
+
+    def utxos(self, scripthash) -> List[dict]:
+        if self._utxos is None:
+            self._utxos = self._make_utxos()
+        return self._utxos.get(scripthash, [])
+
+    def _make_utxos(self):
+        from ..transaction import Transaction
+        spent, utxos = set(), defaultdict(list)
+        ordered = sorted(self.txs.items(), key=lambda kv: kv[1][1:])
+        for txid, (raw, height, pos) in ordered:
+            tx = Transaction(raw)
+            spent.update((i['prevout_hash'], i['prevout_n']) for i in tx.inputs())
+        for txid, (raw, height, pos) in ordered:
+            for n, (_typ, addr, value) in enumerate(Transaction(raw).outputs()):
+                if (txid, n) not in spent and hasattr(addr, 'to_scripthash_hex'):
+                    utxos[addr.to_scripthash_hex()].append({'tx_hash': txid, 'tx_pos': n, 'height': height,
+                                                            'value': value})
+        return utxos
+
+    @classmethod
+    def synthetic(cls, n_addresses=100, n_txs=1000, n_tokens=0, n_fusions=0, *, seed=0,
+                  n_headers=0) -> 'ReplayDataset':
+        ''' The history of synthetic.make_history() in a chain of at least
+        n_headers headers. '''
+        from .. import bitcoin, keystore, networks
+        from . import synthetic
+        hist = synthetic.make_history(n_addresses, n_txs, n_tokens, n_fusions, seed=seed,
+                                      first_height=FIRST_TX_HEIGHT)
+        txs = {txid: (raw, height, pos) for txid, raw, height, pos in hist.txs}
+        blocks = defaultdict(list)
+        for txid, _raw, height, _pos in hist.txs:
+            blocks[height].append(hash_decode(txid))
+        merkle_roots = {height: hash_encode(merkle_branch_and_root(hashes, 0)[1]) for height, hashes in blocks.items()}
+        tip = max(n_headers - 1, max(blocks, default=FIRST_TX_HEIGHT) + 6)
+        headers = synthetic.make_headers(tip + 1, seed=seed, merkle_roots=merkle_roots)
+        history = {addr.to_scripthash_hex(): h for addr, h in hist.history.items()}
+        # The xpub is for regtest, which is what the dataset is served on
+        xtype, depth, fingerprint, child_number, c, cK = bitcoin.deserialize_xpub(
+            keystore.from_xprv(hist.xprv).get_master_public_key())
+        xpub = bitcoin.serialize_xpub(xtype, c, cK, depth, fingerprint, child_number, net=networks.RegtestNet)
+        wallet = {'xpub': xpub, 'gap_limit': n_addresses}
+        return cls(headers, txs, history, wallet)
+
+    def to_json(self) -> dict:
+        return {'version': 1, 'headers': self.headers.hex(), 'txs': self.txs,
+                'history': self.history, 'wallet': self.wallet}
+
+    @classmethod
+    def from_json(cls, d) -> 'ReplayDataset':
+        if d.get('version') != 1:
+            raise ValueError('unsupported dataset version: {!r}'.format(d.get('version')))
+        return cls(bytes.fromhex(d['headers']),
+                   {txid: tuple(v) for txid, v in d['txs'].items()},
+                   {sh: [tuple(item) for item in h] for sh, h in d['history'].items()},
+                   d.get('wallet'))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f)
+
+    @classmethod
+    def load(cls, path) -> 'ReplayDataset':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+
+class ReplayServer(util.PrintError):
+    ''' Serves a ReplayDataset over plain TCP in background threads. Every
+    response is delayed by latency seconds, and if bandwidth (bytes/sec) is
+    set, responses to each client are also paced as if over a link that
+    fast. Counts of the requests served are in stats(). '''
+
+    def __init__(self, dataset: ReplayDataset, host='127.0.0.1', port=0, *, latency=0.0, bandwidth=None):
+        self.dataset = dataset
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connections = 0
+        self.methods = {
+            'server.version': self.server_version,
+            'server.banner': lambda *args: 'Electron Cash replay server',
+            'server.donation_address': lambda: '',
+            'server.features': self.server_features,
+            'server.peers.subscribe': lambda: [],
+            'server.ping': lambda: None,
+            'blockchain.relayfee': lambda: 0.00001,
+            'blockchain.estimatefee': lambda number: 0.00001,
+            'mempool.get_fee_histogram': lambda: [],
+            'blockchain.headers.subscribe': self.headers_subscribe,
+            'blockchain.block.header': self.block_header,
+            'blockchain.block.headers': self.block_headers,
+            'blockchain.scripthash.subscribe': self.scripthash_subscribe,
+            'blockchain.scripthash.unsubscribe': lambda scripthash: True,
+            'blockchain.scripthash.get_history': self.scripthash_get_history,
+            'blockchain.scripthash.get_mempool': lambda scripthash: [],
+            'blockchain.scripthash.get_balance': self.scripthash_get_balance,
+            'blockchain.scripthash.listunspent': self.scripthash_listunspent,
+            'blockchain.transaction.get': self.transaction_get,
+            'blockchain.transaction.get_merkle': self.transaction_get_merkle,
+            'blockchain.transaction.broadcast': self.transaction_broadcast,
+        }
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server._serve(self.request, self.rfile)
+
+        self.tcp_server = socketserver.ThreadingTCPServer((host, port), Handler, bind_and_activate=False)
+        self.tcp_server.allow_reuse_address = True
+        self.tcp_server.daemon_threads = True
+        self.tcp_server.server_bind()
+        self.tcp_server.server_activate()
+        self.thread = threading.Thread(target=self.tcp_server.serve_forever, name='ReplayServer', daemon=True)
+
+    def diagnostic_name(self):
+        return 'ReplayServer'
+
+    @property
+    def port(self) -> int:
+        return self.tcp_server.server_address[1]
+
+    @property
+    def server_key(self) -> str:
+        ''' The server string for the config, e.g. 127.0.0.1:50001:t '''
+        return '{}:{}:t'.format(self.tcp_server.server_address[0], self.port)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.tcp_server.shutdown()
+        self.tcp_server.server_close()
+        self.thread.join()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'requests': dict(self.requests), 'total_requests': sum(self.requests.values()),
+                    'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received,
+                    'connections': self.connections}
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_sent = self.bytes_received = self.connections = 0
+
+    # --- connection handling
+
+    def _serve(self, sock, rfile):
+        with self.lock:
+            self.connections += 1
+        out = queue.Queue()
+        writer = threading.Thread(target=self._writer, args=(sock, out), name='ReplayServerWriter', daemon=True)
+        writer.start()
+        try:
+            for line in rfile:
+                with self.lock:
+                    self.bytes_received += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    out.put((time.time() + self.latency, self._error(None, BAD_REQUEST, 'invalid JSON')))
+                    continue
+                if isinstance(message, list):
+                    response = [self._handle(m) for m in message]
+                else:
+                    response = self._handle(message)
+                out.put((time.time() + self.latency, response))
+        except OSError:
+            pass
+        finally:
+            out.put(None)
+            writer.join()
+
+    def _writer(self, sock, out):
+        link_free = 0.0  # when the simulated link has sent everything so far
+        while True:
+            item = out.get()
+            if item is None:
+                return
+            due, response = item
+            data = json.dumps(response).encode('utf-8') + b'\n'
+            now = time.time()
+            if self.bandwidth:
+                link_free = max(link_free, due, now) + len(data) / self.bandwidth
+                due = link_free
+            if due > now:
+                time.sleep(due - now)
+            try:
+                sock.sendall(data)
+            except OSError:
+                return
+            with self.lock:
+                self.bytes_sent += len(data)
+
+    def _handle(self, message) -> dict:
+        msg_id = message.get('id') if isinstance(message, dict) else None
+        if not isinstance(message, dict) or not isinstance(message.get('method'), str):
+            return self._error(msg_id, BAD_REQUEST, 'invalid request')
+        method = message['method']
+        params = message.get('params') or []
+        with self.lock:
+            self.requests[method] += 1
+        func = self.methods.get(method)
+        if func is None:
+            return self._error(msg_id, METHOD_NOT_FOUND, 'unknown method "{}"'.format(method))
+        try:
+            result = func(*params) if isinstance(params, list) else func(**params)
+        except RPCError as e:
+            return self._error(msg_id, e.code, e.message)
+        except (TypeError, ValueError, KeyError, IndexError) as e:
+            return self._error(msg_id, INVALID_PARAMS, 'invalid params: {!r}'.format(e))
+        return {'jsonrpc': '2.0', 'id': msg_id, 'result': result}
+
+    @staticmethod
+    def _error(msg_id, code, message):
+        return {'jsonrpc': '2.0', 'id': msg_id, 'error': {'code': code, 'message': message}}
+
+    # --- protocol methods
+
+    def server_version(self, client_name='', protocol_version=PROTOCOL_VERSION):
+        return [SERVER_VERSION, PROTOCOL_VERSION]
+
+    def server_features(self):
+        return {'genesis_hash': hash_encode(self.dataset._header_hashes[0]), 'hosts': {},
+                'protocol_min': PROTOCOL_VERSION, 'protocol_max': PROTOCOL_VERSION,
+                'server_version': SERVER_VERSION, 'hash_function': 'sha256', 'pruning': None}
+
+    def headers_subscribe(self):
+        tip = self.dataset.tip
+        return {'hex': self.dataset.header(tip).hex(), 'height': tip}
+
+    def _check_height(self, height, cp_height):
+        if not (isinstance(height, int) and isinstance(cp_height, int)):
+            raise RPCError(BAD_REQUEST, 'heights must be integers')
+        if not 0 <= height <= self.dataset.tip:
+            raise RPCError(BAD_REQUEST, 'height {:,d} out of range'.format(height))
+        if cp_height and not height <= cp_height <= self.dataset.tip:
+            raise RPCError(BAD_REQUEST, 'checkpoint height {:,d} out of range'.format(cp_height))
+
+    def block_header(self, height, cp_height=0):
+        self._check_height(height, cp_height)
+        header = self.dataset.header(height).hex()
+        if not cp_height:
+            return header
+        branch, root = self.dataset.header_proof(height, cp_height)
+        return {'header': header, 'branch': branch, 'root': root}
+
+    def block_headers(self, start_height, count, cp_height=0):
+        if not (isinstance(start_height, int) and isinstance(count, int)) or start_height < 0 or count < 0:
+            raise RPCError(BAD_REQUEST, 'bad start_height or count')
+        count = max(0, min(count, MAX_CHUNK_SIZE, self.dataset.tip + 1 - start_height))
+        result = {'hex': self.dataset.headers[start_height * HEADER_SIZE:(start_height + count) * HEADER_SIZE].hex(),
+                  'count': count, 'max': MAX_CHUNK_SIZE}
+        if count and cp_height:
+            last = start_height + count - 1
+            self._check_height(last, cp_height)
+            result['branch'], result['root'] = self.dataset.header_proof(last, cp_height)
+        return result
+
+    def scripthash_subscribe(self, scripthash):
+        return scripthash_status(self.dataset.history.get(scripthash))
+
+    def scripthash_get_history(self, scripthash):
+        return [{'tx_hash': txid, 'height': height} for txid, height in self.dataset.history.get(scripthash, [])]
+
+    def scripthash_get_balance(self, scripthash, *args):
+        return {'confirmed': sum(u['value'] for u in self.dataset.utxos(scripthash)), 'unconfirmed': 0}
+
+    def scripthash_listunspent(self, scripthash, *args):
+        return self.dataset.utxos(scripthash)
+
+    def transaction_get(self, txid, verbose=False):
+        if verbose:
+            raise RPCError(BAD_REQUEST, 'verbose transactions are not supported')
+        entry = self.dataset.txs.get(txid)
+        if entry is None:
+            raise RPCError(DAEMON_ERROR, 'No such mempool or blockchain transaction')
+        return entry[0]
+
+    def transaction_get_merkle(self, txid, height=None):
+        entry = self.dataset.txs.get(txid)
+        if entry is None or (height is not None and entry[1] != height):
+            raise RPCError(BAD_REQUEST, 'tx hash {} not in block at height {}'.format(txid, height))
+        return self.dataset.tx_merkle(txid)
+
+    def transaction_broadcast(self, raw_tx):
+        raise RPCError(BAD_REQUEST, 'the replay server does not relay transactions')
+
+
+def main(argv=None):
+    from .suite import SCALES
+    parser = argparse.ArgumentParser(prog='python -m electroncash.benchmarks.replay_server',
+                                     description='Serves a fixed regtest chain and wallet history.')
+    parser.add_argument('--dataset', help='a dataset JSON file to serve; otherwise a synthetic one is made')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='size of the synthetic dataset')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='also write the dataset to this file')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=50001)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to delay each response by')
+    parser.add_argument('--bandwidth', type=float, help='bytes/sec to limit each connection to')
+    args = parser.parse_args(argv)
+
+    if args.dataset:
+        dataset = ReplayDataset.load(args.dataset)
+    else:
+        dataset = ReplayDataset.synthetic(*SCALES[args.scale], seed=args.seed)
+    if args.save:
+        dataset.save(args.save)
+    server = ReplayServer(dataset, args.host, args.port, latency=args.latency, bandwidth=args.bandwidth)
+    print('serving {} headers, {} transactions on {}'.format(dataset.tip + 1, len(dataset.txs), server.server_key))
+    if dataset.wallet.get('xpub'):
+        print('wallet xpub:', dataset.wallet['xpub'])
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
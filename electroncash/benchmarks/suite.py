@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" The benchmarks themselves, and running and comparing them. """
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from .. import util
+from ..bitcoin import TYPE_ADDRESS
+from ..version import PACKAGE_VERSION
+from . import synthetic
+
+RESULTS_VERSION = 1
+
+SCALES = {
+    # name: (addresses, transactions, token categories, fusion-like txs)
+    'small': (50, 500, 5, 10),
+    'medium': (200, 5000, 20, 50),
+    'large': (1000, 50000, 50, 200),
+}
+
+DEFAULT_THRESHOLD = 1.25  # a benchmark that got 25% slower is a regression
+
+# name -> setup(ctx) which returns the zero-argument function to be timed
+BENCHMARKS: Dict[str, Callable[['Context'], Callable[[], object]]] = {}
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+class Context:
+    ''' What the benchmarks share: the synthetic wallet, a config and a
+    scratch directory, all made once per run. '''
+
+    def __init__(self, n_addresses, n_txs, n_tokens, n_fusions, *, seed=0):
+        from ..simple_config import SimpleConfig
+        self.tmpdir = tempfile.mkdtemp(prefix='ec_bench_')
+        self.config = SimpleConfig({'electron_cash_path': self.tmpdir})
+        self.synthetic = synthetic.make_wallet(n_addresses, n_txs, n_tokens, n_fusions, seed=seed)
+        self.wallet = self.synthetic.wallet
+
+    def close(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+@benchmark('wallet_save')
+def _wallet_save(ctx):
+    from ..storage import WalletStorage
+    storage = WalletStorage(os.path.join(ctx.tmpdir, 'wallet_save'))
+    storage.data = ctx.wallet.storage.data
+
+    def run():
+        storage.modified = True
+        storage.write()
+    return run
+
+
+@benchmark('wallet_open')
+def _wallet_open(ctx):
+    from ..storage import WalletStorage
+    from ..wallet import Wallet
+    path = os.path.join(ctx.tmpdir, 'wallet_open')
+    storage = WalletStorage(path)
+    storage.data = ctx.wallet.storage.data
+    storage.modified = True
+    storage.write()
+    return lambda: Wallet(WalletStorage(path))
+
+
+@benchmark('address_strings')
+def _address_strings(ctx):
+    import random
+    from ..address import Address
+    rng = random.Random(0)
+    strings = [Address.from_P2PKH_hash(rng.getrandbits(160).to_bytes(20, 'big')).to_storage_string()
+               for _ in range(20000)]
+
+    def run():
+        # What loading a wallet, refreshing its address list, subscribing to
+        # its addresses and saving it do with the same addresses
+        addrs = Address.from_strings(strings)
+        Address.to_strings(Address.FMT_UI, addrs)
+        [addr.to_scripthash_hex() for addr in addrs]
+        Address.to_strings(Address.FMT_LEGACY, addrs)
+    return run
+
+
+@benchmark('get_history')
+def _get_history(ctx):
+    return ctx.wallet.get_history
+
+
+@benchmark('get_history_tokens')
+def _get_history_tokens(ctx):
+    return lambda: ctx.wallet.get_history(include_tokens=True, include_tokens_balances=True)
+
+
+@benchmark('get_utxos')
+def _get_utxos(ctx):
+    return ctx.wallet.get_utxos
+
+
+@benchmark('get_balance')
+def _get_balance(ctx):
+    wallet = ctx.wallet
+
+    def run():
+        # Measure the real work, not the per-address balance cache
+        wallet._addr_bal_cache.clear()
+        return wallet.get_balance()
+    return run
+
+
+@benchmark('coin_selection')
+def _coin_selection(ctx):
+    wallet, config = ctx.wallet, ctx.config
+    amount = sum(wallet.get_balance()[:2]) // 3
+    outputs = [(TYPE_ADDRESS, synthetic.FOREIGN_ADDRESS, amount)]
+    return lambda: wallet.make_unsigned_transaction(wallet.get_spendable_coins(None, config), outputs, config)
+
+
+@benchmark('tx_deserialize')
+def _tx_deserialize(ctx):
+    from ..transaction import Transaction
+    raws = list(ctx.synthetic.raw_txs.values())[:1000]
+    return lambda: [Transaction(raw).deserialize() for raw in raws]
+
+
+@benchmark('tx_serialize')
+def _tx_serialize(ctx):
+    from ..transaction import Transaction
+    txs = [Transaction(raw) for raw in list(ctx.synthetic.raw_txs.values())[:1000]]
+    for tx in txs:
+        tx.deserialize()
+    return lambda: [tx.serialize() for tx in txs]
+
+
+@benchmark('sign_transaction')
+def _sign_transaction(ctx):
+    from ..transaction import Transaction
+    wallet, config = ctx.wallet, ctx.config
+    coins = sorted(wallet.get_spendable_coins(None, config), key=lambda c: -c['value'])[:5]
+    amount = sum(c['value'] for c in coins) // 2
+    unsigned = wallet.make_unsigned_transaction(coins, [(TYPE_ADDRESS, synthetic.FOREIGN_ADDRESS, amount)], config)
+    raw = unsigned.serialize()
+
+    def run():
+        tx = Transaction(raw)
+        wallet.sign_transaction(tx, None)
+        assert tx.is_complete()
+    return run
+
+
+@benchmark('payout_plan')
+def _payout_plan(ctx):
+    from ..payout import PayoutBuilder
+    wallet, config = ctx.wallet, ctx.config
+    coins = wallet.get_spendable_coins(None, config)
+    payouts = [(synthetic.FOREIGN_ADDRESS, 1000 + i) for i in range(10000)]
+
+    def run():
+        PayoutBuilder(wallet, coins, payouts, lambda size: size).plan()
+    return run
+
+
+@benchmark('consolidate_plan')
+def _consolidate_plan(ctx):
+    from ..consolidate import WalletConsolidator
+
+    def run():
+        WalletConsolidator(ctx.wallet, merge_addresses=True).plan()
+    return run
+
+
+@benchmark('header_verify')
+def _header_verify(ctx):
+    from ..blockchain import Blockchain, HeaderChunk
+    data = synthetic.make_headers()
+
+    def run():
+        headers = HeaderChunk(0, data).headers
+        for prev, header in zip(headers, headers[1:]):
+            # verify_header does not use the Blockchain instance itself
+            Blockchain.verify_header(None, header, prev, bits=header['bits'])
+    return run
+
+
+@benchmark('websocket_notify')
+def _websocket_notify(ctx):
+    from ..websockets import PaymentNotifier
+    wallet = ctx.wallet
+    ids = []
+    for addr in wallet.get_receiving_addresses()[:200]:
+        req = wallet.make_payment_request(addr, 10000, 'bench', 3600)
+        wallet.add_payment_request(req, ctx.config, set_address_label=False, save=False)
+        ids.append(req['id'])
+
+    class Client:
+        def __init__(self):
+            self.messages = []
+            self.sendMessage = self.messages.append
+
+    def run():
+        # 5000 pages wait on the requests, then a block comes in
+        notifier = PaymentNotifier({'bench': wallet})
+        clients = [Client() for _ in range(5000)]
+        for i, client in enumerate(clients):
+            notifier.on_message(client, 'id:' + ids[i % len(ids)])
+        notifier._on_network('blockchain_updated')
+        notifier.flush()
+        for client in clients:
+            notifier.unsubscribe(client)
+    return run
+
+
+def _time(func, repeat) -> List[float]:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - t0)
+    return runs
+
+
+def _meta(params) -> dict:
+    from .. import ecc_fast
+    return {
+        'version': PACKAGE_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'libsecp256k1': ecc_fast.is_using_fast_ecc(),
+        'params': params,
+        'time': int(time.time()),
+    }
+
+
+def run(n_addresses, n_txs, n_tokens=0, n_fusions=0, *, repeat=5, only=None, seed=0, log=None) -> dict:
+    ''' Runs the benchmarks (all of them, or those named in only) on a
+    synthetic wallet of the given size, and returns the results as a
+    JSON-friendly dict. Times are in seconds; compare on 'min', which is the
+    least noisy. '''
+    names = list(only or BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError('unknown benchmarks: ' + ', '.join(sorted(unknown)))
+    params = {'addresses': n_addresses, 'transactions': n_txs, 'tokens': n_tokens,
+              'fusions': n_fusions, 'repeat': repeat, 'seed': seed}
+    t0 = time.perf_counter()
+    ctx = Context(n_addresses, n_txs, n_tokens, n_fusions, seed=seed)
+    if log:
+        log('made synthetic wallet in {:.2f}s'.format(time.perf_counter() - t0))
+    results = {}
+    try:
+        for name in names:
+            runs = _time(BENCHMARKS[name](ctx), repeat)
+            results[name] = {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}
+            if log:
+                log('{:<20} {:>10.4f}s'.format(name, results[name]['min']))
+    finally:
+        ctx.close()
+    return {'results_version': RESULTS_VERSION, 'meta': _meta(params), 'results': results}
+
+
+def compare(results: dict, baseline: dict, threshold=DEFAULT_THRESHOLD) -> Dict[str, dict]:
+    ''' Compares the minimum times of the benchmarks in both results.
+    Returns name -> {'baseline', 'current', 'ratio', 'regression'}. '''
+    out = {}
+    for name, cur in results['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = cur['min'] / base['min'] if base['min'] > 0 else float('inf')
+        out[name] = {'baseline': base['min'], 'current': cur['min'], 'ratio': ratio,
+                     'regression': ratio > threshold}
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m electroncash.benchmarks',
+                                     description='Times the wallet hot paths on a synthetic wallet.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                        help='size of the synthetic wallet (default: small)')
+    parser.add_argument('--addresses', type=int, help='override the number of addresses')
+    parser.add_argument('--txs', type=int, help='override the number of transactions')
+    parser.add_argument('--tokens', type=int, help='override the number of token categories')
+    parser.add_argument('--fusions', type=int, help='override the number of fusion-like transactions')
+    parser.add_argument('--repeat', type=int, default=5, help='times to run each benchmark (default: 5)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help='comma separated benchmarks to run')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    parser.add_argument('--output', '-o', help='write the results as JSON to this file ("-" for stdout)')
+    parser.add_argument('--baseline', help='compare against results previously saved with --output')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown ratio that counts as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        return 0
+    # Keep the wallet's logging and @profiler out of the timings
+    util.set_verbosity(False)
+    n_addresses, n_txs, n_tokens, n_fusions = SCALES[args.scale]
+    n_addresses = args.addresses if args.addresses is not None else n_addresses
+    n_txs = args.txs if args.txs is not None else n_txs
+    n_tokens = args.tokens if args.tokens is not None else n_tokens
+    n_fusions = args.fusions if args.fusions is not None else n_fusions
+
+    def log(msg):
+        print(msg, file=sys.stderr)
+
+    try:
+        results = run(n_addresses, n_txs, n_tokens, n_fusions, repeat=max(1, args.repeat),
+                      only=args.only.split(',') if args.only else None, seed=args.seed, log=log)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.output == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('meta', {}).get('params', {}).get('addresses') != n_addresses \
+            or baseline['meta']['params'].get('transactions') != n_txs:
+        log('warning: the baseline was made with a different wallet size')
+    regressions = 0
+    for name, c in compare(results, baseline, args.threshold).items():
+        regressions += c['regression']
+        log('{:<20} {:>10.4f}s -> {:>10.4f}s  x{:.2f}{}'.format(
+            name, c['baseline'], c['current'], c['ratio'], '  REGRESSION' if c['regression'] else ''))
+    return 1 if regressions else 0
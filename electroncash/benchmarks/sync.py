@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" End-to-end wallet sync benchmark against a local ReplayServer.
+
+A fresh watching-only wallet for the dataset's xpub is synced from scratch by
+a real Network, Synchronizer and SPV verifier, and the time taken is
+measured along with the requests the server got, e.g.:
+
+    python -m electroncash.benchmarks.sync --scale medium --latency 0.05 -o sync.json
+
+Results have the same shape as those of the main suite, so --baseline works
+the same way. The network is switched to regtest for the duration. """
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from .. import networks, util
+from .replay_server import ReplayDataset, ReplayServer
+from .suite import DEFAULT_THRESHOLD, RESULTS_VERSION, SCALES, _meta, compare
+
+
+class SyncTimeout(Exception):
+    pass
+
+
+def sync_wallet(dataset: ReplayDataset, *, latency=0.0, bandwidth=None, timeout=600.0) -> dict:
+    ''' Syncs a new wallet from a ReplayServer serving dataset, and returns
+    {'seconds', 'headers_seconds', 'requests', 'total_requests',
+     'bytes_sent', 'transactions'}. headers_seconds is when the headers were
+    all in. Raises SyncTimeout if it is not done within timeout seconds. '''
+    from .. import keystore
+    from ..network import Network
+    from ..simple_config import SimpleConfig
+    from ..storage import WalletStorage
+    from ..wallet import Standard_Wallet
+
+    expected_txs = {txid for h in dataset.history.values() for txid, _height in h}
+    prev_net = networks.net
+    networks.set_regtest()
+    tmpdir = tempfile.mkdtemp(prefix='ec_sync_')
+    server = ReplayServer(dataset, latency=latency, bandwidth=bandwidth)
+    server.start()
+    network = wallet = None
+    try:
+        config = SimpleConfig({'electron_cash_path': tmpdir, 'regtest': True, 'server': server.server_key,
+                               'oneserver': True, 'auto_connect': False})
+        storage = WalletStorage(os.path.join(config.path, 'wallet'))
+        storage.put('keystore', keystore.from_master_key(dataset.wallet['xpub']).dump())
+        storage.put('wallet_type', 'standard')
+        storage.put('gap_limit', dataset.wallet.get('gap_limit', 20))
+        wallet = Standard_Wallet(storage)
+
+        t0 = time.perf_counter()
+        network = Network(config)
+        network.start()
+        wallet.start_threads(network)
+        headers_seconds = None
+        while True:
+            elapsed = time.perf_counter() - t0
+            if headers_seconds is None and network.get_local_height() >= dataset.tip:
+                headers_seconds = elapsed
+            if (headers_seconds is not None and wallet.is_up_to_date()
+                    and len(wallet.verified_tx) >= len(expected_txs)):
+                break
+            if elapsed > timeout:
+                raise SyncTimeout('not synced after {:.0f}s: height {}/{}, {}/{} transactions verified'.format(
+                    elapsed, network.get_local_height(), dataset.tip, len(wallet.verified_tx), len(expected_txs)))
+            time.sleep(0.005)
+        seconds = time.perf_counter() - t0
+        result = {'seconds': seconds, 'headers_seconds': headers_seconds, 'transactions': len(wallet.transactions)}
+        result.update(server.stats())
+        return result
+    finally:
+        if wallet and wallet.network:
+            wallet.stop_threads()
+        if network:
+            network.stop()
+            network.join()
+        server.stop()
+        networks.net = prev_net
+        networks._set_units()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def run(scales, *, repeat=1, latency=0.0, bandwidth=None, seed=0, timeout=600.0, log=None) -> dict:
+    ''' Runs sync_wallet() for synthetic datasets of each of the given
+    scales (names in SCALES, or (addresses, txs, tokens, fusions) tuples) '''
+    results, params = {}, {'latency': latency, 'bandwidth': bandwidth, 'repeat': repeat, 'seed': seed,
+                           'scales': {}}
+    for scale in scales:
+        name, size = (scale, SCALES[scale]) if isinstance(scale, str) else ('x'.join(map(str, scale)), scale)
+        params['scales'][name] = size
+        dataset = ReplayDataset.synthetic(*size, seed=seed)
+        runs = [sync_wallet(dataset, latency=latency, bandwidth=bandwidth, timeout=timeout) for _ in range(repeat)]
+        times = [r['seconds'] for r in runs]
+        best = runs[times.index(min(times))]
+        results['sync_' + name] = dict(best, min=min(times), median=statistics.median(times), runs=times)
+        if log:
+            log('sync_{:<14} {:>9.3f}s  headers {:.3f}s  {} requests'.format(
+                name, best['seconds'], best['headers_seconds'], best['total_requests']))
+    return {'results_version': RESULTS_VERSION, 'meta': _meta(params), 'results': results}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m electroncash.benchmarks.sync',
+                                     description='Times syncing a wallet from a local replay server.')
+    parser.add_argument('--scale', action='append', choices=sorted(SCALES),
+                        help='size of the synthetic wallet; may be given more than once (default: small)')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the server delays each response by')
+    parser.add_argument('--bandwidth', type=float, help='bytes/sec the server is limited to')
+    parser.add_argument('--timeout', type=float, default=600.0)
+    parser.add_argument('--output', '-o', help='write the results as JSON to this file ("-" for stdout)')
+    parser.add_argument('--baseline', help='compare against results previously saved with --output')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    util.set_verbosity(False)
+
+    def log(msg):
+        print(msg, file=sys.stderr)
+
+    results = run(args.scale or ['small'], repeat=max(1, args.repeat), latency=args.latency,
+                  bandwidth=args.bandwidth, seed=args.seed, timeout=args.timeout, log=log)
+    if args.output == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if not args.baseline:
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = 0
+    for name, c in compare(results, baseline, args.threshold).items():
+        regressions += c['regression']
+        log('{:<20} {:>10.4f}s -> {:>10.4f}s  x{:.2f}{}'.format(
+            name, c['baseline'], c['current'], c['ratio'], '  REGRESSION' if c['regression'] else ''))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" Deterministic generator of large synthetic wallets for the benchmarks.
+
+The wallets are real Standard_Wallets on an in-memory WalletStorage. Their
+transactions are fed in through the same code paths the Synchronizer and the
+verifier use (add_transaction, receive_history_callback, verified_tx), so
+every wallet data structure is populated just as it would be for a real
+wallet with the same history. The transactions themselves carry dummy
+signatures: they parse and serialize like real ones, but would not pass
+script verification. """
+
+import random
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from .. import bitcoin, keystore, token
+from ..address import Address
+from ..bitcoin import TYPE_ADDRESS, push_script
+from ..storage import WalletStorage
+from ..transaction import Transaction
+from ..wallet import Standard_Wallet
+
+# Somebody else's coins: the pubkey of the secp256k1 generator point
+FOREIGN_PUBKEY = '0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798'
+FOREIGN_ADDRESS = Address.from_pubkey(FOREIGN_PUBKEY)
+DUMMY_SIG = '30' * 64 + '41'  # 65 bytes, like a Schnorr signature + sighash byte
+TXS_PER_BLOCK = 20
+FIRST_HEIGHT = 700000
+FIRST_TIMESTAMP = 1630000000
+TOKEN_DUST = 800
+N_CHANGE = 6  # change addresses used
+
+
+class SyntheticHistory:
+    ''' The transactions of a synthetic wallet, in chain order, and the
+    history of each of its addresses. Transaction i is mined at height
+    first_height + i // TXS_PER_BLOCK, position i % TXS_PER_BLOCK. '''
+
+    def __init__(self, xprv, txs: List[Tuple[str, str, int, int]], history: Dict[Address, List[Tuple[str, int]]],
+                 token_ids: List[str], n_addresses: int):
+        self.xprv = xprv
+        self.txs = txs  # [(txid, raw hex, height, position in block)]
+        self.history = history
+        self.token_ids = token_ids
+        self.n_addresses = n_addresses  # the gap limit needed to find them all
+
+
+class SyntheticWallet:
+    ''' A wallet plus what the benchmarks need to know about it '''
+
+    def __init__(self, wallet, raw_txs: Dict[str, str], token_ids: List[str]):
+        self.wallet = wallet
+        self.raw_txs = raw_txs  # txid -> raw hex, in the order they were made
+        self.token_ids = token_ids
+
+
+def make_xprv(seed: int) -> str:
+    xprv, _xpub = bitcoin.bip32_root(random.Random(seed).getrandbits(256).to_bytes(32, 'big'), 'standard')
+    return xprv
+
+
+def _input(prevout_hash, prevout_n, pubkey) -> dict:
+    return {
+        'type': 'p2pkh',
+        'prevout_hash': prevout_hash,
+        'prevout_n': prevout_n,
+        'sequence': 0xffffffff,
+        'scriptSig': push_script(DUMMY_SIG) + push_script(pubkey),
+    }
+
+
+def make_history(n_addresses=100, n_txs=1000, n_tokens=0, n_fusions=0, *, seed=0,
+                 first_height=FIRST_HEIGHT) -> SyntheticHistory:
+    ''' Makes the history of a wallet with n_addresses receiving addresses
+    and n_txs transactions, n_fusions of which are CashFusion-like (many
+    inputs and outputs, several of them ours). If n_tokens is nonzero, some
+    receives also carry fungible CashTokens of one of n_tokens categories. '''
+    rng = random.Random(seed)
+    xprv = make_xprv(seed)
+    ks = keystore.from_xprv(xprv)
+    pubkeys = {}
+    for for_change, count in ((0, n_addresses), (1, N_CHANGE)):
+        for n in range(count):
+            pubkey = ks.derive_pubkey(for_change, n)
+            pubkeys[Address.from_pubkey(pubkey)] = pubkey
+    receiving, change = list(pubkeys)[:n_addresses], list(pubkeys)[n_addresses:]
+    pubkey_owner = {pubkey: addr for addr, pubkey in pubkeys.items()}
+    token_ids = [rng.getrandbits(256).to_bytes(32, 'big')[::-1].hex() for _ in range(n_tokens)]
+
+    def foreign_prevout():
+        return rng.getrandbits(256).to_bytes(32, 'big').hex(), rng.randrange(4)
+
+    utxos: List[Tuple[str, int, Address, int]] = []  # our plain (non-token) coins
+    txs = []
+    history = defaultdict(list)
+    fusion_at = set(rng.sample(range(n_txs), min(n_fusions, n_txs)))
+
+    for i in range(n_txs):
+        inputs, outputs, token_datas = [], [], []
+        if i in fusion_at and utxos:
+            # Many of somebody else's coins and a few of ours in; many
+            # equal-ish outputs out, a few of them ours.
+            mine = [utxos.pop(rng.randrange(len(utxos))) for _ in range(min(len(utxos), rng.randint(1, 5)))]
+            inputs += [_input(h, n, pubkeys[addr]) for h, n, addr, _v in mine]
+            inputs += [_input(*foreign_prevout(), FOREIGN_PUBKEY) for _ in range(rng.randint(10, 30))]
+            amount = 1000000
+            outputs += [(TYPE_ADDRESS, rng.choice(receiving), amount) for _ in mine]
+            outputs += [(TYPE_ADDRESS, FOREIGN_ADDRESS, amount) for _ in range(rng.randint(10, 30))]
+            rng.shuffle(outputs)
+        elif utxos and rng.random() < 0.3:
+            # Spend some of our coins, with change
+            mine = [utxos.pop(rng.randrange(len(utxos))) for _ in range(min(len(utxos), rng.randint(1, 3)))]
+            total = sum(v for *_, v in mine)
+            pay = rng.randint(1000, max(1000, total // 2))
+            inputs += [_input(h, n, pubkeys[addr]) for h, n, addr, _v in mine]
+            outputs.append((TYPE_ADDRESS, FOREIGN_ADDRESS, pay))
+            if total - pay - 500 > 546:
+                outputs.append((TYPE_ADDRESS, rng.choice(change), total - pay - 500))
+        else:
+            # Receive from somebody else
+            inputs.append(_input(*foreign_prevout(), FOREIGN_PUBKEY))
+            outputs.append((TYPE_ADDRESS, rng.choice(receiving), rng.randint(10000, 100000000)))
+            outputs.append((TYPE_ADDRESS, FOREIGN_ADDRESS, rng.randint(10000, 100000000)))
+            if token_ids and rng.random() < 0.2:
+                outputs.append((TYPE_ADDRESS, rng.choice(receiving), TOKEN_DUST))
+                token_datas = [None, None, token.OutputData(id=rng.choice(token_ids), amount=rng.randint(1, 10**6))]
+        tx = Transaction.from_io(inputs, outputs, locktime=0, token_datas=token_datas or None)
+        raw = tx.serialize()
+        txid = Transaction(raw).txid_fast()
+        height = first_height + i // TXS_PER_BLOCK
+        txs.append((txid, raw, height, i % TXS_PER_BLOCK))
+        touched = []
+        for txin in inputs:
+            addr = pubkey_owner.get(txin['scriptSig'][-66:])
+            if addr:
+                touched.append(addr)
+        for n, (_t, addr, value) in enumerate(outputs):
+            if addr in pubkeys:
+                touched.append(addr)
+                if not (token_datas and n < len(token_datas) and token_datas[n]):
+                    utxos.append((txid, n, addr, value))
+        # An address may be both spent from and paid to in one tx
+        for addr in dict.fromkeys(touched):
+            history[addr].append((txid, height))
+
+    return SyntheticHistory(xprv, txs, dict(history), token_ids, n_addresses)
+
+
+def make_wallet(n_addresses=100, n_txs=1000, n_tokens=0, n_fusions=0, *, seed=0) -> SyntheticWallet:
+    ''' Makes a wallet with the history of make_history(), already synced
+    and verified. '''
+    hist = make_history(n_addresses, n_txs, n_tokens, n_fusions, seed=seed)
+    storage = WalletStorage(None, in_memory_only=True)
+    storage.put('keystore', keystore.from_xprv(hist.xprv).dump())
+    storage.put('gap_limit', n_addresses)
+    wallet = Standard_Wallet(storage)
+    wallet.synchronize()
+    raw_txs = {}
+    for txid, raw, height, pos in hist.txs:
+        raw_txs[txid] = raw
+        wallet.add_transaction(txid, Transaction(raw))
+        wallet.verified_tx[txid] = (height, FIRST_TIMESTAMP + 600 * (height - FIRST_HEIGHT), pos, None)
+    for addr, h in hist.history.items():
+        wallet.receive_history_callback(addr, h, {})
+    wallet.unverified_tx.clear()
+    wallet.save_transactions()
+    wallet.save_verified_tx()
+    wallet.save_addresses()
+    return SyntheticWallet(wallet, raw_txs, hist.token_ids)
+
+
+def make_headers(count=2016, *, seed=0, merkle_roots: Dict[int, str] = None) -> bytes:
+    ''' Returns count serialized headers that form a valid chain with a
+    trivial proof of work target. merkle_roots maps heights to the merkle
+    roots (hex, as in a deserialized header) those blocks should have; the
+    others get random ones. '''
+    from ..blockchain import hash_header, serialize_header
+    rng = random.Random(seed)
+    bits = 0x207fffff  # the regtest target: every other nonce or so is good
+    target = 0x7fffff << (8 * (0x20 - 3))
+    prev_hash = '00' * 32
+    out = []
+    for height in range(count):
+        merkle_root = rng.getrandbits(256).to_bytes(32, 'big').hex()
+        if merkle_roots and height in merkle_roots:
+            merkle_root = merkle_roots[height]
+        header = {
+            'version': 0x20000000,
+            'prev_block_hash': prev_hash,
+            'merkle_root': merkle_root,
+            'timestamp': FIRST_TIMESTAMP + 600 * height,
+            'bits': bits,
+            'nonce': 0,
+            'block_height': height,
+        }
+        while int(hash_header(header), 16) > target:
+            header['nonce'] += 1
+        out.append(bytes.fromhex(serialize_header(header)))
+        prev_hash = hash_header(header)
+    return b''.join(out)
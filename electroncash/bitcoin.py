@@ -987,16 +987,22 @@ def get_pubkeys_from_secret(secret):
 #  corresponding public key can NOT be determined without the master private key.
 # However, if n is positive, the resulting private key's corresponding
 #  public key can be determined without the master private key.
-def CKD_priv(k, c, n):
+# cK, the compressed public key of k, may be passed in if already known; it
+#  saves a point multiplication when deriving many children of one node.
+def CKD_priv(k, c, n, *, cK=None):
     is_prime = n & BIP32_PRIME
-    return _CKD_priv(k, c, bfh(rev_hex(int_to_hex(n,4))), is_prime)
+    return _CKD_priv(k, c, bfh(rev_hex(int_to_hex(n,4))), is_prime, cK=cK)
 
 
-def _CKD_priv(k, c, s, is_prime):
+def _CKD_priv(k, c, s, is_prime, *, cK=None):
     order = generator_secp256k1.order()
-    keypair = EC_KEY(k)
-    cK = GetPubKey(keypair.pubkey,True)
-    data = bytes([0]) + k + s if is_prime else cK + s
+    if is_prime:
+        data = bytes([0]) + k + s
+    else:
+        if cK is None:
+            keypair = EC_KEY(k)
+            cK = GetPubKey(keypair.pubkey,True)
+        data = cK + s
     I = hmac.new(c, data, hashlib.sha512).digest()
     k_n = number_to_string( (string_to_number(I[0:32]) + string_to_number(k)) % order , order )
     c_n = I[32:]
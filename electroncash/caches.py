@@ -11,6 +11,7 @@ import queue
 import weakref
 import math
 from collections import defaultdict
+from . import metrics
 from .util import PrintError, print_error
 
 
@@ -59,15 +60,18 @@ class ExpiringCache:
         self.maxlen = maxlen
         self.name = name
         self.d = dict()
+        self.hits = self.misses = 0  # for metrics; not locked, so approximate
         _ExpiringCacheMgr.add_cache(self)
 
     def get(self, key, default=None):
         res = self.d.get(key)
         if res is not None:
             # cache hit
+            self.hits += 1
             res[0] = _ExpiringCacheMgr.tick  # update tick access time for this cache hit
             return res[1]
         # cache miss
+        self.misses += 1
         return default
 
     def put(self, key, value):
@@ -267,6 +271,26 @@ class _ExpiringCacheMgr(PrintError):
         return ct
 
 
+def _collect_metrics():
+    with _ExpiringCacheMgr._lock:
+        caches = tuple(_ExpiringCacheMgr._instance.caches) if _ExpiringCacheMgr._instance else ()
+    # Several caches may share a name (e.g. one per wallet); add them up
+    hits, misses, sizes = defaultdict(int), defaultdict(int), defaultdict(int)
+    for c in caches:
+        hits[c.name] += c.hits
+        misses[c.name] += c.misses
+        sizes[c.name] += len(c)
+    yield ('electroncash_cache_hits_total', metrics.COUNTER, 'ExpiringCache hits',
+           [({'cache': name}, n) for name, n in hits.items()])
+    yield ('electroncash_cache_misses_total', metrics.COUNTER, 'ExpiringCache misses',
+           [({'cache': name}, n) for name, n in misses.items()])
+    yield ('electroncash_cache_items', metrics.GAUGE, 'Number of items in ExpiringCaches',
+           [({'cache': name}, n) for name, n in sizes.items()])
+
+
+metrics.add_collector(_collect_metrics)
+
+
 def get_object_size(obj_0):
     """Debug tool -- returns the amount of memory taken by an object in bytes
     by deeply examining its contents recursively (more accurate than
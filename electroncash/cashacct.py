@@ -47,6 +47,7 @@ from .transaction import Transaction
 from . import verifier
 from . import blockchain
 from . import caches
+from .cashacct_store import get_cashacct_store
 
 # 'cashacct:' URI scheme. Used by Crescent Cash and Electron Cash and
 # other wallets in the future.
@@ -642,8 +643,7 @@ def lookup(server, number, name=None, collision_prefix=None, timeout=timeout, ex
 
 def lookup_asynch(server, number, success_cb, error_cb=None,
                   name=None, collision_prefix=None, timeout=timeout, debug=debug):
-    ''' Like lookup() above, but spawns a thread and does its lookup
-    asynchronously.
+    ''' Like lookup() above, but does its lookup asynchronously.
 
     success_cb - will be called on successful completion with a single arg:
                  a tuple of (block_hash, the results list).
@@ -653,14 +653,20 @@ def lookup_asynch(server, number, success_cb, error_cb=None,
     In either case one of the two callbacks will be called. It's ok for
     success_cb and error_cb to be the same function (in which case it should
     inspect the arg passed to it). Note that the callbacks are called in the
-    context of the spawned thread, (So e.g. Qt GUI code using this function
+    context of a worker thread, (So e.g. Qt GUI code using this function
     should not modify the GUI directly from the callbacks but instead should
     emit a Qt signal from within the callbacks to be delivered to the main
-    thread as usual.) '''
+    thread as usual.)
 
-    def thread_func():
+    Lookups run on a bounded pool of worker threads, and a lookup that is
+    asked for while the same one is already underway shares its result. '''
+
+    def do_lookup():
         exc = []
         res = lookup(server=server, number=number, name=name, collision_prefix=collision_prefix, timeout=timeout, exc=exc, debug=debug)
+        return res, exc
+    def on_done(result):
+        res, exc = result
         called = False
         if res is None:
             if callable(error_cb) and exc:
@@ -671,10 +677,8 @@ def lookup_asynch(server, number, success_cb, error_cb=None,
             called = True
         if not called:
             # this should never happen
-            util.print_error("WARNING: no callback called for ", threading.current_thread().name)
-    t = threading.Thread(name=f"CashAcct lookup_asynch: {server} {number} ({name},{collision_prefix},{timeout})",
-                         target=thread_func, daemon=True)
-    t.start()
+            util.print_error("WARNING: no callback called for lookup", server, number)
+    _lookup_pool.submit((server, number, name and name.strip().lower(), collision_prefix), do_lookup, on_done)
 
 def lookup_asynch_all(number, success_cb, error_cb=None, name=None,
                       collision_prefix=None, timeout=timeout, debug=debug):
@@ -691,39 +695,43 @@ def lookup_asynch_all(number, success_cb, error_cb=None, name=None,
     Callbacks are called in another thread context so GUI-facing code should
     be aware of that fact (see nodes for lookup_asynch above).  '''
     assert servers, "No servers hard-coded in cashacct.py. FIXME!"
-    my_servers = servers.copy()
-    random.shuffle(my_servers)
-    N = len(my_servers)
-    q = queue.Queue()
-    lock = threading.Lock()
-    n_ok, n_err = 0, 0
-    def on_succ(res, server):
-        nonlocal n_ok
-        q.put(None)
-        with lock:
-            if debug: util.print_error("success", n_ok+n_err, server)
-            if n_ok:
-                return
-            n_ok += 1
-        success_cb(res, server)
-    def on_err(exc, server):
-        nonlocal n_err
-        q.put(None)
-        with lock:
-            if debug: util.print_error("error", n_ok+n_err, server, exc)
-            if n_ok:
-                return
-            n_err += 1
-            if n_err < N:
-                return
-        if error_cb:
-            error_cb(exc)
     def do_lookup_all_staggered():
         ''' Send req. out to all servers, staggering the requests every 200ms,
         and stopping early after the first success.  The goal here is to
         maximize the chance of successful results returned, with tolerance for
         some servers being unavailable, while also conserving on bandwidth a
-        little bit and not unconditionally going out to ALL servers.'''
+        little bit and not unconditionally going out to ALL servers.
+        Returns ((block_hash, results), server) or the last exception. '''
+        my_servers = servers.copy()
+        random.shuffle(my_servers)
+        N = len(my_servers)
+        q = queue.Queue()
+        lock = threading.Lock()
+        done = threading.Event()
+        n_ok, n_err = 0, 0
+        result = None
+        def on_succ(res, server):
+            nonlocal n_ok, result
+            q.put(None)
+            with lock:
+                if debug: util.print_error("success", n_ok+n_err, server)
+                if n_ok:
+                    return
+                n_ok += 1
+                result = (res, server)
+            done.set()
+        def on_err(exc, server):
+            nonlocal n_err, result
+            q.put(None)
+            with lock:
+                if debug: util.print_error("error", n_ok+n_err, server, exc)
+                if n_ok:
+                    return
+                n_err += 1
+                if n_err < N:
+                    return
+                result = exc
+            done.set()
         t0 = time.time()
         for i, server in enumerate(my_servers):
             if debug: util.print_error("server:", server, i)
@@ -742,14 +750,75 @@ def lookup_asynch_all(number, success_cb, error_cb=None, name=None,
                     q.get_nowait()
             except queue.Empty:
                 pass
-            with lock:
-                if n_ok:  # check for success
-                    if debug:
-                        util.print_error(f"do_lookup_all_staggered: returning "
-                                         f"early on server {i} of {len(my_servers)} after {(time.time()-t0)*1e3} msec")
-                    return
-    t = threading.Thread(daemon=True, target=do_lookup_all_staggered)
-    t.start()
+            if done.is_set():
+                if debug:
+                    util.print_error(f"do_lookup_all_staggered: returning "
+                                     f"early on server {i} of {len(my_servers)} after {(time.time()-t0)*1e3} msec")
+                break
+        # Each lookup gives up after timeout; allow for them waiting their turn in the pool
+        if not done.wait(timeout=timeout * 2 + 1.0):
+            return RuntimeError('Timed out waiting for the lookup servers')
+        return result
+    def on_done(result):
+        if isinstance(result, tuple):
+            success_cb(*result)
+        elif error_cb:
+            error_cb(result)
+    _lookup_all_pool.submit((number, name and name.strip().lower(), collision_prefix), do_lookup_all_staggered,
+                            on_done)
+
+
+class _LookupPool:
+    ''' Runs lookups on at most max_workers daemon threads. A lookup that is
+    submitted with the same key as one that is queued or running is not run
+    again: its callback gets the result of the one underway. '''
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.q = queue.Queue()
+        self.waiters = dict()  # key -> list of callbacks
+        self.n_workers = 0
+        self.n_idle = 0
+
+    def submit(self, key, func, callback):
+        ''' Calls callback(func()) in a worker thread. '''
+        with self.lock:
+            callbacks = self.waiters.get(key)
+            if callbacks is not None:
+                callbacks.append(callback)
+                return
+            self.waiters[key] = [callback]
+            self.q.put((key, func))
+            if self.n_idle < self.q.qsize() and self.n_workers < self.max_workers:
+                self.n_workers += 1
+                threading.Thread(name=f"{self.name} {self.n_workers}", target=self._work, daemon=True).start()
+
+    def _work(self):
+        while True:
+            with self.lock:
+                self.n_idle += 1
+            key, func = self.q.get()
+            with self.lock:
+                self.n_idle -= 1
+            try:
+                result = func()
+            except Exception as e:
+                result = e
+            with self.lock:
+                callbacks = self.waiters.pop(key, [])
+            for callback in callbacks:
+                try:
+                    callback(result)
+                except Exception as e:
+                    util.print_error(f"{self.name}: callback raised", repr(e))
+
+
+max_lookup_workers = 8  # at most this many lookup server requests at once
+_lookup_pool = _LookupPool("CashAcct lookup", max_lookup_workers)
+_lookup_all_pool = _LookupPool("CashAcct lookup_all", max_lookup_workers // 2)
+
 
 class ProcessedBlock:
     __slots__ = ( 'hash',  # str binhex block header hash
@@ -852,7 +921,8 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         # minimal collision hash encodings cache. keyed off (name.lower(), number, collision_hash) -> '03' string or '' string, serialized to disk for good UX on startup.
         self.minimal_ch_cache = caches.ExpiringCache(name=f"{self.wallet.diagnostic_name()} - CashAcct minimal collision_hash cache")
 
-        # Dict of block_height -> ProcessedBlock (not serialized to disk)
+        # Dict of block_height -> ProcessedBlock. Not serialized to the wallet
+        # file; the blocks are kept on disk in the shared cashacct_store instead.
         self.processed_blocks = caches.ExpiringCache(name=f"{self.wallet.diagnostic_name()} - CashAcct processed block cache", maxlen=5000, timeout=3600.0)
 
     def diagnostic_name(self):
@@ -1046,6 +1116,15 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
                 if found is None:
                     # See if we have the block cached
                     pb_cached = self.processed_blocks.get(num2bh(number))
+            if found is None and pb_cached is None:
+                # Or saved from an earlier session
+                stored = self._load_stored_block(num2bh(number))
+                if stored:
+                    pb_cached, minimal_chashes = stored
+                    found = minimal_chashes.get(key[0], {}).get(collision_hash)
+                    if found is not None:
+                        with self.lock:
+                            self.minimal_ch_cache.put(key, found)
         if found is None and pb_cached is not None:
             # We didn't have the chash but we do have the block, use that
             # immediately without going out to network
@@ -1354,8 +1433,19 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
             l = self._blocks_in_flight[number]
             l.append((success_cb, error_cb))
             if len(l) == 1:
-                if debug: self.print_error(f"verify_block_asynch: initiating new lookup_asynch_all on #{number}")
-                lookup_asynch_all(number=number, success_cb=on_success, error_cb=on_error, timeout=timeout, debug=debug)
+                if debug: self.print_error(f"verify_block_asynch: initiating new lookup on #{number}")
+                def start():
+                    stored = self._load_stored_block(num2bh(number))
+                    if stored:
+                        # No need to ask the lookup servers, but do SPV verify
+                        # its txs if we haven't yet
+                        pb = stored[0]
+                        return on_success((pb.hash, list(pb.reg_txs.values())), 'cashacct_store')
+                    lookup_asynch_all(number=number, success_cb=on_success, error_cb=on_error, timeout=timeout, debug=debug)
+                def on_done(result):
+                    if isinstance(result, Exception):
+                        on_error(result)
+                _lookup_all_pool.submit(('stored', id(self), number), start, on_done)
             else:
                 if debug: self.print_error(f"verify_block_asynch: #{number} already in-flight, will just enqueue callbacks")
 
@@ -1368,7 +1458,11 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         network = self.network  # just in case network goes away, capture it
         if not self._do_verify_block_argchecks(network=network, number=number, exc=exc, server=server):
             return
-        res = lookup(server=server, number=number, timeout=timeout, exc=exc, debug=debug)
+        stored = self._load_stored_block(num2bh(number))
+        if stored:
+            res = (stored[0].hash, list(stored[0].reg_txs.values()))
+        else:
+            res = lookup(server=server, number=number, timeout=timeout, exc=exc, debug=debug)
         if not res:
             return
         return self._verify_block_inner(res, network, server, number, verify_txs, timeout, exc, debug=debug)
@@ -1387,9 +1481,15 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
             minimal_ch_removed = []
             with self.lock:
                 pb_cached = self.processed_blocks.get(pb.height)
+            if pb_cached is None:
+                pb_cached = (self._load_stored_block(pb.height) or (None,))[0]
+            with self.lock:
                 if pb_cached and pb != pb_cached:
                     # Poor man's reorg detection below...
                     self.processed_blocks.put(pb.height, None)
+                    store = get_cashacct_store()
+                    if store is not None:
+                        store.discard(pb_cached.height, pb_cached.hash)
                     self.print_error(f"Warning, retrieved block info from server {server} is {pb} which differs from cached version {pb_cached}! Reverifying!")
                     keys = set()  # (lname, number, collision_hash) tuples
                     chash_rtxs = dict()  # chash_key_tuple -> regtx
@@ -1464,8 +1564,55 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
                 network.unregister_callback(on_verified)
         with self.lock:
             self.processed_blocks.put(pb.height, pb)
+        self._store_block(pb)
         return pb
 
+    def _store_block(self, pb : ProcessedBlock):
+        ''' Saves pb, whose txs all verified, to the shared on-disk store. '''
+        store = get_cashacct_store()
+        if store is None or not pb.reg_txs or not pb.status_hash:
+            return
+        data = {
+            'reg_txs': {txid: rtx.script.script.hex() for txid, rtx in pb.reg_txs.items()},
+            'minimal_chashes': dict(self._calc_minimal_chashes_for_block(pb)),
+        }
+        store.put(pb.height, pb.hash, pb.status_hash, data)
+
+    def _load_stored_block(self, height : int):
+        ''' Returns (ProcessedBlock, minimal_chashes) for the block at height
+        on our chain from the shared on-disk store, or None if it's not there.
+        minimal_chashes is as returned by _calc_minimal_chashes_for_block. The
+        ProcessedBlock also goes into the in-memory processed_blocks cache. '''
+        store = get_cashacct_store()
+        network = self.network
+        if store is None or not network:
+            return None
+        header = network.blockchain().read_header(height)
+        if not header:
+            # Can't tell if it's on our chain
+            return None
+        block_hash = blockchain.hash_header(header)
+        for bhash, status_hash, data in store.get(height):
+            if bhash != block_hash:
+                continue  # a block that was reorged away
+            try:
+                reg_txs = dict()
+                for txid, script_hex in data['reg_txs'].items():
+                    script = ScriptOutput(bytes.fromhex(script_hex))
+                    script.make_complete(block_height=height, block_hash=bhash, txid=txid)
+                    reg_txs[txid] = self.RegTx(txid, script)
+                pb = ProcessedBlock(hash=bhash, height=height, reg_txs=reg_txs)
+                if pb.status_hash != status_hash:
+                    raise ValueError('status hash mismatch')
+            except Exception as e:
+                self.print_error(f"_load_stored_block: bad entry for block {height}, discarding:", repr(e))
+                store.discard(height, bhash)
+                return None
+            with self.lock:
+                self.processed_blocks.put(height, pb)
+            return pb, data.get('minimal_chashes', {})
+        return None
+
     ############################
     # UI / Prefs / Convenience #
     ############################
@@ -1740,6 +1887,7 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         its verifier. We need to be told what set of tx_hash was undone. '''
         if not txs: return
         with self.lock:
+            heights = [self.v_tx[txid].block_height for txid in txs if txid in self.v_tx]
             for txid in txs:
                 self._rm_vtx(txid)  # this is safe as a no-op if txid was not relevant
                 self._find_script(txid, False, giveto='w')
@@ -1753,6 +1901,11 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
             # it flushes the cache)... so assigning to .d is safer in this case.
             self.minimal_ch_cache.d = {}
             self.processed_blocks.d = {}
+        # Blocks in the store are only used if they are on our chain, but
+        # there is no point in keeping those that were reorged away.
+        store = get_cashacct_store()
+        if store is not None and heights:
+            store.discard_from(min(heights))
 
     def add_transaction_hook(self, txid: str, tx: object, out_n: int, script: ScriptOutput):
         ''' Called by wallet inside add_transaction (with wallet.lock held) to
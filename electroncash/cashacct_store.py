@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" A persistent store of the Cash Accounts blocks we have processed.
+
+To resolve a Cash Account or to work out its minimal collision hash, CashAcct
+downloads all the registrations in its block from a lookup server and SPV
+verifies them. The result only depends on the block, so it is kept here (in
+an sqlite database in the data directory, shared by every wallet in the
+process) for the next time, including after a restart.
+
+Entries are keyed by block height and block hash. CashAcct only uses an entry
+if its hash is that of the header at its height on our chain, so entries of
+blocks that were reorged away are never used; they are also dropped when the
+wallet undoes verifications because of a reorg. The store is bounded by the
+number of blocks it holds, evicting the least recently used first. """
+
+import json
+import os
+import threading
+import zlib
+from typing import List, Optional, Tuple
+
+from .util import PrintError, print_error
+
+try:
+    import sqlite3
+except ImportError:  # Some stripped-down Python builds lack it; the store is then disabled
+    sqlite3 = None
+
+
+class ProcessedBlockStore(PrintError):
+
+    DEFAULT_MAX_BLOCKS = 20000
+    # On overflow, evict until we are this fraction of max_blocks
+    EVICT_TO = 0.9
+
+    def __init__(self, path: str, *, max_blocks: int = DEFAULT_MAX_BLOCKS):
+        assert sqlite3 is not None, "sqlite3 is not available"
+        self.path = path
+        self.max_blocks = max(1, int(max_blocks))
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS blocks (height INTEGER NOT NULL, hash BLOB NOT NULL,"
+                        " status_hash BLOB NOT NULL, data BLOB NOT NULL, atime INTEGER NOT NULL,"
+                        " PRIMARY KEY (height, hash)) WITHOUT ROWID")
+        self.db.execute("CREATE INDEX IF NOT EXISTS blocks_atime ON blocks (atime)")
+        self.count, max_atime = self.db.execute("SELECT COUNT(*), COALESCE(MAX(atime), 0) FROM blocks").fetchone()
+        self.atime = max_atime
+        self.hits = self.misses = 0
+
+    def diagnostic_name(self):
+        return self.__class__.__name__
+
+    def get(self, height: int) -> List[Tuple[str, str, dict]]:
+        """ Returns a list of (block hash, status hash, data) for the blocks
+        we have at height; usually one, more if there were reorgs. """
+        out = []
+        with self.lock:
+            try:
+                rows = self.db.execute("SELECT hash, status_hash, data FROM blocks WHERE height = ?",
+                                       (height,)).fetchall()
+                if not rows:
+                    self.misses += 1
+                    return out
+                self.atime += 1
+                self.db.execute("UPDATE blocks SET atime = ? WHERE height = ?", (self.atime, height))
+            except sqlite3.Error as e:
+                self.print_error("get failed:", repr(e))
+                return out
+            self.hits += 1
+        for block_hash, status_hash, data in rows:
+            try:
+                out.append((bytes(block_hash).hex(), bytes(status_hash).hex(),
+                            json.loads(zlib.decompress(data).decode('utf-8'))))
+            except (zlib.error, ValueError) as e:
+                self.print_error("corrupt entry for block", height, repr(e))
+                self.discard(height, bytes(block_hash).hex())
+        return out
+
+    def put(self, height: int, block_hash: str, status_hash: str, data: dict) -> bool:
+        """ Stores data (which must be JSON serializable) for the block. """
+        try:
+            key = bytes.fromhex(block_hash)
+            blob = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 6)
+            status = bytes.fromhex(status_hash)
+        except (TypeError, ValueError) as e:
+            self.print_error("refusing to store block", height, repr(e))
+            return False
+        with self.lock:
+            try:
+                self.atime += 1
+                exists = self.db.execute("SELECT 1 FROM blocks WHERE height = ? AND hash = ?",
+                                         (height, key)).fetchone()
+                self.db.execute("INSERT OR REPLACE INTO blocks (height, hash, status_hash, data, atime)"
+                                " VALUES (?, ?, ?, ?, ?)", (height, key, status, blob, self.atime))
+                if not exists:
+                    self.count += 1
+                    if self.count > self.max_blocks:
+                        self._evict(int(self.max_blocks * self.EVICT_TO))
+            except sqlite3.Error as e:
+                self.print_error("put failed:", repr(e))
+                return False
+        return True
+
+    def _evict(self, target):
+        # Called with the lock held
+        rows = self.db.execute("SELECT height, hash FROM blocks ORDER BY atime LIMIT ?",
+                               (max(self.count - target, 0),)).fetchall()
+        self.db.executemany("DELETE FROM blocks WHERE height = ? AND hash = ?", rows)
+        self.count -= len(rows)
+
+    def discard(self, height: int, block_hash: Optional[str] = None):
+        """ Forgets the block at height with block_hash, or all the blocks at
+        height if block_hash is None. """
+        self._delete("DELETE FROM blocks WHERE height = ?" + (" AND hash = ?" if block_hash else ""),
+                     (height, bytes.fromhex(block_hash)) if block_hash else (height,))
+
+    def discard_from(self, height: int):
+        """ Forgets all the blocks at height and above. """
+        self._delete("DELETE FROM blocks WHERE height >= ?", (height,))
+
+    def _delete(self, sql, args):
+        with self.lock:
+            try:
+                cur = self.db.execute(sql, args)
+                self.count -= max(cur.rowcount, 0)
+            except sqlite3.Error as e:
+                self.print_error("delete failed:", repr(e))
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+_store: Optional[ProcessedBlockStore] = None
+_store_failed_path: Optional[str] = None
+_store_lock = threading.Lock()
+
+
+def get_cashacct_store() -> Optional[ProcessedBlockStore]:
+    """ Returns the process-wide ProcessedBlockStore living in the data
+    directory of the current SimpleConfig, opening it on first use. Returns
+    None if there is no config yet, if the store was disabled via the
+    'cashacct_store' config key, or if it could not be opened. """
+    global _store, _store_failed_path
+    from .simple_config import get_config
+    config = get_config()
+    if config is None or not config.get('cashacct_store', True):
+        return None
+    path = os.path.join(config.path, 'cashacct_blocks.sqlite')
+    with _store_lock:
+        if _store is not None and _store.path == path:
+            return _store
+        if sqlite3 is None or path == _store_failed_path:
+            return None
+        if _store is not None:
+            # The config (data directory) changed. This only really happens in tests.
+            _store.close()
+            _store = None
+        try:
+            _store = ProcessedBlockStore(path, max_blocks=config.get('cashacct_store_max_blocks',
+                                                                     ProcessedBlockStore.DEFAULT_MAX_BLOCKS))
+        except (sqlite3.Error, OSError) as e:
+            print_error("[cashacct_store] unable to open", path, repr(e))
+            _store_failed_path = path
+            return None
+        return _store
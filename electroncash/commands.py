@@ -35,29 +35,24 @@ import time
 from decimal import Decimal as PyDecimal  # Qt 5.12 also exports Decimal
 from functools import wraps
 
-from . import bitcoin
-from . import rpa
-from . import token
-from . import token_meta
 from . import util
-from .address import Address, AddressError
-from .bitcoin import hash_160, COIN, TYPE_ADDRESS
-from .consolidate import AddressConsolidator
 from .i18n import _
-from .plugins import run_hook
-from .wallet import create_new_wallet, restore_wallet_from_text
-from .transaction import Transaction, multisig_script, OPReturn, tx_from_str
 from .util import bfh, bh2u, format_satoshis, json_decode, print_error, standardize_path, to_bytes
-from .paymentrequest import PR_PAID, PR_UNCONFIRMED, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
 from .simple_config import SimpleConfig
 from .version import PACKAGE_VERSION
 
+# NB: The command line client imports this module just to parse its arguments
+# (see get_parser() below) before forwarding the command to a running daemon,
+# so the heavy modules (wallet, transaction, bitcoin, ...) are imported by the
+# commands that use them rather than up here.
+
 
 known_commands = {}
 
 
 def satoshis(amount):
     # satoshi conversion must not be performed by the parser
+    from .bitcoin import COIN
     return int(COIN*PyDecimal(amount)) if amount not in ['!', None] else amount
 
 def assertOutpoint(out: str):
@@ -158,6 +153,7 @@ class Commands:
         """ Address, ScriptOutput and other objects contain bytes.  They cannot be serialized
             using JSON. This makes sure they get serialized properly by calling .to_ui_string() on them.
             See issue #638 """
+        from . import token
         def DoChk(v):
             def ChkList(l):
                 for i in range(0,len(l)): l[i] = DoChk(l[i]) # recurse
@@ -181,6 +177,7 @@ class Commands:
         """Convert to/from Legacy <-> Cash Address.  Address can be either
         a legacy or a Cash Address and both forms will be returned as a JSON
         dict."""
+        from .address import Address, AddressError
         try:
             addr = Address.from_string(address)
         except Exception as e:
@@ -215,6 +212,25 @@ class Commands:
         }
         return response
 
+    @command('')
+    def getrpcinfo(self):
+        """ RPC server statistics: connections, queued and in-flight requests,
+        and per-method request counts and latencies (in seconds). """
+        server = self.daemon and self.daemon.server
+        if not server:
+            raise BaseException("Daemon RPC server not running")
+        return server.stats.as_dict()
+
+    @command('')
+    def getmetrics(self):
+        """ Runtime metrics of the daemon: request latencies, sync backlogs,
+        wallet writes, cache hit rates, etc. Set the config key metrics_port
+        to also serve them in the Prometheus text format on localhost. """
+        if not self.daemon:
+            raise BaseException("Daemon not running")
+        from . import metrics
+        return metrics.snapshot()
+
     @command('n')
     def stop(self):
         """Stop daemon"""
@@ -253,6 +269,7 @@ class Commands:
         """Create a new wallet.
         If you want to be prompted for an argument, type '?' or ':' (concealed)
         """
+        from .wallet import create_new_wallet
         d = create_new_wallet(path=wallet_path,
                               passphrase=passphrase,
                               password=password,
@@ -272,6 +289,7 @@ class Commands:
         or bitcoin cash private keys.
         If you want to be prompted for an argument, type '?' or ':' (concealed)
         """
+        from .wallet import restore_wallet_from_text
         d = restore_wallet_from_text(text,
                                      path=wallet_path,
                                      passphrase=passphrase,
@@ -351,6 +369,7 @@ class Commands:
         """Return the transaction history of any address. Note: This is a
         walletless server query, results are not checked by SPV.
         """
+        from .address import Address
         sh = Address.from_string(address).to_scripthash_hex()
         return self.network.synchronous_get(('blockchain.scripthash.get_history', [sh]))
 
@@ -364,6 +383,8 @@ class Commands:
         destination of the same address.
 
         Returns the array of (unsigned) transaction(s) (as hex strings)."""
+        from .address import Address
+        from .consolidate import AddressConsolidator
         if isinstance(address, str):
             address = Address.from_string(address)
         elif not isinstance(address, Address):
@@ -372,10 +393,44 @@ class Commands:
         consolidator = AddressConsolidator(address=address, wallet_instance=self.wallet, output_address=address)
         return [tx.serialize() for tx in consolidator.iter_transactions()]
 
+    @command('wp')
+    def consolidatewallet(self, from_addr=None, feerate=None, output_addr=None, merge_addresses=False,
+                          include_frozen=False, unsigned=False, password=None, preview=False):
+        """Consolidate the coins of all addresses (or of those given with
+        from_addr) into as few transactions as possible. Unless
+        merge_addresses is given, coins of different addresses are never spent
+        together, and go back to the address they came from (or to
+        output_addr). Returns the projected fees and, unless preview is given,
+        the transactions (as hex strings, signed unless unsigned is given).
+        If you want to be prompted for an argument, type '?' or ':' (concealed)
+        """
+        from .bitcoin import COIN
+        from .consolidate import WalletConsolidator
+        self.nocheck = False
+        domain = None if not from_addr else [self._resolver(a) for a in from_addr.split(',')]
+        if feerate is not None:
+            fee_per_kb = 1000 * PyDecimal(feerate)
+            fee_estimator = lambda size: SimpleConfig.estimate_fee_for_feerate(fee_per_kb, size)
+        else:
+            fee_estimator = self.config.estimate_fee
+        consolidator = WalletConsolidator(self.wallet, domain, include_frozen=include_frozen,
+                                          output_address=self._resolver(output_addr),
+                                          merge_addresses=merge_addresses, fee_estimator=fee_estimator)
+        chunks = consolidator.plan()
+        summary = consolidator.summary(chunks)
+        for key in ('input_value', 'fee', 'output_value'):
+            summary[key] = str(PyDecimal(summary[key]) / COIN)
+        out = {'summary': summary}
+        if not preview:
+            txs = consolidator.make_transactions(password, sign=not unsigned, chunks=chunks)
+            out['transactions'] = [str(tx) for tx in txs]
+        return out
+
     @command('w')
     def listunspent(self):
         """List unspent outputs. Returns the list of unspent transaction
         outputs in your wallet."""
+        from .bitcoin import COIN
         l = self.wallet.get_utxos(exclude_frozen=False)
         for i in l:
             v = i["value"]
@@ -388,6 +443,7 @@ class Commands:
         """Returns the UTXO list of any address. Note: This is a walletless server
         query that excludes token UTXOs by default, results are not checked by SPV.
         """
+        from .address import Address
         sh = Address.from_string(address).to_scripthash_hex()
         token_filter = "tokens_only" if tokens_only else "include_tokens" if include_tokens else "exclude_tokens"
         return self.network.synchronous_get(('blockchain.scripthash.listunspent', [sh, token_filter]))
@@ -398,6 +454,10 @@ class Commands:
         Inputs must have a redeemPubkey.
         Outputs must be a list of {'address':address, 'value':satoshi_amount}.
         """
+        from . import bitcoin, token
+        from .address import Address
+        from .bitcoin import TYPE_ADDRESS
+        from .transaction import Transaction
         keypairs = {}
         inputs = jsontx.get('inputs')
         outputs = jsontx.get('outputs')
@@ -454,6 +514,8 @@ class Commands:
         """Sign a transaction. The wallet keys will be used unless a private key is provided.
         If you want to be prompted for an argument, type '?' or ':' (concealed)
         """
+        from . import bitcoin
+        from .transaction import Transaction
         tx = Transaction(tx, sign_schnorr=schnorr or (self.wallet and self.wallet.is_schnorr_enabled()))
         if privkey:
             txin_type, privkey2, compressed = bitcoin.deserialize_privkey(privkey)
@@ -466,18 +528,39 @@ class Commands:
     @command('')
     def deserialize(self, tx):
         """Deserialize a serialized transaction"""
+        from .transaction import Transaction
         tx = Transaction(tx)
         return self._EnsureDictNamedTuplesAreJSONSafe(tx.deserialize().copy())
 
     @command('n')
     def broadcast(self, tx):
         """Broadcast a transaction to the network. """
+        from .transaction import Transaction
         tx = Transaction(tx)
         return self.network.broadcast_transaction(tx)
 
+    @command('n')
+    def broadcastmany(self, txs, timeout=None):
+        """Broadcast many transactions to the network. Transactions that spend
+        from others among them are only sent once those were accepted.
+        Returns the result of each, in the order they came in. If timeout is
+        given, stops waiting after that many seconds."""
+        from .transaction import Transaction
+        txs = [Transaction(tx) for tx in txs_from_str(txs)]
+        for tx in txs:
+            if not tx.is_complete():
+                raise ValueError("Transaction {} is not complete".format(tx.txid() or tx.raw[:16]))
+        out = []
+        for txid, error in self.network.tx_broadcaster.broadcast_many(txs, timeout=timeout and float(timeout)):
+            out.append({'txid': txid, 'success': error is None, 'error': error})
+        return out
+
     @command('')
     def createmultisig(self, num, pubkeys):
         """Create multisig address"""
+        from . import bitcoin
+        from .bitcoin import hash_160
+        from .transaction import multisig_script
         assert isinstance(pubkeys, list), (type(num), type(pubkeys))
         redeem_script = multisig_script(pubkeys, num)
         address = bitcoin.hash160_to_p2sh(hash_160(bfh(redeem_script)))
@@ -486,12 +569,14 @@ class Commands:
     @command('w')
     def freeze(self, address: str):
         """Freeze address. Freeze the funds at one of your wallet\'s addresses"""
+        from .address import Address
         address = Address.from_string(address)
         return self.wallet.set_frozen_state([address], True)
 
     @command('w')
     def unfreeze(self, address: str):
         """Unfreeze address. Unfreeze the funds at one of your wallet\'s address"""
+        from .address import Address
         address = Address.from_string(address)
         return self.wallet.set_frozen_state([address], False)
 
@@ -514,6 +599,7 @@ class Commands:
         """Get private keys of addresses. You may pass a single wallet address, or a list of wallet addresses.
         If you want to be prompted for an argument, type '?' or ':' (concealed)
         """
+        from .address import Address
         def get_pk(address):
             address = Address.from_string(address)
             return self.wallet.export_private_key(address, password)
@@ -526,6 +612,7 @@ class Commands:
     @command('w')
     def ismine(self, address):
         """Check if address is in wallet. Return true if and only address is in wallet"""
+        from .address import Address
         address = Address.from_string(address)
         return self.wallet.is_mine(address)
 
@@ -537,17 +624,20 @@ class Commands:
     @command('')
     def validateaddress(self, address):
         """Check that an address is valid. """
+        from .address import Address
         return Address.is_valid(address)
 
     @command('w')
     def getpubkeys(self, address):
         """Return the public keys for a wallet address. """
+        from .address import Address
         address = Address.from_string(address)
         return self.wallet.get_public_keys(address)
 
     @command('w')
     def getbalance(self):
         """Return the balance of your wallet. """
+        from .bitcoin import COIN
         c, u, x = self.wallet.get_balance()
         out = {"confirmed": str(PyDecimal(c)/COIN)}
         if u:
@@ -561,6 +651,8 @@ class Commands:
         """Return the balance of any address. Note: This is a walletless server
         query that excludes token dust by default, results are not checked by SPV.
         """
+        from .address import Address
+        from .bitcoin import COIN
         sh = Address.from_string(address).to_scripthash_hex()
         token_filter = "tokens_only" if tokens_only else "include_tokens" if include_tokens else "exclude_tokens"
         out = self.network.synchronous_get(('blockchain.scripthash.get_balance', [sh, token_filter]))
@@ -632,6 +724,7 @@ class Commands:
         """Sweep private keys. Returns a transaction that spends UTXOs from
         privkey to a destination address. The transaction is not
         broadcasted."""
+        from .address import Address
         from .wallet import sweep
         tx_fee = satoshis(fee)
         privkeys = privkey.split()
@@ -645,6 +738,7 @@ class Commands:
         """Sign a message with a key. Use quotes if your message contains whitespaces.
         If you want to be prompted for an argument, type '?' or ':' (concealed)
         """
+        from .address import Address
         address = Address.from_string(address)
         sig = self.wallet.sign_message(address, message, password)
         return base64.b64encode(sig).decode('ascii')
@@ -652,6 +746,8 @@ class Commands:
     @command('')
     def verifymessage(self, address, signature, message):
         """Verify a signature."""
+        from . import bitcoin
+        from .address import Address
         address = Address.from_string(address)
         sig = base64.b64decode(signature)
         message = util.to_bytes(message)
@@ -659,6 +755,9 @@ class Commands:
 
     def _mktx(self, outputs, fee=None, feerate=None, change_addr=None, domain=None, nocheck=False,
               unsigned=False, password=None, locktime=None, op_return=None, op_return_raw=None, addtransaction=False):
+        from .bitcoin import TYPE_ADDRESS
+        from .plugins import run_hook
+        from .transaction import OPReturn
         if fee is not None and feerate is not None:
             raise ValueError("Cannot specify both 'fee' and 'feerate' at the same time!")
         if op_return and op_return_raw:
@@ -703,6 +802,7 @@ class Commands:
 
     @command('w')
     def rpa_generate_paycode(self):
+        from . import rpa
         if self.wallet.wallet_type != 'rpa':
             return {'error': 'This command may only be used on an RPA wallet.'}
         return rpa.paycode.generate_paycode(self.wallet)
@@ -710,10 +810,12 @@ class Commands:
     @command('w')
     def rpa_generate_transaction_from_paycode(self, amount, paycode):
         # WARNING: Amount is in full Bitcoin Cash units
+        from . import rpa
         return rpa.paycode.generate_transaction_from_paycode(self.wallet, self.config, amount, paycode)
 
     @command('wp')
     def rpa_extract_private_keys_from_transaction(self, raw_tx, password=None):
+        from . import rpa
         if self.wallet.wallet_type != 'rpa':
             return {'error': 'This command may only be used on an RPA wallet.'}
 
@@ -740,6 +842,32 @@ class Commands:
         tx = self._mktx(outputs, tx_fee, feerate, change_addr, domain, nocheck, unsigned, password, locktime, addtransaction=addtransaction)
         return tx.as_dict()
 
+    @command('wp')
+    def payout(self, payouts, feerate=None, from_addr=None, change_addr=None, unsigned=False, password=None,
+               max_tx_size=None):
+        """Pay many outputs, in as many transactions as it takes to keep each
+        under the standard size. Payouts are CSV ("address, amount" lines) or
+        a JSON list of [address, amount]; amounts are in BCH. Returns the
+        transactions in the order to broadcast them in, e.g. with broadcastmany.
+        If you want to be prompted for an argument, type '?' or ':' (concealed)
+        """
+        from .payout import PayoutBuilder, parse_payouts, MAX_STANDARD_TX_SIZE
+        self.nocheck = False
+        change_addr = self._resolver(change_addr)
+        domain = None if not from_addr else map(self._resolver, from_addr.split(','))
+        coins = self.wallet.get_spendable_coins(domain, self.config)
+        if feerate is not None:
+            fee_per_kb = 1000 * PyDecimal(feerate)
+            fee_estimator = lambda size: SimpleConfig.estimate_fee_for_feerate(fee_per_kb, size)
+        else:
+            fee_estimator = self.config.estimate_fee
+        builder = PayoutBuilder(self.wallet, coins, parse_payouts(payouts), fee_estimator, change_addr=change_addr,
+                                max_tx_size=int(max_tx_size or MAX_STANDARD_TX_SIZE))
+        txs = builder.make_transactions(password, sign=not unsigned)
+        if unsigned:
+            return [tx.as_dict() for tx in txs]
+        return [str(tx) for tx in txs]
+
     @command('w')
     def history(self, year=0, show_addresses=False, show_fiat=False, use_net=False, timeout=30.0):
         """Wallet history. Returns the transaction history of your wallet."""
@@ -787,6 +915,7 @@ class Commands:
     @command('w')
     def token_history(self, year=0, use_net=False, timeout=30.0):
         """Token history. Returns the token history of your wallet."""
+        from . import token_meta
         class BasicTokenMeta(token_meta.TokenMeta):
             def _icon_to_bytes(self, icon) -> bytes: return b''
             def _bytes_to_icon(self, buf: bytes) -> bytes: return b''
@@ -828,48 +957,51 @@ class Commands:
         return results
 
     @command('w')
-    def listaddresses(self, receiving=False, change=False, labels=False, frozen=False, unused=False, funded=False, balance=False):
+    def listaddresses(self, receiving=False, change=False, labels=False, frozen=False, unused=False, funded=False, balance=False,
+                      offset=0, limit=None):
         """List wallet addresses. Returns the list of all addresses in your wallet. Use optional arguments to filter the results."""
+        if receiving and change:
+            return []
+        summaries = self.wallet.get_address_summaries(change=True if change else False if receiving else None,
+                                                      frozen=True if frozen else None,
+                                                      used=False if unused else None,
+                                                      funded=True if funded else None,
+                                                      offset=offset or 0, limit=limit)
         out = []
-        for addr in self.wallet.get_addresses():
-            if frozen and not self.wallet.is_frozen(addr):
-                continue
-            if receiving and self.wallet.is_change(addr):
-                continue
-            if change and not self.wallet.is_change(addr):
-                continue
-            if unused and self.wallet.is_used(addr):
-                continue
-            if funded and self.wallet.is_empty(addr):
-                continue
-            item = addr.to_ui_string()
+        for summary in summaries:
+            item = summary.address.to_ui_string()
             if labels or balance:
                 item = (item,)
             if balance:
-                item += (format_satoshis(sum(self.wallet.get_addr_balance(addr))),)
+                item += (format_satoshis(sum(summary.balance)),)
             if labels:
-                item += (repr(self.wallet.labels.get(addr.to_storage_string(), '')),)
+                item += (repr(summary.label),)
             out.append(item)
         return out
 
     @command('n')
     def gettransaction(self, txid):
         """Retrieve a transaction. """
+        from .transaction import Transaction
         if self.wallet and txid in self.wallet.transactions:
             tx = self.wallet.transactions[txid]
         elif not self.daemon:
             raise BaseException("Transaction not in wallet")
         else:
-            raw = self.network.synchronous_get(('blockchain.transaction.get', [txid]))
-            if raw:
-                tx = Transaction(raw)
-            else:
-                raise BaseException("Unknown transaction")
+            tx = Transaction.tx_cache_get(txid)
+            if not tx:
+                raw = self.network.synchronous_get(('blockchain.transaction.get', [txid]))
+                if raw:
+                    tx = Transaction(raw)
+                    Transaction.tx_cache_put(tx, txid, persist=bool(self.wallet and self.wallet.allows_tx_store()))
+                else:
+                    raise BaseException("Unknown transaction")
         return tx.as_dict()
 
     @command('')
     def encrypt(self, pubkey, message):
         """Encrypt a message with a public key. Use quotes if the message contains whitespaces."""
+        from . import bitcoin
         if not isinstance(pubkey, (str, bytes, bytearray)) or not isinstance(message, (str, bytes, bytearray)):
             raise ValueError("pubkey and message text must both be strings")
         message = to_bytes(message)
@@ -895,6 +1027,7 @@ class Commands:
         return res
 
     def _format_request(self, out):
+        from .paymentrequest import PR_PAID, PR_UNCONFIRMED, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
         pr_str = {
             PR_UNKNOWN: 'Unknown',
             PR_UNPAID: 'Pending',
@@ -910,6 +1043,7 @@ class Commands:
     @command('w')
     def getrequest(self, key):
         """Return a payment request"""
+        from .address import Address
         r = self.wallet.get_payment_request(Address.from_string(key), self.config)
         if not r:
             raise BaseException("Request not found")
@@ -921,9 +1055,9 @@ class Commands:
     #    pass
 
     @command('w')
-    def listrequests(self, pending=False, expired=False, paid=False):
+    def listrequests(self, pending=False, expired=False, paid=False, offset=0, limit=None):
         """List the payment requests you made."""
-        out = self.wallet.get_sorted_requests(self.config)
+        from .paymentrequest import PR_PAID, PR_UNPAID, PR_EXPIRED
         if pending:
             f = PR_UNPAID
         elif expired:
@@ -932,8 +1066,8 @@ class Commands:
             f = PR_PAID
         else:
             f = None
-        if f is not None:
-            out = list(filter(lambda x: x.get('status')==f, out))
+        out = self.wallet.get_sorted_requests(self.config, statuses=None if f is None else (f,),
+                                              offset=offset, limit=limit)
         return list(map(self._format_request, out))
 
     @command('w')
@@ -997,6 +1131,7 @@ class Commands:
     @command('n')
     def notify(self, address, URL):
         """Watch an address. Everytime the address changes, a http POST is sent to the URL."""
+        from .address import Address
         def callback(x):
             import urllib.request
             headers = {'content-type':'application/json'}
@@ -1038,6 +1173,7 @@ param_descriptions = {
     'pos': 'Position',
     'height': 'Block height',
     'tx': 'Serialized transaction (hexadecimal)',
+    'txs': 'Serialized transactions (a JSON list, or hexadecimal separated by whitespace)',
     'key': 'Variable name',
     'pubkey': 'Public key',
     'message': 'Clear text message. Use quotes if it contains spaces.',
@@ -1045,6 +1181,7 @@ param_descriptions = {
     'amount': 'Amount to be sent (in BCH). Type \'!\' to send the maximum available.',
     'requested_amount': 'Requested amount (in BCH).',
     'outputs': 'list of ["address", amount]',
+    'payouts': 'Outputs to pay, as CSV ("address, amount" per line) or a JSON list of ["address", amount]',
     'redeem_script': 'redeem script (hexadecimal)',
 }
 
@@ -1066,22 +1203,29 @@ command_options = {
     'frozen':      (None, "Show only frozen addresses"),
     'funded':      (None, "Show only funded addresses"),
     'imax':        (None, "Maximum number of inputs"),
+    'include_frozen': (None, "Include frozen coins"),
     'include_tokens': (None, "Include CashToken-containing UTXOs"),
     'index_url':   (None, 'Override the URL where you would like users to be shown the BIP70 Payment Request'),
     'labels':      ("-l", "Show the labels of listed addresses"),
     'language':    ("-L", "Default language for wordlist"),
+    'limit':       (None, "Maximum number of results to return"),
     'locktime':    (None, "Set locktime block number"),
+    'max_tx_size': (None, "Largest transaction to make, in bytes"),
     'memo':        ("-m", "Description of the request"),
+    'merge_addresses': (None, "Spend coins of different addresses together (this links the addresses)"),
     'nbits':       (None, "Number of bits of entropy"),
     'new_password':(None, "New Password"),
     'nocheck':     (None, "Do not verify aliases"),
+    'offset':      (None, "Number of results to skip"),
     'op_return':   (None, "Specify string data to add to the transaction as an OP_RETURN output"),
     'op_return_raw': (None, 'Specify raw hex data to add to the transaction as an OP_RETURN output (0x6a aka the OP_RETURN byte will be auto-prepended for you so do not include it)'),
+    'output_addr': (None, "Address to send the consolidated coins to"),
     'paid':        (None, "Show only paid requests."),
     'passphrase':  (None, "Seed extension"),
     'password':    ("-W", "Password"),
     'payment_url': (None, 'Optional URL where you would like users to POST the BIP70 Payment message'),
     'pending':     (None, "Show only pending requests."),
+    'preview':     (None, "Only report what would be done"),
     'privkey':     (None, "Private key"),
     'receiving':   (None, "Show only receiving addresses"),
     'schnorr':     (None, "Use Schnorr signatures instead of ECDSA"),
@@ -1099,8 +1243,18 @@ command_options = {
 }
 
 
+def tx_from_str(txt):
+    from .transaction import tx_from_str
+    return tx_from_str(txt)
+
+def txs_from_str(txt):
+    if isinstance(txt, str) and not txt.lstrip().startswith('['):
+        return [tx_from_str(tx) for tx in txt.split()]
+    if isinstance(txt, str):
+        txt = json.loads(txt)
+    return [tx_from_str(tx if isinstance(tx, str) else json.dumps(tx)) for tx in txt]
+
 # don't use floats because of rounding errors
-from .transaction import tx_from_str
 json_loads = lambda x: json.loads(x, parse_float=lambda x: str(PyDecimal(x)))
 arg_types = {
     'num': int,
@@ -1109,6 +1263,7 @@ arg_types = {
     'year': int,
     'entropy': int,
     'tx': tx_from_str,
+    'txs': txs_from_str,
     'pubkeys': json_loads,
     'jsontx': json_loads,
     'inputs': json_loads,
@@ -1116,6 +1271,8 @@ arg_types = {
     'fee': lambda x: str(PyDecimal(x)) if x is not None else None,
     'amount': lambda x: str(PyDecimal(x)) if x != '!' else '!',
     'locktime': int,
+    'offset': int,
+    'limit': int,
 }
 
 config_variables = {
@@ -27,7 +27,7 @@ This module provides coin consolidation tools.
 Attribution: https://github.com/scinklja/Electron-Cash/tree/consolidate_address
 """
 import copy
-from typing import Iterator, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 from . import wallet
 from .address import Address
@@ -74,7 +74,8 @@ class AddressConsolidator:
             if (
                 (include_coinbase or not utxo["coinbase"])
                 and (include_non_coinbase or utxo["coinbase"])
-                and (include_slp or utxo["slp_token"] is None)
+                and (include_slp or (utxo["slp_token"] is None
+                                     and not wallet_instance.slp.txid_is_pending(utxo["prevout_hash"])))
                 and (include_cashtokens or utxo["token_data"] is None)
                 and (include_frozen or not utxo["is_frozen_coin"])
                 and (min_value_sats is None or utxo["value"] >= min_value_sats)
@@ -200,3 +201,194 @@ class AddressConsolidator:
         txin["value"] = value
         txin.update(copy.deepcopy(siginfo))
 
+
+
+class ConsolidationChunk(NamedTuple):
+    """One transaction of a wallet consolidation, as planned by
+    WalletConsolidator.plan()."""
+
+    coins: List[dict]
+    output_address: Address
+    value: int
+    """What the output gets, in satoshis"""
+    fee: int
+    size: int
+    """Estimated size in bytes"""
+
+
+class WalletConsolidator:
+    """Consolidate coins of many addresses of a wallet.
+
+    Unlike AddressConsolidator, this takes the coins from the wallet's UTXO
+    set in one go, works out the size of an input once per address rather than
+    serializing the transaction for each coin it adds, and fills transactions
+    up to max_tx_size. Coins that are worth less than the fee to spend them
+    are left alone, unless include_uneconomic is set.
+
+    By default, coins of different addresses are never spent together, as
+    that would link the addresses: each address's coins go back to it (or to
+    output_address). With merge_addresses, the coins of all addresses are
+    packed together and sent to output_address, by default a change address.
+
+    CashToken and SLP coins are never consolidated, as the output would burn
+    their tokens.
+    """
+
+    def __init__(
+        self,
+        wallet_instance: wallet.Abstract_Wallet,
+        addresses: Optional[Iterable[Address]] = None,
+        include_coinbase: bool = True,
+        include_non_coinbase: bool = True,
+        include_frozen: bool = False,
+        include_uneconomic: bool = False,
+        min_value_sats: Optional[int] = None,
+        max_value_sats: Optional[int] = None,
+        min_height: Optional[int] = None,
+        max_height: Optional[int] = None,
+        output_address: Optional[Address] = None,
+        merge_addresses: bool = False,
+        fee_estimator: Optional[Callable[[int], int]] = None,
+        max_tx_size: int = MAX_STANDARD_TX_SIZE,
+    ):
+        assert max_tx_size <= MAX_TX_SIZE
+        self.wallet = wallet_instance
+        self.max_tx_size = max_tx_size
+        self.merge_addresses = merge_addresses
+        self.fee_estimator = fee_estimator or (lambda size: size * FEERATE)
+        self.dust_threshold = wallet_instance.dust_threshold()
+        self.sign_schnorr = wallet_instance.is_schnorr_enabled()
+        self.num_uneconomic = 0
+        """How many coins were left out for being worth less than their fee"""
+
+        coins = wallet_instance.get_utxos(
+            addresses,
+            exclude_frozen=not include_frozen,
+            mature=True,
+            exclude_slp=True,
+            exclude_tokens=True,
+        )
+        # Coins by address, in the order of the wallet's addresses
+        self._groups: Dict[Address, List[dict]] = {}
+        self._input_sizes: Dict[Address, int] = {}
+        for coin in coins:
+            if not (
+                (include_coinbase or not coin["coinbase"])
+                and (include_non_coinbase or coin["coinbase"])
+                and (min_value_sats is None or coin["value"] >= min_value_sats)
+                and (max_value_sats is None or coin["value"] <= max_value_sats)
+                and (min_height is None or coin["height"] >= min_height)
+                and (max_height is None or coin["height"] <= max_height)
+            ):
+                continue
+            address = coin["address"]
+            coin = dict(coin)
+            coin["type"] = wallet_instance.get_txin_type(address)
+            wallet_instance.add_input_sig_info(coin, address)
+            input_size = self._input_sizes.get(address)
+            if input_size is None:
+                # The same for all the coins of an address
+                input_size = self._input_sizes[address] = Transaction.estimated_input_size(
+                    coin, self.sign_schnorr
+                )
+            if not include_uneconomic and coin["value"] <= self.fee_estimator(input_size):
+                self.num_uneconomic += 1
+                continue
+            self._groups.setdefault(address, []).append(coin)
+
+        if merge_addresses and output_address is None:
+            change_addrs = (
+                wallet_instance.get_default_change_addresses(1)
+                if wallet_instance.use_change
+                else []
+            )
+            output_address = (
+                change_addrs[0] if change_addrs else next(iter(self._groups), None)
+            )
+        self.output_address = output_address
+
+    def plan(self) -> List[ConsolidationChunk]:
+        """Work out the transactions, without building them. Coins that
+        would end up alone in a transaction are left out, as spending them
+        would only cost a fee."""
+        if self.merge_addresses:
+            groups = [(self.output_address, [c for coins in self._groups.values() for c in coins])]
+        else:
+            groups = [
+                (self.output_address or address, coins)
+                for address, coins in self._groups.items()
+            ]
+        chunks = []
+        for output_address, coins in groups:
+            if len(coins) < 2:
+                continue
+            out_size = Transaction.estimated_output_size(output_address)
+            i = 0
+            while i < len(coins):
+                start, in_size, value = i, 0, 0
+                while i < len(coins):
+                    coin_size = self._input_sizes[coins[i]["address"]]
+                    size = (
+                        Transaction.estimated_overhead_size(i - start + 1, 1)
+                        + in_size
+                        + coin_size
+                        + out_size
+                    )
+                    if size > self.max_tx_size:
+                        break
+                    in_size += coin_size
+                    value += coins[i]["value"]
+                    i += 1
+                if i == start:
+                    raise ValueError("max_tx_size is too small for a single coin")
+                if i - start < 2:
+                    continue
+                size = Transaction.estimated_overhead_size(i - start, 1) + in_size + out_size
+                fee = self.fee_estimator(size)
+                if value - fee < self.dust_threshold:
+                    continue
+                chunks.append(
+                    ConsolidationChunk(coins[start:i], output_address, value - fee, fee, size)
+                )
+        return chunks
+
+    def summary(self, chunks: Optional[List[ConsolidationChunk]] = None) -> dict:
+        """What consolidating would do: how many transactions, coins and
+        addresses, and the value in, the fees and the value out, in
+        satoshis."""
+        if chunks is None:
+            chunks = self.plan()
+        return {
+            "transactions": len(chunks),
+            "coins": sum(len(c.coins) for c in chunks),
+            "addresses": len({coin["address"] for c in chunks for coin in c.coins}),
+            "input_value": sum(c.value + c.fee for c in chunks),
+            "fee": sum(c.fee for c in chunks),
+            "output_value": sum(c.value for c in chunks),
+            "uneconomic_coins": self.num_uneconomic,
+        }
+
+    def make_transactions(
+        self,
+        password=None,
+        sign: bool = True,
+        chunks: Optional[List[ConsolidationChunk]] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[Transaction]:
+        """Build the planned transactions and, if sign is set, sign them,
+        in parallel if the wallet's keys allow."""
+        if chunks is None:
+            chunks = self.plan()
+        locktime = max(self.wallet.get_local_height(), 0)
+        txs = [
+            Transaction.from_io(
+                copy.deepcopy(c.coins),
+                [(TYPE_ADDRESS, c.output_address, c.value)],
+                locktime=locktime,
+                sign_schnorr=self.sign_schnorr,
+            )
+            for c in chunks
+        ]
+        if sign:
+            self.wallet.sign_transactions(txs, password, max_workers=max_workers)
+        return txs
@@ -24,22 +24,23 @@
 # SOFTWARE.
 import ast
 import os
+import threading
 import time
 import sys
+import weakref
 
 # from jsonrpc import JSONRPCResponseManager
 import jsonrpclib
-from .jsonrpc import VerifyingJSONRPCServer
 
 from .version import PACKAGE_VERSION
-from .network import Network
 from .util import (json_decode, DaemonThread, print_error, to_string,
                    standardize_path)
-from .wallet import Wallet
-from .storage import WalletStorage
-from .commands import known_commands, Commands
 from .simple_config import SimpleConfig
-from .exchange_rate import FxThread
+
+# NB: The client side of this module (get_server() and friends) is on the
+# startup path of every command-line invocation that gets forwarded to a
+# running daemon, so it must stay cheap to import. The heavy modules (network,
+# wallet, commands, ...) are only imported by the Daemon itself, as needed.
 
 
 def get_lockfile(config):
@@ -139,6 +140,8 @@ def get_rpc_credentials(config):
 class Daemon(DaemonThread):
 
     def __init__(self, config, fd, is_gui, plugins, *, listen_jsonrpc=True):
+        from .exchange_rate import FxThread
+        from .network import Network
         DaemonThread.__init__(self)
         self.plugins = plugins
         self.config = config
@@ -157,19 +160,41 @@ class Daemon(DaemonThread):
             self.network.add_jobs([self.fx])
         self.gui = None
         self.server = None
+        self.metrics_server = None
         self.wallets = {}
+        # RPC requests against the same wallet run one at a time; requests
+        # against different wallets run concurrently.
+        self._wallet_locks = weakref.WeakKeyDictionary()
+        self._wallet_locks_lock = threading.Lock()
         if listen_jsonrpc:
             # Setup JSONRPC server
             self.init_server(config, fd, is_gui)
+        if config.get('metrics_port'):
+            self.init_metrics_server(config)
+
+    def init_metrics_server(self, config):
+        from .metrics import PrometheusServer
+        host = config.get('metrics_host', '127.0.0.1')
+        try:
+            self.metrics_server = PrometheusServer(int(config.get('metrics_port')), host)
+        except Exception as e:
+            self.print_error('Warning: cannot start metrics server on host', host, repr(e))
+            return
+        self.metrics_server.start()
+        self.print_error('serving metrics on', '{}:{}'.format(host, self.metrics_server.port))
 
     def init_server(self, config, fd, is_gui):
+        from .commands import known_commands, Commands
+        from .jsonrpc import VerifyingJSONRPCServer
         host = config.get('rpchost', '127.0.0.1')
         port = config.get('rpcport', 0)
 
         rpc_user, rpc_password = get_rpc_credentials(config)
+        max_workers = config.get('rpcthreads', 8)
         try:
             server = VerifyingJSONRPCServer((host, port), logRequests=False,
-                                            rpc_user=rpc_user, rpc_password=rpc_password)
+                                            rpc_user=rpc_user, rpc_password=rpc_password,
+                                            max_workers=max_workers)
         except Exception as e:
             self.print_error('Warning: cannot initialize RPC server on host', host, e)
             os.close(fd)
@@ -183,8 +208,61 @@ class Daemon(DaemonThread):
         server.register_function(self.run_daemon, 'daemon')
         self.cmd_runner = Commands(self.config, None, self.network, self)
         for cmdname in known_commands:
-            server.register_function(getattr(self.cmd_runner, cmdname), cmdname)
+            server.register_function(self._make_rpc_command(cmdname), cmdname)
         server.register_function(self.run_cmdline, 'run_cmdline')
+        server.request_lock = self._rpc_request_lock
+
+    def _make_rpc_command(self, cmdname):
+        ''' Wraps a command for direct JSON-RPC use. By default commands act on
+        the most recently loaded wallet, as before. Clients juggling several
+        wallets may pass the wallet's path as the named param 'wallet' to
+        target a specific loaded wallet. '''
+        from .commands import known_commands, Commands
+        def rpc_command(*args, wallet=None, **kwargs):
+            if wallet is not None:
+                path = standardize_path(wallet)
+                w = self.wallets.get(path)
+                if w is None:
+                    raise BaseException('Wallet "%s" is not loaded. Use "electron-cash daemon load_wallet"'
+                                        % os.path.basename(path))
+            else:
+                # Read once: a concurrent load_wallet may swap self.cmd_runner.wallet,
+                # and the command must run on the wallet whose lock we take
+                w = self.cmd_runner.wallet
+            cmd_runner = Commands(self.config, w, self.network, self)
+            with self.wallet_lock(w if known_commands[cmdname].requires_wallet else None):
+                return getattr(cmd_runner, cmdname)(*args, **kwargs)
+        rpc_command.__name__ = cmdname
+        return rpc_command
+
+    def _rpc_request_lock(self, method, params):
+        ''' The wallet lock that a JSON-RPC request is going to take, if any.
+        The server takes it before a worker slot, so that requests piling up
+        on one busy wallet don't hold up the requests for other wallets. The
+        commands take the (reentrant) lock again themselves, for the wallet
+        they actually end up running on. '''
+        from .commands import known_commands
+        wallet = None
+        if method == 'run_cmdline':
+            options = params[0] if isinstance(params, (list, tuple)) and params else None
+            cmd = known_commands.get(options.get('cmd')) if isinstance(options, dict) else None
+            if cmd and cmd.requires_wallet and not (cmd.name == 'signtransaction' and options.get('privkey')):
+                wallet = self.wallets.get(SimpleConfig(options).get_wallet_path())
+        elif method in known_commands and known_commands[method].requires_wallet:
+            path = params.get('wallet') if isinstance(params, dict) else None
+            wallet = self.wallets.get(standardize_path(path)) if path is not None else self.cmd_runner.wallet
+        return self.wallet_lock(wallet) if wallet is not None else None
+
+    def wallet_lock(self, wallet):
+        ''' Returns the lock that serializes RPC commands on `wallet`. For
+        `wallet` None, a fresh (uncontended) lock is returned. '''
+        if wallet is None:
+            return threading.Lock()
+        with self._wallet_locks_lock:
+            lock = self._wallet_locks.get(wallet)
+            if lock is None:
+                lock = self._wallet_locks[wallet] = threading.RLock()
+            return lock
 
     def ping(self):
         return True
@@ -255,6 +333,8 @@ class Daemon(DaemonThread):
         return response
 
     def load_wallet(self, path, password):
+        from .storage import WalletStorage
+        from .wallet import Wallet
         path = standardize_path(path)
         # wizard will be launched if we return
         if path in self.wallets:
@@ -299,6 +379,7 @@ class Daemon(DaemonThread):
             wallet.stop_threads()
 
     def run_cmdline(self, config_options):
+        from .commands import known_commands, Commands
         password = config_options.get('password')
         new_password = config_options.get('new_password')
         config = SimpleConfig(config_options)
@@ -325,7 +406,8 @@ class Daemon(DaemonThread):
         cmd_runner = Commands(config, wallet, self.network, self)
         func = getattr(cmd_runner, cmd.name)
         try:
-            result = func(*args, **kwargs)
+            with self.wallet_lock(wallet):
+                result = func(*args, **kwargs)
         except TypeError as e:
             raise Exception("Wrapping TypeError to prevent JSONRPC-Pelix from hiding traceback") from e
         return result
@@ -339,6 +421,8 @@ class Daemon(DaemonThread):
             self.print_error("shutting down network")
             self.network.stop()
             self.network.join()
+        if self.metrics_server:
+            self.metrics_server.stop()
         self.on_stop()
 
     def stop(self):
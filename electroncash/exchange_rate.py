@@ -1,5 +1,7 @@
-from datetime import datetime
+from array import array
+from datetime import date, datetime
 import inspect
+import math
 import requests
 import sys
 import os
@@ -9,6 +11,7 @@ from threading import Thread
 import time
 import csv
 import decimal
+import struct
 from decimal import Decimal as PyDecimal  # Qt 5.12 also exports Decimal
 from collections import defaultdict
 
@@ -42,6 +45,163 @@ def to_decimal(x):
     return PyDecimal(str(x))
 
 
+class RateHistory:
+    """ The historical rates of one currency: one rate per (local) day.
+
+    The rates are kept in an array of floats indexed by day ordinal, so a
+    lookup is an index operation rather than a strftime and a dict lookup,
+    and a year of rates takes ~3KB. Days missing from the data (gaps in what
+    the exchange gave us) get the rate of the nearest day we do have. Days
+    before the first or after the last known day have no rate. """
+
+    MAGIC = b'ECfx'
+    VERSION = 1
+    _header = struct.Struct('<4sHII')  # magic, version, first day ordinal, number of days
+    _EPOCH = date(1970, 1, 1).toordinal()
+    def __init__(self, first: int = 0, rates=None):
+        self.first = first  # ordinal of the day of rates[0]
+        self.rates = array('d', rates or ())  # NaN = no data for that day
+        self._filled = self._fill_gaps(self.rates)
+        self._offset_cache = {}  # UTC day -> local UTC offset (seconds) during that day, or None if it changes
+
+    @staticmethod
+    def _fill_gaps(rates):
+        filled = array('d', rates)
+        n = len(filled)
+        prev = [None] * n  # index of the nearest known day at or before i
+        last = None
+        for i in range(n):
+            if not math.isnan(filled[i]):
+                last = i
+            prev[i] = last
+        nxt = None
+        for i in range(n - 1, -1, -1):
+            if not math.isnan(rates[i]):
+                nxt = i
+                continue
+            p = prev[i]
+            if p is None or (nxt is not None and nxt - i < i - p):
+                p = nxt
+            if p is not None:
+                filled[i] = rates[p]
+        return filled
+
+    def __len__(self):
+        return sum(1 for r in self.rates if not math.isnan(r))
+
+    def __bool__(self):
+        return len(self.rates) > 0
+
+    @classmethod
+    def from_dict(cls, d):
+        """ d: {'YYYY-MM-DD': rate} as returned by ExchangeBase.request_history
+        and as stored by older versions of this module. Unparseable entries are
+        skipped. """
+        days = {}
+        for k, v in d.items():
+            try:
+                rate = float(v)
+                day = date(int(k[:4]), int(k[5:7]), int(k[8:10])).toordinal()
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(rate):
+                days[day] = rate
+        if not days:
+            return cls()
+        first = min(days)
+        rates = [math.nan] * (max(days) - first + 1)
+        for day, rate in days.items():
+            rates[day - first] = rate
+        return cls(first, rates)
+
+    def to_dict(self):
+        return {date.fromordinal(self.first + i).isoformat(): r
+                for i, r in enumerate(self.rates) if not math.isnan(r)}
+
+    def updated(self, d):
+        """ Returns a new RateHistory with the rates in dict d added (and
+        taking precedence). """
+        merged = self.to_dict()
+        merged.update(RateHistory.from_dict(d).to_dict())
+        return RateHistory.from_dict(merged)
+
+    def to_bytes(self):
+        rates = array('d', self.rates)
+        if sys.byteorder != 'little':
+            rates.byteswap()
+        return self._header.pack(self.MAGIC, self.VERSION, self.first, len(rates)) + rates.tobytes()
+
+    @classmethod
+    def from_bytes(cls, b):
+        magic, version, first, n = cls._header.unpack_from(b)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError('not a rate history file')
+        rates = array('d')
+        rates.frombytes(b[cls._header.size:cls._header.size + 8 * n])
+        if len(rates) != n:
+            raise ValueError('truncated rate history file')
+        if sys.byteorder != 'little':
+            rates.byteswap()
+        return cls(first, rates)
+
+    def get_day(self, day: int):
+        i = day - self.first
+        if 0 <= i < len(self._filled):
+            r = self._filled[i]
+            if not math.isnan(r):
+                return r
+        return None
+
+    def get(self, d_t):
+        """ d_t: a date or datetime. Returns the rate as a float, or None. """
+        return self.get_day(d_t.toordinal())
+
+    def _utc_offset(self, utc_day):
+        offset = self._offset_cache.get(utc_day, False)
+        if offset is False:
+            t = utc_day * 86400
+            offset = time.localtime(t).tm_gmtoff
+            if time.localtime(t + 86399).tm_gmtoff != offset:
+                offset = None  # DST change on this day
+            self._offset_cache[utc_day] = offset
+        return offset
+
+    def day_for_timestamp(self, timestamp):
+        """ Returns the ordinal of the local date of timestamp, or None for a
+        garbage timestamp. """
+        try:
+            timestamp = int(timestamp)
+            offset = self._utc_offset(timestamp // 86400)
+            if offset is None:
+                return date.fromtimestamp(timestamp).toordinal()
+        except (OverflowError, OSError, ValueError, TypeError):
+            return None
+        return (timestamp + offset) // 86400 + self._EPOCH
+
+    def get_many(self, timestamps):
+        """ Returns the rates (floats, or None) for a whole list of unix
+        timestamps (which may contain None), in local time like
+        util.timestamp_to_datetime. """
+        filled, first, epoch = self._filled, self.first, self._EPOCH
+        n = len(filled)
+        offsets = self._offset_cache
+        out = []
+        append = out.append
+        for ts in timestamps:
+            # Inlined day_for_timestamp() for the common case
+            try:
+                ts = int(ts)
+                offset = offsets[ts // 86400]
+            except (KeyError, TypeError, ValueError, OverflowError):
+                day = self.day_for_timestamp(ts) if ts is not None else None
+            else:
+                day = (ts + offset) // 86400 + epoch if offset is not None else self.day_for_timestamp(ts)
+            i = day - first if day is not None else -1
+            r = filled[i] if 0 <= i < n else None
+            append(r if r == r else None)  # NaN -> None
+        return out
+
+
 class ExchangeBase(PrintError):
 
     def __init__(self, on_quotes, on_history):
@@ -84,21 +244,33 @@ class ExchangeBase(PrintError):
         t.start()
 
     def read_historical_rates(self, ccy, cache_dir):
-        filename = self._get_cache_filename(ccy, cache_dir)
+        """ Returns (RateHistory or None, timestamp of the cache file). Falls
+        back to the JSON cache files written by older versions. """
         h, timestamp = None, 0.0
-        if os.path.exists(filename):
+        for filename, is_legacy in ((self._get_cache_filename(ccy, cache_dir), False),
+                                    (self._get_legacy_cache_filename(ccy, cache_dir), True)):
+            if not os.path.exists(filename):
+                continue
             timestamp = os.stat(filename).st_mtime
             try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    h = json.loads(f.read())
+                if is_legacy:
+                    with open(filename, 'r', encoding='utf-8') as f:
+                        h = RateHistory.from_dict(json.loads(f.read()))
+                else:
+                    with open(filename, 'rb') as f:
+                        h = RateHistory.from_bytes(f.read())
                 if h:
                     self.print_error("read_historical_rates: returning cached history from", filename)
+                    break
             except Exception as e:
                 self.print_error("read_historical_rates: error", repr(e))
         h = h or None
         return h, timestamp
 
     def _get_cache_filename(self, ccy, cache_dir):
+        return os.path.join(cache_dir, self.name() + '_' + ccy + '.rates')
+
+    def _get_legacy_cache_filename(self, ccy, cache_dir):
         return os.path.join(cache_dir, self.name() + '_' + ccy)
 
     @staticmethod
@@ -115,9 +287,12 @@ class ExchangeBase(PrintError):
         wroteBytes, filename = 0, '(none)'
         try:
             filename = self._get_cache_filename(ccy, cache_dir)
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(h))
+            with open(filename, 'wb') as f:
+                f.write(h.to_bytes())
             wroteBytes = os.stat(filename).st_size
+            legacy_filename = self._get_legacy_cache_filename(ccy, cache_dir)
+            if os.path.exists(legacy_filename):
+                os.remove(legacy_filename)
         except Exception as e:
             self.print_error("cache_historical_rates error:", repr(e))
             return False
@@ -135,9 +310,7 @@ class ExchangeBase(PrintError):
                     # Paranoia: No data; abort early rather than write out an
                     # empty file
                     raise RuntimeWarning(f"received empty history for {ccy}")
-                if not cached_history:
-                    cached_history = {}
-                cached_history.update(new_history)
+                cached_history = (cached_history or RateHistory()).updated(new_history)
                 self._cache_historical_rates(cached_history, ccy, cache_dir)
             except Exception as e:
                 self.print_error("failed fx new_history:", repr(e))
@@ -159,7 +332,13 @@ class ExchangeBase(PrintError):
         return []
 
     def historical_rate(self, ccy, d_t):
-        return self.history.get(ccy, {}).get(d_t.strftime('%Y-%m-%d'))
+        h = self.history.get(ccy)
+        return h.get(d_t) if h else None
+
+    def historical_rates(self, ccy, timestamps):
+        """ Like historical_rate, for a whole list of unix timestamps """
+        h = self.history.get(ccy)
+        return h.get_many(timestamps) if h else [None] * len(timestamps)
 
     def get_currencies(self):
         rates = self.get_rates('')
@@ -533,7 +712,23 @@ class FxThread(ThreadJob):
         if rate is None and (datetime.today().date() - d_t.date()).days <= 2:
             rate = self.exchange.quotes.get(self.ccy)
             self.history_used_spot = True
-        return PyDecimal(rate) if rate is not None else None
+        return to_decimal(rate) if rate is not None else None
+
+    def history_rates(self, timestamps):
+        """ Like history_rate, for a whole list of unix timestamps (which may
+        contain None). Use this when formatting many rows at once. """
+        timestamps = list(timestamps)
+        rates = self.exchange.historical_rates(self.ccy, timestamps)
+        today = date.today().toordinal()
+        spot = self.exchange.quotes.get(self.ccy)
+        out = []
+        for ts, rate in zip(timestamps, rates):
+            if (rate is None and spot is not None and ts is not None
+                    and today - date.fromtimestamp(ts).toordinal() <= 2):
+                rate = spot
+                self.history_used_spot = True
+            out.append(to_decimal(rate) if rate is not None else None)
+        return out
 
     def historical_value_str(self, satoshis, d_t):
         rate = self.history_rate(d_t)
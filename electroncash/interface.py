@@ -42,6 +42,7 @@ from .utils import Event
 
 ca_path = requests.certs.where()
 
+from . import metrics
 from . import util
 from . import x509
 from . import pem
@@ -49,6 +50,11 @@ from . import pem
 
 PING_INTERVAL = 300
 
+_request_seconds = metrics.histogram('electroncash_interface_request_seconds',
+                                     'Round-trip time of requests to servers', ('method',))
+_request_errors = metrics.counter('electroncash_interface_request_errors_total',
+                                  'Error responses from servers', ('method',))
+
 
 def Connection(server, queue, config_path, callback=None):
     """Makes asynchronous connections to a remote electrum server.
@@ -307,6 +313,13 @@ class Interface(util.PrintError):
     MODE_CATCH_UP = 'catch_up'
     MODE_VERIFICATION = 'verification'
 
+    # Weight given to each new sample by the moving averages below
+    EWMA_ALPHA = 0.25
+    # Seconds after which an unanswered request no longer counts towards
+    # response_time. Its entry in sent_times is dropped then, as it may never
+    # be answered at all.
+    REQUEST_TIMEOUT = 60.0
+
     def __init__(self, server, socket, *, max_message_bytes=0, config=None):
         self.server = server
         self.config = config
@@ -321,6 +334,16 @@ class Interface(util.PrintError):
         self.unanswered_requests = {}
         self.last_send = time.time()
 
+        # Performance tracking, see record_response(). These are moving
+        # averages, and are None until we have a sample.
+        self.sent_times = {}  # wire id -> time the request was sent
+        self.ping_rtt = None  # seconds, of server.ping round trips
+        self.response_time = None  # seconds, of all request round trips
+        self.throughput = None  # bytes/sec received while requests were outstanding
+        self.num_responses = 0
+        self.num_errors = 0
+        self._tp_sample = (time.time(), 0)  # (time, pipe.bytes_received)
+
         self.mode = None
 
     def __repr__(self):
@@ -416,12 +439,71 @@ class Interface(util.PrintError):
             return False
 
         self.unsent_requests = self.unsent_requests[n:]
+        now = time.time()
+        if wire_requests and not self.unanswered_requests:
+            # We were idle until now, so don't count the idle time against
+            # the throughput
+            self._tp_sample = (now, self.pipe.bytes_received)
         for request in wire_requests:
             if self.debug:
                 self.print_error("-->", request)
             self.unanswered_requests[request[2]] = request
+            self.sent_times[request[2]] = now
+        self._prune_sent_times(now)
         return True
 
+    def _prune_sent_times(self, now):
+        # sent_times is in the order the requests were sent, oldest first
+        while self.sent_times:
+            wire_id, sent = next(iter(self.sent_times.items()))
+            if now - sent < self.REQUEST_TIMEOUT:
+                break
+            del self.sent_times[wire_id]
+
+    @classmethod
+    def _ewma(cls, avg, sample):
+        return sample if avg is None else avg + cls.EWMA_ALPHA * (sample - avg)
+
+    def record_response(self, request, response, now):
+        ''' Updates the performance stats with the response to request. '''
+        method, _params, wire_id = request
+        sent = self.sent_times.pop(wire_id, None)
+        self.num_responses += 1
+        if response.get('error'):
+            self.num_errors += 1
+            _request_errors.labels(method).inc()
+        if sent is None:
+            return
+        rtt = max(0.0, now - sent)
+        _request_seconds.labels(method).observe(rtt)
+        self.response_time = self._ewma(self.response_time, rtt)
+        if method == 'server.ping':
+            self.ping_rtt = self._ewma(self.ping_rtt, rtt)
+
+    def latency(self) -> Optional[float]:
+        ''' Our best estimate of this server's latency in seconds, or None if
+        we have no idea yet. Pings are the purest measure; the average of
+        all responses also reflects how loaded the server is. '''
+        if self.ping_rtt is None:
+            return self.response_time
+        if self.response_time is None:
+            return self.ping_rtt
+        return (self.ping_rtt + self.response_time) / 2.0
+
+    def num_pending(self) -> int:
+        return len(self.unanswered_requests) + len(self.unsent_requests)
+
+    def get_stats(self) -> dict:
+        return {
+            'ping_rtt': self.ping_rtt,
+            'response_time': self.response_time,
+            'throughput': self.throughput,
+            'responses': self.num_responses,
+            'errors': self.num_errors,
+            'pending': self.num_pending(),
+            'bytes_received': self.pipe.bytes_received,
+        }
+
     def ping_required(self):
         """Returns True if a ping should be sent."""
         return time.time() - self.last_send > PING_INTERVAL
@@ -492,14 +574,25 @@ class Interface(util.PrintError):
             else:
                 request = self.unanswered_requests.pop(wire_id, None)
                 if request:
+                    self.record_response(request, response, time.time())
                     responses.append((request, response))
                 else:
                     self.print_error("unknown wire ID", wire_id)
                     responses.append((None, None))  # Signal
                     break
 
+        if any(request for request, _ in responses):
+            self._update_throughput()
         return responses
 
+    def _update_throughput(self):
+        now = time.time()
+        then, nbytes = self._tp_sample
+        delta = self.pipe.bytes_received - nbytes
+        if delta > 0 and now - then >= 0.1:  # Too short an interval gives silly numbers
+            self.throughput = self._ewma(self.throughput, delta / (now - then))
+            self._tp_sample = (now, self.pipe.bytes_received)
+
 
 def check_cert(host, cert):
     try:
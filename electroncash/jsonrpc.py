@@ -24,7 +24,11 @@
 # SOFTWARE.
 
 from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer, SimpleJSONRPCRequestHandler
+from jsonrpclib.jsonrpc import Fault
 from base64 import b64decode
+from contextlib import nullcontext
+import socketserver
+import threading
 import time
 
 from . import util
@@ -45,15 +49,96 @@ class RPCAuthUnsupportedType(Exception):
         return 'Authentication failed (only basic auth is supported)'
 
 
+class RPCStats:
+    ''' Thread-safe request latency bookkeeping for the RPC server. Latencies
+    are recorded per method name, and exclude time spent waiting in the
+    request queue (which is tracked separately). '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.methods = {}  # name -> [count, errors, total_secs, max_secs]
+        self.in_flight = 0
+        self.queued = 0
+        self.total_queue_secs = 0.0
+        self.max_queue_secs = 0.0
+        self.connections = 0  # currently open
+
+    def record(self, name, secs, error=False):
+        with self.lock:
+            m = self.methods.get(name)
+            if m is None:
+                m = self.methods[name] = [0, 0, 0.0, 0.0]
+            m[0] += 1
+            m[1] += int(bool(error))
+            m[2] += secs
+            m[3] = max(m[3], secs)
+
+    def as_dict(self):
+        with self.lock:
+            n_requests = sum(m[0] for m in self.methods.values())
+            return {
+                'uptime': round(time.time() - self.started, 3),
+                'connections': self.connections,
+                'requests': n_requests,
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'avg_queue_wait': round(self.total_queue_secs / n_requests, 6) if n_requests else 0.0,
+                'max_queue_wait': round(self.max_queue_secs, 6),
+                'methods': {
+                    name: {
+                        'count': count,
+                        'errors': errors,
+                        'avg': round(total / count, 6) if count else 0.0,
+                        'max': round(mx, 6),
+                    }
+                    for name, (count, errors, total, mx) in sorted(self.methods.items())
+                },
+            }
+
+
 # based on http://acooke.org/cute/BasicHTTPA0.html by andrew cooke
-class VerifyingJSONRPCServer(SimpleJSONRPCServer):
+class VerifyingJSONRPCServer(socketserver.ThreadingMixIn, SimpleJSONRPCServer):
+    ''' Each connection is served by its own thread, with HTTP keep-alive.
+    At most `max_workers` requests actually execute at any one time; the rest
+    wait their turn. JSON-RPC batch requests are executed in order and each
+    entry counts as one request.
+
+    If set, `request_lock(method, params)` returns a lock for the request to
+    hold while it waits for a worker and runs, or None. Requests that must
+    run one at a time (e.g. on the same wallet) then queue on that lock
+    without taking up a worker that a request for something else could
+    use. '''
 
-    def __init__(self, *args, rpc_user, rpc_password, **kargs):
+    daemon_threads = True
+    # Idle keep-alive connections are dropped after this many seconds
+    keepalive_timeout = 60.0
+
+    def __init__(self, *args, rpc_user, rpc_password, max_workers=8, **kargs):
 
         self.rpc_user = rpc_user
         self.rpc_password = rpc_password
+        self.stats = RPCStats()
+        self.workers = threading.BoundedSemaphore(max(1, max_workers))
+        self.request_lock = None
 
         class VerifyingRequestHandler(SimpleJSONRPCRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            timeout = self.keepalive_timeout
+
+            def setup(myself):
+                super().setup()
+                with self.stats.lock:
+                    self.stats.connections += 1
+
+            def finish(myself):
+                # Called once the connection is done with, however handle() ended
+                try:
+                    super().finish()
+                finally:
+                    with self.stats.lock:
+                        self.stats.connections -= 1
+
             def parse_request(myself):
                 # first, call the original implementation which returns
                 # True if all OK so far
@@ -93,3 +178,38 @@ class VerifyingJSONRPCServer(SimpleJSONRPCServer):
                 and util.constant_time_compare(password, self.rpc_password)):
             time.sleep(0.050)
             raise RPCAuthCredentialsInvalid()
+
+    def request_label(self, method, params):
+        ''' Name under which a request's latency is recorded. The command
+        line client tunnels every command through 'run_cmdline', so those are
+        broken out by the actual command name. '''
+        if method == 'run_cmdline' and params and isinstance(params, list) and isinstance(params[0], dict):
+            return 'run_cmdline:' + str(params[0].get('cmd'))
+        return method
+
+    def _dispatch(self, method, params, config=None):
+        stats = self.stats
+        try:
+            lock = self.request_lock(method, params) if self.request_lock else None
+        except Exception:
+            lock = None  # bad params; the call itself will report them
+        t0 = time.time()
+        with stats.lock:
+            stats.queued += 1
+        with lock or nullcontext(), self.workers:
+            waited = time.time() - t0
+            with stats.lock:
+                stats.queued -= 1
+                stats.in_flight += 1
+                stats.total_queue_secs += waited
+                stats.max_queue_secs = max(stats.max_queue_secs, waited)
+            try:
+                t1 = time.time()
+                result = super()._dispatch(method, params, config)
+                # Errors in the called method come back as a Fault rather than raising
+                stats.record(self.request_label(method, params), time.time() - t1,
+                             error=isinstance(result, Fault))
+                return result
+            finally:
+                with stats.lock:
+                    stats.in_flight -= 1
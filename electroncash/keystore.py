@@ -97,6 +97,42 @@ class KeyStore(PrintError):
         return False
 
 
+class SigningSession:
+    """Hands out the private keys of a Software_KeyStore for signing many
+    inputs at once. The password is checked and the keystore's secrets are
+    decrypted just once, when the session is made, instead of once per key.
+    Use it as a context manager: on exit it drops the decrypted secrets and
+    the password it holds.
+
+    This generic one only saves the repeated password checks; the keystore
+    types below have their own, which also skip the repeated decryption and
+    derivation work."""
+
+    def __init__(self, keystore, password):
+        self.keystore = keystore
+        self.password = password
+        self.open()
+
+    def open(self):
+        """Checks the password and decrypts what the session needs. Raises
+        InvalidPassword."""
+        self.keystore.check_password(self.password)
+
+    def get_private_key(self, derivation):
+        """Returns a (32 byte privkey, is_compressed) pair, like
+        get_private_key() of the keystore."""
+        return self.keystore.get_private_key(derivation, self.password)
+
+    def close(self):
+        self.password = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 class Software_KeyStore(KeyStore):
 
     def __init__(self):
@@ -116,15 +152,19 @@ class Software_KeyStore(KeyStore):
         decrypted = ec.decrypt_message(message)
         return decrypted
 
+    def signing_session(self, password) -> SigningSession:
+        """Returns a SigningSession for getting many private keys with one
+        password check. Raises InvalidPassword."""
+        return SigningSession(self, password)
+
     def sign_transaction(self, tx, password, *, use_cache=False, ndata=None, grind=None):
         if self.is_watching_only():
             return
-        # Raise if password is not correct.
-        self.check_password(password)
-        # Add private keys
+        # Add private keys. Raises if password is not correct.
         keypairs = self.get_tx_derivations(tx)
-        for k, v in keypairs.items():
-            keypairs[k] = self.get_private_key(v, password)
+        with self.signing_session(password) as session:
+            for k, v in keypairs.items():
+                keypairs[k] = session.get_private_key(v)
         # Sign
         if keypairs:
             if ndata is not None:
@@ -216,6 +256,9 @@ class Imported_KeyStore(Software_KeyStore):
         WIF_privkey = self.export_private_key(pubkey, password)
         return PublicKey.privkey_from_WIF_privkey(WIF_privkey)
 
+    def signing_session(self, password):
+        return _ImportedSigningSession(self, password)
+
     def get_pubkey_derivation(self, x_pubkey):
         if x_pubkey[0:2] in ['02', '03', '04']:
             pubkey = PublicKey.from_string(x_pubkey)
@@ -463,6 +506,9 @@ class BIP32_KeyStore(Deterministic_KeyStore, Xprv):
     def is_watching_only(self):
         return not self.has_master_private_key()
 
+    def signing_session(self, password):
+        return _XprvSigningSession(self, password)
+
     def add_xprv_from_seed(self, bip32_seed, xtype, derivation):
         xprv, xpub = bip32_root(bip32_seed, xtype)
         xprv, xpub = bip32_private_derivation(xprv, "m/", derivation)
@@ -559,6 +605,9 @@ class Old_KeyStore(Deterministic_KeyStore):
         pk = self.get_private_key_from_stretched_exponent(for_change, n, secexp)
         return pk, False
 
+    def signing_session(self, password):
+        return _OldSigningSession(self, password)
+
     def check_seed(self, seed):
         ''' As a performance optimization we also return the stretched key
         in case the caller needs it. Otherwise we raise InvalidPassword. '''
@@ -612,6 +661,96 @@ class Old_KeyStore(Deterministic_KeyStore):
             self.seed = pw_encode(decoded, new_password)
 
 
+class _ImportedSigningSession(SigningSession):
+    """Checks the password on one key, and then just decrypts the keys asked
+    for, with the AES key derived from the password once."""
+
+    def open(self):
+        self.keystore.check_password(self.password)
+        self._secret = Hash(self.password) if self.password is not None else None
+
+    def get_private_key(self, pubkey):
+        enc_privkey = self.keystore.keypairs[pubkey]
+        if self._secret is None:
+            WIF_privkey = enc_privkey
+        else:
+            try:
+                WIF_privkey = to_string(DecodeAES_base64(self._secret, enc_privkey), "utf8")
+            except Exception as e:
+                raise InvalidPassword() from e
+        return PublicKey.privkey_from_WIF_privkey(WIF_privkey)
+
+    def close(self):
+        super().close()
+        self._secret = None
+
+
+class _XprvSigningSession(SigningSession):
+    """Decrypts and deserializes the xprv once, and keeps the branch nodes
+    (m/0 and m/1 for a wallet) together with their public keys, so that
+    deriving a leaf key is one HMAC with no elliptic curve work."""
+
+    def open(self):
+        xprv = self.keystore.get_master_private_key(self.password)
+        # The same checks as Xprv.check_password(), on the one decryption
+        try:
+            assert DecodeBase58Check(xprv) is not None
+        except Exception:
+            # Password was None but key was encrypted.
+            raise InvalidPassword()
+        _, _, _, _, c, k = deserialize_xprv(xprv)
+        if c != deserialize_xpub(self.keystore.xpub)[4]:
+            raise InvalidPassword()
+        self._nodes = {(): (k, c)}  # derivation prefix -> (k, c)
+        self._pubkeys = {}  # derivation prefix -> compressed public key of its node
+
+    def _node(self, sequence):
+        node = self._nodes.get(sequence)
+        if node is None:
+            k, c = self._node(sequence[:-1])
+            node = self._nodes[sequence] = CKD_priv(k, c, sequence[-1], cK=self._pubkey(sequence[:-1]))
+        return node
+
+    def _pubkey(self, sequence):
+        cK = self._pubkeys.get(sequence)
+        if cK is None:
+            k, _ = self._node(sequence)
+            cK = self._pubkeys[sequence] = GetPubKey(EC_KEY(k).pubkey, True)
+        return cK
+
+    def get_private_key(self, sequence):
+        sequence = tuple(sequence)
+        if not sequence:
+            return self._nodes[()][0], True
+        # Only the branch nodes are kept, not the leaves
+        parent = sequence[:-1]
+        k, c = self._node(parent)
+        pk, _ = CKD_priv(k, c, sequence[-1], cK=self._pubkey(parent))
+        return pk, True
+
+    def close(self):
+        super().close()
+        self._nodes.clear()
+        self._pubkeys.clear()
+
+
+class _OldSigningSession(SigningSession):
+    """Stretches the seed once; each key is then just a hash and an
+    addition."""
+
+    def open(self):
+        seed = self.keystore.get_hex_seed(self.password)
+        self._secexp = self.keystore.check_seed(seed)
+
+    def get_private_key(self, sequence):
+        for_change, n = sequence
+        return self.keystore.get_private_key_from_stretched_exponent(for_change, n, self._secexp), False
+
+    def close(self):
+        super().close()
+        self._secexp = None
+
+
 class Hardware_KeyStore(KeyStore, Xpub):
     # Derived classes must set:
     #   - device
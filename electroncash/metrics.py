@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" Lightweight runtime metrics: counters, gauges and histograms.
+
+Metrics are created at module level where they are used, e.g.:
+
+    _write_seconds = metrics.histogram('electroncash_storage_write_seconds',
+                                       'Time taken to write a wallet file')
+    ...
+    with _write_seconds.time():
+        ...
+
+and may have labels:
+
+    _requests = metrics.counter('electroncash_foo_total', 'Foos', ('method',))
+    _requests.labels('blockchain.headers.subscribe').inc()
+
+Values that are cheaper to compute on demand than to keep up to date (e.g.
+cache statistics) can be supplied by a collector function instead, see
+add_collector().
+
+The daemon command `getmetrics` returns a snapshot(), and if the config key
+'metrics_port' is set the daemon also serves them in the Prometheus text
+format on http://127.0.0.1:<metrics_port>/metrics. """
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+COUNTER, GAUGE, HISTOGRAM = 'counter', 'gauge', 'histogram'
+
+# Default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Timer:
+    __slots__ = ('child', 't0')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.t0)
+
+
+class _Value:
+    ''' A single time series of a counter or gauge '''
+    __slots__ = ('value', 'lock')
+
+    def __init__(self, lock):
+        self.value = 0
+        self.lock = lock
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _HistogramValue:
+    ''' A single time series of a histogram '''
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'lock')
+
+    def __init__(self, lock, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # not cumulative; the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = lock
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            if i < len(self.counts):
+                self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        ''' Context manager that observes the time taken by its body '''
+        return _Timer(self)
+
+    def get(self):
+        with self.lock:
+            cumulative, total = {}, 0
+            for bound, n in zip(self.buckets, self.counts):
+                total += n
+                cumulative[bound] = total
+            return {'count': self.count, 'sum': self.sum, 'buckets': cumulative}
+
+
+class Metric:
+    ''' A named metric, with zero or more label names. With no labels, the
+    methods of its single time series (inc, set, observe, ...) may be called
+    on the metric directly; otherwise use labels() to get at a time series. '''
+
+    def __init__(self, name, documentation, kind, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        if self.kind == HISTOGRAM:
+            return _HistogramValue(self._lock, self.buckets)
+        return _Value(self._lock)
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name}: expected labels {self.labelnames}, got {values}')
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def remove(self, *values):
+        ''' Forgets the time series with the given label values '''
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in values), None)
+
+    def samples(self) -> List[Tuple[Dict[str, str], object]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child.get()) for values, child in items]
+
+    # Shortcuts for metrics without labels
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def get(self):
+        return self._default.get()
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable] = []
+
+    def register(self, name, documentation, kind, labelnames=(), **kwargs) -> Metric:
+        ''' Returns the metric called name, creating it if needed '''
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric(name, documentation, kind, labelnames, **kwargs)
+            elif metric.kind != kind or metric.labelnames != tuple(labelnames):
+                raise ValueError(f'metric {name} already registered with a different type or labels')
+            return metric
+
+    def add_collector(self, func: Callable[[], Iterable[Tuple[str, str, str, list]]]):
+        ''' func() is called whenever the metrics are read, and should return
+        an iterable of (name, kind, documentation, samples) where samples is
+        a list of (labels dict, value). Only counters and gauges are
+        supported. '''
+        with self.lock:
+            self.collectors.append(func)
+
+    def collect(self):
+        ''' Yields (name, kind, documentation, samples) for every metric '''
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+        for m in metrics:
+            yield m.name, m.kind, m.documentation, m.samples()
+        for func in collectors:
+            try:
+                yield from func()
+            except Exception as e:
+                from .util import print_error
+                print_error('[metrics] collector', func, 'failed:', repr(e))
+
+    def snapshot(self) -> dict:
+        ''' Returns all metrics as a JSON-friendly dict '''
+        return {name: {'type': kind, 'help': doc,
+                       'samples': [{'labels': labels, 'value': value} for labels, value in samples]}
+                for name, kind, doc, samples in self.collect()}
+
+    def render_prometheus(self) -> str:
+        ''' Returns all metrics in the Prometheus text exposition format '''
+        lines = []
+        for name, kind, doc, samples in self.collect():
+            lines.append(f'# HELP {name} {_escape_help(doc)}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                if kind == HISTOGRAM:
+                    for bound, n in value['buckets'].items():
+                        lines.append(_sample(name + '_bucket', dict(labels, le=_fmt(bound)), n))
+                    lines.append(_sample(name + '_bucket', dict(labels, le='+Inf'), value['count']))
+                    lines.append(_sample(name + '_sum', labels, value['sum']))
+                    lines.append(_sample(name + '_count', labels, value['count']))
+                else:
+                    lines.append(_sample(name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return repr(value) if value == value else 'NaN'
+    return str(value)
+
+
+def _escape_help(s):
+    return s.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def _escape_label(s):
+    return str(s).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _sample(name, labels, value):
+    if labels:
+        name += '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + '}'
+    return f'{name} {_fmt(value)}'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()) -> Metric:
+    return REGISTRY.register(name, documentation, COUNTER, labelnames)
+
+
+def gauge(name, documentation, labelnames=()) -> Metric:
+    return REGISTRY.register(name, documentation, GAUGE, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Metric:
+    return REGISTRY.register(name, documentation, HISTOGRAM, labelnames, buckets=buckets)
+
+
+def add_collector(func):
+    REGISTRY.add_collector(func)
+
+
+def snapshot() -> dict:
+    return REGISTRY.snapshot()
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+class PrometheusServer:
+    ''' Serves the metrics over HTTP in a background thread. Only binds to
+    localhost by default; put a reverse proxy in front of it if it needs to be
+    reachable from elsewhere. '''
+
+    def __init__(self, port: int, host: str = '127.0.0.1', registry: Optional[Registry] = None):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = registry or REGISTRY
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='PrometheusServer', daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
@@ -43,12 +43,20 @@ from .bitcoin import *
 from . import networks
 from .i18n import _
 from .interface import Connection, Interface
+from .subscriptions import ScripthashSubscriptions
 from . import blockchain
+from . import metrics
 from . import version
 from .tor import TorController, check_proxy_bypass_tor_control
+from .tx_broadcaster import TxBroadcaster
+from .tx_fetcher import TxFetcher
 from .utils import Event
 
 DEFAULT_AUTO_CONNECT = True
+
+_response_batch = metrics.histogram('electroncash_network_response_batch_size',
+                                    'Number of responses read from an interface at a time',
+                                    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
 # Versions prior to 4.0.15 had this set to True, but we opted for False to
 # promote network health by allowing clients to connect to new servers easily.
 DEFAULT_WHITELIST_SERVERS_ONLY = False
@@ -228,6 +236,15 @@ class Network(util.DaemonThread):
     NODES_RETRY_INTERVAL = 60  # How often to retry a node we know about in secs, if we are connected to less than 10 nodes
     SERVER_RETRY_INTERVAL = 10  # How often to reconnect when server down in secs
     MAX_MESSAGE_BYTES = 1024*1024*32 # = 32MB. The message size limit in bytes. This is to prevent a DoS vector whereby the server can fill memory with garbage data.
+    # Idempotent read requests which, when not directed at a particular
+    # interface, may be answered by any healthy interface rather than just the
+    # main one; see queue_request(). Header requests are deliberately not in
+    # here: their responses drive the chain sync of the interface they were
+    # sent to.
+    DISTRIBUTABLE_METHODS = frozenset(('blockchain.transaction.get', 'blockchain.transaction.get_merkle'))
+    MAX_SECONDARY_PENDING = 50  # Don't give a secondary interface more reads than this at a time
+    RESUBSCRIBE_BATCH = 200  # Re-subscribe to at most this many scripthashes per network loop iteration ...
+    RESUBSCRIBE_MAX_PENDING = 500  # ... and only while the server has fewer than this many of our requests pending
 
     tor_controller: TorController = None
 
@@ -262,6 +279,11 @@ class Network(util.DaemonThread):
 
         self.pending_sends = []
         self.message_id = util.Monotonic(locking=True)
+        # All fetching of transactions by txid should go through this, see tx_fetcher.py
+        self.tx_fetcher = TxFetcher(self, max_in_flight=self.config.get('tx_fetch_max_in_flight', 8))
+        # Broadcasting of many transactions at once should go through this, see tx_broadcaster.py
+        self.tx_broadcaster = TxBroadcaster(self, max_in_flight=self.config.get('broadcast_max_in_flight', 16))
+        self.add_jobs([self.tx_fetcher, self.tx_broadcaster])
         self.verified_checkpoint = False
         self.verifications_required = 1
         # If the height is cleared from the network constants, we're
@@ -278,9 +300,11 @@ class Network(util.DaemonThread):
         self.donation_address = ''
         self.features = None
         self.relay_fee = None
-        # callbacks passed with subscriptions
+        # callbacks passed with subscriptions (other than scripthash ones)
         self.subscriptions = defaultdict(list)
         self.sub_cache = {}                     # note: needs self.interface_lock
+        # scripthash subscriptions, shared by all wallets; needs self.lock
+        self.scripthash_subs = ScripthashSubscriptions()
         # callbacks set by the GUI
         self.callbacks = defaultdict(list)
 
@@ -289,10 +313,11 @@ class Network(util.DaemonThread):
             os.mkdir(dir_path)
             os.chmod(dir_path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
 
-        # subscriptions and requests
-        self.subscribed_addresses = set()
         # Requests from client we've not seen a response to
         self.unanswered_requests = {}
+        # server -> the latency of that server (seconds) when we last disconnected from it
+        self.server_latency = {}
+        self.distribute_reads = self.config.get('network_distribute_reads', True)
         # retry times
         self.server_retry_time = time.time()
         self.nodes_retry_time = time.time()
@@ -466,6 +491,8 @@ class Network(util.DaemonThread):
         """
         if interface is None:
             interface = self.interface
+            if self.distribute_reads and method in self.DISTRIBUTABLE_METHODS:
+                interface = self._pick_read_interface(interface)
         elif interface == 'random':
             interface = random.choice(self.get_interfaces(interfaces=True)
                                       or (None,))  # may set interface to None if no interfaces
@@ -502,25 +529,30 @@ class Network(util.DaemonThread):
         self.queue_request('server.peers.subscribe', [])
         #self.request_fee_estimates()  # We disable fee estimates globally in this app for now. BCH doesn't need them and they create more user confusion than anything.
         self.queue_request('blockchain.relayfee', [])
-        n_defunct = 0
-        method = 'blockchain.scripthash.subscribe'
-        for h in self.subscribed_addresses.copy():
-            params = [h]
-            k = self.get_index(method, params)
-            if self.subscriptions.get(k, None):
-                self.queue_request(method, params)
-            else:
-                # If a wallet was closed, we stayed subscribed to its scripthashes
-                # (there is no way to unsubscribe from a scripthash, unfortunately)
-                # However, now that we are connecting to a new server, use this
-                # opportunity to clean house and not subscribe to scripthashes
-                # for closed wallets.  We know a scripthash is defunct if it is
-                # missing a callback (no entry in self.subscriptions dict).
-                #self.print_error("removing defunct subscription", h)
-                self.subscribed_addresses.discard(h)
-                self.subscriptions.pop(k, None)  # it may be an empty list (or missing), so pop it just in case it's a list.
-                n_defunct += 1
-        self.print_error('sent subscriptions to', self.interface.server, len(old_reqs),"reqs", len(self.subscribed_addresses), "subs", n_defunct, "defunct subs")
+        # Scripthashes are re-subscribed to a few at a time by
+        # _resubscribe_some(), so as not to flood the new server. Each is
+        # subscribed to once, however many wallets are watching it.
+        with self.lock:
+            self.scripthash_subs.begin_resubscribe()
+            n_subs = len(self.scripthash_subs)
+        self.print_error('sent subscriptions to', self.interface.server, len(old_reqs), "reqs,", n_subs, "scripthash subs queued")
+
+    def _resubscribe_some(self):
+        ''' Sends the next batch of the scripthash re-subscriptions queued up by
+        send_subscriptions, as long as the server isn't already busy with
+        lots of our requests. '''
+        interface = self.interface
+        if not interface or not self.scripthash_subs.backlog:
+            return
+        room = min(self.RESUBSCRIBE_BATCH, self.RESUBSCRIBE_MAX_PENDING - interface.num_pending())
+        if room <= 0:
+            return
+        with self.lock:
+            scripthashes = self.scripthash_subs.take_backlog(room)
+        for sh in scripthashes:
+            self.queue_request('blockchain.scripthash.subscribe', [sh])
+        if not self.scripthash_subs.backlog:
+            self.print_error('re-subscribed to', len(self.scripthash_subs), 'scripthashes on', interface.server)
 
     def request_fee_estimates(self):
         self.print_error("request_fee_estimates called: DISABLED in network.py")
@@ -616,10 +648,66 @@ class Network(util.DaemonThread):
         exclude_set = exclude_set.union(self.blacklisted_servers)
         return exclude_set
 
+    def get_server_latency(self, server):
+        ''' Returns the latency in seconds of server, as measured by the
+        interface to it, or as last measured if not connected. Returns None
+        if we never measured it. '''
+        interface = self.interfaces.get(server)
+        latency = interface and interface.latency()
+        return latency if latency is not None else self.server_latency.get(server)
+
+    def _pick_by_latency(self, servers):
+        ''' Picks one of servers at random, favouring those with lower
+        latency. Servers we have not measured yet are given the median
+        latency, so that they still get a fair chance. '''
+        servers = list(servers)
+        if not servers:
+            return None
+        latencies = [self.get_server_latency(server) for server in servers]
+        known = sorted(lat for lat in latencies if lat is not None)
+        median = known[len(known) // 2] if known else 1.0
+        weights = [1.0 / max(lat if lat is not None else median, 0.001) for lat in latencies]
+        return random.choices(servers, weights=weights)[0]
+
+    def _is_healthy_secondary(self, interface, main):
+        ''' True if interface can answer reads on behalf of main: it is fully
+        synced, on the same chain, agrees on the tip, and is not swamped. '''
+        return (interface.mode == Interface.MODE_DEFAULT
+                and interface.blockchain is not None and interface.blockchain is main.blockchain
+                and interface.tip_header is not None and interface.tip_header == main.tip_header
+                and interface.num_pending() < self.MAX_SECONDARY_PENDING)
+
+    def _pick_read_interface(self, main):
+        ''' Returns the interface to send a distributable read request to:
+        main or a healthy secondary, weighted by how soon each is expected to
+        answer (its latency, scaled by its backlog). '''
+        if not main:
+            return main
+        with self.interface_lock:
+            candidates = [i for i in self.interfaces.values()
+                          if i is main or self._is_healthy_secondary(i, main)]
+        if len(candidates) < 2:
+            return main
+        main_latency = main.latency() or 1.0
+        def expected_wait(i):
+            latency = i.latency()
+            return (latency if latency is not None else main_latency) * (1 + i.num_pending() / 10)
+        weights = [1.0 / max(expected_wait(i), 0.001) for i in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+    def get_interface_stats(self):
+        ''' Returns a dict of server -> performance stats for each connected
+        interface. '''
+        with self.interface_lock:
+            main = self.interface
+            return {server: dict(i.get_stats(), main=i is main, mode=i.mode,
+                                 healthy=bool(main) and (i is main or self._is_healthy_secondary(i, main)))
+                    for server, i in self.interfaces.items()}
+
     def start_random_interface(self):
         exclude_set = self.get_unavailable_servers()
         hostmap = self.get_servers() if not self.is_whitelist_only() else self.whitelisted_servers_hostmap
-        server_key = pick_random_server(hostmap, self.protocol, exclude_set)
+        server_key = self._pick_by_latency(get_eligible_servers(hostmap, self.protocol, exclude_set))
         if server_key:
             self.start_interface(server_key)
 
@@ -735,7 +823,7 @@ class Network(util.DaemonThread):
         if self.default_server in servers:
             servers.remove(self.default_server)
         if servers:
-            self.switch_to_interface(random.choice(servers))
+            self.switch_to_interface(self._pick_by_latency(servers))
 
     def switch_lagging_interface(self):
         """If auto_connect and lagging, switch interface"""
@@ -744,7 +832,7 @@ class Network(util.DaemonThread):
             header = self.blockchain().read_header(self.get_local_height())
             filtered = list(map(lambda x:x[0], filter(lambda x: x[1].tip_header==header, self.interfaces.items())))
             if filtered:
-                choice = random.choice(filtered)
+                choice = self._pick_by_latency(filtered)
                 self.switch_to_interface(choice, self.SWITCH_LAGGING)
 
     SWITCH_DEFAULT = 'SWITCH_DEFAULT'
@@ -777,6 +865,9 @@ class Network(util.DaemonThread):
 
     def close_interface(self, interface):
         if interface:
+            latency = interface.latency()
+            if latency is not None:
+                self.server_latency[interface.server] = latency
             with self.interface_lock:
                 if interface.server in self.interfaces:
                     self.interfaces.pop(interface.server)
@@ -877,6 +968,8 @@ class Network(util.DaemonThread):
 
     def process_responses(self, interface):
         responses = interface.get_responses()
+        if responses:
+            _response_batch.observe(len(responses))
         for request, response in responses:
             if request:
                 method, params, message_id = request
@@ -886,9 +979,11 @@ class Network(util.DaemonThread):
                 # and are placed in the unanswered_requests dictionary
                 client_req = self.unanswered_requests.pop(message_id, None)
                 if client_req:
-                    if interface != self.interface:
+                    if interface != self.interface and method not in self.DISTRIBUTABLE_METHODS:
                         self.print_error("advisory: response from non-primary {}".format(interface))
                     callbacks = [client_req[2]]
+                elif method == 'blockchain.scripthash.subscribe':
+                    callbacks = []  # fanned out below
                 else:
                     # fixme: will only work for subscriptions
                     k = self.get_index(method, params)
@@ -897,10 +992,6 @@ class Network(util.DaemonThread):
                 # Copy the request method and params to the response
                 response['method'] = method
                 response['params'] = params
-                # Only once we've received a response to an addr subscription
-                # add it to the list; avoids double-sends on reconnection
-                if method == 'blockchain.scripthash.subscribe' and params and isinstance(params, (list, tuple)):
-                    self.subscribed_addresses.add(params[0])
             else:
                 if not response:  # Closed remotely / misbehaving
                     self.connection_down(interface.server)
@@ -916,15 +1007,35 @@ class Network(util.DaemonThread):
                     elif method == 'blockchain.scripthash.subscribe':
                         response['params'] = [params[0]]  # addr
                         response['result'] = params[1]
-                callbacks = self.subscriptions.get(k, [])
+                callbacks = self.subscriptions.get(k, []) if method != 'blockchain.scripthash.subscribe' else []
 
-            # update cache if it's a subscription
-            if method.endswith('.subscribe'):
+            if method == 'blockchain.scripthash.subscribe':
+                callbacks = self._on_scripthash_status(interface, response, callbacks)
+            elif method.endswith('.subscribe'):
+                # update cache if it's a subscription
                 with self.interface_lock:
                     self.sub_cache[k] = response
             # Response is now in canonical form
             self.process_response(interface, request, response, callbacks)
 
+    def _on_scripthash_status(self, interface, response, callbacks):
+        ''' Records the status in a scripthash subscription response or
+        notification, and returns the callbacks of every wallet watching
+        that scripthash (plus any in `callbacks`) to fan it out to. '''
+        params = response.get('params')
+        if not params or not isinstance(params, (list, tuple)) or not isinstance(params[0], str):
+            return callbacks
+        sh = params[0]
+        with self.lock:
+            if interface is self.interface:
+                # Statuses from any other server are of no use to us
+                if 'error' in response:
+                    self.scripthash_subs.on_error(sh)
+                else:
+                    self.scripthash_subs.on_status(sh, response.get('result'))
+            fanout = self.scripthash_subs.get_callbacks(sh)
+        return fanout + [cb for cb in callbacks if cb not in fanout]
+
     def subscribe_to_scripthashes(self, scripthashes: Iterable[str], callback):
         msgs = [('blockchain.scripthash.subscribe', [sh])
                 for sh in scripthashes]
@@ -935,24 +1046,13 @@ class Network(util.DaemonThread):
         msgs = []
         for sh in scripthashes:
             params = [sh]
-            k = self.get_index(method_sub, params)
             with self.lock:
                 # Clear any potential previously-queued subscription request
                 self.cancel_requests(callback, method=method_sub, params=params)
-                # See if this would have been the last callback
-                callbacks = self.subscriptions.get(k, None)
-                if isinstance(callbacks, (list, set)):
-                    # "refct" of the subscription is now 0
-                    try:
-                        callbacks.remove(callback)
-                    except (ValueError, KeyError):
-                        pass
-                if not callbacks:
+                # Only unsubscribe from the server if no other wallet is
+                # watching this scripthash
+                if self.scripthash_subs.remove(sh, callback):
                     msgs.append(('blockchain.scripthash.unsubscribe', params))
-                    self.subscriptions.pop(k, None)
-                    self.subscribed_addresses.discard(sh)
-                    with self.interface_lock:
-                        self.sub_cache.pop(k, None)
         if msgs:
             def unsub_callback(response):
                 method = response.get('method')
@@ -987,6 +1087,16 @@ class Network(util.DaemonThread):
         for messages, callback in sends:
             for method, params in messages:
                 r = None
+                if method == 'blockchain.scripthash.subscribe':
+                    with self.lock:
+                        need_subscribe, r = self.scripthash_subs.add(params[0], callback)
+                    if r is not None:
+                        callback(r)
+                    elif need_subscribe:
+                        # No callback: the response is fanned out to everyone
+                        # watching this scripthash
+                        self.queue_request(method, params)
+                    continue
                 if method.endswith('.subscribe'):
                     k = self.get_index(method, params)
                     # add callback to list
@@ -1038,9 +1148,8 @@ class Network(util.DaemonThread):
         to avoid race conditions."""
         # Note: we can't unsubscribe from the server, so if we receive
         # subsequent notifications, they will be safely ignored as
-        # no callbacks will exist to process them. For subscriptions we will
-        # however cache the 'result' hash and feed it back in case a wallet that
-        # was closed gets reopened (self.sub_cache).
+        # no callbacks will exist to process them. Scripthashes left with no
+        # callbacks are forgotten, and not re-subscribed to on the next server.
         ct = 0
         with self.lock:
             for k,v in self.subscriptions.copy().items():
@@ -1050,6 +1159,7 @@ class Network(util.DaemonThread):
                         # remove empty list
                         self.subscriptions.pop(k, None)
                     ct += 1
+            ct += self.scripthash_subs.discard_callback(callback)
         ct2, ct3 = self._cancel_pending_sends(callback)
         if ct or ct2 or ct3:
             qname = getattr(callback, '__qualname__', '<unknown>')
@@ -1089,12 +1199,24 @@ class Network(util.DaemonThread):
         if server == self.default_server:
             self.set_status('disconnected')
         if server in self.interfaces:
-            self.close_interface(self.interfaces[server])
+            interface = self.interfaces[server]
+            self.close_interface(interface)
+            self._requeue_requests(interface)
             self.notify('interfaces')
         for b in self.blockchains.values():
             if b.catch_up == server:
                 b.catch_up = None
 
+    def _requeue_requests(self, interface):
+        ''' Re-sends the client requests that were still pending on a closed
+        interface, so that their callbacks don't wait forever. Requests that
+        were on the main interface end up waiting for the next one. '''
+        message_ids = set(interface.unanswered_requests) | {r[2] for r in interface.unsent_requests}
+        for message_id in message_ids:
+            request = self.unanswered_requests.pop(message_id, None)
+            if request:
+                self.queue_request(request[0], request[1], callback=request[2])
+
     def new_interface(self, server_key, socket):
         self.add_recent_server(server_key)
 
@@ -1607,6 +1729,7 @@ class Network(util.DaemonThread):
             if self.verified_checkpoint:
                 self.run_jobs()    # Synchronizer and Verifier and Fx
             self.process_pending_sends()
+            self._resubscribe_some()
         self.stop_network()
 
         self.tor_controller.active_port_changed.remove(self.on_tor_port_changed)
@@ -1851,8 +1974,8 @@ class Network(util.DaemonThread):
                  if the server message is not recognized). """
         txid = str(txid).strip()
         try:
-            r = self.synchronous_get(('blockchain.transaction.get',[txid]), timeout=timeout)
-            return True, r
+            tx = self.tx_fetcher.get(txid, timeout=timeout, priority=TxFetcher.PRIORITY_UI)
+            return True, tx.raw
         except BaseException as e:
             self.print_error("Exception retrieving transaction for '{}': {}".format(txid, repr(e)))
             msg = str(e).lower().strip()
@@ -2147,3 +2270,33 @@ class Network(util.DaemonThread):
                 for s in self.interfaces.copy():
                     if s not in self.whitelisted_servers:
                         self.connection_down(s)
+
+
+def _collect_metrics():
+    network = Network.INSTANCE
+    if not network:
+        return
+    interface = network.interface
+    gauges = (
+        ('electroncash_network_connected_servers', 'Number of servers we are connected to',
+         len(network.interfaces)),
+        ('electroncash_network_local_height', 'Height of our best chain of verified headers',
+         network.get_local_height()),
+        ('electroncash_network_server_height', 'Chain tip height reported by the main server',
+         interface.tip if interface else 0),
+        ('electroncash_network_unanswered_requests', 'Client requests awaiting a response',
+         len(network.unanswered_requests)),
+        ('electroncash_network_pending_sends', 'Client requests not yet queued on an interface',
+         len(network.pending_sends)),
+        ('electroncash_network_main_server_pending_requests', 'Requests outstanding on the main server',
+         interface.num_pending() if interface else 0),
+        ('electroncash_network_scripthash_subscriptions', 'Scripthashes subscribed to, across all wallets',
+         len(network.scripthash_subs)),
+        ('electroncash_network_resubscribe_backlog', 'Scripthashes waiting to be re-subscribed after a server switch',
+         len(network.scripthash_subs.backlog)),
+    )
+    for name, doc, value in gauges:
+        yield name, metrics.GAUGE, doc, [({}, value)]
+
+
+metrics.add_collector(_collect_metrics)
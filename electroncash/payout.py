@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" Payouts to thousands of addresses.
+
+paytomany makes one transaction, picks its coins with the CoinChooser and
+works out its size by serializing it again for each coin it tries. That is
+fine for a handful of outputs, but a payroll or a mining pool payout of ten
+thousand outputs does not fit in one standard transaction, and serializing
+it over and over is slow. The PayoutBuilder instead:
+
+    - Splits the outputs, in the order they were given, over as many
+      transactions as it takes to stay under max_tx_size (by default the
+      largest transaction nodes relay).
+    - Keeps a running tally of each transaction's size, from the sizes of
+      its outputs and inputs which it works out once, rather than
+      serializing the transaction to measure it.
+    - Funds each transaction with the largest coins left. When those run
+      out, it spends the change of the earlier transactions, so that a
+      batch can be paid from a few large coins; such transactions must be
+      broadcast after their parents (Network.tx_broadcaster does that).
+    - Signs the transactions that do not spend from one another in
+      parallel, when the wallet's keys are in software.
+"""
+
+import copy
+import json
+from decimal import Decimal as PyDecimal, InvalidOperation
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .address import Address
+from .bitcoin import COIN, TYPE_ADDRESS
+from .consolidate import MAX_STANDARD_TX_SIZE, MAX_TX_SIZE
+from .transaction import Transaction
+from .util import NotEnoughFunds
+
+Payout = Tuple[Address, int]  # (address, amount in satoshis)
+
+
+def _is_number(s) -> bool:
+    try:
+        PyDecimal(str(s))
+    except InvalidOperation:
+        return False
+    return True
+
+
+def parse_payouts(text) -> List[Payout]:
+    """ Parses payouts given as CSV, one "address, amount" per line, or as a
+    JSON list of [address, amount] pairs or of {"address": .., "amount": ..}
+    objects. `text` may also be that list already. Amounts are in BCH.
+    Blank lines, lines starting with '#' and a header line (a first line
+    with neither an address nor an amount, such as "address,amount") are
+    skipped. Raises ValueError, naming the offending line or item. """
+    if isinstance(text, (bytes, bytearray)):
+        text = text.decode('utf-8')
+    if isinstance(text, str) and text.lstrip().startswith('['):
+        text = json.loads(text, parse_float=lambda x: str(PyDecimal(x)))
+    if isinstance(text, str):
+        rows = []
+        for lineno, line in enumerate(text.splitlines(), 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = [f.strip() for f in line.split(',')]
+            if len(fields) != 2:
+                raise ValueError("Line {}: expected \"address, amount\"".format(lineno))
+            rows.append(("Line {}".format(lineno), fields[0], fields[1]))
+    else:
+        rows = []
+        for i, item in enumerate(text):
+            if isinstance(item, dict):
+                rows.append(("Item {}".format(i), item.get('address'), item.get('amount')))
+            elif isinstance(item, (list, tuple)) and len(item) == 2:
+                rows.append(("Item {}".format(i), item[0], item[1]))
+            else:
+                raise ValueError("Item {}: expected [address, amount]".format(i))
+    addresses: Dict[str, Address] = {}  # the same addresses tend to come up again and again
+    payouts = []
+    for n, (where, addr_str, amount_str) in enumerate(rows):
+        try:
+            addr = addresses.get(addr_str)
+            if addr is None:
+                addr = addresses[addr_str] = Address.from_string(addr_str)
+        except Exception:
+            if n == 0 and isinstance(text, str) and not _is_number(amount_str):
+                continue  # a header
+            raise ValueError("{}: bad address {!r}".format(where, addr_str))
+        try:
+            amount = PyDecimal(str(amount_str)) * COIN
+        except InvalidOperation:
+            raise ValueError("{}: bad amount {!r}".format(where, amount_str))
+        if amount != amount.to_integral_value() or amount <= 0:
+            raise ValueError("{}: bad amount {!r}".format(where, amount_str))
+        payouts.append((addr, int(amount)))
+    return payouts
+
+
+class PayoutChunk:
+    """ One transaction of a payout, as planned by PayoutBuilder.plan(). """
+    __slots__ = ('start', 'end', 'coins', 'parents', 'change', 'fee', 'size')
+
+    def __init__(self, start, end, coins, parents, change, fee, size):
+        self.start, self.end = start, end  # the slice of the payouts it pays
+        self.coins = coins  # the wallet coins it spends
+        self.parents = parents  # the indexes of the chunks whose change it spends
+        self.change = change  # its change, 0 if none
+        self.fee = fee
+        self.size = size  # its estimated size, in bytes
+
+
+class PayoutBuilder:
+
+    def __init__(self, wallet, coins: Sequence[dict], payouts: Sequence[Payout],
+                 fee_estimator: Callable[[int], int], *, change_addr: Optional[Address] = None,
+                 max_tx_size: int = MAX_STANDARD_TX_SIZE, sign_schnorr: Optional[bool] = None,
+                 dust_threshold: Optional[int] = None):
+        """ Pays `payouts` from `coins` (as from wallet.get_spendable_coins),
+        paying the fee that fee_estimator(size in bytes) gives for each
+        transaction. The change goes to change_addr, by default a change
+        address of the wallet. """
+        if not payouts:
+            raise ValueError("Nothing to pay")
+        if max_tx_size > MAX_TX_SIZE:
+            raise ValueError("max_tx_size may be at most {}".format(MAX_TX_SIZE))
+        self.wallet = wallet
+        self.payouts = list(payouts)
+        self.fee_estimator = fee_estimator
+        self.max_tx_size = max_tx_size
+        self.sign_schnorr = wallet.is_schnorr_enabled() if sign_schnorr is None else bool(sign_schnorr)
+        self.dust_threshold = wallet.dust_threshold() if dust_threshold is None else dust_threshold
+        if not coins:
+            raise NotEnoughFunds()
+        if change_addr is None:
+            change_addrs = wallet.get_default_change_addresses(1) if wallet.use_change else []
+            change_addr = change_addrs[0] if change_addrs else coins[0]['address']
+        self.change_addr = change_addr
+        # Change can only be spent again if we can sign for it
+        self.chain_change = wallet.is_mine(change_addr)
+        self.change_size = Transaction.estimated_output_size(change_addr)
+        sizes: Dict[Address, int] = {}
+        self._out_sizes = []
+        for addr, _value in self.payouts:
+            size = sizes.get(addr)
+            if size is None:
+                size = sizes[addr] = Transaction.estimated_output_size(addr)
+            self._out_sizes.append(size)
+        coins = list(coins)
+        for coin in coins:
+            wallet.add_input_info(coin)
+        # Smallest first, so that pop() gives the largest coin left
+        self._coins = sorted(((coin['value'], Transaction.estimated_input_size(coin, self.sign_schnorr), i)
+                              for i, coin in enumerate(coins)))
+        self._coin_dicts = coins
+        self._change_in_size = None
+        if self.chain_change:
+            self._change_in_size = Transaction.estimated_input_size(self._change_txin('00' * 32, 0, 0),
+                                                                    self.sign_schnorr)
+
+    def _change_txin(self, prevout_hash, prevout_n, value) -> dict:
+        addr = self.change_addr
+        txin = {
+            'address': addr,
+            'type': self.wallet.get_txin_type(addr),
+            'prevout_hash': prevout_hash,
+            'prevout_n': prevout_n,
+            'value': value,
+            'token_data': None,
+            'coinbase': False,
+            'height': 0,
+        }
+        self.wallet.add_input_sig_info(txin, addr)
+        return txin
+
+    def plan(self) -> List[PayoutChunk]:
+        """ Works out which payouts and coins go in which transaction.
+        Raises NotEnoughFunds, or ValueError if a payout cannot fit in a
+        transaction of max_tx_size on its own. """
+        coins = list(self._coins)
+        spare: List[int] = []  # chunks whose change is not spent yet
+        chunks: List[PayoutChunk] = []
+        out_sizes = self._out_sizes
+        i, n = 0, len(self.payouts)
+        while i < n:
+            start = i
+            in_value = in_size = 0
+            taken = []  # ('coin', (value, size, index)) or ('change', chunk index)
+            out_value = out_size = 0
+            size = 0
+            while i < n:
+                new_out_value = out_value + self.payouts[i][1]
+                new_out_size = out_size + out_sizes[i]
+                n_taken = len(taken)
+                value, s = in_value, in_size
+                while True:
+                    size = (Transaction.estimated_overhead_size(len(taken), i - start + 2) + s + new_out_size
+                            + self.change_size)
+                    if size > self.max_tx_size or value >= new_out_value + self.fee_estimator(size):
+                        break
+                    if coins:
+                        coin = coins.pop()
+                        taken.append(('coin', coin))
+                        value += coin[0]
+                        s += coin[1]
+                    elif spare:
+                        k = max(spare, key=lambda k: chunks[k].change)
+                        spare.remove(k)
+                        taken.append(('change', k))
+                        value += chunks[k].change
+                        s += self._change_in_size
+                    else:
+                        raise NotEnoughFunds()
+                if size > self.max_tx_size:
+                    # Put back what we took for this payout and close the transaction
+                    for kind, item in reversed(taken[n_taken:]):
+                        (coins if kind == 'coin' else spare).append(item)
+                    del taken[n_taken:]
+                    break
+                in_value, in_size = value, s
+                out_value, out_size = new_out_value, new_out_size
+                i += 1
+            if i == start:
+                raise ValueError("Payout #{} does not fit in a transaction of {} bytes".format(i, self.max_tx_size))
+            size = (Transaction.estimated_overhead_size(len(taken), i - start + 1) + in_size + out_size
+                    + self.change_size)
+            fee = self.fee_estimator(size)
+            change = in_value - out_value - fee
+            if change < self.dust_threshold:
+                # Not worth its own output: leave it to the miners
+                size -= self.change_size
+                change, fee = 0, in_value - out_value
+            chunk = PayoutChunk(start, i, [self._coin_dicts[item[2]] for kind, item in taken if kind == 'coin'],
+                                [item for kind, item in taken if kind == 'change'], change, fee, size)
+            if change and self.chain_change:
+                spare.append(len(chunks))
+            chunks.append(chunk)
+        return chunks
+
+    def make_transactions(self, password=None, *, sign=True, max_workers=None) -> List[Transaction]:
+        """ Returns the payout transactions, in an order they can be
+        broadcast in. If sign is False, the transactions are left unsigned,
+        which is only possible if none of them spends the change of another
+        (as its txid is not known until it is signed). """
+        chunks = self.plan()
+        if not sign and any(chunk.parents for chunk in chunks):
+            raise ValueError("Paying out needs the change of transactions that are not signed yet")
+        txs: List[Optional[Transaction]] = [None] * len(chunks)
+        done = 0
+        while done < len(chunks):
+            # The chunks up to the first one that spends from one not signed
+            # yet can all be signed at once
+            batch = []
+            for k in range(done, len(chunks)):
+                if any(p >= done for p in chunks[k].parents):
+                    break
+                txs[k] = self._make_tx(chunks[k], txs)
+                batch.append(txs[k])
+            if sign:
+                self.wallet.sign_transactions(batch, password, max_workers=max_workers)
+            done += len(batch)
+        return txs
+
+    def _make_tx(self, chunk: PayoutChunk, txs) -> Transaction:
+        # Copies, as signing fills in the signatures of the inputs
+        inputs = [copy.deepcopy(coin) for coin in chunk.coins]
+        for k in chunk.parents:
+            parent = txs[k]
+            if not parent.is_complete():
+                raise RuntimeError("Could not sign payout transaction {}".format(k))
+            inputs.append(self._change_txin(parent.txid(), len(parent.outputs()) - 1, parent.outputs()[-1][2]))
+        outputs = [(TYPE_ADDRESS, addr, value) for addr, value in self.payouts[chunk.start:chunk.end]]
+        if chunk.change:
+            outputs.append((TYPE_ADDRESS, self.change_addr, chunk.change))
+        locktime = max(self.wallet.get_local_height(), 0)
+        return Transaction.from_io(inputs, outputs, locktime=locktime, sign_schnorr=self.sign_schnorr)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" Maintained statuses of a wallet's payment requests.
+
+Working out whether a request was paid means looking at everything its
+address received, and a merchant wallet can carry tens of thousands of open
+requests. So instead of doing that for every request on every refresh, the
+RequestStatusIndex keeps what each request address received and only looks
+again at the addresses the wallet tells it about: those of the transactions
+that were added, verified or unverified, and those whose history changed.
+Requests expire by time. A heap ordered by expiry time moves them from unpaid
+to expired as their time comes, so that queries by status need not look at
+the others.
+
+What each address received is saved along with the requests, so a wallet
+that is opened again need not work it all out again. """
+
+import heapq
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from .address import Address
+from .paymentrequest import PR_EXPIRED, PR_PAID, PR_UNCONFIRMED, PR_UNKNOWN, PR_UNPAID
+
+# (height, value, txid) of an output towards a request; height is 0 if the tx is not verified
+Received = List[Tuple[int, int, str]]
+
+
+def payment_status(received: Received, amount, local_height) -> Tuple[bool, Optional[int], List[str]]:
+    """ Returns (is_paid, conf, tx_hashes), like Abstract_Wallet.get_payment_status(). """
+    l = sorted((max(local_height - height + 1, 0) if height > 0 else 0, v, txid) for height, v, txid in received)
+    tx_hashes = []
+    vsum = 0
+    amount = amount or 0
+    is_paid = False
+    result_conf = None
+    for conf, v, tx_hash in reversed(l):
+        vsum += v
+        tx_hashes.append(tx_hash)
+        if vsum >= amount:
+            is_paid = True
+            result_conf = conf
+    return is_paid, result_conf, tx_hashes
+
+
+def _expires_at(req) -> Optional[int]:
+    timestamp = req.get('time', 0)
+    if timestamp and type(timestamp) != int:
+        timestamp = 0
+    expiration = req.get('exp')
+    if expiration and type(expiration) != int:
+        expiration = 0
+    if expiration is None:
+        return None
+    return timestamp + expiration
+
+
+class RequestStatusIndex:
+    """ Statuses of the payment requests of wallet (its receive_requests),
+    by address. All methods must be called with the wallet's lock held. """
+
+    def __init__(self, wallet, saved: Optional[dict] = None):
+        self.wallet = wallet
+        self._received: Dict[Address, Received] = {}
+        for key, (_status, received) in (saved or {}).items():
+            try:
+                self._received[Address.from_string(key)] = [tuple(r) for r in received]
+            except Exception:
+                continue  # the request will just be looked at again
+        self._dirty: Set[Address] = set()  # requests whose received outputs must be looked at again
+        self._status: Dict[Address, int] = {}
+        self._by_status: Dict[int, Set[Address]] = {s: set() for s in (PR_UNPAID, PR_EXPIRED, PR_UNCONFIRMED,
+                                                                        PR_PAID)}
+        self._expiry: List[Tuple[int, Address]] = []  # heap of (expires at, addr) of unpaid requests
+        self._expires: Dict[Address, int] = {}  # addr -> its latest entry in the heap
+        self._order: Optional[List[Address]] = None  # the requests in display order, None if not known
+        self._known: Set[Address] = set()  # the requests we know of
+        self._height = None  # local height at which the statuses were worked out
+        self.modified = not saved  # True if there are changes to be saved
+
+    # -- updates
+
+    def add(self, addr: Address):
+        """ The request at addr was added or changed. """
+        self._dirty.add(addr)
+        self._order = None
+        self.modified = True
+
+    def remove(self, addr: Address):
+        self._forget(addr)
+        self._order = None
+        self.modified = True
+
+    def invalidate(self, addr: Address):
+        """ What addr received may have changed. """
+        if addr in self.wallet.receive_requests:
+            self._dirty.add(addr)
+
+    def invalidate_all(self):
+        self._dirty.update(self._known)
+        # Saved ones we have not picked up yet are simply dropped
+        for addr in self._received.keys() - self._known:
+            del self._received[addr]
+
+    def invalidate_tx(self, tx) -> List[Address]:
+        """ The tx was added, verified or unverified. Returns the request
+        addresses it pays to. """
+        addrs = []
+        for _, addr, _ in tx.outputs():
+            if isinstance(addr, Address) and addr in self.wallet.receive_requests:
+                self._dirty.add(addr)
+                addrs.append(addr)
+        return addrs
+
+    # -- queries
+
+    def get(self, addr: Address):
+        """ Returns (status, conf, tx_hashes) like
+        Abstract_Wallet.get_request_status(), or PR_UNKNOWN if there is no
+        request at addr. """
+        req = self.wallet.receive_requests.get(addr)
+        if req is None:
+            return PR_UNKNOWN
+        if addr in self._dirty or addr not in self._received:
+            return self._classify(addr)
+        return self._compute(addr, req)
+
+    # -- internals
+
+    def _compute(self, addr, req):
+        paid, conf, tx_hashes = payment_status(self._received[addr], req.get('amount'),
+                                               self.wallet.get_local_height())
+        if not paid:
+            status = PR_UNPAID
+        elif conf == 0:
+            status = PR_UNCONFIRMED
+        else:
+            status = PR_PAID
+        if status == PR_UNPAID:
+            expires_at = _expires_at(req)
+            if expires_at is not None and time.time() > expires_at:
+                status = PR_EXPIRED
+        return status, conf, tx_hashes
+
+    def query(self, statuses=None, *, filter_asset: Optional[str] = None, offset=0, limit=None) -> List[Address]:
+        """ Returns the addresses of the requests with one of statuses (all of
+        them if None), in display order, from offset and at most limit of
+        them. `filter_asset` is as in Abstract_Wallet.get_sorted_requests. """
+        self._update()
+        wanted = None
+        if statuses is not None:
+            wanted = set()
+            for s in statuses:
+                wanted |= self._by_status.get(s, set())
+        reqs = self.wallet.receive_requests
+        out = []
+        for addr in self._ordered():
+            if wanted is not None and addr not in wanted:
+                continue
+            if filter_asset is not None and (filter_asset == 'token') != reqs[addr].get('tokenreq', False):
+                continue
+            if offset > 0:
+                offset -= 1
+                continue
+            if limit is not None and len(out) >= limit:
+                break
+            out.append(addr)
+        return out
+
+    def counts(self) -> Dict[int, int]:
+        """ Returns status -> how many requests have it """
+        self._update()
+        return {s: len(addrs) for s, addrs in self._by_status.items()}
+
+    def dump(self) -> dict:
+        """ What to save along with the requests """
+        self._update()
+        return {addr.to_storage_string(): [self._status[addr], self._received[addr]] for addr in self._known}
+
+    def _refresh(self, addr):
+        req = self.wallet.receive_requests[addr]
+        self._received[addr] = self.wallet._get_payment_received(addr, tokenreq=req.get('tokenreq', False),
+                                                                  category_id=req.get('category_id'))
+        self._dirty.discard(addr)
+        self.modified = True
+
+    def _classify(self, addr):
+        """ Works out the status of addr and files it under it. """
+        req = self.wallet.receive_requests[addr]
+        if addr in self._dirty or addr not in self._received:
+            self._refresh(addr)
+        ret = self._compute(addr, req)
+        status = ret[0]
+        old = self._status.get(addr)
+        if old != status:
+            if old is not None:
+                self._by_status[old].discard(addr)
+            self._by_status[status].add(addr)
+            self._status[addr] = status
+        if status == PR_UNPAID:
+            expires_at = _expires_at(req)
+            if expires_at is not None and self._expires.get(addr) != expires_at:
+                self._expires[addr] = expires_at
+                heapq.heappush(self._expiry, (expires_at, addr))
+        return ret
+
+    def _forget(self, addr):
+        self._known.discard(addr)
+        self._dirty.discard(addr)
+        self._received.pop(addr, None)
+        self._expires.pop(addr, None)
+        status = self._status.pop(addr, None)
+        if status is not None:
+            self._by_status[status].discard(addr)
+
+    def _update(self):
+        reqs = self.wallet.receive_requests
+        if len(self._known) != len(reqs) or self._order is None:
+            # Pick up requests added or removed behind our back
+            for addr in self._known - reqs.keys():
+                self._forget(addr)
+            for addr in reqs.keys() - self._known:
+                self._known.add(addr)
+                if addr not in self._received:
+                    self._dirty.add(addr)
+                self._classify(addr)
+        height = self.wallet.get_local_height()
+        if height != self._height:
+            # A tx verified above our local height counts as unconfirmed
+            # until we catch up with it
+            self._height = height
+            for addr in list(self._by_status[PR_UNCONFIRMED]):
+                self._classify(addr)
+        for addr in list(self._dirty):
+            self._classify(addr)
+        now = time.time()
+        while self._expiry and self._expiry[0][0] < now:
+            expires_at, addr = heapq.heappop(self._expiry)
+            if self._expires.get(addr) == expires_at:
+                del self._expires[addr]
+                if self._status.get(addr) == PR_UNPAID:
+                    self._classify(addr)
+
+    def _ordered(self) -> List[Address]:
+        if self._order is None:
+            wallet = self.wallet
+
+            def key(addr):
+                try:
+                    return wallet.get_address_index(addr) or addr
+                except Exception:
+                    return addr
+            try:
+                self._order = sorted(self._known, key=key)
+            except TypeError:
+                # See issue #1231 -- can get inhomogenous keys above, if some
+                # address has dropped out of the wallet.
+                self._order = list(self._known)
+        return self._order
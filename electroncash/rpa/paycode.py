@@ -16,6 +16,7 @@ import threading
 import time
 import queue
 import traceback
+from collections import namedtuple
 from decimal import Decimal as PyDecimal
 
 from . import addr
@@ -436,7 +437,35 @@ def generate_transaction_from_paycode(wallet, config, amount, rpa_paycode, fee=N
     return retval
 
 
-def extract_private_keys_from_transaction(wallet, raw_tx, password=None):
+class RpaScanKeys(namedtuple("RpaScanKeys", "scan_privkey spend_privkey spend_pubkey")):
+    """The decrypted key material needed to scan transactions for RPA payments.
+
+    scan_privkey is an int, spend_privkey and spend_pubkey are bytes.  Deriving this involves decrypting the rpa
+    auxilliary keystore, so callers that scan many transactions should compute it once via get_rpa_scan_keys() and
+    pass it in to extract_private_keys_from_transaction(), rather than re-deriving it per input."""
+    __slots__ = ()
+
+
+def get_rpa_scan_keys(wallet, password=None) -> RpaScanKeys:
+    # We need the private key that corresponds to the scanpubkey.
+    # In this implementation, this is the one that goes with receiving
+    # address 0
+    scan_private_key_wif_format = wallet.export_private_key_from_index((False, 0), password)
+    scan_private_key_int_format = int.from_bytes(Base58.decode_check(scan_private_key_wif_format)[1:33],
+                                                 byteorder="big")
+
+    # Get the spendpubkey for our paycode.
+    # In this implementation, simply: receiving address 1.
+    spendpubkey = bytes.fromhex(wallet.derive_pubkeys(0, 1))
+
+    # Fetch our own private (spend) key out of the wallet.
+    spend_private_key_wif_format = wallet.export_private_key_from_index((False, 1), password)
+    spend_private_key_bytes = Base58.decode_check(spend_private_key_wif_format)[1:33]
+
+    return RpaScanKeys(scan_private_key_int_format, spend_private_key_bytes, spendpubkey)
+
+
+def extract_private_keys_from_transaction(wallet, raw_tx, password=None, *, scan_keys: RpaScanKeys = None):
     # Initialize return value.  Will return empty list if no private key can be found.
     retval = []
 
@@ -445,13 +474,15 @@ def extract_private_keys_from_transaction(wallet, raw_tx, password=None):
 
     # Get a list of output addresses (we will need this for later to check if
     # our key matches)
-    output_addresses = []
+    output_addresses = set()
     outputs = unpacked_tx["outputs"]
     for i in outputs:
         if isinstance(i['address'], Address):
-            output_addresses.append(
-                i['address'].to_string(
-                    Address.FMT_CASHADDR))
+            output_addresses.add(i['address'])
+
+    if not output_addresses:
+        # Nothing could possibly be paying us, skip the expensive ECDH below
+        return retval
 
     # Variables for looping
     inputs = unpacked_tx["inputs"]
@@ -491,56 +522,48 @@ def extract_private_keys_from_transaction(wallet, raw_tx, password=None):
             # hex string (P2PK, etc), or is not a scriptSig we can understand
             continue
 
-        # We need the private key that corresponds to the scanpubkey.
-        # In this implementation, this is the one that goes with receiving
-        # address 0
-        scanpubkey = wallet.derive_pubkeys(0, 0)
-
-        scan_private_key_wif_format = wallet.export_private_key_from_index(
-            (False, 0), password)
+        # Only decrypt our keys once we know there is at least one input worth looking at
+        if scan_keys is None:
+            scan_keys = get_rpa_scan_keys(wallet, password)
 
-        scan_private_key_int_format = int.from_bytes(Base58.decode_check(scan_private_key_wif_format)[1:33],
-                                                     byteorder="big")
         # Calculate shared secret
         shared_secret = _calculate_paycode_shared_secret(
-            scan_private_key_int_format, sender_pubkey, outpoint_string)
-
-        # Get the spendpubkey for our paycode.
-        # In this implementation, simply: receiving address 1.
-        spendpubkey = wallet.derive_pubkeys(0, 1)
+            scan_keys.scan_privkey, sender_pubkey, outpoint_string)
 
         # Get the destination address for the transaction
-        destination = _generate_address_from_pubkey_and_secret(bytes.fromhex(spendpubkey), shared_secret).to_string(
-            Address.FMT_CASHADDR)
+        destination = _generate_address_from_pubkey_and_secret(scan_keys.spend_pubkey, shared_secret)
 
-        # Fetch our own private (spend) key out of the wallet.
-        spendpubkey = wallet.derive_pubkeys(0, 1)
-        spend_private_key_wif_format = wallet.export_private_key_from_index(
-            (False, 1), password)
-        spend_private_key_int_format = int.from_bytes(Base58.decode_check(spend_private_key_wif_format)[1:33],
-                                                      byteorder="big")
+        # Check the address matches
+        if destination in output_addresses:
+            # Generate the private key for the money being received via paycode
+            privkey = _generate_privkey_from_secret(scan_keys.spend_privkey, shared_secret)
 
-        # Generate the private key for the money being received via paycode
-        spend_private_key_hex_format = hex(spend_private_key_int_format)[2:]
+            # Now convert to WIF
+            extendedkey_bytes = bytes((networks.net.WIF_PREFIX,)) + bytes.fromhex(privkey)
+            privkey_wif = bitcoin.EncodeBase58Check(extendedkey_bytes)
+            retval.append(privkey_wif)
 
-        # Pad with leading zero if necesssary
-        if len(spend_private_key_hex_format) % 2 !=0:
-            spend_private_key_hex_format = "0" + spend_private_key_hex_format
+    return retval
 
-        privkey = _generate_privkey_from_secret(bytes.fromhex(
-            spend_private_key_hex_format), shared_secret)
 
-        # Now convert to WIF
-        extendedkey = bytes((networks.net.WIF_PREFIX,)).hex() + privkey
-        extendedkey_bytes = bytes.fromhex(extendedkey)
-        checksum = bitcoin.Hash(extendedkey).hex()[0:8]
-        key_with_checksum = extendedkey + checksum
-        privkey_wif = bitcoin.EncodeBase58Check(extendedkey_bytes)
+def extract_private_keys_from_transactions(wallet, raw_txs, password=None, *, scan_keys: RpaScanKeys = None,
+                                           executor=None):
+    """Batch version of extract_private_keys_from_transaction. Returns a list of WIF private keys found across all of
+    raw_txs.  If `executor` (a concurrent.futures.Executor) is specified, the work is spread across its workers (the
+    ECDH in _calculate_paycode_shared_secret runs in libsecp256k1 which releases the GIL, if available)."""
+    raw_txs = list(raw_txs)
+    if not raw_txs:
+        return []
+    if scan_keys is None:
+        scan_keys = get_rpa_scan_keys(wallet, password)
 
-        # Check the address matches
-        if destination in output_addresses:
-            retval.append(privkey_wif)
+    def func(raw_tx):
+        return extract_private_keys_from_transaction(wallet, raw_tx, password, scan_keys=scan_keys)
 
+    mapper = executor.map if executor is not None else map
+    retval = []
+    for keys in mapper(func, raw_txs):
+        retval.extend(keys)
     return retval
 
 
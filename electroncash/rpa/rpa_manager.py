@@ -23,16 +23,50 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
-import queue
+import multiprocessing
 import time
 
 from electroncash.util import ThreadJob
 
 
+class _BlockWindow:
+    """A contiguous range of blocks [start, start + count) being scanned. Tracks the txids we still are waiting on
+    from the server, the raw txs we got so far, and the pending key extraction job (if any)."""
+    __slots__ = ('start', 'count', 'have_history', 'pending_txids', 'raw_txs', 'futures')
+
+    def __init__(self, start, count):
+        self.start = start
+        self.count = count
+        self.have_history = False
+        self.pending_txids = set()
+        self.raw_txs = []
+        self.futures = None
+
+    @property
+    def last(self):
+        return self.start + self.count - 1
+
+    @property
+    def fetched(self):
+        return self.have_history and not self.pending_txids
+
+
 class RpaManager(ThreadJob):
     """Based loosely on the structure of the synchronizer class.
-    External interface: __init__() and add() member functions."""
+    External interface: __init__(), run() and stop() member functions."""
+
+    # Number of blocks requested per 'blockchain.reusable.get_history' call
+    blocks_per_window = 50
+    # Number of block windows that may be in flight (requested but not yet fully processed) at once
+    max_windows_in_flight = 4
+    # A window that fails is re-requested after retry_delay seconds, doubling (up to max_retry_delay) each time it
+    # fails again. After max_window_retries consecutive failures of the same window we give up, see `error`.
+    retry_delay = 2.0
+    max_retry_delay = 60.0
+    max_window_retries = 5
 
     def __init__(self, wallet, network):
         from electroncash.wallet import RpaWallet
@@ -40,24 +74,48 @@ class RpaManager(ThreadJob):
         self.wallet = wallet
         self.network = network
         self.lock = Lock()
-        self.rpa_q_rawtx = queue.Queue()
         self.last_mempool_check = 0.0
         self._up_to_date = True
 
-        # self.tx_heights is a dict that stores the height of each tx the rpa_manager encounters.
-        self.tx_heights = dict()
+        # Block windows in flight, keyed by start height, in ascending order of height.  Windows are requested
+        # concurrently but retired strictly in order, so that the persisted wallet.rpa_height is always a height
+        # below which everything has been scanned, and a restart resumes exactly where we left off.
+        self.windows = OrderedDict()
+
+        # Consecutive failures of the window starting at failed_height, and when we may request it again
+        self.failed_height = None
+        self.failures = 0
+        self.retry_time = 0.0
+        # Set to a message if we gave up on a window that kept failing. The scan stays stopped until the wallet's
+        # threads are restarted (which makes a new RpaManager).
+        self.error = None
 
-        # self.block_requests is a dict that stores the requests made for blocks from the server.
-        self.block_requests = dict()
+        # Mempool raw txs awaiting key extraction, and the pending extraction jobs for them (if any)
+        self.mempool_raw_txs = []
+        self.mempool_futures = None
 
         # To avoid downloading the same txn multiple times if mempool polling
         self.already_downloaded_txids = set()
 
+        # Decrypted scan keys, cached for as long as the wallet password (wallet.rpa_pwd) doesn't change
+        self._scan_keys = None
+        self._scan_keys_pw = None
+
+        # Worker pool for the ECDH/derivation work in extract_private_keys_from_transactions
+        self.num_workers = max(1, multiprocessing.cpu_count())
+        self.executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="RPA scan worker")
+
     def diagnostic_name(self):
         cn = super().diagnostic_name()
         wn = self.wallet.diagnostic_name() if self.wallet else "???"
         return f"{wn}/{cn}"
 
+    def stop(self):
+        """Called by the wallet when it stops its threads. Any in-progress extraction jobs are abandoned; their windows
+        were not yet retired so they will be re-scanned next time."""
+        self.executor.shutdown(wait=False)
+        self._scan_keys = self._scan_keys_pw = None
+
     @property
     def up_to_date(self) -> bool:
         return self._up_to_date
@@ -68,6 +126,41 @@ class RpaManager(ThreadJob):
             self._up_to_date = b
             self.network.trigger_callback('wallet_updated', self.wallet)
 
+    def _get_scan_keys(self):
+        password = self.wallet.rpa_pwd
+        if self._scan_keys is None or self._scan_keys_pw != password:
+            self._scan_keys = self.wallet.get_rpa_scan_keys(password)
+            self._scan_keys_pw = password
+        return self._scan_keys
+
+    def _submit_extraction(self, raw_txs):
+        """Splits raw_txs into one slice per worker and returns the list of futures for the extraction jobs."""
+        password = self.wallet.rpa_pwd
+        scan_keys = self._get_scan_keys()
+        return [self.executor.submit(self.wallet.extract_private_keys_from_transactions, raw_txs[i::self.num_workers],
+                                     password, scan_keys=scan_keys)
+                for i in range(min(self.num_workers, len(raw_txs)))]
+
+    @staticmethod
+    def _all_done(futures):
+        return futures is not None and all(f.done() for f in futures)
+
+    def _import_keys(self, futures):
+        """Bulk-import the keys found by a set of finished extraction jobs. Returns the exception if any job failed,
+        or None on success."""
+        keys = []
+        try:
+            for f in futures:
+                keys.extend(f.result())
+        except Exception as e:
+            self.print_error(f"Error extracting private keys: {e!r}")
+            return e
+        if keys:
+            added = self.wallet.import_private_keys(keys, self.wallet.rpa_pwd)
+            if added:
+                self.print_error(f"Imported {len(added)} RPA key(s)")
+        return None
+
     def rpa_phase_1_mempool(self, polling=False):
         """Part of the normal peristent loop, but runs once every 10 seconds.  This is also called externally
         from the wallet wants to check the mempool (with polling=False).  We make the request similar to the
@@ -84,12 +177,6 @@ class RpaManager(ThreadJob):
         self.last_mempool_check = time.time()
 
     def rpa_phase_1(self):
-        # Check the rawtx queue first, because if it still has transactions to process from a previous run,
-        # we don't want to request more blocks from the server until we're caught up.
-        if not self.rpa_q_rawtx.empty():
-            self.up_to_date = False
-            return
-
         # Make sure the password is available.  If not, do nothing.
         if self.wallet.has_password() and self.wallet.rpa_pwd is None:
             return
@@ -104,32 +191,32 @@ class RpaManager(ThreadJob):
         if rpa_height is None:
             self.wallet.rpa_height = rpa_height = server_height - 100
 
-        # Only request blocks if the rpa_height is lagging behind the tip.
-        if rpa_height < server_height:
-
-            number_of_blocks = 50
-            # Only request enough blocks to get to the tip.  Otherwise, the next request will be too far ahead
-            if rpa_height + number_of_blocks > server_height:
-                number_of_blocks = server_height-rpa_height
+        if self.error is not None or time.time() < self.retry_time:
+            return
 
-            # Define the "grind string" (the RPA prefix)
-            rpa_grind_string = self.wallet.get_grind_string()
-            params = [rpa_height, number_of_blocks + 1, rpa_grind_string]
+        with self.lock:
+            if not self.windows and rpa_height >= server_height:
+                self.up_to_date = True
+                return
+            # The next window starts right after the last one in flight, or at the persisted rpa_height (inclusive)
+            # if nothing is in flight.
+            next_height = next(reversed(self.windows.values())).last + 1 if self.windows else rpa_height
             requests = []
-
-            # self.block_requests is used to ensure only 1 call is made at any given height.
-            # Otherwise, a plethora of requests can be sent.
-            if rpa_height not in self.block_requests:
+            while len(self.windows) < self.max_windows_in_flight and next_height <= server_height:
+                # Only request enough blocks to get to the tip.  Otherwise, the next request will be too far ahead
+                number_of_blocks = min(self.blocks_per_window, server_height - next_height + 1)
+                self.windows[next_height] = _BlockWindow(next_height, number_of_blocks)
+                params = [next_height, number_of_blocks, self.wallet.get_grind_string()]
                 requests.append(('blockchain.reusable.get_history', params))
-                self.network.send(requests, self.rpa_phase_2)
-                self.block_requests[rpa_height]=1
-                self.up_to_date = False
-        else:
-            self.up_to_date = True
+                next_height += number_of_blocks
+        if requests:
+            self.network.send(requests, self.rpa_phase_2)
+        if self.windows:
+            self.up_to_date = False
 
     def rpa_phase_2(self, response):
         """This is the callback that gives us a payload of txids.  Iterate through them,
-        and request the full Raw TX for each."""
+        and request the full Raw TX for each, in a single batch."""
 
         # Unpack the response
         payload = response.get('result')
@@ -140,84 +227,126 @@ class RpaManager(ThreadJob):
         if payload is None:
             error = response.get('error')
             self.print_error(f"Got error reply for '{method}' with params: {params}. Error: {error}")
+            if method == 'blockchain.reusable.get_history':
+                # Forget about this window and all the ones after it; phase 1 will re-request them
+                self._window_failed(params[0], error)
             return
 
+        window = None
+        if method == 'blockchain.reusable.get_history':
+            with self.lock:
+                window = self.windows.get(params[0])
+            if window is None:
+                # Stale reply for a window we gave up on
+                return
+
+        txids = []
         for i in payload:
             txid = i['tx_hash']
             tx_height = i['height']
-            if tx_height == self.tx_heights.get(txid) and txid in self.already_downloaded_txids:
+            if tx_height <= 0 and txid in self.already_downloaded_txids:
                 # Skip known txns (mempool polling)
                 continue
-            self.tx_heights[txid] = tx_height
-            rawtx_request = [('blockchain.transaction.get', [txid])]
-            self.network.send(rawtx_request, self.rpa_phase_3)
-
-        # We will also implement a special queue item called "lastblock" which contains the literal strick "lastblock"
-        # instead of a rawtx.  This can pushed on the queue after all other items in the payload are pushed.  The FIFO
-        # structure of the network queue will then process this last, and this module can then update the rpa_height
-        # for the wallet.  This neatly handles all the cases where there are no transactions at certain blockheights,
-        # empty payloads, and so on.  This approach means we aren't looking at the heights of individual transactions.
-        # Instead we're concerned with the height of the entire payload with regards to bumping the wallet height.
-
-        # Put the lastblock item into the queue.  Only for block requests, not mempool.
-        if method == 'blockchain.reusable.get_history':
-            # Don't forget to subtract one from the blockheight plus the number of blocks.
-            last_block_in_payload = params[0] + params[1] - 1
-            # Put a special "last block" item in the queue.  We can do it here rather than using a callback, which
-            # happens for normal queue items
-            raw_tx_and_height_tuple = ("lastblock", last_block_in_payload)
-            self.rpa_q_rawtx.put(raw_tx_and_height_tuple)
-
-    def rpa_phase_3(self, response):
-
-        # Each raw transaction that is returned needs to be put on the queue.
-        # We will store the transaction as a tuple consisting of the serialized tx, and the height.
-
+            if tx_height <= 0:
+                self.already_downloaded_txids.add(txid)
+            txids.append(txid)
+
+        with self.lock:
+            if window is not None:
+                window.pending_txids.update(txids)
+                window.have_history = True
+
+        # Fetch all the raw txs at once. The server will see these as pipelined requests on the one connection.
+        callback = self.rpa_phase_3 if window is None else lambda r: self.rpa_phase_3(r, window)
+        self.network.send([('blockchain.transaction.get', [txid]) for txid in txids], callback)
+
+    def rpa_phase_3(self, response, window=None):
+        # Each raw transaction that is returned is attached to its block window (or to the mempool list).  A window
+        # for which all raw txs have arrived is ready for phase 4.
         raw_tx = response.get('result')
         params = response.get('params')
         error = response.get('error')
+        txid = params[0]
         if error is not None:
             method = response.get('method')
             self.print_error(f"Got error reply for '{method}' with params: {params}. Error: {error}")
+            if window is not None:
+                # Start the window over, so we don't skip over this tx
+                self._window_failed(window.start, error, window)
+            else:
+                self.already_downloaded_txids.discard(txid)
             return
-        txid = params[0]
-        tx_height = self.tx_heights[txid]
-        raw_tx_and_height_tuple = (raw_tx, tx_height)
-        if tx_height <= 0:
-            self.already_downloaded_txids.add(txid)
-        self.rpa_q_rawtx.put(raw_tx_and_height_tuple)
+        with self.lock:
+            if window is None:
+                self.mempool_raw_txs.append(raw_tx)
+            elif self.windows.get(window.start) is window and txid in window.pending_txids:
+                window.pending_txids.discard(txid)
+                window.raw_txs.append(raw_tx)
+
+    def _window_failed(self, start, error, window=None):
+        """The window at `start` failed to fetch or scan. Drop it and all the ones after it, so that phase 1 re-requests
+        them once the retry delay is up. If it keeps failing, give up and set `error`. Errors for a window we already
+        dropped (or, if `window` is given, one that has since been re-requested) are ignored."""
+        with self.lock:
+            current = self.windows.get(start)
+            if current is None or (window is not None and current is not window):
+                return
+            for h in [h for h in self.windows if h >= start]:
+                w = self.windows.pop(h)
+                for f in w.futures or ():
+                    f.cancel()
+            if start == self.failed_height:
+                self.failures += 1
+            else:
+                self.failed_height, self.failures = start, 1
+            if self.failures > self.max_window_retries:
+                self.error = f"Scanning blocks from {start} failed {self.failures} times: {error}"
+            else:
+                delay = min(self.retry_delay * 2 ** (self.failures - 1), self.max_retry_delay)
+                self.retry_time = time.time() + delay
+        if self.error is not None:
+            self.print_error(f"Giving up. {self.error}")
+            self.network.trigger_callback('wallet_updated', self.wallet)
+        else:
+            self.print_error(f"Will retry blocks from {start} in {delay:.0f} seconds")
 
     def rpa_phase_4(self):
+        # Hand off every fully fetched window to the worker pool, then retire finished windows strictly in height
+        # order: bulk-import the keys found and bump the wallet's rpa_height past the window.
+        if self.wallet.has_password() and self.wallet.rpa_pwd is None:
+            return
+        with self.lock:
+            for window in self.windows.values():
+                if window.fetched and window.futures is None:
+                    window.futures = self._submit_extraction(window.raw_txs)
+            to_retire = []
+            for window in self.windows.values():
+                if not self._all_done(window.futures):
+                    break
+                to_retire.append(window)
+            if self.mempool_futures is None and self.mempool_raw_txs:
+                self.mempool_futures = self._submit_extraction(self.mempool_raw_txs)
+                self.mempool_raw_txs = []
+            mempool_futures = self.mempool_futures
+            if self._all_done(mempool_futures):
+                self.mempool_futures = None
+            else:
+                mempool_futures = None
 
-        # The rawtx tuple unpacks into a a rawtx and a height.  There is a special value
-        # for rawtx: "lastblock", which also has a height, and is treated differently.
-        # It signals that the payload chunk is completely processed and the rpa_height in the wallet can be bumped.
-
-        limit_iters = 20
-        iterct = 0
-
-        while not self.rpa_q_rawtx.empty():
-            rawtx_tuple = self.rpa_q_rawtx.get()
-            rawtx = rawtx_tuple[0]
-            tx_height = rawtx_tuple[1]
+        if mempool_futures is not None:
+            self._import_keys(mempool_futures)
 
-            if rawtx != "lastblock":
-                password = self.wallet.rpa_pwd
-                # This will be assigned to zero if the private key cannot be extracted (most tx)
-                extracted_private_keys = self.wallet.extract_private_keys_from_transaction(rawtx, password)
-                for pk in extracted_private_keys:
-                    self.wallet.import_private_key(pk, password)
-            else:
-                # last block
-                lastblock_height = tx_height
-                new_height = lastblock_height + 1
-                if new_height > 0:
-                    self.wallet.rpa_height = lastblock_height
-
-            iterct += 1
-            if iterct >= limit_iters:
-                # Don't iterate more than limit_iters, to keep things peppy
+        for window in to_retire:
+            error = self._import_keys(window.futures)
+            if error is not None:
+                self._window_failed(window.start, repr(error), window)
                 break
+            with self.lock:
+                self.windows.pop(window.start, None)
+                if self.failed_height is not None and window.last >= self.failed_height:
+                    self.failed_height, self.failures = None, 0
+            if window.last >= 0:
+                self.wallet.rpa_height = window.last
 
     def run(self):
         """Called from the network proxy thread main loop."""
@@ -225,29 +354,25 @@ class RpaManager(ThreadJob):
         # This rpa_manager module is for communicating with the server on behalf of the wallet, and its purpose is to
         # manage the various network calls and functionality for RPA wallets.
         #
-        # The RPA process consists of 4 distinct phases.
+        # The RPA process consists of 4 distinct phases, pipelined over up to `max_windows_in_flight` windows of
+        # `blocks_per_window` blocks each.
         #
-        # Phase 1:  First check if the "raw tx queue" (used by later phases) is empty.  If empty, then
-        # continue.  If the server network height is greater than the wallet's "rpa height",
-        # then make a network request for a chunk of blocks, with care to only request each chunk once.
+        # Phase 1:  If the server network height is greater than the wallet's "rpa height", then make a network request
+        # for each chunk of blocks not yet in flight, up to max_windows_in_flight chunks.
         #
         # Phase 2:  This is the callback for the network request in phase 1.  Here we take the payload of transaction ids,
-        # iterate through it, and make a network request to fetch the full raw tx.  Theoretically,
+        # and make a single batched network request to fetch all of the full raw txs.  Theoretically,
         # the full raw tx could have been returned along with the txid, but the server side developers
-        # decided it is better to a seperate call.  In the phase, we also put a "lastblock" item onto the queue
-        # that tells the system that the current chunk is complete.
+        # decided it is better to a seperate call.
         #
-        # Phase 3:  This is the callback for the network request in phase 2.  The Raw tx is put into a queue for processing.
-        # We use a queue structure so we can easily deteremine when all the callbacks have been completed.  Perhaps this phase
-        # could have been combined with phase 4 but this is a cleaner design to handle this as separate phase.
+        # Phase 3:  This is the callback for the network request in phase 2.  The raw tx is attached to its block window.
+        # Once every raw tx for a window has arrived, the window is considered fetched.
         #
-        # Phaase 4: In this phase, we iterate through the raw transaction queue and process each transaction.  We attempt to
-        # extract the private key from the transaction and if successful, import it into the wallet keystore.  When we encounter
-        # the "lastblock" item, we know the current chunk has finished processing, and we can update the rpa_height in the wallet,
-        # which will allow phase 1 to process the next chunk, and so on.
+        # Phase 4: In this phase, each fetched window is handed to a worker pool, which attempts to extract private keys
+        # from its transactions.  Finished windows are retired in height order: the extracted keys are imported into the
+        # wallet keystore in bulk, and the rpa_height in the wallet is updated, which persists our progress.
         #
         # Note: only phase 1 and phase 4 are called directly from this run loop.  Phases 2 and 3 are executed as callbacks.
+        self.rpa_phase_4()
         self.rpa_phase_1()
         self.rpa_phase_1_mempool(polling=True)
-        self.rpa_phase_4()
-
@@ -10,7 +10,6 @@ from . import util
 from copy import deepcopy
 from .util import user_dir, make_dir, print_error, PrintError
 
-from .bitcoin import MAX_FEE_RATE, FEE_TARGETS
 
 config = None
 
@@ -274,6 +273,8 @@ class SimpleConfig(PrintError):
         #return f
 
     def dynfee(self, i):
+        # Imported here as this module is on the fast command-line startup path, see daemon.py
+        from .bitcoin import MAX_FEE_RATE, FEE_TARGETS
         if i < 4:
             j = FEE_TARGETS[i]
             fee = self.fee_estimates.get(j)
@@ -3,12 +3,16 @@ from .. import address  # for ScriptOutput, OpCodes, ScriptError, Script
 from .. import caches
 from .. import util
 from ..transaction import Transaction
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Set
+import multiprocessing
+import threading
 
 from .exceptions import *
 
 lokad_id = b"SLP\x00"  # aka protocol code (prefix) -- this appears after the 'OP_RETURN + OP_PUSH(4)' bytes in the ScriptOutput for *ALL* SLP scripts
 valid_token_types = frozenset((1, 65, 129))  # any token types not in this set will be rejected
+_raw_lokad_hex = (bytes((address.OpCodes.OP_RETURN, 4)) + lokad_id).hex()  # appears in the raw hex of every SLP tx
 
 def _i2b(val): return bytes((val,))
 
@@ -623,9 +627,13 @@ class WalletData(util.PrintError):
 
     DATA_VERSION = 0.1  # used by load/save for data storage versioning
 
+    REBUILD_CHUNK_SIZE = 1000  # number of txs parsed per chunk by a rebuild, between short critical sections
+    REBUILD_SYNCH_MAX = 1000  # rebuilds touching at most this many txs are done synchronously, in the calling thread
+
     def __init__(self, wallet):
         assert wallet
         self.wallet = wallet
+        self.rebuild_thread = None
         self.clear()
 
     def diagnostic_name(self):
@@ -634,32 +642,64 @@ class WalletData(util.PrintError):
     def load(self) -> bool:
         ''' This takes no locks. If calling in multithreaded environment,
         guard with locks. (Currently this is only called in wallet.py setup
-        code so locking is not relevant). '''
+        code so locking is not relevant).
+
+        Inconsistent entries are tracked per-tx: if an individual entry fails
+        to load, only the txid it came from is flagged for reprocessing (see
+        self.pending_txids). Only if the data as a whole is missing or of the
+        wrong version is every tx in the wallet flagged. '''
         data = self.wallet.storage.get('slp')
+        self.clear()
         try:
             assert isinstance(data, dict), "missing or invalid 'slp' dictionary"
             ver = data['version']
             assert ver == self.DATA_VERSION, f"incompatible or missing slp data version '{ver}', expected '{self.DATA_VERSION}'"
-            # dict of txid -> int
-            self.validity = {k.lower():int(v) for k,v in data['validity'].items()}
-            # dict of "token_id_hex" -> dict of ["txo_name"] -> qty (int)
-            self.token_quantities = {k.lower() : { vv0.lower() : int(vv1) for vv0,vv1 in v} for k,v in data['token_quantities'].items()}
-            # build the mapping of prevouthash:n (str) -> token_id_hex (str) from self.token_quantities
-            self.txo_token_id = dict()
-            for token_id_hex, txo_dict in self.token_quantities.items():
-                for txo in txo_dict:
-                    self.txo_token_id[txo] = token_id_hex
-            # dict of Address -> set of txo_name
-            self.txo_byaddr = {address.Address.from_string(k) : {vv.lower() for vv in v} for k,v in data['txo_byaddr'].items()}
-            self.need_rebuild = False
-        except (ValueError, TypeError, AttributeError, address.AddressError, AssertionError, KeyError) as e:
+            validity, token_quantities, txo_byaddr = data['validity'], data['token_quantities'], data['txo_byaddr']
+            assert isinstance(validity, dict) and isinstance(token_quantities, dict) and isinstance(txo_byaddr, dict)
+            # txids left over from a previous rebuild that didn't finish, if any
+            bad = {txid.lower() for txid in data.get('pending', ())}
+        except (ValueError, TypeError, AttributeError, AssertionError, KeyError) as e:
             # Note: We want TypeError/AttributeError/KeyError raised above on
             # missing keys since that indicates data inconsistency, hence why
             # the lookups above do not use .get() (thus ensuring the above
             # should raise on incorrect or missing data).
             self.print_error("Error loading slp data; will flag for rebuild:", repr(e))
-            self.clear()
             self.need_rebuild = True
+            self.pending_txids = None  # None means: all of wallet.transactions
+            return False
+        # dict of txid -> int
+        for k, v in validity.items():
+            try:
+                self.validity[k.lower()] = int(v)
+            except (ValueError, TypeError, AttributeError) as e:
+                self.print_error(f"Bad validity entry for {k}:", repr(e))
+                if isinstance(k, str):
+                    bad.add(k.lower())
+        # dict of "token_id_hex" -> dict of ["txo_name"] -> qty (int)
+        for k, v in token_quantities.items():
+            for item in v:
+                try:
+                    vv0, vv1 = item
+                    self._add_token_qty(k.lower(), vv0.lower(), int(vv1))
+                except (ValueError, TypeError, AttributeError) as e:
+                    self.print_error(f"Bad token quantity entry for {k}: {item!r}:", repr(e))
+                    bad.update(self._txids_of_txos(item if isinstance(item, (list, tuple)) else ()))
+        # build the mapping of prevouthash:n (str) -> token_id_hex (str) from self.token_quantities
+        for token_id_hex, txo_dict in self.token_quantities.items():
+            for txo in txo_dict:
+                self.txo_token_id[txo] = token_id_hex
+        # dict of Address -> set of txo_name
+        for k, v in txo_byaddr.items():
+            try:
+                self.txo_byaddr[address.Address.from_string(k)] = {vv.lower() for vv in v}
+            except (ValueError, TypeError, AttributeError, address.AddressError) as e:
+                self.print_error(f"Bad txo_byaddr entry for {k}:", repr(e))
+                bad.update(self._txids_of_txos(v if isinstance(v, (list, tuple)) else ()))
+        if bad:
+            self.print_error(f"{len(bad)} tx(s) flagged for reprocessing")
+            self._forget_txids(bad)
+        self.pending_txids = bad
+        self.need_rebuild = bool(bad)
         return not self.need_rebuild
 
     def save(self):
@@ -671,22 +711,140 @@ class WalletData(util.PrintError):
             'txo_byaddr' : { k.to_storage_string() : list(v) for k,v in self.txo_byaddr.items() },
             'version' : self.DATA_VERSION,
         }
+        if self.pending_txids is None:
+            # Nothing was ever processed (rebuild hasn't started yet); an absent 'slp' key flags a full rebuild next load
+            data = None
+        elif self.pending_txids:
+            # A rebuild is in progress. Record what's left, so that next load can pick up where we left off.
+            data['pending'] = list(self.pending_txids)
         self.wallet.storage.put('slp', data)
 
     def clear(self):
         '''Caller should hold locks'''
         self.need_rebuild = False
+        self.pending_txids = set()  # txids that are flagged as needing (re)processing by a rebuild
         self.validity = dict()  # txid -> int
         self.txo_byaddr = dict()  # [address] -> set of "prevouthash:n" for that address
         self.token_quantities = dict() # [token_id_hex] -> dict of ["prevouthash:n"] -> qty (-1 for qty indicates minting baton)
         self.txo_token_id = dict() # ["prevouthash:n"] -> "token_id_hex"
 
+    @staticmethod
+    def _txids_of_txos(txos):
+        return {txo.rsplit(':', 1)[0].lower() for txo in txos if isinstance(txo, str) and ':' in txo}
+
+    def _forget_txids(self, txids):
+        ''' Caller should hold locks. Like rm_tx, but for a whole set of txids
+        at once, and unconditionally (even if absent from self.validity). '''
+        def is_bad(txo):
+            return txo.rsplit(':', 1)[0] in txids
+        for txid in txids:
+            self.validity.pop(txid, None)
+        for txo in [txo for txo in self.txo_token_id if is_bad(txo)]:
+            del self.txo_token_id[txo]
+        for addr, txo_set in list(self.txo_byaddr.items()):
+            txo_set.difference_update([txo for txo in txo_set if is_bad(txo)])
+            if not txo_set:
+                del self.txo_byaddr[addr]
+        for tok_id, txo_dict in list(self.token_quantities.items()):
+            for txo in [txo for txo in txo_dict if is_bad(txo)]:
+                del txo_dict[txo]
+            if not txo_dict:
+                del self.token_quantities[tok_id]
+                self.validity.pop(tok_id, None)
+
     def rebuild(self):
-        '''This takes wallet.lock'''
+        '''Synchronously rebuilds everything from scratch. This takes wallet.lock (in short critical sections).'''
         with self.wallet.lock:
             self.clear()
-            for txid, tx in self.wallet.transactions.items():
-                self.add_tx(txid, Transaction(tx.raw))  # we take a copy of the transaction so prevent storing deserialized tx in wallet.transactions dict
+            self.pending_txids = set(self.wallet.transactions)
+        self._process_pending()
+
+    def start_rebuild(self):
+        '''Reprocesses the txs flagged by load() (or all of them if the data
+        was missing). Small rebuilds are done right away; large ones are
+        done in the background in self.rebuild_thread, in chunks, so as to
+        not block the wallet for the duration. Takes wallet.lock.'''
+        with self.wallet.lock:
+            if self.pending_txids is None:
+                self.clear()
+                self.pending_txids = set(self.wallet.transactions)
+            else:
+                # Forget about any txids that are no longer in the wallet
+                self.pending_txids.intersection_update(self.wallet.transactions)
+            n_pending = len(self.pending_txids)
+            if not n_pending:
+                self.need_rebuild = False
+                return
+            self.need_rebuild = True
+        if n_pending <= self.REBUILD_SYNCH_MAX:
+            self._process_pending()
+            return
+        self.print_error(f"Rebuilding SLP data for {n_pending} tx(s) in the background")
+        self.rebuild_thread = threading.Thread(target=self._process_pending, args=(True,), name="SLP rebuild",
+                                               daemon=True)
+        self.rebuild_thread.start()
+
+    def stop_rebuild(self):
+        '''Signals the background rebuild (if any) to stop, and waits for it.
+        Anything not yet processed remains in self.pending_txids (and is
+        persisted by save()) for next time.'''
+        t, self.rebuild_thread = self.rebuild_thread, None  # this also signals a stop
+        if t and t.is_alive() and t is not threading.current_thread():
+            t.join()
+
+    @staticmethod
+    def _parse_candidate(raw):
+        '''Worker function: returns a parsed Transaction if `raw` might be an
+        SLP tx, or None. We take a copy of the transaction so as to not store
+        a deserialized tx in the wallet.transactions dict.'''
+        if not raw or (_raw_lokad_hex not in raw and _raw_lokad_hex.upper() not in raw):
+            # Cheap pre-filter: outputs[0] of an SLP tx always has the lokad prefix
+            return None
+        tx = Transaction(raw)
+        tx.outputs()  # deserialize in this worker thread, rather than later with the lock held
+        return tx
+
+    def _process_pending(self, in_background=False):
+        '''Parses all txs in self.pending_txids with a worker pool, one chunk
+        at a time, merging the results with wallet.lock held only for a short
+        time per chunk.'''
+        me = threading.current_thread()
+        with ThreadPoolExecutor(max_workers=max(1, multiprocessing.cpu_count()),
+                                thread_name_prefix="SLP rebuild worker") as executor:
+            while True:
+                if in_background and self.rebuild_thread is not me:
+                    self.print_error("Rebuild stopped with", len(self.pending_txids), "tx(s) left to process")
+                    return
+                with self.wallet.lock:
+                    chunk = []
+                    for txid in self.pending_txids:
+                        tx = self.wallet.transactions.get(txid)
+                        if tx is not None:
+                            chunk.append((txid, tx.raw))
+                        if len(chunk) >= self.REBUILD_CHUNK_SIZE:
+                            break
+                    if not chunk:
+                        self.pending_txids.clear()
+                        self.need_rebuild = False
+                        break
+                parsed = executor.map(self._parse_candidate, [raw for _, raw in chunk])
+                parsed = list(zip((txid for txid, _ in chunk), parsed))
+                with self.wallet.lock:
+                    for txid, tx in parsed:
+                        if txid not in self.pending_txids:
+                            # Was processed (or removed) in the meantime by the add_tx/rm_tx hooks
+                            continue
+                        self.pending_txids.discard(txid)
+                        if tx is not None:
+                            self._add_tx(txid, tx)
+                    # txs that are gone from the wallet no longer need processing
+                    self.pending_txids.difference_update([txid for txid, _ in chunk
+                                                          if txid not in self.wallet.transactions])
+        with self.wallet.lock:
+            self.save()
+        if in_background:
+            self.rebuild_thread = None
+            self.print_error("Background rebuild done")
 
     #--- GETTERS / SETTERS from wallet
     def token_info_for_txo(self, txo) -> Tuple[str, int]:
@@ -702,6 +860,12 @@ class WalletData(util.PrintError):
     def txo_has_token(self, txo) -> bool:
         ''' Takes no locks. '''
         return txo in self.txo_token_id
+    def txid_is_pending(self, txid) -> bool:
+        ''' Returns True if txid is yet to be processed by a rebuild, in which
+        case we can't tell whether its outputs have tokens on them. Takes no
+        locks. '''
+        pending = self.pending_txids
+        return pending is None or txid in pending
     def get_addr_txo(self, addr) -> Set[str]:
         ''' Note this returns the actual reference to the set.  Returns all
         txos (spend and/or unspent) that have ever received tokens for a
@@ -732,6 +896,8 @@ class WalletData(util.PrintError):
         eviscerate the tx in question.
 
         TODO: characterize whether a speedup here is warranted. '''
+        if self.pending_txids:
+            self.pending_txids.discard(txid)
         try:
             del self.validity[txid]
         except KeyError:
@@ -761,6 +927,11 @@ class WalletData(util.PrintError):
         ''' Caller should hold wallet.lock.
         This is (usually) called by wallet.add_transaction in the network thread
         with locks held.'''
+        if self.pending_txids:
+            self.pending_txids.discard(txid)
+        self._add_tx(txid, tx)
+
+    def _add_tx(self, txid, tx):
         outputs = tx.outputs()
         so = outputs and outputs[0][1]
         if not isinstance(so, ScriptOutput):  # Note: ScriptOutput here is the subclass defined in this file, not address.ScriptOutput
@@ -29,6 +29,7 @@ import json
 import copy
 import re
 import stat
+import time
 import hmac, hashlib
 import base64
 import zlib
@@ -38,6 +39,7 @@ from .util import PrintError, profiler, standardize_path
 from .plugins import run_hook, plugin_loaders
 from .keystore import bip44_derivation
 from . import bitcoin
+from . import metrics
 
 
 # seed_version is now used for the version of the wallet file
@@ -49,6 +51,9 @@ FINAL_SEED_VERSION = 17     # electrum >= 2.7 will set this to prevent
 
 TMP_SUFFIX = ".tmp.{}".format(os.getpid())
 
+_write_seconds = metrics.histogram('electroncash_storage_write_seconds', 'Time taken to write a wallet file')
+_write_bytes = metrics.counter('electroncash_storage_write_bytes_total', 'Bytes written to wallet files')
+
 
 def multisig_type(wallet_type):
     '''If wallet_type is mofn multi-sig, return [m, n],
@@ -192,6 +197,7 @@ class WalletStorage(PrintError):
             return
         if not self.modified:
             return
+        t0 = time.perf_counter()
         s = json.dumps(self.data,
                        indent=None if self.pubkey else 4,  # Fast settings if encrypted,
                        sort_keys=not self.pubkey)          # readable settings otherwise.
@@ -223,6 +229,8 @@ class WalletStorage(PrintError):
         self._file_exists = True
         self.print_error("saved", self.path)
         self.modified = False
+        _write_seconds.observe(time.perf_counter() - t0)
+        _write_bytes.inc(len(s))  # json.dumps and the encryption both output ASCII
 
     def requires_split(self):
         d = self.get('accounts', {})
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" The Network's registry of scripthash subscriptions.
+
+A daemon may host many wallets that watch the same scripthashes (e.g. several
+watching-only copies of the same xpub). The server only needs to hear about
+each scripthash once, though, and on a server switch each one needs to be
+re-subscribed only once. This registry reference-counts the callbacks per
+scripthash, fans the status notifications out to all of them, remembers the
+last known status of each, and keeps the backlog of scripthashes to
+re-subscribe after a server switch, so that the Network can trickle them out
+rather than flooding the new server with all of them at once.
+
+Scripthashes are stored as 32-byte binary keys and statuses as 32-byte binary
+values, which takes a fraction of the memory of the hex strings (and of whole
+cached response dicts) for wallets with many addresses.
+
+This class is not thread-safe by itself; the Network calls it with its lock
+held. """
+
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+METHOD = 'blockchain.scripthash.subscribe'
+
+
+def _key(sh: str) -> bytes:
+    return bytes.fromhex(sh)
+
+
+class ScripthashSubscriptions:
+
+    # Sentinel meaning "subscribed, but we don't know the status yet"
+    _UNKNOWN = object()
+
+    def __init__(self):
+        self.callbacks: Dict[bytes, List[Callable]] = dict()
+        # Key present: subscribed on the current server, or the request to do
+        # so is on its way. Value: status (32 bytes or None), or _UNKNOWN if we
+        # are still waiting for the server to tell us.
+        self.status: Dict[bytes, object] = dict()
+        # Scripthashes we need to re-subscribe to after a server switch
+        self.backlog = deque()
+
+    def __len__(self):
+        return len(self.callbacks)
+
+    def __contains__(self, sh: str) -> bool:
+        return _key(sh) in self.callbacks
+
+    @staticmethod
+    def make_response(sh: str, status: Optional[str]) -> dict:
+        return {'method': METHOD, 'params': [sh], 'result': status}
+
+    def add(self, sh: str, callback: Callable) -> Tuple[bool, Optional[dict]]:
+        ''' Registers callback for sh. Returns (need_subscribe, cached_response):
+        need_subscribe is True if the caller should now send a subscribe
+        request to the server. cached_response is the response to hand the
+        callback right away, if we already know the status of sh. '''
+        key = _key(sh)
+        callbacks = self.callbacks.setdefault(key, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+        status = self.status.get(key, self._UNKNOWN)
+        if key not in self.status:
+            # New, or still waiting in the re-subscribe backlog (take_backlog
+            # will skip it now)
+            self.status[key] = self._UNKNOWN
+            return True, None
+        if status is self._UNKNOWN:
+            return False, None  # The response to the subscribe already sent will be fanned out
+        return False, self.make_response(sh, status.hex() if status else None)
+
+    def remove(self, sh: str, callback: Callable) -> bool:
+        ''' Unregisters callback for sh. Returns True if that was the last
+        callback, in which case the caller should unsubscribe from the server. '''
+        key = _key(sh)
+        callbacks = self.callbacks.get(key)
+        if callbacks is None:
+            return False
+        try:
+            callbacks.remove(callback)
+        except ValueError:
+            pass
+        if callbacks:
+            return False
+        del self.callbacks[key]
+        self.status.pop(key, None)
+        return True
+
+    def discard_callback(self, callback: Callable) -> int:
+        ''' Removes callback from every scripthash. Scripthashes left without
+        callbacks are forgotten (but not unsubscribed from on the server).
+        Returns the number of scripthashes callback was removed from. '''
+        ct = 0
+        for key, callbacks in list(self.callbacks.items()):
+            if callback in callbacks:
+                callbacks.remove(callback)
+                ct += 1
+                if not callbacks:
+                    del self.callbacks[key]
+                    self.status.pop(key, None)
+        return ct
+
+    def get_callbacks(self, sh: str) -> List[Callable]:
+        try:
+            return list(self.callbacks.get(_key(sh), ()))
+        except (TypeError, ValueError):
+            return []
+
+    def on_status(self, sh: str, status: Optional[str]):
+        ''' Records the status the server sent for sh (in a subscribe response
+        or a notification). '''
+        try:
+            key = _key(sh)
+            value = bytes.fromhex(status) if status else None
+        except (TypeError, ValueError):
+            return
+        if key in self.callbacks:
+            self.status[key] = value
+
+    def on_error(self, sh: str):
+        ''' The server refused the subscription; the next add() for sh will
+        try again. '''
+        try:
+            key = _key(sh)
+        except (TypeError, ValueError):
+            return
+        if self.status.get(key) is self._UNKNOWN:
+            del self.status[key]
+
+    def get_status(self, sh: str) -> Optional[str]:
+        status = self.status.get(_key(sh))
+        return status.hex() if isinstance(status, bytes) else None
+
+    def begin_resubscribe(self):
+        ''' Called on a server switch. Forgets what the old server told us,
+        and queues up every scripthash for re-subscription. '''
+        self.status.clear()
+        self.backlog = deque(self.callbacks.keys())
+
+    def take_backlog(self, n: int) -> List[str]:
+        ''' Returns up to n scripthashes (hex) from the re-subscribe backlog,
+        marking them as subscribed. Scripthashes that lost their callbacks in
+        the meantime, or that were subscribed in some other way, are skipped. '''
+        out = []
+        while self.backlog and len(out) < n:
+            key = self.backlog.popleft()
+            if key in self.callbacks and key not in self.status:
+                self.status[key] = self._UNKNOWN
+                out.append(key.hex())
+        return out
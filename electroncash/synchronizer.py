@@ -37,9 +37,13 @@ import warnings
 from .address import Address
 from .transaction import Transaction
 from .util import ThreadJob, bh2u, Monotonic, profiler
+from . import metrics
 from . import networks
 from .bitcoin import InvalidXKeyFormat
 
+_backlog = metrics.gauge('electroncash_synchronizer_backlog',
+                         'Synchronizer requests awaiting a response', ('wallet', 'kind'))
+
 
 class Synchronizer(ThreadJob):
     """The synchronizer keeps the wallet up-to-date with its set of
@@ -126,12 +130,20 @@ class Synchronizer(ThreadJob):
         self.network.cancel_requests(self._on_address_history)
         self.network.cancel_requests(self._tx_response)
         self.network.remove_jobs([self])
+        for kind in ('status', 'history', 'tx'):
+            _backlog.remove(self.wallet.diagnostic_name(), kind)
 
     def release(self):
         """ Called from main thread, enqueues a 'release' to happen in the
         Network thread. """
         self._need_release = True
 
+    def _update_metrics(self):
+        name = self.wallet.diagnostic_name()
+        _backlog.labels(name, 'status').set(len(self.requested_hashes))
+        _backlog.labels(name, 'history').set(len(self.requested_histories))
+        _backlog.labels(name, 'tx').set(len(self.requested_tx))
+
     def add(self, address, *, for_change=False):
         """ This can be called from the proxy or GUI threads. """
         with self.lock:
@@ -427,6 +439,7 @@ class Synchronizer(ThreadJob):
                 self._subscribe_to_addresses(addresses_for_change, for_change=True)
 
             # 3. Detect if situation has changed
+            self._update_metrics()
             up_to_date = self.is_up_to_date()
             if up_to_date != self.wallet.is_up_to_date():
                 self.wallet.set_up_to_date(up_to_date)
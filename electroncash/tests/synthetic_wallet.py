@@ -0,0 +1,29 @@
+""" Helpers for the tests that run against a synthetic wallet, see
+benchmarks/synthetic.py. """
+
+from unittest import mock
+
+from ..benchmarks import synthetic
+from ..transaction import Transaction
+
+
+def make_wallet(n_addresses, n_txs, n_tokens=0, *, seed, n_unused=0) -> synthetic.SyntheticWallet:
+    """ synthetic.make_wallet(), plus n_unused receiving addresses that never
+    received anything. """
+    sw = synthetic.make_wallet(n_addresses, n_txs, n_tokens, 0, seed=seed)
+    for _ in range(n_unused):
+        sw.wallet.create_new_address(False)
+    return sw
+
+
+def make_config():
+    """ A config that has the default value for every key. """
+    config = mock.Mock()
+    config.get = lambda key, default=None: default
+    return config
+
+
+def foreign_tx(outputs, prevout_hash='ab' * 32, n=0) -> Transaction:
+    """ A tx with the given outputs, spending a coin that isn't ours. """
+    tx = Transaction.from_io([synthetic._input(prevout_hash, n, synthetic.FOREIGN_PUBKEY)], outputs, locktime=0)
+    return Transaction(tx.serialize())
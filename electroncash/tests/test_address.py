@@ -0,0 +1,66 @@
+import copy
+import pickle
+import unittest
+
+from .. import networks
+from ..address import Address, AddressError, hash_to_hex_str, sha256
+
+CASHADDR = 'qpm2qsznhks23z7629mms6s4cwef74vcwvy22gdx6a'
+LEGACY = '1BpEi6DfDAUFd7GtittLSdBeYJvcoaVggu'
+
+
+class TestAddressInterning(unittest.TestCase):
+
+    def test_interned(self):
+        addr = Address.from_string(CASHADDR)
+        self.assertIs(addr, Address(bytes(addr.hash), addr.kind))
+        self.assertIs(addr, Address(bytearray(addr.hash), addr.kind))
+        for string in (LEGACY, 'bitcoincash:' + CASHADDR, CASHADDR.upper(), addr.to_token_string()):
+            self.assertIs(addr, Address.from_string(string))
+        self.assertIs(addr, copy.copy(addr))
+        self.assertIs(addr, copy.deepcopy({'a': addr})['a'])
+        self.assertIs(addr, pickle.loads(pickle.dumps(addr)))
+        self.assertIsNot(addr, Address.from_P2SH_hash(addr.hash))
+
+    def test_encodings(self):
+        # Whichever string an address was parsed from, it encodes the same
+        for string in (CASHADDR.upper(), 'bitcoincash:' + CASHADDR, LEGACY, CASHADDR):
+            addr = Address.from_string(string)
+            self.assertEqual(CASHADDR, addr.to_cashaddr())
+            self.assertEqual(CASHADDR, addr.to_ui_string())
+            self.assertEqual(LEGACY, addr.to_storage_string())
+            self.assertEqual('bitcoincash:' + CASHADDR, addr.to_full_ui_string())
+        self.assertEqual(hash_to_hex_str(sha256(addr.to_script())), addr.to_scripthash_hex())
+        self.assertIs(addr.to_scripthash_hex(), addr.to_scripthash_hex())
+
+    def test_network_change(self):
+        addr = Address.from_string(CASHADDR)
+        self.assertEqual(CASHADDR, addr.to_ui_string())
+        networks.set_testnet()
+        try:
+            self.assertTrue(addr.to_ui_string().startswith('qpm2qsznhks23z7629mms6s4cwef74vcw'))
+            self.assertNotEqual(CASHADDR, addr.to_ui_string())
+            self.assertNotEqual(LEGACY, addr.to_storage_string())
+            self.assertIs(addr, Address.from_string(addr.to_storage_string()))
+            self.assertEqual([CASHADDR], Address.to_strings(Address.FMT_CASHADDR, [addr], net=networks.MainNet))
+        finally:
+            networks.set_mainnet()
+        self.assertEqual(CASHADDR, addr.to_ui_string())
+        self.assertEqual([LEGACY], Address.to_strings(Address.FMT_LEGACY, [addr]))
+
+    def test_bulk(self):
+        addrs = [Address.from_P2PKH_hash(bytes([i]) * 20) for i in range(50)]
+        addrs += [Address.from_P2SH_hash(bytes([i]) * 32) for i in range(50)]
+        for fmt in (Address.FMT_CASHADDR, Address.FMT_LEGACY, Address.FMT_TOKEN):
+            strings = Address.to_strings(fmt, addrs)
+            self.assertEqual([addr.to_string(fmt) for addr in addrs], strings)
+            self.assertEqual(addrs, Address.from_strings(strings))
+        self.assertEqual([], Address.from_strings([]))
+        with self.assertRaises(AddressError):
+            Address.from_strings([CASHADDR, 'notanaddress'])
+        with self.assertRaises(AddressError):
+            Address.to_strings(7, addrs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from ..commands import Commands
+from .synthetic_wallet import make_wallet
+
+
+class TestAddressSummaries(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sw = make_wallet(40, 600, 3, seed=5, n_unused=5)
+
+    def setUp(self):
+        self.wallet = self.sw.wallet
+        self.wallet._addr_bal_cache.clear()
+
+    def test_balances(self):
+        wallet = self.wallet
+        addrs = wallet.get_addresses()
+        coins = wallet.get_utxos()
+        wallet.set_frozen_coin_state(coins[:5], True)
+        try:
+            for exclude_frozen_coins in (False, True):
+                wallet._addr_bal_cache.clear()
+                bulk = wallet.get_addr_balances(addrs, exclude_frozen_coins)
+                wallet._addr_bal_cache.clear()
+                self.assertEqual({addr: wallet.get_addr_balance(addr, exclude_frozen_coins, tokens=True)
+                                  for addr in addrs}, bulk)
+        finally:
+            wallet.set_frozen_coin_state(coins[:5], False)
+        # The bulk pass fills the cache, which it then uses
+        wallet._addr_bal_cache.clear()
+        wallet.get_addr_balances(addrs)
+        self.assertEqual(len(addrs), len(wallet._addr_bal_cache))
+        self.assertEqual(sum(map(sum, (wallet.get_addr_balance(a) for a in addrs))), sum(wallet.get_balance()))
+
+    def test_filters_and_paging(self):
+        wallet = self.wallet
+        wallet.set_frozen_state(wallet.get_receiving_addresses()[:3], True)
+        wallet.set_label(wallet.get_receiving_addresses()[1].to_storage_string(), 'hello')
+        try:
+            everything = wallet.get_address_summaries()
+            self.assertEqual(wallet.get_addresses(), [s.address for s in everything])
+            for s in everything:
+                self.assertEqual(wallet.is_change(s.address), s.is_change)
+                self.assertEqual(wallet.get_addr_balance(s.address), s.balance)
+                self.assertEqual(len(wallet.get_address_history(s.address)), s.num_txs)
+                self.assertEqual(wallet.is_frozen(s.address), s.is_frozen)
+            self.assertEqual('hello', everything[1].label)
+
+            def addrs(**kwargs):
+                return [s.address for s in wallet.get_address_summaries(**kwargs)]
+            self.assertEqual(wallet.get_change_addresses(), addrs(change=True))
+            self.assertEqual(wallet.get_receiving_addresses()[:3], addrs(frozen=True))
+            self.assertEqual([a for a in wallet.get_addresses() if not wallet.is_used(a)], addrs(used=False))
+            funded = [a for a in wallet.get_addresses() if not wallet.is_empty(a)]
+            self.assertEqual(funded, addrs(funded=True))
+            self.assertEqual(funded[3:8], addrs(funded=True, offset=3, limit=5))
+            self.assertEqual(wallet.get_addresses()[10:15], addrs(offset=10, limit=5))
+        finally:
+            wallet.set_frozen_state(wallet.get_receiving_addresses()[:3], False)
+            wallet.set_label(wallet.get_receiving_addresses()[1].to_storage_string(), '')
+
+    def test_listaddresses(self):
+        commands = Commands(None, self.wallet, None)
+        out = commands.listaddresses(funded=True, balance=True, labels=True)
+        funded = [a for a in self.wallet.get_addresses() if not self.wallet.is_empty(a)]
+        self.assertEqual([a.to_ui_string() for a in funded], [item[0] for item in out])
+        self.assertEqual(out[2:4], commands.listaddresses(funded=True, balance=True, labels=True, offset=2, limit=2))
+        self.assertEqual([], commands.listaddresses(receiving=True, change=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
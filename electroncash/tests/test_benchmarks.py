@@ -0,0 +1,105 @@
+import json
+import unittest
+
+from .. import benchmarks
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_synthetic_wallet(self):
+        sw = benchmarks.make_wallet(10, 60, n_tokens=2, n_fusions=3)
+        wallet = sw.wallet
+        self.assertEqual(60, len(sw.raw_txs))
+        self.assertEqual(60, len(wallet.get_history()))
+        self.assertTrue(wallet.get_utxos())
+        self.assertGreater(sum(wallet.get_balance()), 0)
+        # Deterministic
+        self.assertEqual(list(sw.raw_txs), list(benchmarks.make_wallet(10, 60, n_tokens=2, n_fusions=3).raw_txs))
+
+    def test_run_and_compare(self):
+        results = benchmarks.run(5, 20, repeat=1, only=['get_history', 'tx_deserialize'])
+        results = json.loads(json.dumps(results))
+        self.assertEqual({'get_history', 'tx_deserialize'}, set(results['results']))
+        self.assertEqual(20, results['meta']['params']['transactions'])
+        baseline = json.loads(json.dumps(results))
+        baseline['results']['get_history']['min'] = results['results']['get_history']['min'] / 2
+        baseline['results']['tx_deserialize']['min'] = results['results']['tx_deserialize']['min'] * 2
+        comparison = benchmarks.compare(results, baseline, threshold=1.5)
+        self.assertTrue(comparison['get_history']['regression'])
+        self.assertFalse(comparison['tx_deserialize']['regression'])
+        with self.assertRaises(ValueError):
+            benchmarks.run(5, 20, only=['nope'])
+
+
+class TestReplayServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from ..benchmarks.replay_server import ReplayDataset
+        cls.dataset = ReplayDataset.synthetic(5, 30, seed=1)
+
+    def test_merkle_proofs(self):
+        from ..blockchain import root_from_proof
+        from ..verifier import SPV
+        from ..bitcoin import Hash
+        from ..benchmarks.replay_server import merkle_branch_and_root
+        ds = self.dataset
+        for txid, (_raw, height, pos) in ds.txs.items():
+            merkle = ds.tx_merkle(txid)
+            header = ds.header(height)
+            # the merkle root in the header, as the verifier reads it
+            self.assertEqual(header[36:68][::-1].hex(), SPV.hash_merkle_root(merkle['merkle'], txid, pos))
+        for height in (0, 51, 99, 100):
+            branch, root = ds.header_proof(height, 100)
+            self.assertEqual(bytes.fromhex(root)[::-1],
+                             root_from_proof(Hash(ds.header(height)), [bytes.fromhex(b)[::-1] for b in branch], height))
+        self.assertEqual(([], b'x'), merkle_branch_and_root([b'x'], 0))
+
+    def test_protocol(self):
+        import socket
+        from ..benchmarks.replay_server import ReplayServer, scripthash_status
+        ds = self.dataset
+        server = ReplayServer(ds)
+        server.start()
+        try:
+            with socket.create_connection(('127.0.0.1', server.port), timeout=5) as s:
+                f = s.makefile('rwb')
+                sh, hist = next(iter(ds.history.items()))
+                requests = [
+                    ('server.version', ['test', '1.4']),
+                    ('blockchain.headers.subscribe', []),
+                    ('blockchain.block.headers', [90, 11, 100]),
+                    ('blockchain.block.headers', [ds.tip - 1, 2016]),
+                    ('blockchain.scripthash.subscribe', [sh]),
+                    ('blockchain.scripthash.get_history', [sh]),
+                    ('blockchain.transaction.get', [hist[0][0]]),
+                    ('blockchain.transaction.get', ['00' * 32]),
+                    ('no.such.method', []),
+                ]
+                for i, (method, params) in enumerate(requests):
+                    f.write(json.dumps({'id': i, 'method': method, 'params': params}).encode() + b'\n')
+                f.flush()
+                r = [json.loads(f.readline()) for _ in requests]
+            self.assertEqual([i for i in range(len(requests))], [x['id'] for x in r])
+            self.assertEqual({'hex': ds.header(ds.tip).hex(), 'height': ds.tip}, r[1]['result'])
+            self.assertEqual(11, r[2]['result']['count'])
+            self.assertIn('root', r[2]['result'])
+            self.assertEqual(2, r[3]['result']['count'])  # clipped at the tip
+            self.assertEqual(scripthash_status(hist), r[4]['result'])
+            self.assertEqual([{'tx_hash': t, 'height': h} for t, h in hist], r[5]['result'])
+            self.assertEqual(ds.txs[hist[0][0]][0], r[6]['result'])
+            self.assertIn('error', r[7])
+            self.assertIn('error', r[8])
+            self.assertEqual(len(requests), server.stats()['total_requests'])
+        finally:
+            server.stop()
+
+    def test_sync(self):
+        from .. import networks
+        from ..benchmarks.sync import sync_wallet
+        net = networks.net
+        result = sync_wallet(self.dataset, timeout=60)
+        self.assertIs(net, networks.net)
+        self.assertEqual(30, result['transactions'])
+        self.assertEqual(30, result['requests']['blockchain.transaction.get_merkle'])
+        self.assertEqual(1, result['connections'])
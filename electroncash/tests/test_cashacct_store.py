@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from .. import blockchain, cashacct
+from ..cashacct import _LookupPool
+from ..cashacct_store import ProcessedBlockStore
+
+HASH_A = 'aa' * 32
+HASH_B = 'bb' * 32
+STATUS = '11' * 32
+
+
+class TestProcessedBlockStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cashacct_blocks.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_put_get_and_persistence(self):
+        store = ProcessedBlockStore(self.path)
+        data = {'reg_txs': {'cc' * 32: '6a0401010101'}, 'minimal_chashes': {'name': {'0123456789': '0'}}}
+        self.assertEqual([], store.get(600000))
+        self.assertTrue(store.put(600000, HASH_A, STATUS, data))
+        self.assertTrue(store.put(600000, HASH_A, STATUS, data))  # dupe is fine
+        self.assertEqual([(HASH_A, STATUS, data)], store.get(600000))
+        self.assertEqual(1, len(store))
+        store.close()
+        store = ProcessedBlockStore(self.path)
+        self.assertEqual([(HASH_A, STATUS, data)], store.get(600000))
+        self.assertEqual(1, len(store))
+        self.assertFalse(store.put(600001, 'not hex', STATUS, data))
+        store.close()
+
+    def test_discard(self):
+        store = ProcessedBlockStore(self.path)
+        for height in range(600000, 600005):
+            store.put(height, HASH_A, STATUS, {})
+        store.put(600002, HASH_B, STATUS, {})  # a block that was reorged away
+        self.assertEqual({HASH_A, HASH_B}, {h for h, _, _ in store.get(600002)})
+        store.discard(600002, HASH_B)
+        self.assertEqual([HASH_A], [h for h, _, _ in store.get(600002)])
+        store.discard(600000)
+        self.assertEqual([], store.get(600000))
+        store.discard_from(600003)
+        self.assertEqual([], store.get(600003))
+        self.assertEqual([], store.get(600004))
+        self.assertEqual(2, len(store))
+        store.close()
+
+    def test_lru_eviction(self):
+        store = ProcessedBlockStore(self.path, max_blocks=10)
+        for height in range(10):
+            store.put(height, HASH_A, STATUS, {})
+        # Touch the oldest so that it becomes the most recently used
+        self.assertTrue(store.get(0))
+        store.put(10, HASH_A, STATUS, {})
+        # We evicted down to 90% of max_blocks, least recently used first
+        self.assertEqual(9, len(store))
+        self.assertTrue(store.get(0))
+        self.assertFalse(store.get(1))
+        self.assertFalse(store.get(2))
+        self.assertTrue(store.get(10))
+        store.close()
+
+    def test_corrupt_entry(self):
+        store = ProcessedBlockStore(self.path)
+        store.put(600000, HASH_A, STATUS, {})
+        store.db.execute("UPDATE blocks SET data = ?", (b'garbage',))
+        self.assertEqual([], store.get(600000))
+        self.assertEqual(0, len(store))
+        store.close()
+
+
+class TestCashAcctUsesStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = ProcessedBlockStore(os.path.join(self.tmpdir, 'cashacct_blocks.sqlite'))
+        wallet = mock.Mock()
+        wallet.diagnostic_name.return_value = 'test'
+        self.ca = cashacct.CashAcct(wallet)
+        self.ca.network = mock.Mock()
+        self.header = {'version': 1, 'prev_block_hash': '00' * 32, 'merkle_root': '00' * 32, 'timestamp': 0,
+                       'bits': 0, 'nonce': 0, 'block_height': cashacct.num2bh(200)}
+        self.ca.network.blockchain.return_value.read_header.return_value = self.header
+        patcher = mock.patch.object(cashacct, 'get_cashacct_store', return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        height, txid = self.header['block_height'], 'cc' * 32
+        block_hash = blockchain.hash_header(self.header)
+        script = cashacct.ScriptOutput(bytes.fromhex('6a040101010103627631150190c0cbaefcd5f3b93b8214074e645e39d7aae4ad'))
+        script.make_complete(block_height=height, block_hash=block_hash, txid=txid)
+        pb = cashacct.ProcessedBlock(hash=block_hash, height=height, reg_txs={txid: self.ca.RegTx(txid, script)})
+        self.ca._store_block(pb)
+        self.assertEqual(1, len(self.store))
+        stored_pb, minimal_chashes = self.ca._load_stored_block(height)
+        self.assertEqual(pb, stored_pb)
+        self.assertEqual(script.collision_hash, stored_pb.reg_txs[txid].script.collision_hash)
+        self.assertEqual({'bv1': {script.collision_hash: ''}}, minimal_chashes)
+        # A fresh start finds the minimal collision hash without a lookup
+        self.ca._init_data()
+        self.assertEqual('', self.ca.get_minimal_chash('BV1', 200, script.collision_hash, only_cached=True))
+        # Not used when the block is not on our chain
+        self.ca._init_data()
+        self.header['nonce'] = 1
+        self.assertIsNone(self.ca._load_stored_block(height))
+
+
+class TestLookupPool(unittest.TestCase):
+
+    def test_coalescing(self):
+        pool = _LookupPool("test", 2)
+        release = threading.Event()
+        calls, results = [], []
+        done = threading.Semaphore(0)
+
+        def func(key):
+            def f():
+                calls.append(key)
+                release.wait(5)
+                if key == 'bad':
+                    raise ValueError(key)
+                return key.upper()
+            return f
+
+        def callback(result):
+            results.append(result)
+            done.release()
+
+        for key in ('a', 'a', 'b', 'a', 'bad'):
+            pool.submit(key, func(key), callback)
+        release.set()
+        for _ in range(5):
+            self.assertTrue(done.acquire(timeout=5))
+        self.assertEqual(['a', 'b', 'bad'], sorted(calls))
+        self.assertEqual(['A', 'A', 'A', 'B'], sorted(r for r in results if isinstance(r, str)))
+        self.assertIsInstance(next(r for r in results if not isinstance(r, str)), ValueError)
+        self.assertLessEqual(pool.n_workers, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ from unittest.mock import Mock
 
 from .. import consolidate
 from ..address import Address
+from ..bitcoin import TYPE_ADDRESS
+from .synthetic_wallet import make_config, make_wallet
 
 TEST_ADDRESS: Address = Address.from_string(
     "bitcoincash:qr3l6uufcuwm9prgpa6cfxnez87fzstxescngr64l4"
@@ -250,10 +252,101 @@ class TestConsolidateCoinSelection(unittest.TestCase):
             self.assertEqual(total_fee, total_size * FEERATE)
 
 
+class TestWalletConsolidator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sw = make_wallet(20, 150, seed=7, n_unused=1)
+
+    def setUp(self) -> None:
+        self.wallet = self.sw.wallet
+        self.coins = self.wallet.get_utxos(mature=True)
+
+    def check_txs(self, consolidator, chunks, txs):
+        self.assertEqual(len(chunks), len(txs))
+        spent = set()
+        for chunk, tx in zip(chunks, txs):
+            self.assertTrue(tx.is_complete())
+            size = len(tx.raw) // 2
+            self.assertLessEqual(size, chunk.size)
+            self.assertLessEqual(chunk.size, consolidator.max_tx_size)
+            self.assertGreaterEqual(len(tx.inputs()), 2)
+            self.assertEqual([(TYPE_ADDRESS, chunk.output_address, chunk.value)], tx.outputs())
+            self.assertEqual(chunk.fee, tx.get_fee())
+            for txin in tx.inputs():
+                spent.add((txin["prevout_hash"], txin["prevout_n"]))
+        return spent
+
+    def test_per_address(self):
+        consolidator = consolidate.WalletConsolidator(self.wallet)
+        chunks = consolidator.plan()
+        txs = consolidator.make_transactions(max_workers=4)
+        spent = self.check_txs(consolidator, chunks, txs)
+        by_address = {}
+        for coin in self.coins:
+            by_address.setdefault(coin["address"], []).append(coin)
+        for chunk in chunks:
+            self.assertEqual({chunk.output_address}, {c["address"] for c in chunk.coins})
+        # Each address with more than one coin is consolidated, and only those
+        expected = {
+            (c["prevout_hash"], c["prevout_n"])
+            for coins in by_address.values()
+            if len(coins) > 1
+            for c in coins
+        }
+        self.assertEqual(expected, spent)
+        summary = consolidator.summary(chunks)
+        self.assertEqual(len(txs), summary["transactions"])
+        self.assertEqual(sum(tx.get_fee() for tx in txs), summary["fee"])
+        self.assertEqual(sum(tx.input_value() for tx in txs), summary["input_value"])
+
+    def test_merged(self):
+        output_address = self.wallet.get_unused_addresses()[0]
+        addresses = self.wallet.get_receiving_addresses()[:6]
+        consolidator = consolidate.WalletConsolidator(
+            self.wallet,
+            addresses,
+            output_address=output_address,
+            merge_addresses=True,
+            max_tx_size=1000,
+        )
+        chunks = consolidator.plan()
+        self.assertGreater(len(chunks), 1)
+        txs = consolidator.make_transactions()
+        spent = self.check_txs(consolidator, chunks, txs)
+        coins = [c for c in self.coins if c["address"] in addresses]
+        self.assertEqual({(c["prevout_hash"], c["prevout_n"]) for c in coins}, spent)
+        self.assertEqual({output_address}, {c.output_address for c in chunks})
+        self.assertGreater(len({c["address"] for c in chunks[0].coins}), 1)
+
+    def test_uneconomic(self):
+        input_size = 141  # p2pkh with a Schnorr signature
+        # Make a few of the coins cost more to spend than they are worth
+        feerate = sorted(c["value"] for c in self.coins)[3] // input_size + 1
+        consolidator = consolidate.WalletConsolidator(
+            self.wallet, fee_estimator=lambda size: size * feerate
+        )
+        n_small = sum(1 for c in self.coins if c["value"] <= input_size * feerate)
+        self.assertGreater(n_small, 0)
+        self.assertEqual(n_small, consolidator.num_uneconomic)
+        for chunk in consolidator.plan():
+            self.assertTrue(all(c["value"] > input_size * feerate for c in chunk.coins))
+
+    def test_command(self):
+        from ..commands import Commands
+
+        commands = Commands(make_config(), self.wallet, None)
+        out = commands.consolidatewallet(feerate="2", preview=True)
+        self.assertNotIn("transactions", out)
+        self.assertGreater(out["summary"]["transactions"], 0)
+        out = commands.consolidatewallet(feerate="2", unsigned=True)
+        self.assertEqual(out["summary"]["transactions"], len(out["transactions"]))
+
+
 def suite():
     test_suite = unittest.TestSuite()
     loadTests = unittest.defaultTestLoader.loadTestsFromTestCase
     test_suite.addTest(loadTests(TestConsolidateCoinSelection))
+    test_suite.addTest(loadTests(TestWalletConsolidator))
     return test_suite
 
 
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import json
+from datetime import date, datetime
+
+from ..exchange_rate import ExchangeBase, RateHistory
+
+
+class TestRateHistory(unittest.TestCase):
+
+    d = {'2020-01-01': 100.0, '2020-01-02': '101.5', '2020-01-05': 105, '2020-01-06': 'garbage', 'bad': 1}
+
+    def test_lookup_and_gaps(self):
+        h = RateHistory.from_dict(self.d)
+        self.assertEqual(3, len(h))
+        self.assertEqual(100.0, h.get(date(2020, 1, 1)))
+        self.assertEqual(101.5, h.get(datetime(2020, 1, 2, 23, 59)))
+        # Gaps get the nearest day's rate, earlier day on a tie
+        self.assertEqual(101.5, h.get(date(2020, 1, 3)))
+        self.assertEqual(105.0, h.get(date(2020, 1, 4)))
+        # Nothing outside the range we have data for
+        self.assertIsNone(h.get(date(2019, 12, 31)))
+        self.assertIsNone(h.get(date(2020, 1, 6)))
+        self.assertIsNone(RateHistory().get(date(2020, 1, 1)))
+        self.assertEqual({'2020-01-01': 100.0, '2020-01-02': 101.5, '2020-01-05': 105.0}, h.to_dict())
+        h2 = h.updated({'2020-01-05': 99, '2020-01-07': 107})
+        self.assertEqual(99.0, h2.get(date(2020, 1, 5)))
+        self.assertEqual(107.0, h2.get(date(2020, 1, 7)))
+
+    def test_get_many(self):
+        h = RateHistory.from_dict(self.d)
+        timestamps = [datetime(2020, 1, day, hour).timestamp() for day in range(1, 7) for hour in (0, 12, 23)]
+        expected = [h.get(datetime.fromtimestamp(ts)) for ts in timestamps]
+        self.assertEqual(expected, h.get_many(timestamps))
+        self.assertEqual([None, None], h.get_many([None, 1e20]))
+
+    def test_serialization(self):
+        h = RateHistory.from_dict(self.d)
+        h2 = RateHistory.from_bytes(h.to_bytes())
+        self.assertEqual(h.to_dict(), h2.to_dict())
+        self.assertEqual(101.5, h2.get(date(2020, 1, 3)))
+        with self.assertRaises(ValueError):
+            RateHistory.from_bytes(h.to_bytes()[:-1])
+        with self.assertRaises(ValueError):
+            RateHistory.from_bytes(b'{"json": 1}' + bytes(20))
+
+    def test_cache_file_migration(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            exchange = ExchangeBase(None, None)
+            with open(os.path.join(cache_dir, 'ExchangeBase_USD'), 'w', encoding='utf-8') as f:
+                f.write(json.dumps(self.d))
+            h, timestamp = exchange.read_historical_rates('USD', cache_dir)
+            self.assertEqual(101.5, h.get(date(2020, 1, 2)))
+            self.assertTrue(exchange._cache_historical_rates(h, 'USD', cache_dir))
+            self.assertEqual(['ExchangeBase_USD.rates'], os.listdir(cache_dir))
+            h, timestamp = exchange.read_historical_rates('USD', cache_dir)
+            self.assertEqual(101.5, h.get(date(2020, 1, 2)))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_many_lookups_are_fast(self):
+        start = date(2017, 8, 1).toordinal()
+        h = RateHistory(start, [float(i) for i in range(3000)])
+        t0 = datetime(2017, 8, 1).timestamp()
+        timestamps = [t0 + i * 2000 for i in range(100000)]
+        t = time.perf_counter()
+        rates = h.get_many(timestamps)
+        elapsed = time.perf_counter() - t
+        self.assertEqual(100000, len(rates))
+        self.assertLess(elapsed, 1.0)  # ~30ms here; generous so as not to be flaky
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# What the electron-cash script imports before forwarding a command to a
+# running daemon.
+CLIENT_PATH = '''
+import time
+t0 = time.perf_counter()
+from electroncash import util, networks, daemon
+from electroncash.simple_config import SimpleConfig
+from electroncash.commands import get_parser, known_commands
+get_parser()
+print(int((time.perf_counter() - t0) * 1000))
+print(' '.join(sorted(sys.modules)))
+'''
+
+# None of these may be imported on the client path
+HEAVY_MODULES = (
+    'electroncash.bitcoin', 'electroncash.network', 'electroncash.storage', 'electroncash.transaction',
+    'electroncash.wallet', 'ecdsa', 'dns', 'google.protobuf', 'requests',
+)
+
+# Generous, so as not to be flaky on slow machines. A regression to the old
+# behaviour of importing the whole library costs several times this.
+BUDGET_MS = int(os.environ.get('EC_IMPORTTIME_BUDGET_MS', 1000))
+
+
+class TestImportTime(unittest.TestCase):
+
+    def run_python(self, code, *args):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return subprocess.run([sys.executable, *args, '-c', 'import sys; sys.path.insert(0, %r)\n' % root + code],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    def test_client_path_stays_light(self):
+        out = self.run_python(CLIENT_PATH).stdout.splitlines()
+        elapsed_ms, modules = int(out[-2]), set(out[-1].split())
+        self.assertEqual([], [m for m in HEAVY_MODULES if m in modules])
+        if elapsed_ms > BUDGET_MS:
+            # Show where the time went
+            def cumulative_us(line):
+                fields = line.split('|')
+                return int(fields[1]) if len(fields) == 3 and fields[1].strip().isdigit() else 0
+            report = sorted(self.run_python(CLIENT_PATH, '-X', 'importtime').stderr.splitlines(), key=cumulative_us)
+            self.fail('client imports took {} ms (budget {} ms). Slowest:\n{}'.format(
+                elapsed_ms, BUDGET_MS, '\n'.join(report[-15:])))
+
+    def test_lazy_package_attributes(self):
+        out = self.run_python('import electroncash\n'
+                              'assert "electroncash.wallet" not in sys.modules\n'
+                              'from electroncash import Wallet, SimpleConfig, bitcoin\n'
+                              'print(Wallet.__module__, SimpleConfig.__module__, bitcoin.__name__)').stdout
+        self.assertEqual('electroncash.wallet electroncash.simple_config electroncash.bitcoin', out.splitlines()[-1])
@@ -108,3 +108,105 @@ class TestInterfaceSSLVerify(unittest.TestCase):
             with self.assertRaises(ssl.SSLCertVerificationError) as cm:
                 self._has_ca_signed_valid_cert(f"{host}:{port}:s")
             self.assertEqual(cm.exception.verify_code, 20)  # X509_V_ERR_UNABLE_TO_GET_ISSUER_CERT_LOCALLY
+
+
+class TestInterfaceStats(unittest.TestCase):
+
+    def setUp(self):
+        self.sock, self.peer = socket.socketpair()
+        self.iface = interface.Interface('host:50002:s', self.sock)
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def _round_trip(self, method, delay, wire_id):
+        self.iface.queue_request(method, [], wire_id)
+        self.assertTrue(self.iface.send_requests())
+        self.iface.sent_times[wire_id] -= delay  # pretend it was sent `delay` seconds ago
+        self.peer.recv(4096)
+        self.peer.sendall(('{"jsonrpc": "2.0", "id": %d, "result": null}\n' % wire_id).encode())
+        responses = []
+        while not responses:
+            responses = self.iface.get_responses()
+        self.assertEqual(wire_id, responses[0][1]['id'])
+
+    def test_latency_tracking(self):
+        self.assertIsNone(self.iface.latency())
+        self._round_trip('blockchain.transaction.get', 0.4, 1)
+        self.assertAlmostEqual(0.4, self.iface.response_time, delta=0.05)
+        self.assertIsNone(self.iface.ping_rtt)
+        self.assertAlmostEqual(0.4, self.iface.latency(), delta=0.05)
+        self._round_trip('server.ping', 0.1, 2)
+        self.assertAlmostEqual(0.1, self.iface.ping_rtt, delta=0.05)
+        # A moving average of both
+        self.assertLess(self.iface.response_time, 0.4)
+        self.assertGreater(self.iface.response_time, 0.1)
+        stats = self.iface.get_stats()
+        self.assertEqual(2, stats['responses'])
+        self.assertEqual(0, stats['pending'])
+        self.assertGreater(stats['bytes_received'], 0)
+        self.assertEqual({}, self.iface.sent_times)
+
+    def test_sent_times_pruned(self):
+        self.iface.queue_request('blockchain.transaction.get', [], 1)
+        self.assertTrue(self.iface.send_requests())
+        self.iface.sent_times[1] -= self.iface.REQUEST_TIMEOUT + 1  # never answered
+        self.iface.queue_request('server.ping', [], 2)
+        self.assertTrue(self.iface.send_requests())
+        self.assertEqual([2], list(self.iface.sent_times))
+        self.peer.recv(4096)
+        # A late answer is still handled, but isn't a response time sample
+        self.peer.sendall(b'{"jsonrpc": "2.0", "id": 1, "result": null}\n')
+        responses = []
+        while not responses:
+            responses = self.iface.get_responses()
+        self.assertEqual(1, responses[0][1]['id'])
+        self.assertEqual(1, self.iface.num_responses)
+        self.assertIsNone(self.iface.response_time)
+
+
+class TestServerSelection(unittest.TestCase):
+
+    class FakeInterface:
+        def __init__(self, server, latency, pending=0, tip=b'tip', mode=interface.Interface.MODE_DEFAULT):
+            self.server, self._latency, self.pending = server, latency, pending
+            self.tip_header, self.mode, self.blockchain = tip, mode, 'chain'
+
+        def latency(self):
+            return self._latency
+
+        def num_pending(self):
+            return self.pending
+
+    def make_network(self, *interfaces):
+        from ..network import Network
+        net = Network.__new__(Network)
+        net.interface_lock = threading.RLock()
+        net.interfaces = {i.server: i for i in interfaces}
+        net.interface = interfaces[0] if interfaces else None
+        net.server_latency = {}
+        return net
+
+    def test_pick_by_latency(self):
+        net = self.make_network(self.FakeInterface('fast', 0.01), self.FakeInterface('slow', 1.0))
+        net.server_latency['gone'] = 0.02
+        picks = [net._pick_by_latency(['fast', 'slow', 'gone', 'unknown']) for _ in range(2000)]
+        self.assertGreater(picks.count('fast'), picks.count('slow') * 10)
+        self.assertGreater(picks.count('gone'), picks.count('slow') * 10)
+        # Unknown servers get the median latency
+        self.assertGreater(picks.count('unknown'), picks.count('slow'))
+        self.assertIsNone(net._pick_by_latency([]))
+
+    def test_reads_go_to_healthy_secondaries_only(self):
+        main = self.FakeInterface('main', 0.1)
+        good = self.FakeInterface('good', 0.1)
+        forked = self.FakeInterface('forked', 0.01, tip=b'other tip')
+        syncing = self.FakeInterface('syncing', 0.01, mode=interface.Interface.MODE_CATCH_UP)
+        swamped = self.FakeInterface('swamped', 0.01, pending=1000)
+        net = self.make_network(main, good, forked, syncing, swamped)
+        picks = {net._pick_read_interface(main).server for _ in range(200)}
+        self.assertEqual({'main', 'good'}, picks)
+        self.assertIsNone(net._pick_read_interface(None))
+        net = self.make_network(main, forked)
+        self.assertIs(main, net._pick_read_interface(main))
@@ -0,0 +1,108 @@
+import base64
+import http.client
+import json
+import threading
+import time
+import unittest
+
+from ..jsonrpc import VerifyingJSONRPCServer
+
+
+class TestVerifyingJSONRPCServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = VerifyingJSONRPCServer(('127.0.0.1', 0), logRequests=False,
+                                             rpc_user='user', rpc_password='pass', max_workers=4)
+        self.server.timeout = 0.1
+        self.release = threading.Event()
+        self.server.register_function(lambda: self.release.wait(5.0), 'slow')
+        self.server.register_function(lambda x: x * 2, 'double')
+        self.running = True
+        def serve():
+            while self.running:
+                self.server.handle_request()
+        self.thread = threading.Thread(target=serve, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.release.set()
+        self.running = False
+        self.thread.join()
+        self.server.server_close()
+
+    def _connect(self):
+        return http.client.HTTPConnection(*self.server.server_address, timeout=5.0)
+
+    def _post(self, conn, payload):
+        auth = base64.b64encode(b'user:pass').decode('ascii')
+        conn.request('POST', '/', body=json.dumps(payload),
+                     headers={'Authorization': 'Basic ' + auth, 'Content-Type': 'application/json'})
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read() or 'null')
+
+    def test_slow_request_does_not_block_others(self):
+        slow_conn = self._connect()
+        t = threading.Thread(target=self._post, args=(slow_conn, {'jsonrpc': '2.0', 'id': 1, 'method': 'slow', 'params': []}))
+        t.start()
+        time.sleep(0.1)
+        t0 = time.time()
+        status, resp = self._post(self._connect(), {'jsonrpc': '2.0', 'id': 2, 'method': 'double', 'params': [21]})
+        self.assertEqual(200, status)
+        self.assertEqual(42, resp['result'])
+        self.assertLess(time.time() - t0, 2.0)
+        self.assertEqual(1, self.server.stats.as_dict()['in_flight'])
+        self.release.set()
+        t.join()
+
+    def test_busy_wallet_does_not_block_others(self):
+        # Requests for wallet 'a' run one at a time, and the first one hangs
+        locks = {'a': threading.RLock(), 'b': threading.RLock()}
+        self.server.request_lock = lambda method, params: locks.get(params[0]) if method == 'wallet' else None
+        self.server.register_function(lambda w: self.release.wait(5.0) if w == 'a' else w, 'wallet')
+        threads = []
+        for i in range(6):  # more than max_workers
+            t = threading.Thread(target=self._post, args=(self._connect(), {'jsonrpc': '2.0', 'id': i,
+                                                                           'method': 'wallet', 'params': ['a']}))
+            t.start()
+            threads.append(t)
+        time.sleep(0.2)
+        stats = self.server.stats.as_dict()
+        self.assertEqual(1, stats['in_flight'])
+        self.assertEqual(5, stats['queued'])
+        t0 = time.time()
+        status, resp = self._post(self._connect(), {'jsonrpc': '2.0', 'id': 9, 'method': 'wallet', 'params': ['b']})
+        self.assertEqual('b', resp['result'])
+        self.assertLess(time.time() - t0, 2.0)
+        self.release.set()
+        for t in threads:
+            t.join()
+
+    def test_keepalive_and_batch(self):
+        conn = self._connect()
+        for i in range(3):
+            status, resp = self._post(conn, {'jsonrpc': '2.0', 'id': i, 'method': 'double', 'params': [i]})
+            self.assertEqual(2 * i, resp['result'])
+        status, resp = self._post(conn, [{'jsonrpc': '2.0', 'id': i, 'method': 'double', 'params': [i]}
+                                         for i in range(5)])
+        self.assertEqual(200, status)
+        self.assertEqual([2 * i for i in range(5)], [r['result'] for r in sorted(resp, key=lambda r: r['id'])])
+        stats = self.server.stats.as_dict()
+        self.assertEqual(1, stats['connections'])  # all of the above went over one connection
+        self.assertEqual(8, stats['methods']['double']['count'])
+        self.assertEqual(0, stats['methods']['double']['errors'])
+        conn.close()
+        for _ in range(50):
+            if not self.server.stats.as_dict()['connections']:
+                break
+            time.sleep(0.02)
+        self.assertEqual(0, self.server.stats.as_dict()['connections'])
+
+    def test_errors_are_counted(self):
+        status, resp = self._post(self._connect(), {'jsonrpc': '2.0', 'id': 1, 'method': 'double', 'params': [None]})
+        self.assertIn('error', resp)
+        self.assertEqual(1, self.server.stats.as_dict()['methods']['double']['errors'])
+
+    def test_bad_credentials(self):
+        conn = self._connect()
+        conn.request('POST', '/', body='{}', headers={'Authorization': 'Basic ' + base64.b64encode(b'user:nope').decode()})
+        self.assertEqual(401, conn.getresponse().status)
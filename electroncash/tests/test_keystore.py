@@ -0,0 +1,56 @@
+import unittest
+
+from .. import keystore
+from ..util import InvalidPassword
+
+XPRV = 'xprv9s21ZrQH143K3QTDL4LXw2F7HEK3wJUD2nW2nRk4stbPy6cq3jPPqjiChkVvvNKmPGJxWUtg6LnF5kejMRNNU3TGtRBeJgk33yuGBxrMPHi'
+OLD_SEED = 'powerful random nobody notice nothing important anyway look away hidden message over'
+WIFS = ['KwFfNUhSDaASSAwtG7ssQM1uVX8RgX5GHWnnLfhfiQDigjioWXHH',
+        'KwHcZJGj2U4H97CSjYERuQvU8RYMWUSUjUqt4C4DaYyLL6udseoj',
+        '5HqcWhyRCs4RfJKaaXGQRodiBVmF87yoG49c4ndeiAgQnWFudFt']  # uncompressed
+
+
+class TestSigningSession(unittest.TestCase):
+
+    def _keystores(self, password):
+        bip32 = keystore.from_xprv(XPRV)
+        old = keystore.from_seed(OLD_SEED, '', False)
+        imported = keystore.Imported_KeyStore({})
+        for wif in WIFS:
+            imported.import_privkey(wif, None)
+        for ks in (bip32, old, imported):
+            if password:
+                ks.update_password(None, password)
+        return [(bip32, [[0, 0], [0, 7], [1, 3], [0, 1]]),
+                (old, [[0, 0], [1, 2], [0, 5]]),
+                (imported, list(imported.keypairs))]
+
+    def test_same_keys(self):
+        for password in (None, 'secret'):
+            for ks, derivations in self._keystores(password):
+                with ks.signing_session(password) as session:
+                    self.assertIsInstance(session, keystore.SigningSession)
+                    for derivation in derivations:
+                        self.assertEqual(ks.get_private_key(derivation, password),
+                                         session.get_private_key(derivation))
+
+    def test_wrong_password(self):
+        for ks, _derivations in self._keystores('secret'):
+            with self.assertRaises(InvalidPassword):
+                ks.signing_session('wrong')
+        bip32 = self._keystores('secret')[0][0]
+        with self.assertRaises(InvalidPassword):
+            bip32.signing_session(None)
+
+    def test_secrets_dropped(self):
+        ks, derivations = self._keystores('secret')[0]
+        with ks.signing_session('secret') as session:
+            session.get_private_key(derivations[0])
+            self.assertEqual(2, len(session._nodes))  # the master and m/0
+        self.assertIsNone(session.password)
+        self.assertFalse(session._nodes)
+        self.assertFalse(session._pubkeys)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import urllib.request
+
+from .. import metrics
+from ..caches import ExpiringCache
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter_gauge_histogram(self):
+        c = self.registry.register('test_requests_total', 'Requests', metrics.COUNTER, ('method',))
+        c.labels('a').inc()
+        c.labels('a').inc(2)
+        c.labels('b').inc()
+        with self.assertRaises(ValueError):
+            c.labels('a', 'b')
+        g = self.registry.register('test_depth', 'Depth', metrics.GAUGE)
+        g.set(5)
+        g.dec()
+        h = self.registry.register('test_seconds', 'Latency', metrics.HISTOGRAM, buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.7, 2.0):
+            h.observe(v)
+        snap = self.registry.snapshot()
+        self.assertEqual([({'method': 'a'}, 3), ({'method': 'b'}, 1)],
+                         [(s['labels'], s['value']) for s in snap['test_requests_total']['samples']])
+        self.assertEqual(4, snap['test_depth']['samples'][0]['value'])
+        self.assertEqual({'count': 4, 'sum': 3.25, 'buckets': {0.1: 1, 1.0: 3}},
+                         snap['test_seconds']['samples'][0]['value'])
+        # Registering again gets the same metric, but not with other labels
+        self.assertIs(c, self.registry.register('test_requests_total', 'Requests', metrics.COUNTER, ('method',)))
+        with self.assertRaises(ValueError):
+            self.registry.register('test_requests_total', 'Requests', metrics.GAUGE, ('method',))
+        c.remove('b')
+        self.assertEqual(1, len(self.registry.snapshot()['test_requests_total']['samples']))
+
+    def test_prometheus_format(self):
+        c = self.registry.register('test_total', 'Help with "quotes"', metrics.COUNTER, ('name',))
+        c.labels('x"y').inc()
+        h = self.registry.register('test_seconds', 'Latency', metrics.HISTOGRAM, buckets=(0.5,))
+        with h.time():
+            pass
+        self.registry.add_collector(lambda: [('test_collected', metrics.GAUGE, 'Collected', [({}, 7)])])
+        self.registry.add_collector(lambda: 1 / 0)  # broken collectors are skipped
+        text = self.registry.render_prometheus()
+        self.assertEqual([
+            '# HELP test_total Help with "quotes"',
+            '# TYPE test_total counter',
+            'test_total{name="x\\"y"} 1',
+            '# HELP test_seconds Latency',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="0.5"} 1',
+            'test_seconds_bucket{le="+Inf"} 1',
+        ], text.splitlines()[:7])
+        self.assertIn('test_seconds_count 1', text)
+        self.assertTrue(text.endswith('# TYPE test_collected gauge\ntest_collected 7\n'))
+
+    def test_http_server(self):
+        self.registry.register('test_up', 'Up', metrics.GAUGE).set(1)
+        server = metrics.PrometheusServer(0, registry=self.registry)
+        server.start()
+        try:
+            with urllib.request.urlopen('http://127.0.0.1:{}/metrics'.format(server.port), timeout=5) as r:
+                self.assertIn('test_up 1', r.read().decode('utf-8'))
+        finally:
+            server.stop()
+
+    def test_cache_metrics(self):
+        cache = ExpiringCache(name='test_metrics_cache')
+        cache.put('k', 'v')
+        cache.get('k')
+        cache.get('nope')
+        snap = metrics.snapshot()
+        for name in ('electroncash_cache_hits_total', 'electroncash_cache_misses_total', 'electroncash_cache_items'):
+            samples = {s['labels']['cache']: s['value'] for s in snap[name]['samples']}
+            self.assertEqual(1, samples['test_metrics_cache'], name)
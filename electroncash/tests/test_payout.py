@@ -0,0 +1,117 @@
+import json
+import random
+import unittest
+
+from ..address import Address
+from ..payout import PayoutBuilder, parse_payouts
+from ..transaction import Transaction
+from ..util import NotEnoughFunds
+from .synthetic_wallet import make_config, make_wallet
+
+
+def random_addresses(n, seed=0):
+    rng = random.Random(seed)
+    return [Address.from_P2PKH_hash(rng.getrandbits(160).to_bytes(20, 'big')) for _ in range(n)]
+
+
+class TestParsePayouts(unittest.TestCase):
+
+    def test_csv_and_json(self):
+        a, b = (addr.to_ui_string() for addr in random_addresses(2))
+        expected = [(Address.from_string(a), 150000000), (Address.from_string(b), 1000)]
+        csv = "address,amount\n# a comment\n{}, 1.5\n\n{},0.00001\n".format(a, b)
+        self.assertEqual(expected, parse_payouts(csv))
+        self.assertEqual(expected, parse_payouts(json.dumps([[a, 1.5], {'address': b, 'amount': '0.00001'}])))
+        self.assertEqual(expected, parse_payouts([(a, '1.5'), (b, '0.00001')]))
+
+    def test_errors(self):
+        a = random_addresses(1)[0].to_ui_string()
+        for bad in ("{},1\nnotanaddress,1".format(a), "{},0.000000001".format(a), "{},-1".format(a),
+                    "{},abc".format(a), "{}".format(a), [[a]],
+                    # A bad address on the first line is not mistaken for a header
+                    "{}x,5\n{},1".format(a, a), "notanaddress,5\n{},1".format(a)):
+            with self.assertRaises(ValueError):
+                parse_payouts(bad)
+
+
+class TestPayoutBuilder(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sw = make_wallet(20, 200, seed=3)
+
+    def setUp(self):
+        self.wallet = self.sw.wallet
+        self.config = make_config()
+        self.coins = self.wallet.get_spendable_coins(None, self.config)
+        self.payouts = [(addr, 10000 + i) for i, addr in enumerate(random_addresses(1500, seed=1))]
+
+    def check(self, builder, txs, chunks):
+        self.assertEqual(len(chunks), len(txs))
+        paid, spent = [], set()
+        for tx, chunk in zip(txs, chunks):
+            self.assertTrue(tx.is_complete())
+            size = len(tx.raw) // 2
+            self.assertLessEqual(size, builder.max_tx_size)
+            # The estimate allows for the longest signatures
+            self.assertLessEqual(size, chunk.size)
+            self.assertGreater(size, chunk.size - 3 * len(tx.inputs()))
+            self.assertEqual(chunk.fee, tx.get_fee())
+            self.assertGreaterEqual(tx.get_fee(), size)
+            outputs = tx.outputs()
+            if chunk.change:
+                self.assertEqual((builder.change_addr, chunk.change), outputs[-1][1:])
+                outputs = outputs[:-1]
+            paid += [(addr, value) for _, addr, value in outputs]
+            for txin in tx.inputs():
+                prevout = (txin['prevout_hash'], txin['prevout_n'])
+                self.assertNotIn(prevout, spent)
+                spent.add(prevout)
+        self.assertEqual(self.payouts, paid)
+
+    def test_split(self):
+        builder = PayoutBuilder(self.wallet, self.coins, self.payouts, lambda size: size,
+                                max_tx_size=10000)
+        chunks = builder.plan()
+        self.assertGreater(len(chunks), 5)
+        self.assertFalse(any(chunk.parents for chunk in chunks))
+        txs = builder.make_transactions(None, max_workers=4)
+        self.check(builder, txs, chunks)
+        unsigned = builder.make_transactions(sign=False)
+        self.assertFalse(any(tx.is_complete() for tx in unsigned))
+
+    def test_chained_change(self):
+        coin = max(self.coins, key=lambda c: c['value'])
+        self.assertGreater(coin['value'], 2 * sum(v for _, v in self.payouts))
+        builder = PayoutBuilder(self.wallet, [coin], self.payouts, lambda size: size, max_tx_size=10000)
+        chunks = builder.plan()
+        self.assertEqual([[]] + [[k] for k in range(len(chunks) - 1)], [chunk.parents for chunk in chunks])
+        txs = builder.make_transactions(None)
+        self.check(builder, txs, chunks)
+        for parent, child in zip(txs, txs[1:]):
+            self.assertEqual([(parent.txid(), len(parent.outputs()) - 1)],
+                             [(txin['prevout_hash'], txin['prevout_n']) for txin in child.inputs()])
+        with self.assertRaises(ValueError):
+            builder.make_transactions(sign=False)
+
+    def test_not_enough(self):
+        coins = sorted(self.coins, key=lambda c: c['value'])[:2]
+        payouts = [(addr, 10 ** 8) for addr in random_addresses(100)]
+        with self.assertRaises(NotEnoughFunds):
+            PayoutBuilder(self.wallet, coins, payouts, lambda size: size).plan()
+        with self.assertRaises(ValueError):
+            PayoutBuilder(self.wallet, self.coins, self.payouts, lambda size: size, max_tx_size=100).plan()
+
+    def test_command(self):
+        from ..commands import Commands
+        commands = Commands(self.config, self.wallet, None)
+        csv = '\n'.join('{},{}'.format(addr.to_ui_string(), '0.0001') for addr, _ in self.payouts[:300])
+        raw = commands.payout(csv, feerate='2', max_tx_size=5000)
+        txs = [Transaction(r) for r in raw]
+        self.assertGreater(len(txs), 1)
+        self.assertTrue(all(tx.is_complete() and len(tx.raw) // 2 <= 5000 for tx in txs))
+        self.assertEqual(300, sum(1 for tx in txs for _, addr, _ in tx.outputs() if addr != txs[0].outputs()[-1][1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
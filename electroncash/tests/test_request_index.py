@@ -0,0 +1,105 @@
+import time
+import unittest
+from unittest import mock
+
+from ..benchmarks import synthetic
+from ..bitcoin import TYPE_ADDRESS
+from ..paymentrequest import PR_EXPIRED, PR_PAID, PR_UNCONFIRMED, PR_UNKNOWN, PR_UNPAID
+from ..request_index import RequestStatusIndex
+from .synthetic_wallet import foreign_tx, make_config, make_wallet
+
+
+class TestRequestStatusIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sw = make_wallet(30, 200, seed=7, n_unused=10)
+
+    def setUp(self):
+        self.wallet = self.sw.wallet
+        self.wallet.storage.put('stored_height', synthetic.FIRST_HEIGHT + 100)
+        self.config = make_config()
+        used = [a for a in self.wallet.get_receiving_addresses() if self.wallet.get_address_history(a)]
+        unused = self.wallet.get_unused_addresses()
+        self.paid, self.unpaid = used[0], used[1]
+        self.pending, self.expired = unused[0], unused[1]
+        now = int(time.time())
+        for addr, amount, t, exp in ((self.paid, 1000, now, None), (self.unpaid, 10**15, now, 3600),
+                                     (self.pending, 5000, now, 3600), (self.expired, 5000, now - 7200, 3600)):
+            req = self.wallet.make_payment_request(addr, amount, 'test', exp)
+            req['time'] = t
+            self.wallet.add_payment_request(req, self.config, set_address_label=False, save=False)
+
+    def tearDown(self):
+        for addr in list(self.wallet.receive_requests):
+            self.wallet.remove_payment_request(addr, self.config, save=False)
+
+    def statuses(self):
+        return {addr: self.wallet.get_request_status(addr)[0] for addr in self.wallet.receive_requests}
+
+    def test_statuses_and_queries(self):
+        self.assertEqual({self.paid: PR_PAID, self.unpaid: PR_UNPAID, self.pending: PR_UNPAID,
+                          self.expired: PR_EXPIRED}, self.statuses())
+        self.assertEqual(PR_UNKNOWN, self.wallet.get_request_status(self.wallet.get_unused_addresses()[5]))
+        self.assertEqual({PR_PAID: 1, PR_UNPAID: 2, PR_EXPIRED: 1, PR_UNCONFIRMED: 0},
+                         self.wallet.get_request_counts())
+        everything = [r['address'] for r in self.wallet.get_sorted_requests(self.config)]
+        self.assertEqual(4, len(everything))
+        self.assertEqual(everything[1:3], [r['address'] for r in self.wallet.get_sorted_requests(
+            self.config, offset=1, limit=2)])
+        unpaid = self.wallet.get_sorted_requests(self.config, statuses=(PR_UNPAID,))
+        self.assertEqual({self.unpaid, self.pending}, {r['address'] for r in unpaid})
+        self.assertTrue(all(r['status'] == PR_UNPAID for r in unpaid))
+
+    def test_payment_and_expiry(self):
+        index = self.wallet.request_index
+        index.counts()
+        tx = foreign_tx([(TYPE_ADDRESS, self.pending, 6000)])
+        tx_hash = tx.txid_fast()
+        self.wallet.receive_history_callback(self.pending, [(tx_hash, 0)], {})
+        self.wallet.receive_tx_callback(tx_hash, tx, 0)
+        self.assertEqual(PR_UNCONFIRMED, self.statuses()[self.pending])
+        self.assertEqual([self.pending], index.query((PR_UNCONFIRMED,)))
+
+        height = synthetic.FIRST_HEIGHT + 100
+        self.wallet.verified_tx[tx_hash] = (height, 0, 0, None)
+        self.wallet._update_request_statuses_touched_by_tx(tx_hash)
+        self.assertIn(self.pending, index.query((PR_PAID,)))
+
+        # The unpaid request expires in its time, without being looked at again
+        with mock.patch.object(self.wallet, '_get_payment_received', side_effect=AssertionError), \
+                mock.patch('time.time', return_value=time.time() + 7200):
+            self.assertEqual({self.unpaid, self.expired}, set(index.query((PR_EXPIRED,))))
+
+        self.wallet.remove_transaction(tx_hash)
+        self.wallet.verified_tx.pop(tx_hash)
+        self.wallet.receive_history_callback(self.pending, [], {})
+        self.assertEqual(PR_UNPAID, self.statuses()[self.pending])
+
+    def test_saved(self):
+        saved = self.wallet.request_index.dump()
+        self.assertEqual(4, len(saved))
+        # A new index from what was saved does not look at the wallet's txs
+        index = RequestStatusIndex(self.wallet, saved)
+        with mock.patch.object(self.wallet, '_get_payment_received', side_effect=AssertionError):
+            self.assertEqual({addr: s for addr, s in self.statuses().items()},
+                             {addr: index.get(addr)[0] for addr in self.wallet.receive_requests})
+            self.assertEqual(self.wallet.request_index.counts(), index.counts())
+
+    def test_saved_for_other_txs(self):
+        # The statuses are saved with the hash of the txids they were worked out from
+        self.wallet.save_transactions()
+        self.wallet.save_request_statuses()
+        self.assertEqual(self.wallet.storage.get('ct_txid_hash'),
+                         self.wallet.storage.get('payment_requests_txid_hash'))
+        # Saved statuses that came from another set of txs are all looked at again
+        expected = self.wallet.request_index.counts()
+        index = RequestStatusIndex(self.wallet, self.wallet.request_index.dump())
+        index.invalidate_all()
+        with mock.patch.object(self.wallet, '_get_payment_received', wraps=self.wallet._get_payment_received) as m:
+            self.assertEqual(expected, index.counts())
+        self.assertEqual(4, m.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
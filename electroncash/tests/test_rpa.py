@@ -0,0 +1,275 @@
+import os
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest import mock
+
+from .. import bitcoin
+from ..address import Address
+from ..bitcoin import TYPE_ADDRESS, bip32_root
+from ..keystore import from_master_key
+from ..rpa import paycode
+from ..rpa.rpa_manager import RpaManager
+from ..transaction import Transaction
+from ..wallet import RpaWallet
+
+
+class _MockRpaWallet:
+    def __init__(self, keystore):
+        self.keystore = keystore
+
+    def derive_pubkeys(self, c, i):
+        return self.keystore.derive_pubkey(c, i)
+
+    def export_private_key_from_index(self, index, password):
+        pk, compressed = self.keystore.get_private_key(index, password)
+        return bitcoin.serialize_privkey(pk, compressed, 'p2pkh')
+
+
+class TestRpaKeyExtraction(unittest.TestCase):
+
+    def setUp(self):
+        xprv, _ = bip32_root(os.urandom(32), 'standard')
+        self.wallet = _MockRpaWallet(from_master_key(xprv))
+        self.scan_keys = paycode.get_rpa_scan_keys(self.wallet)
+
+    def _make_rpa_tx(self):
+        """Returns a raw tx paying to the wallet's paycode, plus the destination address"""
+        sender_priv = os.urandom(32)
+        sender_pub = bytes.fromhex(bitcoin.public_key_from_private_key(sender_priv, True))
+        prevout_hash = os.urandom(32).hex()
+        scan_pubkey = bytes.fromhex(self.wallet.derive_pubkeys(0, 0))
+        secret = paycode._calculate_paycode_shared_secret(int.from_bytes(sender_priv, 'big'), scan_pubkey,
+                                                          prevout_hash + '0')
+        dest = paycode._generate_address_from_pubkey_and_secret(self.scan_keys.spend_pubkey, secret)
+        txin = {'prevout_hash': prevout_hash, 'prevout_n': 0, 'type': 'unknown', 'address': None, 'value': 1000,
+                'sequence': 0xffffffff, 'scriptSig': '47' + '30' * 71 + '21' + sender_pub.hex(),
+                'x_pubkeys': [], 'num_sig': 0, 'signatures': []}
+        outputs = [(TYPE_ADDRESS, dest, 1000), (TYPE_ADDRESS, Address.from_pubkey(sender_pub), 546)]
+        return Transaction.from_io([txin], outputs).serialize(), dest
+
+    def _address_for_wif(self, wif):
+        txin_type, privkey, compressed = bitcoin.deserialize_privkey(wif)
+        return Address.from_pubkey(bitcoin.public_key_from_private_key(privkey, compressed))
+
+    def test_extract_single(self):
+        raw_tx, dest = self._make_rpa_tx()
+        keys = paycode.extract_private_keys_from_transaction(self.wallet, raw_tx)
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(self._address_for_wif(keys[0]), dest)
+        # Passing in precomputed scan keys gives the same result
+        self.assertEqual(keys, paycode.extract_private_keys_from_transaction(self.wallet, raw_tx,
+                                                                             scan_keys=self.scan_keys))
+
+    def test_extract_not_ours(self):
+        other = _MockRpaWallet(from_master_key(bip32_root(os.urandom(32), 'standard')[0]))
+        raw_tx, _ = self._make_rpa_tx()
+        self.assertEqual(paycode.extract_private_keys_from_transaction(other, raw_tx), [])
+
+    def test_extract_batch(self):
+        txs = [self._make_rpa_tx() for _ in range(6)]
+        raw_txs = [raw_tx for raw_tx, _ in txs]
+        expected = [dest for _, dest in txs]
+        serial = paycode.extract_private_keys_from_transactions(self.wallet, raw_txs)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            parallel = paycode.extract_private_keys_from_transactions(self.wallet, raw_txs, executor=executor)
+        self.assertEqual(serial, parallel)
+        self.assertEqual([self._address_for_wif(k) for k in serial], expected)
+        self.assertEqual(paycode.extract_private_keys_from_transactions(self.wallet, []), [])
+
+
+class _InlineExecutor:
+    """Runs the extraction jobs synchronously, so the tests needn't wait on them"""
+    def submit(self, fn, *args, **kwargs):
+        f = Future()
+        try:
+            f.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            f.set_exception(e)
+        return f
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class _FakeNetwork:
+    def __init__(self, server_height):
+        self.server_height = server_height
+        self.sent = []  # (requests, callback)
+
+    def get_server_height(self):
+        return self.server_height
+
+    def send(self, requests, callback):
+        self.sent.append((requests, callback))
+
+    def trigger_callback(self, *args):
+        pass
+
+
+class TestRpaManagerWindows(unittest.TestCase):
+    """The block windows pipeline, with the server and the key extraction faked out"""
+
+    def setUp(self):
+        self.wallet = self._make_wallet(rpa_height=100)
+        self.network = _FakeNetwork(server_height=139)
+        self.mgr = self._make_manager()
+
+    def _make_wallet(self, rpa_height):
+        wallet = mock.Mock(spec=RpaWallet)
+        wallet.rpa_height = rpa_height
+        wallet.rpa_pwd = None
+        wallet.has_password.return_value = False
+        wallet.get_grind_string.return_value = 'ff'
+        wallet.get_rpa_scan_keys.return_value = 'scan_keys'
+        wallet.extract_private_keys_from_transactions.side_effect = self._extract
+        wallet.import_private_keys.side_effect = lambda keys, pw: keys
+        return wallet
+
+    def _make_manager(self):
+        mgr = RpaManager(self.wallet, self.network)
+        mgr.executor.shutdown()
+        mgr.executor = _InlineExecutor()
+        mgr.num_workers = 1
+        mgr.blocks_per_window = 10
+        mgr.print_error = lambda *args: None
+        return mgr
+
+    @staticmethod
+    def _extract(raw_txs, password, scan_keys=None):
+        if 'bad' in raw_txs:
+            raise ValueError('bad tx')
+        return ['key_' + raw for raw in raw_txs]
+
+    def _history_requests(self):
+        """Pops the get_history requests sent since the last call; returns their start heights and the callback"""
+        starts, callback = [], None
+        for requests, cb in self.network.sent:
+            for method, params in requests:
+                if method == 'blockchain.reusable.get_history':
+                    starts.append(params[0])
+                    callback = cb
+        self.network.sent.clear()
+        return starts, callback
+
+    def _reply_history(self, start, txids):
+        self.mgr.rpa_phase_2({'method': 'blockchain.reusable.get_history', 'params': [start, 10, 'ff'],
+                              'result': [{'tx_hash': txid, 'height': start} for txid in txids]})
+        requests, callback = self.network.sent.pop()
+        self.assertEqual([params[0] for _, params in requests], txids)
+        return callback
+
+    def _reply_tx(self, callback, txid, raw_tx):
+        callback({'method': 'blockchain.transaction.get', 'params': [txid], 'result': raw_tx})
+
+    def _fail_history(self, start):
+        self.mgr.rpa_phase_2({'method': 'blockchain.reusable.get_history', 'params': [start, 10, 'ff'],
+                              'error': {'message': 'oops'}})
+
+    def _imported(self):
+        return [c.args[0] for c in self.wallet.import_private_keys.call_args_list]
+
+    def test_windows_retire_in_order(self):
+        self.mgr.rpa_phase_1()
+        starts, _ = self._history_requests()
+        self.assertEqual(starts, [100, 110, 120, 130])
+        # The second window is fully fetched first, but can't retire before the first one
+        cb = self._reply_history(110, ['b'])
+        self._reply_tx(cb, 'b', 'raw_b')
+        self.mgr.rpa_phase_4()
+        self.assertEqual(self.wallet.rpa_height, 100)
+        self.assertEqual(self._imported(), [])
+        cb = self._reply_history(100, ['a'])
+        self.mgr.rpa_phase_4()
+        self.assertEqual(self.wallet.rpa_height, 100)  # still waiting on tx 'a'
+        self._reply_tx(cb, 'a', 'raw_a')
+        self.mgr.rpa_phase_4()
+        self.assertEqual(self.wallet.rpa_height, 119)
+        self.assertEqual(self._imported(), [['key_raw_a'], ['key_raw_b']])
+        self.assertEqual(list(self.mgr.windows), [120, 130])
+        # More windows are requested as the first ones retire
+        self.network.server_height = 159
+        self.mgr.rpa_phase_1()
+        self.assertEqual(self._history_requests()[0], [140, 150])
+        for start in (120, 130, 140, 150):
+            self._reply_history(start, [])
+        self.mgr.rpa_phase_4()
+        self.assertEqual(self.wallet.rpa_height, 159)
+        self.assertEqual(self.mgr.windows, {})
+        self.mgr.rpa_phase_1()
+        self.assertTrue(self.mgr.up_to_date)
+        self.assertEqual(self.network.sent, [])
+
+    def test_resume_height(self):
+        self.mgr.rpa_phase_1()
+        self._history_requests()
+        self._reply_history(100, [])
+        self._reply_history(120, [])  # after a gap: doesn't count
+        self.mgr.rpa_phase_4()
+        self.assertEqual(self.wallet.rpa_height, 109)
+        # The wallet is restarted with windows still in flight: scanning resumes at the persisted height
+        self.mgr.stop()
+        self.mgr = self._make_manager()
+        self.mgr.rpa_phase_1()
+        self.assertEqual(self._history_requests()[0], [109, 119, 129, 139])
+        self.assertEqual(self.mgr.windows[139].count, 1)  # only up to the tip
+
+    def test_restart_after_error(self):
+        self.mgr.retry_delay = 0.0
+        self.mgr.rpa_phase_1()
+        self._history_requests()
+        self._reply_history(100, [])
+        cb = self._reply_history(110, ['b'])
+        # A failed window is dropped along with the ones after it; the windows before it still retire
+        self._fail_history(120)
+        self.assertEqual(list(self.mgr.windows), [100, 110])
+        self._fail_history(130)  # stale, already dropped
+        self.assertEqual(self.mgr.failures, 1)
+        self.mgr.rpa_phase_1()
+        self.assertEqual(self._history_requests()[0], [120, 130])
+        # A failed extraction starts the window over too
+        self._reply_tx(cb, 'b', 'bad')
+        self.mgr.rpa_phase_4()
+        self.assertEqual(self.wallet.rpa_height, 109)
+        self.assertEqual(list(self.mgr.windows), [])
+        self.assertEqual((self.mgr.failed_height, self.mgr.failures), (110, 1))
+        self.mgr.rpa_phase_1()  # nothing in flight: restarts at the persisted height
+        self.assertEqual(self._history_requests()[0], [109, 119, 129, 139])
+        # Retiring past the window that failed resets the failure count
+        cb = self._reply_history(109, ['b'])
+        self._reply_tx(cb, 'b', 'raw_b')
+        self.mgr.rpa_phase_4()
+        self.assertEqual(self.wallet.rpa_height, 118)
+        self.assertEqual((self.mgr.failed_height, self.mgr.failures), (None, 0))
+
+    def test_backoff_and_give_up(self):
+        self.mgr.rpa_phase_1()
+        self._history_requests()
+        self._fail_history(100)
+        # Not re-requested until the retry delay is up, which doubles with each consecutive failure
+        delay = self.mgr.retry_time - time.time()
+        self.assertTrue(0 < delay <= self.mgr.retry_delay)
+        self.mgr.rpa_phase_1()
+        self.assertEqual(self.network.sent, [])
+        for n in range(2, self.mgr.max_window_retries + 1):
+            self.mgr.retry_time = 0.0
+            self.mgr.rpa_phase_1()
+            self.assertEqual(self._history_requests()[0][0], 100)
+            self._fail_history(100)
+            delay = self.mgr.retry_time - time.time()
+            self.assertTrue(self.mgr.retry_delay * 2 ** (n - 2) < delay <= self.mgr.retry_delay * 2 ** (n - 1))
+            self.assertIsNone(self.mgr.error)
+        # One more and we give up, rather than retrying the same window forever
+        self.mgr.retry_time = 0.0
+        self.mgr.rpa_phase_1()
+        self._history_requests()
+        self._fail_history(100)
+        self.assertIn('oops', self.mgr.error)
+        self.mgr.retry_time = 0.0
+        self.mgr.rpa_phase_1()
+        self.assertEqual(self.network.sent, [])
+        self.assertEqual(self.wallet.rpa_height, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,12 @@
 import json
+import threading
 import unittest
 
 
 from .. import address
+from .. import bitcoin
 from .. import slp
+from ..transaction import Transaction
 
 
 script_tests_json = r'''
@@ -614,3 +617,145 @@ class SLPTests(unittest.TestCase):
 
         print("Completed %d OP_RETURN *build* tests"%ctr)
 
+
+
+class _MockStorage(dict):
+    def put(self, key, value):
+        if value is None:
+            self.pop(key, None)
+        else:
+            self[key] = value
+
+
+class _MockWallet:
+    def __init__(self, my_addresses):
+        self.lock = threading.RLock()
+        self.transactions = {}
+        self.storage = _MockStorage()
+        self.my_addresses = set(my_addresses)
+
+    def diagnostic_name(self):
+        return "mock"
+
+    def is_mine(self, addr):
+        return addr in self.my_addresses
+
+
+class SLPWalletDataTests(unittest.TestCase):
+
+    def setUp(self):
+        self.mine = address.Address.from_string("bitcoincash:qr3l6uufcuwm9prgpa6cfxnez87fzstxescngr64l4")
+        self.wallet = _MockWallet([self.mine])
+        self.slp_txids = set()
+        for i in range(30):
+            outputs = []
+            if i % 3 == 0:
+                outputs.append(slp.Build.GenesisOpReturnOutput_V1('TOK', 'Token %d' % i, '', '', 0, None, 100 + i))
+            outputs.append((bitcoin.TYPE_ADDRESS, self.mine, 1000 + i))
+            txin = {'prevout_hash': '%064x' % (i + 1), 'prevout_n': 0, 'type': 'unknown', 'address': None,
+                    'value': 5000, 'sequence': 0xffffffff, 'scriptSig': '00', 'x_pubkeys': [], 'num_sig': 0,
+                    'signatures': []}
+            tx = Transaction.from_io([txin], outputs)
+            txid = tx.txid()
+            self.wallet.transactions[txid] = Transaction(tx.serialize())
+            if i % 3 == 0:
+                self.slp_txids.add(txid)
+
+    def _expected_token_quantities(self):
+        wd = slp.WalletData(self.wallet)
+        with self.wallet.lock:
+            for txid, tx in self.wallet.transactions.items():
+                wd.add_tx(txid, Transaction(tx.raw))
+        return wd.token_quantities
+
+    def test_rebuild(self):
+        wd = slp.WalletData(self.wallet)
+        wd.rebuild()
+        self.assertFalse(wd.need_rebuild)
+        self.assertEqual(set(wd.token_quantities), self.slp_txids)
+        self.assertEqual(wd.token_quantities, self._expected_token_quantities())
+
+    def test_background_rebuild(self):
+        wd = slp.WalletData(self.wallet)
+        wd.REBUILD_SYNCH_MAX = 0
+        wd.REBUILD_CHUNK_SIZE = 7
+        self.assertFalse(wd.load())  # no data at all -> need full rebuild
+        wd.start_rebuild()
+        self.assertIsNotNone(wd.rebuild_thread)
+        wd.rebuild_thread.join()
+        self.assertFalse(wd.need_rebuild)
+        self.assertEqual(wd.token_quantities, self._expected_token_quantities())
+        self.assertNotIn('pending', self.wallet.storage['slp'])
+
+    def test_load_flags_only_bad_txids(self):
+        wd = slp.WalletData(self.wallet)
+        wd.rebuild()
+        wd.save()
+        data = self.wallet.storage['slp']
+        bad_txid = sorted(self.slp_txids)[0]
+        data['token_quantities'][bad_txid][0][1] = 'not a number'
+        wd = slp.WalletData(self.wallet)
+        self.assertFalse(wd.load())
+        self.assertEqual(wd.pending_txids, {bad_txid})
+        self.assertNotIn(bad_txid, wd.token_quantities)
+        wd.start_rebuild()
+        self.assertFalse(wd.need_rebuild)
+        self.assertEqual(wd.token_quantities, self._expected_token_quantities())
+
+
+class SLPRebuildSpendableTests(unittest.TestCase):
+
+    def test_pending_coins_not_spendable(self):
+        from unittest import mock
+        from .synthetic_wallet import make_config, make_wallet
+        wallet = make_wallet(5, 30, seed=1).wallet
+        config = make_config()
+        coins = wallet.get_spendable_coins(None, config)
+        self.assertTrue(coins)
+        release = threading.Event()
+        parse = slp.WalletData._parse_candidate
+
+        def blocked_parse(raw):
+            release.wait(10)
+            return parse(raw)
+        wd = wallet.slp
+        wd.REBUILD_SYNCH_MAX = 0
+        with mock.patch.object(slp.WalletData, '_parse_candidate', staticmethod(blocked_parse)):
+            wd.pending_txids = None  # as after load() found no data
+            wd.start_rebuild()
+            try:
+                self.assertIsNotNone(wd.rebuild_thread)
+                # We can't tell yet which coins have tokens on them
+                self.assertEqual([], wallet.get_spendable_coins(None, config))
+                self.assertTrue(wallet.get_utxos(exclude_slp=False))
+            finally:
+                release.set()
+                wd.rebuild_thread.join()
+        self.assertEqual(coins, wallet.get_spendable_coins(None, config))
+
+    def test_rebuild_resumes_on_start_threads(self):
+        from unittest import mock
+        from .synthetic_wallet import make_wallet
+        wallet = make_wallet(5, 30, seed=1).wallet
+        release = threading.Event()
+        parse = slp.WalletData._parse_candidate
+
+        def blocked_parse(raw):
+            release.wait(10)
+            return parse(raw)
+        wd = wallet.slp
+        wd.REBUILD_SYNCH_MAX = 0
+        wd.REBUILD_CHUNK_SIZE = 5
+        with mock.patch.object(slp.WalletData, '_parse_candidate', staticmethod(blocked_parse)):
+            wd.pending_txids = None  # as after load() found no data
+            wd.start_rebuild()
+            threading.Timer(0.1, release.set).start()
+            wallet.stop_threads()  # stops after the chunk in progress
+        self.assertTrue(wd.need_rebuild)
+        self.assertTrue(wd.pending_txids)
+        wallet.start_threads(None)
+        t = wd.rebuild_thread
+        self.assertIsNotNone(t)
+        t.join()
+        self.assertFalse(wd.need_rebuild)
+        self.assertFalse(wd.pending_txids)
@@ -0,0 +1,136 @@
+import threading
+import unittest
+
+from ..subscriptions import ScripthashSubscriptions
+
+SH1 = '11' * 32
+SH2 = '22' * 32
+STATUS = 'ab' * 32
+
+
+class TestScripthashSubscriptions(unittest.TestCase):
+
+    def setUp(self):
+        self.subs = ScripthashSubscriptions()
+        self.cb1 = lambda r: None
+        self.cb2 = lambda r: None
+
+    def test_refcounting(self):
+        self.assertEqual((True, None), self.subs.add(SH1, self.cb1))
+        # Second wallet: no new server subscription, and nothing to tell it yet
+        self.assertEqual((False, None), self.subs.add(SH1, self.cb2))
+        self.assertEqual((False, None), self.subs.add(SH1, self.cb2))
+        self.assertEqual([self.cb1, self.cb2], self.subs.get_callbacks(SH1))
+        self.assertFalse(self.subs.remove(SH1, self.cb1))
+        self.assertTrue(self.subs.remove(SH1, self.cb2))
+        self.assertNotIn(SH1, self.subs)
+        self.assertFalse(self.subs.remove(SH1, self.cb2))
+
+    def test_status_cache(self):
+        self.subs.add(SH1, self.cb1)
+        self.subs.on_status(SH1, STATUS)
+        self.assertEqual(STATUS, self.subs.get_status(SH1))
+        self.assertEqual((False, self.subs.make_response(SH1, STATUS)), self.subs.add(SH1, self.cb2))
+        self.subs.on_status(SH1, None)  # no history
+        self.assertEqual((False, self.subs.make_response(SH1, None)), self.subs.add(SH1, self.cb2))
+        # Keys are stored in binary
+        self.assertEqual([bytes.fromhex(SH1)], list(self.subs.status))
+        # Garbage from the server and notifications for unknown scripthashes are ignored
+        self.subs.on_status(SH1, 'not hex')
+        self.subs.on_status(SH2, STATUS)
+        self.assertIsNone(self.subs.get_status(SH1))
+        self.assertNotIn(SH2, self.subs)
+
+    def test_error_allows_retry(self):
+        self.subs.add(SH1, self.cb1)
+        self.subs.on_error(SH1)
+        self.assertEqual((True, None), self.subs.add(SH1, self.cb2))
+
+    def test_resubscribe_backlog(self):
+        self.subs.add(SH1, self.cb1)
+        self.subs.add(SH2, self.cb1)
+        self.subs.on_status(SH1, STATUS)
+        self.subs.begin_resubscribe()
+        self.assertIsNone(self.subs.get_status(SH1))
+        # Another wallet joining in the meantime jumps the queue, once
+        self.assertEqual((True, None), self.subs.add(SH1, self.cb2))
+        self.assertEqual((False, None), self.subs.add(SH1, self.cb1))
+        self.assertEqual(2, self.subs.discard_callback(self.cb1))  # SH2 is now defunct
+        self.assertEqual([], self.subs.take_backlog(10))
+        self.subs.begin_resubscribe()
+        self.assertEqual([SH1], self.subs.take_backlog(10))
+        self.assertEqual((False, None), self.subs.add(SH1, self.cb1))
+
+
+class TestNetworkFanout(unittest.TestCase):
+
+    class FakeInterface:
+        def __init__(self):
+            self.server = 'server'
+            self.responses = []
+            self.pending = 0
+
+        def get_responses(self):
+            r, self.responses = self.responses, []
+            return r
+
+        def num_pending(self):
+            return self.pending
+
+    def setUp(self):
+        from ..network import Network
+        net = self.net = Network.__new__(Network)
+        net.lock = threading.RLock()
+        net.interface_lock = threading.RLock()
+        net.pending_sends_lock = threading.RLock()
+        net.pending_sends = []
+        net.subscriptions, net.sub_cache, net.unanswered_requests = {}, {}, {}
+        net.scripthash_subs = ScripthashSubscriptions()
+        net.interface = self.FakeInterface()
+        net.debug = False
+        self.sent = []
+        net.queue_request = lambda method, params, *args, **kwargs: self.sent.append((method, params[0]))
+        net.print_error = lambda *args: None
+        self.got = {1: [], 2: []}
+        self.cb1 = lambda r: self.got[1].append(r['result'])
+        self.cb2 = lambda r: self.got[2].append(r['result'])
+
+    def respond(self, sh, status):
+        self.net.interface.responses.append((('blockchain.scripthash.subscribe', [sh], 0), {'result': status}))
+        self.net.process_responses(self.net.interface)
+
+    def test_two_wallets_one_subscription(self):
+        net = self.net
+        net.subscribe_to_scripthashes([SH1, SH2], self.cb1)
+        net.subscribe_to_scripthashes([SH1], self.cb2)
+        net.process_pending_sends()
+        self.assertEqual([('blockchain.scripthash.subscribe', SH1), ('blockchain.scripthash.subscribe', SH2)], self.sent)
+        self.respond(SH1, STATUS)
+        self.assertEqual([STATUS], self.got[1])
+        self.assertEqual([STATUS], self.got[2])
+        # A notification fans out to both as well
+        net.interface.responses.append((None, {'method': 'blockchain.scripthash.subscribe', 'params': [SH1, None]}))
+        net.process_responses(net.interface)
+        self.assertEqual([STATUS, None], self.got[2])
+        # Only the last wallet to leave unsubscribes from the server
+        del self.sent[:]
+        net.unsubscribe_from_scripthashes([SH1], self.cb1)
+        self.assertEqual([], net.pending_sends)
+        net.unsubscribe_from_scripthashes([SH1], self.cb2)
+        self.assertEqual([('blockchain.scripthash.unsubscribe', [SH1])], net.pending_sends[0][0])
+
+    def test_rate_limited_resubscribe(self):
+        net = self.net
+        shs = ['%064x' % i for i in range(net.RESUBSCRIBE_BATCH + 10)]
+        net.subscribe_to_scripthashes(shs, self.cb1)
+        net.process_pending_sends()
+        del self.sent[:]
+        net.scripthash_subs.begin_resubscribe()
+        net.interface.pending = net.RESUBSCRIBE_MAX_PENDING
+        net._resubscribe_some()
+        self.assertEqual([], self.sent)  # server is busy
+        net.interface.pending = 0
+        net._resubscribe_some()
+        self.assertEqual(net.RESUBSCRIBE_BATCH, len(self.sent))
+        net._resubscribe_some()
+        self.assertEqual(shs, [sh for _, sh in self.sent])
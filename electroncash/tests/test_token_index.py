@@ -0,0 +1,95 @@
+import unittest
+from collections import defaultdict
+
+from .. import token
+from ..address import Address
+from ..token_index import TokenIndex
+from .synthetic_wallet import make_wallet
+
+ADDR = Address.from_string('1FJEEB8ihPMbzs2SkLmr37dHyRFzakqUmo')
+ID1, ID2 = 'aa' * 32, 'bb' * 32
+
+
+def nft(id_hex, capability=0, commitment=b''):
+    td = token.OutputData(id=bytes.fromhex(id_hex)[::-1], amount=0, commitment=commitment,
+                          bitfield=token.Structure.HasNFT | capability)
+    assert td.id_hex == id_hex
+    return td
+
+
+def ft(id_hex, amount):
+    return token.OutputData(id=bytes.fromhex(id_hex)[::-1], amount=amount)
+
+
+class TestTokenIndex(unittest.TestCase):
+
+    def test_outputs_and_spends(self):
+        idx = TokenIndex()
+        idx.add_output('11' * 32 + ':0', ADDR, ft(ID1, 100))
+        idx.add_output('11' * 32 + ':1', ADDR, nft(ID1, token.Capability.Minting, b'\x01'))
+        idx.add_output('22' * 32 + ':0', ADDR, nft(ID2, token.Capability.Mutable))
+        # A spend may come in before the output it spends
+        idx.add_spend('33' * 32 + ':0', '44' * 32, ADDR)
+        idx.add_output('33' * 32 + ':0', ADDR, ft(ID1, 5))
+        b = idx.get_balances()
+        self.assertEqual({ID1, ID2}, set(b))
+        self.assertEqual((100, {'11' * 32 + ':1': b'\x01'}, 1, 0, 2), b[ID1])
+        self.assertEqual(1, b[ID2].mutable)
+
+        idx.add_spend('22' * 32 + ':0', '55' * 32, ADDR)
+        self.assertEqual([ID1], list(idx.categories()))
+        idx.remove_spends_by('55' * 32)
+        self.assertEqual({ID1, ID2}, set(idx.categories()))
+        idx.remove_spends_by('44' * 32)
+        self.assertEqual(105, idx.get_balance(ID1).fungible)
+        self.assertEqual(3, len(idx.get_utxos(ID1)))
+
+        idx.remove_tx('11' * 32)
+        self.assertEqual((5, {}, 0, 0, 1), idx.get_balance(ID1))
+        idx.remove_tx('22' * 32)
+        idx.remove_tx('33' * 32)
+        self.assertFalse(idx.get_balances())
+        self.assertFalse(idx.has_address(ADDR))
+
+
+class TestWalletTokenIndex(unittest.TestCase):
+
+    def _check(self, wallet):
+        # The index agrees with the full scan
+        scanned = wallet.get_utxos(tokens_only=True)
+        fungible = defaultdict(int)
+        for x in scanned:
+            fungible[x['token_data'].id_hex] += x['token_data'].amount
+        self.assertEqual(dict(fungible), {k: b.fungible for k, b in wallet.get_token_balances().items()})
+        key = lambda x: (x['prevout_hash'], x['prevout_n'])
+        self.assertEqual(sorted(scanned, key=key), sorted(wallet.get_token_utxos(), key=key))
+        for id_hex in fungible:
+            self.assertEqual(sorted((x for x in scanned if x['token_data'].id_hex == id_hex), key=key),
+                             sorted(wallet.get_token_utxos(id_hex), key=key))
+        return scanned
+
+    def test_wallet(self):
+        sw = make_wallet(20, 300, 3, seed=3)
+        wallet = sw.wallet
+        scanned = self._check(wallet)
+        self.assertTrue(scanned)
+
+        # Remove and add back a tx that received tokens
+        tx_hash = scanned[0]['prevout_hash']
+        wallet.remove_transaction(tx_hash)
+        self.assertNotIn(tx_hash, [x['prevout_hash'] for x in wallet.get_token_utxos()])
+        wallet.add_transaction(tx_hash, wallet.transactions[tx_hash])
+        self.assertEqual(scanned, self._check(wallet))
+
+        # Reloading rebuilds the same index
+        wallet.load_transactions()
+        self._check(wallet)
+
+        # Addresses that never had tokens have no token deltas
+        addr = next(a for a in wallet.get_addresses() if not wallet.token_index.has_address(a))
+        for tx_hash, _height in wallet.get_address_history(addr):
+            self.assertEqual({}, wallet.get_tx_tokens_delta(tx_hash, addr))
+
+
+if __name__ == '__main__':
+    unittest.main()
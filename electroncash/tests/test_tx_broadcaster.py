@@ -0,0 +1,164 @@
+import threading
+import unittest
+from unittest import mock
+
+from ..benchmarks import synthetic
+from ..bitcoin import TYPE_ADDRESS
+from ..transaction import Transaction
+from ..tx_broadcaster import TxBroadcaster
+from .synthetic_wallet import foreign_tx
+
+
+def make_tx(prevout_hash, n=0, value=10000):
+    return foreign_tx([(TYPE_ADDRESS, synthetic.FOREIGN_ADDRESS, value)], prevout_hash, n)
+
+
+class MockNetwork:
+    ''' Records broadcasts instead of sending them; the test answers them. '''
+
+    transmogrify_broadcast_response_for_gui = staticmethod(lambda msg: 'rejected: ' + msg)
+
+    def __init__(self):
+        self.interface = 'main'
+        self.interfaces = ['main', 'other1', 'other2']
+        self.sent = []  # (txid, interface, callback)
+
+    def get_interfaces(self, *, interfaces=False):
+        return list(self.interfaces)
+
+    def queue_request(self, method, params, interface=None, callback=None):
+        assert method == 'blockchain.transaction.broadcast'
+        self.sent.append((Transaction(params[0]).txid(), interface or self.interface, callback))
+
+    def answer(self, txid, error=None, result=None):
+        for i, (t, _interface, cb) in enumerate(self.sent):
+            if t == txid:
+                del self.sent[i]
+                r = {'method': 'blockchain.transaction.broadcast'}
+                if error:
+                    r['error'] = {'code': 1, 'message': error}
+                else:
+                    r['result'] = result or txid
+                cb(r)
+                return
+        raise AssertionError('no such request: ' + txid)
+
+    def sent_txids(self):
+        return [t for t, _, _ in self.sent]
+
+    def sent_to(self, txid):
+        return next(i for t, i, _ in self.sent if t == txid)
+
+
+class TestTxBroadcaster(unittest.TestCase):
+
+    def setUp(self):
+        self.network = MockNetwork()
+        self.broadcaster = TxBroadcaster(self.network, max_in_flight=3)
+        self.results = []
+
+    def callback(self, txid, error):
+        self.results.append((txid, error))
+
+    def submit(self, txs):
+        self.broadcaster.submit(txs, self.callback)
+        # Nothing goes out until the network thread runs its jobs
+        self.assertFalse(self.network.sent)
+        self.broadcaster.run()
+
+    def start_network_thread(self):
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(0.005):
+                self.broadcaster.run()
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+
+        def cleanup():
+            stop.set()
+            t.join()
+        self.addCleanup(cleanup)
+
+    def test_pipelined(self):
+        txs = [make_tx('%02x' % i * 32) for i in range(5)]
+        self.submit(txs)
+        # Three go out at once, the rest as answers come in
+        self.assertEqual([tx.txid() for tx in txs[:3]], self.network.sent_txids())
+        self.network.answer(txs[1].txid())
+        self.assertEqual([(txs[1].txid(), None)], self.results)
+        self.assertEqual(3, len(self.network.sent))
+        for tx in txs[:1] + txs[2:]:
+            self.network.answer(tx.txid())
+        self.assertEqual({tx.txid() for tx in txs}, {txid for txid, _ in self.results})
+        self.assertEqual(0, self.broadcaster.pending_count())
+
+    def test_chains(self):
+        parent = make_tx('aa' * 32)
+        child = make_tx(parent.txid())
+        grandchild = make_tx(child.txid())
+        other = make_tx('bb' * 32)
+        # Children given first still wait for their parents
+        self.submit([grandchild, child, parent, other])
+        self.assertEqual([parent.txid(), other.txid()], self.network.sent_txids())
+        self.network.answer(parent.txid())
+        self.assertEqual([other.txid(), child.txid()], self.network.sent_txids())
+        self.assertEqual('main', self.network.sent_to(child.txid()))
+        self.network.answer(child.txid(), 'txn-already-known')
+        self.network.answer(grandchild.txid())
+        self.assertEqual([(parent.txid(), None), (child.txid(), None), (grandchild.txid(), None)], self.results)
+
+    def test_rejected_takes_descendants(self):
+        parent = make_tx('aa' * 32)
+        child = make_tx(parent.txid())
+        grandchild = make_tx(child.txid())
+        self.submit([parent, child, grandchild])
+        self.network.answer(parent.txid(), 'the transaction was rejected by network rules.\n\nmin relay fee not met')
+        self.assertEqual([parent.txid(), child.txid(), grandchild.txid()], [txid for txid, _ in self.results])
+        self.assertTrue(self.results[0][1].startswith('rejected: '))
+        self.assertIn(parent.txid(), self.results[2][1])
+        self.assertFalse(self.network.sent)
+        self.assertEqual(0, self.broadcaster.pending_count())
+
+    def test_retry_elsewhere(self):
+        tx = make_tx('cc' * 32)
+        self.submit([tx])
+        self.network.answer(tx.txid(), 'daemon error: connection refused')
+        self.assertEqual('other1', self.network.sent_to(tx.txid()))
+        # No answer at all: given up on after request_timeout, and tried on yet another server
+        with mock.patch('time.time', return_value=self.broadcaster.in_flight[tx.txid()][0] + 100):
+            self.broadcaster.run()
+        self.assertEqual(['other1', 'other2'], [i for _, i, _ in self.network.sent])
+        self.network.answer(tx.txid())  # the late answer from other1 is ignored
+        self.assertFalse(self.results)
+        with mock.patch('time.time', return_value=self.broadcaster.in_flight[tx.txid()][0] + 100):
+            self.broadcaster.run()
+        self.assertEqual([(tx.txid(), 'Server did not answer')], self.results)
+
+    def test_broadcast_many(self):
+        txs = [make_tx('%02x' % i * 32) for i in range(2)]
+        self.start_network_thread()
+        self.network.queue_request = lambda method, params, interface=None, callback=None: callback(
+            {'result': Transaction(params[0]).txid()})
+        self.assertEqual([(tx.txid(), None) for tx in txs], list(self.broadcaster.broadcast_many(txs)))
+        self.network.queue_request = lambda *args, **kwargs: None
+        self.assertEqual([(txs[0].txid(), 'Server did not answer')],
+                         list(self.broadcaster.broadcast_many(txs[:1], timeout=0.01)))
+
+    def test_command(self):
+        from ..commands import Commands
+        parent = make_tx('aa' * 32)
+        child = make_tx(parent.txid())
+        self.start_network_thread()
+        self.network.queue_request = lambda method, params, interface=None, callback=None: callback(
+            {'result': Transaction(params[0]).txid()})
+        self.network.tx_broadcaster = self.broadcaster
+        commands = Commands(None, None, self.network)
+        out = commands.broadcastmany(' '.join([child.raw, parent.raw]))
+        self.assertEqual([parent.txid(), child.txid()], [r['txid'] for r in out])
+        self.assertTrue(all(r['success'] for r in out))
+        self.assertEqual(2, len(commands.broadcastmany([{'hex': parent.raw}, child.raw])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import threading
+import unittest
+from unittest import mock
+
+from .. import util
+from ..bitcoin import Hash
+from ..transaction import Transaction
+from ..tx_fetcher import TxFetcher
+
+
+def make_tx():
+    raw = os.urandom(100).hex()
+    return Hash(bytes.fromhex(raw))[::-1].hex(), raw
+
+
+class MockNetwork:
+    ''' Records requests instead of sending them; the test answers them. '''
+
+    def __init__(self):
+        self.sent = []  # (txid, callback)
+
+    def queue_request(self, method, params, interface=None, callback=None):
+        assert method == 'blockchain.transaction.get'
+        self.sent.append((params[0], callback))
+
+    def answer(self, txid, raw=None, error=None):
+        for i, (t, cb) in enumerate(self.sent):
+            if t == txid:
+                del self.sent[i]
+                r = {'method': 'blockchain.transaction.get', 'params': [txid]}
+                if error:
+                    r['error'] = error
+                else:
+                    r['result'] = raw
+                cb(r)
+                return
+        raise AssertionError('no such request: ' + txid)
+
+    def sent_txids(self):
+        return [t for t, _ in self.sent]
+
+
+class TestTxFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.network = MockNetwork()
+        self.fetcher = TxFetcher(self.network, max_in_flight=2)
+        self.txs = [make_tx() for _ in range(5)]
+        self.results = []
+
+    def tearDown(self):
+        for txid, _ in self.txs:
+            Transaction._fetched_tx_cache.d.pop(txid, None)
+
+    def callback(self, txid, tx, error):
+        self.results.append((txid, tx and tx.raw, error))
+
+    def fetch(self, *args, **kwargs):
+        sent = self.network.sent_txids()
+        req = self.fetcher.fetch(*args, **kwargs)
+        # Nothing goes out until the network thread runs its jobs
+        self.assertEqual(sent, self.network.sent_txids())
+        self.fetcher.run()
+        return req
+
+    def start_network_thread(self):
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(0.005):
+                self.fetcher.run()
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+
+        def cleanup():
+            stop.set()
+            t.join()
+        self.addCleanup(cleanup)
+
+    def test_dedup_and_multiple_waiters(self):
+        txid, raw = self.txs[0]
+        results2 = []
+        self.fetch([txid, txid], self.callback)
+        self.fetch([txid], lambda *args: results2.append(args))
+        self.assertEqual([txid], self.network.sent_txids())
+        self.network.answer(txid, raw)
+        self.assertEqual([(txid, raw, None)], self.results)
+        self.assertEqual(1, len(results2))
+        # Each waiter got its own copy
+        self.assertIsNot(results2[0][1].raw, None)
+        # Now it's cached, and no further network requests are made
+        self.fetch([txid], self.callback)
+        self.assertEqual([], self.network.sent_txids())
+        self.assertEqual(2, len(self.results))
+
+    def test_concurrency_limit_and_priority(self):
+        txids = [txid for txid, _ in self.txs]
+        self.fetch(txids[:4], self.callback)
+        self.assertEqual(txids[:2], self.network.sent_txids())
+        # A UI request jumps the queue, even for a txid that was already queued
+        self.fetch([txids[4], txids[3]], self.callback, priority=TxFetcher.PRIORITY_UI)
+        self.assertEqual(2, len(self.network.sent))
+        self.network.answer(*self.txs[0])
+        self.network.answer(*self.txs[1])
+        self.assertEqual([txids[4], txids[3]], self.network.sent_txids())
+        self.network.answer(*self.txs[4])
+        self.assertEqual([txids[3], txids[2]], self.network.sent_txids())
+
+    def test_bad_responses(self):
+        (txid, raw), (txid2, raw2) = self.txs[:2]
+        self.fetch([txid, txid2], self.callback)
+        self.network.answer(txid, raw2)  # phony
+        self.network.answer(txid2, error={'code': 1, 'message': 'no such tx'})
+        self.assertEqual([txid, txid2], [r[0] for r in self.results])
+        self.assertTrue(all(r[1] is None and r[2] for r in self.results))
+        self.assertEqual('no such tx', self.results[1][2])
+        self.assertIsNone(Transaction.tx_cache_get(txid))
+
+    def test_cancel(self):
+        txids = [txid for txid, _ in self.txs]
+        req = self.fetch(txids[:3], self.callback)
+        self.fetcher.cancel(req)
+        self.network.answer(*self.txs[0])
+        self.network.answer(*self.txs[1])
+        # The queued request that nobody wants any longer was never sent
+        self.assertEqual([], self.network.sent_txids())
+        self.assertEqual([], self.results)
+
+    def test_persist(self):
+        (txid, raw), (txid2, raw2) = self.txs[:2]
+        self.fetch([txid], self.callback)
+        self.fetch([txid, txid2], self.callback, persist=True)
+        self.fetch([txid2], self.callback)
+        with mock.patch.object(Transaction, 'tx_cache_put') as put:
+            self.network.answer(txid, raw)
+            self.network.answer(txid2, raw2)
+        # Persisted if any of the waiters wanted it
+        self.assertEqual([True, True], [c[1]['persist'] for c in put.call_args_list])
+        txid3, raw3 = self.txs[2]
+        self.fetch([txid3], self.callback)
+        with mock.patch.object(Transaction, 'tx_cache_put') as put:
+            self.network.answer(txid3, raw3)
+        self.assertFalse(put.call_args[1]['persist'])
+
+    def test_expiry(self):
+        txid, _ = self.txs[0]
+        self.fetch([txid], self.callback)
+        self.fetcher.run()
+        self.assertEqual([], self.results)
+        # Not answered: given up on the next time the network thread runs us
+        with mock.patch('time.time', return_value=self.fetcher.in_flight[txid] + 100):
+            self.fetcher.run()
+        self.assertEqual([(txid, None, 'Server did not answer')], self.results)
+        self.assertFalse(self.fetcher.in_flight)
+        self.network.answer(txid, error='late')  # ignored
+        self.assertEqual(1, len(self.results))
+
+    def test_blocking_get(self):
+        self.start_network_thread()
+        txid, raw = self.txs[0]
+        t = threading.Timer(0.05, lambda: self.network.answer(txid, raw))
+        t.start()
+        self.assertEqual(raw, self.fetcher.get(txid, timeout=5).raw)
+        t.join()
+        txid2, _ = self.txs[1]
+        with self.assertRaises(util.TimeoutException):
+            self.fetcher.get(txid2, timeout=0.05)
+        self.network.answer(txid2, error='nope')
+        txid3, _ = self.txs[2]
+        t = threading.Timer(0.05, lambda: self.network.answer(txid3, error='nope'))
+        t.start()
+        with self.assertRaises(util.ServerError):
+            self.fetcher.get(txid3, timeout=5)
+        t.join()
@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from .. import transaction, tx_store
+from ..bitcoin import Hash
+from ..transaction import Transaction
+from ..tx_store import RawTxStore
+
+
+def txid_of(raw: bytes) -> str:
+    return Hash(raw)[::-1].hex()
+
+
+class TestRawTxStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'tx_store.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_put_get_and_persistence(self):
+        store = RawTxStore(self.path)
+        raw = os.urandom(300)
+        txid = txid_of(raw)
+        self.assertIsNone(store.get(txid))
+        self.assertTrue(store.put(raw.hex(), txid))
+        self.assertTrue(store.put(raw))  # dupe is fine
+        self.assertEqual(raw.hex(), store.get(txid))
+        self.assertIn(txid, store)
+        self.assertEqual(1, len(store))
+        store.close()
+        store = RawTxStore(self.path)
+        self.assertEqual(raw.hex(), store.get(txid))
+        self.assertEqual(300, store.total_bytes)
+        store.close()
+
+    def test_rejects_mismatched_txid(self):
+        store = RawTxStore(self.path)
+        raw = os.urandom(200)
+        bad_txid = txid_of(raw + b'\x00')
+        self.assertFalse(store.put(raw, bad_txid))
+        self.assertIsNone(store.get(bad_txid))
+        self.assertEqual(0, len(store))
+        self.assertFalse(store.put('not hex'))
+        self.assertIsNone(store.get('not a txid'))
+        store.close()
+
+    def test_compression(self):
+        store = RawTxStore(self.path, compress=True)
+        raw = bytes(1000)  # very compressible
+        txid = txid_of(raw)
+        self.assertTrue(store.put(raw))
+        self.assertLess(store.total_bytes, 100)
+        self.assertEqual(raw.hex(), store.get(txid))
+        # Incompressible data is stored as-is
+        raw2 = os.urandom(1000)
+        self.assertTrue(store.put(raw2))
+        self.assertEqual(raw2.hex(), store.get(txid_of(raw2)))
+        store.close()
+
+    def test_lru_eviction_by_bytes(self):
+        store = RawTxStore(self.path, max_bytes=1000)
+        raws = [os.urandom(200) for _ in range(5)]
+        for raw in raws:
+            self.assertTrue(store.put(raw))
+        self.assertEqual(1000, store.total_bytes)
+        # Touch the oldest so that it becomes the most recently used
+        self.assertIsNotNone(store.get(txid_of(raws[0])))
+        store.put(os.urandom(200))
+        # We evicted down to 90% of max_bytes, least recently used first
+        self.assertLessEqual(store.total_bytes, 900)
+        self.assertIn(txid_of(raws[0]), store)
+        self.assertNotIn(txid_of(raws[1]), store)
+        self.assertNotIn(txid_of(raws[2]), store)
+        self.assertIn(txid_of(raws[4]), store)
+        # Too big to ever fit
+        self.assertFalse(store.put(os.urandom(1001)))
+        store.close()
+        store = RawTxStore(self.path, max_bytes=1000)
+        self.assertEqual(800, store.total_bytes)
+        self.assertEqual(4, len(store))
+        store.close()
+
+
+class TestTxStoreUse(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if tx_store._store is not None:
+            tx_store._store.close()
+            tx_store._store = None
+        shutil.rmtree(self.tmpdir)
+
+    def config(self, **kwargs):
+        config = mock.Mock()
+        config.path = self.tmpdir
+        config.get.side_effect = lambda key, default=None: kwargs.get(key, default)
+        return config
+
+    def test_opt_in(self):
+        with mock.patch('electroncash.simple_config.get_config', return_value=self.config()):
+            self.assertIsNone(tx_store.get_tx_store())
+        with mock.patch('electroncash.simple_config.get_config', return_value=self.config(tx_store=True)):
+            store = tx_store.get_tx_store()
+            self.assertIsInstance(store, RawTxStore)
+            self.assertIs(store, tx_store.get_tx_store())
+
+    def test_persist_only_when_asked(self):
+        store = RawTxStore(os.path.join(self.tmpdir, 'tx_store.sqlite'))
+        self.addCleanup(store.close)
+        raws = [os.urandom(100).hex() for _ in range(2)]
+        txids = [txid_of(bytes.fromhex(raw)) for raw in raws]
+        for txid in txids:
+            self.addCleanup(Transaction._fetched_tx_cache.d.pop, txid, None)
+        with mock.patch.object(transaction, 'get_tx_store', return_value=store):
+            Transaction.tx_cache_put(Transaction(raws[0]), txids[0])
+            Transaction.tx_cache_put(Transaction(raws[1]), txids[1], persist=True)
+        self.assertNotIn(txids[0], store)
+        self.assertIn(txids[1], store)
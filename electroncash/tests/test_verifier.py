@@ -0,0 +1,159 @@
+import unittest
+
+from ..verifier import SPV, SPVDelegate
+
+
+def txid(n):
+    return '%064x' % (n + 1)
+
+
+class FakeDelegate(SPVDelegate):
+
+    def __init__(self, unverified):
+        self.unverified = dict(unverified)
+        self.version = 0
+        self.reads = 0
+        self.verified = {}
+        self.saves = []
+
+    def get_unverified_txs(self):
+        self.reads += 1
+        return dict(self.unverified)
+
+    def get_unverified_txs_version(self):
+        return self.version
+
+    def add_verified_tx(self, tx_hash, info, header):
+        self.unverified.pop(tx_hash, None)
+        self.verified[tx_hash] = info
+
+    def is_up_to_date(self):
+        return True
+
+    def save_verified_tx(self, write=False):
+        self.saves.append(write)
+
+    def undo_verifications(self, blkchain, height):
+        return set()
+
+    def verification_failed(self, tx_hash, reason):
+        pass
+
+    def diagnostic_name(self):
+        return 'test'
+
+
+class FakeBlockchain:
+
+    def __init__(self, height):
+        self._height = height
+        self.reads = []
+        self.merkle_roots = {}
+
+    def read_header(self, height):
+        self.reads.append(height)
+        if height > self._height:
+            return None
+        return {'version': 1, 'prev_block_hash': '00' * 32, 'merkle_root': self.merkle_roots.get(height, '11' * 32),
+                'timestamp': 1600000000 + height, 'bits': 0x207fffff, 'nonce': 0, 'block_height': height}
+
+
+class FakeNetwork:
+
+    def __init__(self, height):
+        self.height = height
+        self.chain = FakeBlockchain(height)
+        self.interface = type('Interface', (), {'blockchain': self.chain, 'server': 'test',
+                                                'print_error': lambda *args: None})()
+        self.requests = []
+        self.chunk_requests = []
+
+    def blockchain(self):
+        return self.chain
+
+    def get_local_height(self):
+        return self.height
+
+    def get_merkle_for_transaction(self, tx_hash, tx_height, callback, max_qlen=10):
+        self.requests.append((tx_height, tx_hash))
+        return len(self.requests)
+
+    def request_chunk(self, interface, index):
+        self.chunk_requests.append(index)
+        return True
+
+    def trigger_callback(self, *args):
+        pass
+
+
+class TestSPVScheduling(unittest.TestCase):
+
+    def setUp(self):
+        # 3 txs per block at heights 100..199, and some not mined yet
+        self.unverified = {txid(i): 100 + i // 3 for i in range(300)}
+        self.unverified.update({txid(1000): 0, txid(1001): 500})
+        self.delegate = FakeDelegate(self.unverified)
+        self.network = FakeNetwork(199)
+        self.spv = SPV(self.network, self.delegate)
+
+    def test_height_ordered_window(self):
+        self.spv.run()
+        requests = self.network.requests
+        self.assertEqual(SPV.MAX_IN_FLIGHT, len(requests))
+        self.assertEqual(sorted(requests), requests)
+        self.assertEqual(100, requests[0][0])
+        # One header read per block
+        self.assertEqual(sorted(set(h for h, _ in requests)), self.network.chain.reads)
+        # Nothing more while the window is full
+        self.spv.run()
+        self.assertEqual(SPV.MAX_IN_FLIGHT, len(requests))
+        # Never the unconfirmed one or the one above our height
+        self.spv.in_flight.clear()
+        for _ in range(5):
+            self.spv.run()
+            self.spv.in_flight.clear()
+        self.assertEqual(300, len(requests))
+        self.assertNotIn(txid(1000), [t for _, t in requests])
+        self.assertNotIn(txid(1001), [t for _, t in requests])
+
+    def test_rereads_only_on_change(self):
+        self.spv.run()
+        self.spv.run()
+        self.assertEqual(1, self.delegate.reads)
+        self.delegate.version += 1
+        self.spv.run()
+        self.assertEqual(2, self.delegate.reads)
+
+    def test_response_verifies_and_refills(self):
+        # Make the first block hold just txid(0), so its root is its txid
+        self.network.chain.merkle_roots[100] = txid(0)
+        self.spv.run()
+        self.spv._next_save = 0  # due for a progress save
+        self.spv.verify_merkle({'params': [txid(0), 100],
+                                'result': {'block_height': 100, 'merkle': [], 'pos': 0}})
+        self.assertIn(txid(0), self.delegate.verified)
+        self.assertEqual([True], self.delegate.saves)
+        self.assertEqual(SPV.MAX_IN_FLIGHT - 1, len(self.spv.in_flight))
+        self.spv.run()
+        self.assertEqual(SPV.MAX_IN_FLIGHT, len(self.spv.in_flight))
+        self.assertEqual(SPV.MAX_IN_FLIGHT + 1, len(self.network.requests))
+
+    def test_stops_at_missing_header(self):
+        # We have headers up to 109 only
+        self.network.chain._height = 109
+        self.spv.run()
+        self.assertEqual(30, len(self.network.requests))
+        self.assertEqual(list(range(100, 111)), self.network.chain.reads)
+        self.assertEqual([0], self.network.chunk_requests)
+        # Everything from 110 up is still queued, for the next tick
+        self.assertEqual(270 + 1, len(self.spv.queue))  # + the one at 500
+        self.assertEqual((110, txid(30)), self.spv.queue[0])
+
+    def test_header_not_cached_across_ticks(self):
+        self.spv.run()
+        # The headers file changed under the same Blockchain object, e.g.
+        # with Blockchain.swap_with_parent
+        self.network.chain.merkle_roots[100] = txid(0)
+        self.spv.verify_merkle({'params': [txid(0), 100],
+                                'result': {'block_height': 100, 'merkle': [], 'pos': 0}})
+        self.assertIn(txid(0), self.delegate.verified)
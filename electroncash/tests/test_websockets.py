@@ -0,0 +1,206 @@
+import base64
+import json
+import os
+import socket
+import time
+import unittest
+from collections import defaultdict
+from unittest import mock
+
+from .. import websockets
+from ..benchmarks import synthetic
+from ..bitcoin import TYPE_ADDRESS
+from .synthetic_wallet import foreign_tx, make_config, make_wallet
+
+
+class FakeNetwork:
+
+    def __init__(self, height):
+        self.callbacks = defaultdict(list)
+        self.height = height
+
+    def get_local_height(self):
+        return self.height
+
+    def register_callback(self, callback, events):
+        for event in events:
+            self.callbacks[event].append(callback)
+
+    def unregister_callback(self, callback):
+        for callbacks in self.callbacks.values():
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def callback_listener_count(self, event):
+        return len(self.callbacks[event])
+
+    def trigger_callback(self, event, *args):
+        for callback in list(self.callbacks[event]):
+            callback(event, *args)
+
+
+class FakeSocket:
+
+    def __init__(self):
+        self.messages = []
+
+    def sendMessage(self, data):
+        self.messages.append(data)
+
+    def statuses(self):
+        return [json.loads(m)['status'] if m != 'paid' else m for m in self.messages]
+
+
+class TestPaymentNotifier(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sw = make_wallet(30, 200, seed=11, n_unused=10)
+
+    def setUp(self):
+        self.wallet = self.sw.wallet
+        self.height = synthetic.FIRST_HEIGHT + 100
+        self.network = FakeNetwork(self.height)
+        self.wallet.network = self.network
+        self.config = make_config()
+        self.addrs = self.wallet.get_unused_addresses()[:5]
+        self.ids = []
+        for addr in self.addrs:
+            req = self.wallet.make_payment_request(addr, 5000, 'test', 3600)
+            self.wallet.add_payment_request(req, self.config, set_address_label=False, save=False)
+            self.ids.append(req['id'])
+        self.notifier = websockets.PaymentNotifier({'w': self.wallet}, self.network, depth=3)
+        self.notifier.start()
+
+    def tearDown(self):
+        self.notifier.stop()
+        self.wallet.network = None
+        for addr in list(self.wallet.receive_requests):
+            self.wallet.remove_payment_request(addr, self.config, save=False)
+
+    def pay(self, addr, height):
+        tx = foreign_tx([(TYPE_ADDRESS, addr, 6000)], 'cd' * 32)
+        tx_hash = tx.txid_fast()
+        self.wallet.receive_history_callback(addr, [(tx_hash, height)], {})
+        self.wallet.receive_tx_callback(tx_hash, tx, height)
+        return tx_hash
+
+    def new_block(self, height):
+        self.network.height = height
+        self.network.trigger_callback('blockchain_updated')
+
+    def test_many_sockets(self):
+        sockets = [FakeSocket() for _ in range(2000)]
+        with mock.patch.object(self.wallet, 'get_request_status', wraps=self.wallet.get_request_status) as status:
+            for i, ws in enumerate(sockets):
+                self.notifier.on_message(ws, 'id:' + self.ids[i % 5])
+            # One look at each request, however many sockets wait on it
+            self.assertEqual(5, status.call_count)
+        self.assertEqual(2000, self.notifier.num_sockets())
+        self.assertTrue(all(ws.statuses() == ['Pending'] for ws in sockets))
+
+        tx_hash = self.pay(self.addrs[0], 0)
+        with mock.patch.object(self.wallet, 'get_request_status', wraps=self.wallet.get_request_status) as status:
+            self.assertEqual(1, self.notifier.flush())
+            self.assertEqual(1, status.call_count)
+        waiting = sockets[::5]
+        self.assertTrue(all(ws.statuses() == ['Pending', 'Unconfirmed', 'paid'] for ws in waiting))
+        self.assertTrue(all(len(ws.messages) == 1 for ws in sockets[1::5]))
+
+        # Confirmations are pushed until there are depth of them
+        self.wallet.verified_tx[tx_hash] = (self.height + 1, 0, 0, None)
+        self.wallet._update_request_statuses_touched_by_tx(tx_hash)
+        self.new_block(self.height + 1)
+        self.notifier.flush()
+        for height in range(self.height + 2, self.height + 6):
+            self.new_block(height)
+            self.notifier.flush()
+        confirmations = [json.loads(m)['confirmations'] for m in waiting[0].messages if m != 'paid']
+        self.assertEqual([0, 0, 1, 2, 3], confirmations)
+        self.assertEqual('Paid', waiting[0].statuses()[-1])
+
+        # A page opened later is told at once
+        late = FakeSocket()
+        self.notifier.subscribe(late, self.ids[0])
+        self.assertEqual(['Paid', 'paid'], late.statuses())
+
+        for ws in sockets:
+            self.notifier.unsubscribe(ws)
+        self.notifier.unsubscribe(late)
+        self.assertEqual(0, self.notifier.num_sockets())
+        self.assertFalse(self.notifier._subs)
+        self.wallet.remove_transaction(tx_hash)
+        self.wallet.verified_tx.pop(tx_hash)
+        self.wallet.receive_history_callback(self.addrs[0], [], {})
+
+    def test_lookup(self):
+        ws = FakeSocket()
+        self.notifier.on_message(ws, 'id:nosuchid')
+        self.notifier.on_message(ws, 'junk')
+        self.notifier.on_message(ws, 'id:' + self.addrs[1].to_storage_string())
+        self.assertEqual(['Unknown', 'Pending'], ws.statuses())
+        # Requests added after the first lookup are found too
+        addr = self.wallet.get_unused_addresses()[0]
+        req = self.wallet.make_payment_request(addr, 1000, 'later', 3600)
+        self.wallet.add_payment_request(req, self.config, set_address_label=False, save=False)
+        self.notifier.on_message(ws, 'id:' + req['id'])
+        self.assertEqual(['Unknown', 'Pending', 'Pending'], ws.statuses())
+
+    def test_lookup_after_replace(self):
+        ws = FakeSocket()
+        self.notifier.on_message(ws, 'id:' + self.ids[0])
+        # One request goes and another comes, so there are as many as before
+        self.wallet.remove_payment_request(self.addrs[4], self.config, save=False)
+        addr = next(a for a in self.wallet.get_unused_addresses() if a != self.addrs[4])
+        req = self.wallet.make_payment_request(addr, 1000, 'replacement', 3600)
+        self.wallet.add_payment_request(req, self.config, set_address_label=False, save=False)
+        self.notifier.on_message(ws, 'id:' + req['id'])
+        self.assertEqual(['Pending', 'Pending'], ws.statuses())
+
+    def test_expiry(self):
+        ws = FakeSocket()
+        self.notifier.subscribe(ws, self.ids[2])
+        with mock.patch('time.time', return_value=time.time() + 7200):
+            self.new_block(self.height + 1)
+            self.notifier.flush()
+        self.assertEqual(['Pending', 'Expired'], ws.statuses())
+
+
+@unittest.skipIf(websockets.WebSocket is None, "SimpleWebSocketServer is not installed")
+class TestWebSocketServer(unittest.TestCase):
+
+    def test_serve(self):
+        config = {'websocket_server': '127.0.0.1', 'websocket_port': 0}
+        daemon = mock.Mock(wallets={}, network=None)
+        thread = websockets.WebSocketServer(mock.Mock(get=lambda k, d=None: config.get(k, d)), daemon)
+        thread.start()
+        try:
+            for _ in range(100):
+                if thread.server:
+                    break
+                time.sleep(0.05)
+            port = thread.server.serversocket.getsockname()[1]
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as s:
+                key = base64.b64encode(os.urandom(16)).decode()
+                s.sendall(('GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                           'Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n'.format(key)).encode())
+                response = b''
+                while b'\r\n\r\n' not in response:
+                    response += s.recv(4096)
+                self.assertIn(b' 101 ', response.split(b'\r\n')[0])
+                payload = b'id:nosuchid'
+                mask = os.urandom(4)
+                s.sendall(bytes([0x81, 0x80 | len(payload)]) + mask
+                          + bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+                frame = response.split(b'\r\n\r\n', 1)[1]
+                while len(frame) < 2 or len(frame) < 2 + frame[1]:
+                    frame += s.recv(4096)
+                self.assertEqual({'id': 'nosuchid', 'status': 'Unknown'}, json.loads(frame[2:2 + frame[1]]))
+        finally:
+            thread.stop()
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
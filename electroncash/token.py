@@ -16,8 +16,6 @@ from .i18n import _
 from .serialize import BCDataStream, SerializationError
 from .util import print_error
 
-from . import wallet
-
 # By consensus, NFT commitment byte blobs may not exceed this length
 MAX_CONSENSUS_COMMITMENT_LENGTH = 128  # Originally was 40, upgraded to 128 after May 2026
 
@@ -216,6 +214,7 @@ def heuristic_dust_limit_for_longest_possible_token_bearing_p2pkh_output() -> in
     p2pkh output."""
     script_byte_len = len(PREFIX_BYTE) + LONGEST_POSSIBLE_TOKEN_SERIALIZATON_LEN + 25  # 25 is a p2pkh script
     # Pre-May 2026 this returned 798, post May-2026 this returns 1062
+    from . import wallet  # Avoid circular import: wallet -> transaction -> token
     return wallet.dust_threshold(None, script_byte_len=script_byte_len)
 
 
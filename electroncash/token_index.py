@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" A maintained index of a wallet's unspent CashToken outputs, by category.
+
+The wallet's ct_txo and ct_txi dicts record every token output it received
+and every token output it spent, keyed by transaction. Answering "what
+tokens do we have" from them means walking all of them. This index is kept
+up to date alongside those dicts, by Abstract_Wallet.add_transaction and
+remove_transaction, so that per-category balances and UTXO sets are
+available directly.
+
+An output is unspent here if we have it and no transaction we know of spends
+it. Like ct_txo, this includes unconfirmed and frozen coins. """
+
+from collections import Counter, namedtuple
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from .address import Address
+from . import token
+
+# What get_balances() returns per category. nfts maps "prevout_hash:n" to the
+# NFT commitment (bytes); minting and mutable are how many of those NFTs have
+# that capability.
+TokenBalance = namedtuple("TokenBalance", "fungible, nfts, minting, mutable, num_utxos")
+
+
+class _Category:
+    __slots__ = ('utxos', 'fungible', 'nfts', 'minting', 'mutable')
+
+    def __init__(self):
+        self.utxos: Dict[str, Tuple[Address, token.OutputData]] = {}
+        self.fungible = 0
+        self.nfts: Dict[str, bytes] = {}
+        self.minting = 0
+        self.mutable = 0
+
+    def add(self, ser, addr, token_data):
+        self.utxos[ser] = (addr, token_data)
+        self.fungible += token_data.amount
+        if token_data.has_nft():
+            self.nfts[ser] = token_data.commitment
+            self.minting += token_data.is_minting_nft()
+            self.mutable += token_data.is_mutable_nft()
+
+    def remove(self, ser):
+        addr, token_data = self.utxos.pop(ser)
+        self.fungible -= token_data.amount
+        if token_data.has_nft():
+            del self.nfts[ser]
+            self.minting -= token_data.is_minting_nft()
+            self.mutable -= token_data.is_mutable_nft()
+
+
+class TokenIndex:
+    """ Not thread safe: the wallet calls it with its lock held. Outpoints are
+    "prevout_hash:n" strings, as in the wallet's txi. """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._outputs: Dict[str, Tuple[Address, token.OutputData]] = {}  # ser -> (addr, token_data)
+        self._spent: Dict[str, Set[str]] = {}  # ser -> the tx_hashes that spend it
+        self._tx_outputs: Dict[str, Set[str]] = {}  # tx_hash -> sers of its token outputs
+        self._tx_spends: Dict[str, Dict[str, Address]] = {}  # tx_hash -> ser -> addr, of what it spends
+        self._categories: Dict[str, _Category] = {}  # token id hex -> its unspent outputs
+        self._addr_refs: Counter = Counter()  # Address -> how many of the above mention it
+
+    def rebuild(self, ct_txi, ct_txo):
+        """ Rebuilds the index from the wallet's ct_txi and ct_txo. """
+        self.clear()
+        for tx_hash, addrmap in ct_txo.items():
+            for addr, outputs in addrmap.items():
+                for n, token_data in outputs.items():
+                    self.add_output(f'{tx_hash}:{n}', addr, token_data)
+        for tx_hash, addrmap in ct_txi.items():
+            for addr, prevouts in addrmap.items():
+                for prevout_hash, inputs in prevouts.items():
+                    for prevout_n in inputs:
+                        self.add_spend(f'{prevout_hash}:{prevout_n}', tx_hash, addr)
+
+    # -- updates
+
+    def add_output(self, ser: str, addr: Address, token_data: token.OutputData):
+        if ser in self._outputs:
+            self.remove_output(ser)
+        self._outputs[ser] = (addr, token_data)
+        self._tx_outputs.setdefault(ser.split(':', 1)[0], set()).add(ser)
+        self._addr_refs[addr] += 1
+        if not self._spent.get(ser):
+            self._category(token_data.id_hex).add(ser, addr, token_data)
+
+    def remove_output(self, ser: str):
+        item = self._outputs.pop(ser, None)
+        if item is None:
+            return
+        addr, token_data = item
+        tx_hash = ser.split(':', 1)[0]
+        sers = self._tx_outputs.get(tx_hash)
+        if sers is not None:
+            sers.discard(ser)
+            if not sers:
+                del self._tx_outputs[tx_hash]
+        self._unref(addr)
+        if not self._spent.get(ser):
+            self._uncategory(token_data.id_hex, ser)
+
+    def add_spend(self, ser: str, spender: str, addr: Address):
+        """ Records that transaction spender spends ser, an output of addr. """
+        spends = self._tx_spends.setdefault(spender, {})
+        if ser in spends:
+            return
+        spends[ser] = addr
+        self._addr_refs[addr] += 1
+        spenders = self._spent.setdefault(ser, set())
+        spenders.add(spender)
+        if len(spenders) == 1 and ser in self._outputs:
+            self._uncategory(self._outputs[ser][1].id_hex, ser)
+
+    def remove_spend(self, ser: str, spender: str):
+        spends = self._tx_spends.get(spender)
+        if not spends or ser not in spends:
+            return
+        self._unref(spends.pop(ser))
+        if not spends:
+            del self._tx_spends[spender]
+        spenders = self._spent[ser]
+        spenders.discard(spender)
+        if not spenders:
+            del self._spent[ser]
+            item = self._outputs.get(ser)
+            if item is not None:
+                self._category(item[1].id_hex).add(ser, *item)
+
+    def remove_outputs_of(self, tx_hash: str):
+        for ser in list(self._tx_outputs.get(tx_hash, ())):
+            self.remove_output(ser)
+
+    def remove_spends_by(self, tx_hash: str):
+        for ser in list(self._tx_spends.get(tx_hash, ())):
+            self.remove_spend(ser, tx_hash)
+
+    def remove_tx(self, tx_hash: str):
+        """ Forgets the token outputs of tx_hash, what it spends, and what
+        spends its outputs. """
+        for ser in self._tx_outputs.get(tx_hash, ()):
+            for spender in list(self._spent.get(ser, ())):
+                self.remove_spend(ser, spender)
+        self.remove_spends_by(tx_hash)
+        self.remove_outputs_of(tx_hash)
+
+    # -- queries
+
+    def categories(self) -> Iterable[str]:
+        """ The token ids of which we have unspent outputs """
+        return self._categories.keys()
+
+    def get_balances(self) -> Dict[str, TokenBalance]:
+        return {id_hex: TokenBalance(c.fungible, dict(c.nfts), c.minting, c.mutable, len(c.utxos))
+                for id_hex, c in self._categories.items()}
+
+    def get_balance(self, id_hex: str) -> Optional[TokenBalance]:
+        c = self._categories.get(id_hex)
+        if c is None:
+            return None
+        return TokenBalance(c.fungible, dict(c.nfts), c.minting, c.mutable, len(c.utxos))
+
+    def get_utxos(self, id_hex: Optional[str] = None) -> Dict[str, Tuple[Address, token.OutputData]]:
+        """ Returns "prevout_hash:n" -> (addr, token_data) of the unspent
+        outputs of the category id_hex, or of all categories if None. """
+        if id_hex is not None:
+            c = self._categories.get(id_hex)
+            return dict(c.utxos) if c else {}
+        ret = {}
+        for c in self._categories.values():
+            ret.update(c.utxos)
+        return ret
+
+    def get_addresses(self, id_hex: Optional[str] = None) -> Set[Address]:
+        """ The addresses holding unspent outputs of the category id_hex, or
+        of any category if None. """
+        return {addr for addr, _td in self.get_utxos(id_hex).values()}
+
+    def has_address(self, addr: Address) -> bool:
+        """ True if addr ever received or spent a token output we know of. """
+        return addr in self._addr_refs
+
+    # -- internals
+
+    def _category(self, id_hex) -> _Category:
+        c = self._categories.get(id_hex)
+        if c is None:
+            self._categories[id_hex] = c = _Category()
+        return c
+
+    def _uncategory(self, id_hex, ser):
+        c = self._categories[id_hex]
+        c.remove(ser)
+        if not c.utxos:
+            del self._categories[id_hex]
+
+    def _unref(self, addr):
+        self._addr_refs[addr] -= 1
+        if self._addr_refs[addr] <= 0:
+            del self._addr_refs[addr]
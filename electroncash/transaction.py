@@ -31,6 +31,7 @@
 
 from .util import print_error, profiler
 from .caches import ExpiringCache
+from .tx_store import get_tx_store
 
 from .bitcoin import *
 from .address import (PublicKey, Address, Script, ScriptOutput, hash160,
@@ -899,6 +900,20 @@ class Transaction:
         script = bfh(cls.input_script(txin, True, sign_schnorr=sign_schnorr))
         return len(cls.serialize_input_bytes(txin, script, True))
 
+    @staticmethod
+    def estimated_output_size(address):
+        """Return the serialized size in bytes of a (non-token) output paying
+        to address."""
+        script_len = len(address.to_script())
+        return 8 + len(var_int_bytes(script_len)) + script_len
+
+    @staticmethod
+    def estimated_overhead_size(n_inputs, n_outputs):
+        """Return the serialized size in bytes of the parts of a tx other than
+        its inputs and outputs: the version, the input and output counts and
+        the locktime."""
+        return 4 + len(var_int_bytes(n_inputs)) + len(var_int_bytes(n_outputs)) + 4
+
     def signature_count(self):
         r = 0
         s = 0
@@ -1193,44 +1208,23 @@ class Transaction:
             # what we have
             if use_network and eph.get('_fetch') == t and wallet.network:
                 callback_funcs_to_cancel = set()
+                fetch_req = None
                 try:  # the whole point of this try block is the `finally` way below...
                     prog(-1)  # tell interested code that progress is now 0%
-                    # Next, queue the transaction.get requests, spreading them
-                    # out randomly over the connected interfaces
+                    # Next, ask the network's TxFetcher for the tx's. It
+                    # shares requests with anybody else already waiting on
+                    # the same txids, limits how many requests are in flight
+                    # at once (spreading them out randomly over the connected
+                    # interfaces), and caches the results even if the user
+                    # cancels this operation.
                     q = queue.Queue()
                     q_ct = 0
-                    bad_txids = set()
-                    def put_in_queue_and_cache(r):
-                        """ we cache the results directly in the network callback
-                        as even if the user cancels the operation, we would like
-                        to save the returned tx in our cache, since we did the
-                        work to retrieve it anyway. """
-                        q.put(r)  # put the result in the queue no matter what it is
-                        txid = ''
-                        try:
-                            # Below will raise if response was 'error' or
-                            # otherwise invalid. Note: for performance reasons
-                            # we don't validate the tx here or deserialize it as
-                            # this function runs in the network thread and we
-                            # don't want to eat up that thread's CPU time
-                            # needlessly. Also note the cache doesn't store
-                            # deserializd tx's so as to save memory. We
-                            # always deserialize a copy when reading the cache.
-                            tx = Transaction(r['result'])
-                            txid = r['params'][0]
-                            assert txid == cls._txid(tx.raw), "txid-is-sane-check"  # protection against phony responses
-                            cls.tx_cache_put(tx=tx, txid=txid)  # save tx to cache here
-                        except Exception as e:
-                            # response was not valid, ignore (don't cache)
-                            if txid:  # txid may be '' if KeyError from r['result'] above
-                                bad_txids.add(txid)
-                            print_error("fetch_input_data: put_in_queue_and_cache fail for txid:", txid, repr(e))
-                    for txid, l in need_dl_txids.items():
-                        wallet.network.queue_request('blockchain.transaction.get', [txid],
-                                                     interface='random',
-                                                     callback=put_in_queue_and_cache)
-                        callback_funcs_to_cancel.add(put_in_queue_and_cache)
-                        q_ct += 1
+                    if need_dl_txids:
+                        fetcher = wallet.network.tx_fetcher
+                        fetch_req = fetcher.fetch(need_dl_txids, lambda *args: q.put(args),
+                                                  priority=fetcher.PRIORITY_UI,
+                                                  persist=wallet.allows_tx_store())
+                        q_ct += len(need_dl_txids)
 
                     def get_bh():
                         if eph.get('block_height'):
@@ -1269,15 +1263,10 @@ class Transaction:
                             if r == 'block_height':
                                 # ignore block_height reply from network.. was already processed in other thread in got_tx_info above
                                 continue
-                            if r.get('error'):
-                                msg = r.get('error')
-                                if isinstance(msg, dict):
-                                    msg = msg.get('message') or 'unknown error'
-                                raise ErrorResp(msg)
-                            rawhex = r['result']
-                            txid = r['params'][0]
-                            assert txid not in bad_txids, "txid marked bad"  # skip if was marked bad by our callback code
-                            tx = Transaction(rawhex); tx.deserialize()
+                            txid, tx, error = r
+                            if error:
+                                raise ErrorResp(txid, error)
+                            tx.deserialize()
                             for item in need_dl_txids[txid]:
                                 ii, n = item
                                 assert n < len(tx.outputs())
@@ -1297,6 +1286,8 @@ class Transaction:
                 finally:
                     # force-cancel any extant requests -- this is especially
                     # crucial on error/timeout/failure.
+                    if fetch_req:
+                        wallet.network.tx_fetcher.cancel(fetch_req)
                     for func in callback_funcs_to_cancel:
                         wallet.network.cancel_requests(func)
             if len(inps) == len(self_inputs) and eph.get('_fetch') == t:  # sanity check
@@ -1350,15 +1341,27 @@ class Transaction:
             # use up 10x memory consumption, and not the cached instance which
             # should just be an undeserialized raw tx.
             return Transaction(tx.raw)
+        # Not in memory, try the on-disk store
+        store = get_tx_store()
+        raw = store.get(txid) if store is not None else None
+        if raw:
+            cls._fetched_tx_cache.put(txid, Transaction(raw))
+            return Transaction(raw)
         return None
 
     @classmethod
-    def tx_cache_put(cls, tx : object, txid : str = None):
-        """ Puts a non-deserialized copy of tx into the tx_cache. """
+    def tx_cache_put(cls, tx : object, txid : str = None, *, persist : bool = False):
+        """ Puts a non-deserialized copy of tx into the tx_cache and, if
+        persist is True, into the on-disk store (which verifies it against
+        txid). Only pass persist=True for txs fetched on behalf of a wallet
+        whose allows_tx_store() is True. """
         if not tx or not tx.raw:
             raise ValueError('Please pass a tx which has a valid .raw attribute!')
         txid = txid or cls._txid(tx.raw)  # optionally, caller can pass-in txid to save CPU time for hashing
         cls._fetched_tx_cache.put(txid, Transaction(tx.raw))
+        store = get_tx_store() if persist else None
+        if store is not None:  # NB: an empty store is falsy
+            store.put(tx.raw, txid)
 
 
 def tx_from_str(txt):
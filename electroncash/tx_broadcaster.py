@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" Network-level broadcasting of many transactions.
+
+Network.broadcast_transaction2 sends one transaction and waits for the
+answer, which makes pushing out a batch of thousands of payouts take
+thousands of round trips. The Network's TxBroadcaster instead:
+
+    - Keeps up to max_in_flight broadcasts out on the connection at once.
+    - Holds back a transaction until the transactions it spends from (among
+      those it was given) were accepted, and then sends it to the server that
+      accepted its parent, so that chains of unconfirmed transactions go out
+      parent first.
+    - Tells each caller the result of each of its transactions as soon as
+      it comes in.
+    - Retries on another server when a server does not answer or has
+      trouble of its own, but not when the transaction was rejected. A
+      transaction that was rejected takes its descendants down with it.
+"""
+
+import collections
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from .transaction import Transaction
+from .util import ThreadJob
+
+METHOD = 'blockchain.transaction.broadcast'
+
+# Server answers that mean the transaction is already where we want it
+ALREADY_KNOWN = ('txn-already-in-mempool', 'txn-already-known', 'transaction already in block chain')
+# Server answers that mean the server has trouble, not the transaction
+TRANSIENT = ('daemon error', 'server busy', 'excessive resource usage', 'internal error', 'timed out')
+
+
+class TxBroadcaster(ThreadJob):
+
+    class Request:
+        ''' Returned by submit(). Pass it to cancel() once no longer interested. '''
+        __slots__ = ('callback', 'pending', 'cancelled')
+
+        def __init__(self, callback):
+            self.callback = callback
+            self.pending = set()
+            self.cancelled = False
+
+    class _Entry:
+        __slots__ = ('raw', 'parents', 'children', 'waiters', 'interface', 'tried', 'tries')
+
+        def __init__(self, raw):
+            self.raw = raw
+            self.parents = set()  # txids of ours it spends from, not accepted yet
+            self.children = set()  # txids of ours that spend from it
+            self.waiters = []  # Requests
+            self.interface = None  # where to send it, None for the main server
+            self.tried = set()  # the servers that did not answer
+            self.tries = 0
+
+    def __init__(self, network, *, max_in_flight=16, request_timeout=30.0, max_tries=3):
+        self.network = network
+        self.max_in_flight = max(1, max_in_flight)
+        self.request_timeout = request_timeout
+        self.max_tries = max(1, max_tries)
+        self.lock = threading.Lock()
+        self.entries: Dict[str, TxBroadcaster._Entry] = {}  # txid -> what we know of the tx, until it is done
+        self.ready = collections.deque()  # txids whose parents were all accepted, in the order they were given
+        self.in_flight: Dict[str, Tuple[float, object]] = {}  # txid -> (time sent, interface)
+
+    def diagnostic_name(self):
+        return self.__class__.__name__
+
+    def submit(self, txs: Iterable[Transaction], callback: Callable[[str, Optional[str]], None]) -> 'TxBroadcaster.Request':
+        ''' Broadcasts txs. `callback(txid, error)` is called once for each of
+        them, from the network thread, with error None if the transaction
+        was accepted or was already known to the server, and otherwise a
+        message suitable for showing to the user. May be called from any
+        thread: the transactions go out from the network thread, the next
+        time it runs its jobs. '''
+        req = self.Request(callback)
+        batch = [(tx.txid(), tx) for tx in txs]
+        with self.lock:
+            new = []
+            for txid, tx in batch:
+                req.pending.add(txid)
+                entry = self.entries.get(txid)
+                if entry is None:
+                    self.entries[txid] = entry = self._Entry(str(tx))
+                    new.append((txid, tx))
+                entry.waiters.append(req)
+            for txid, tx in new:
+                entry = self.entries[txid]
+                for txin in tx.inputs():
+                    parent = self.entries.get(txin['prevout_hash'])
+                    if parent is not None and parent is not entry:
+                        entry.parents.add(txin['prevout_hash'])
+                        parent.children.add(txid)
+                if not entry.parents:
+                    self.ready.append(txid)
+        return req
+
+    def cancel(self, req: 'TxBroadcaster.Request'):
+        ''' Stops delivering results to req. Transactions already given to
+        us are still broadcast. '''
+        req.cancelled = True
+        with self.lock:
+            for txid in req.pending:
+                entry = self.entries.get(txid)
+                if entry and req in entry.waiters:
+                    entry.waiters.remove(req)
+            req.pending.clear()
+
+    def broadcast_many(self, txs: Iterable[Transaction], *, timeout=None) -> Iterator[Tuple[str, Optional[str]]]:
+        ''' Blocking version of submit(). Yields (txid, error) for each of txs
+        as their results come in. If timeout seconds (in total) go by first,
+        the rest are yielded with a timeout error. Do not call this from the
+        network thread. '''
+        txs = list(txs)
+        q = queue.Queue()
+        req = self.submit(txs, lambda *args: q.put(args))
+        remaining = {tx.txid() for tx in txs}
+        deadline = timeout and time.time() + timeout
+        try:
+            while remaining:
+                try:
+                    txid, error = q.get(timeout=deadline and max(deadline - time.time(), 0.001))
+                except queue.Empty:
+                    break
+                if txid in remaining:
+                    remaining.discard(txid)
+                    yield txid, error
+        finally:
+            self.cancel(req)
+        for txid in remaining:
+            yield txid, 'Server did not answer'
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return len(self.entries)
+
+    def run(self):
+        # Called periodically from the network thread: sends what was
+        # submitted since, and picks up broadcasts that were never answered
+        if self.ready or self.in_flight:
+            self._pump()
+
+    def _pump(self):
+        ''' Sends as many ready transactions as max_in_flight allows, and
+        gives up on (and retries) those that went unanswered for too long.
+        Network thread only, as Network.queue_request is. '''
+        to_send, results = [], []
+        now = time.time()
+        with self.lock:
+            for txid, (ts, interface) in list(self.in_flight.items()):
+                if now - ts > self.request_timeout:
+                    del self.in_flight[txid]
+                    self._retry(txid, interface, 'Server did not answer', results)
+            while self.ready and len(self.in_flight) < self.max_in_flight:
+                txid = self.ready.popleft()
+                entry = self.entries.get(txid)
+                if entry is None or txid in self.in_flight:
+                    continue
+                interface = self._pick_interface(entry)
+                entry.tries += 1
+                self.in_flight[txid] = (now, interface)
+                to_send.append((txid, entry.raw, interface))
+        for txid, raw, interface in to_send:
+            self.network.queue_request(METHOD, [raw], interface, callback=self._make_callback(txid, interface))
+        self._deliver(results)
+
+    def _make_callback(self, txid, interface):
+        return lambda response: self._on_response(txid, interface, response)
+
+    def _on_response(self, txid, interface, response):
+        # Runs in the network thread
+        error = response.get('error')
+        results = []
+        with self.lock:
+            sent = self.in_flight.get(txid)
+            if sent is None or sent[1] is not interface:
+                return  # we gave up on this one already
+            del self.in_flight[txid]
+            if error:
+                msg = error.get('message') if isinstance(error, dict) else error
+                msg = str(msg or error)
+                lmsg = msg.lower()
+                if any(s in msg for s in ALREADY_KNOWN):
+                    self._done(txid, interface, None, results)
+                elif any(s in lmsg for s in TRANSIENT):
+                    self.print_error("server trouble broadcasting", txid, msg)
+                    self._retry(txid, interface, self.network.transmogrify_broadcast_response_for_gui(msg), results)
+                else:
+                    self.print_error("broadcast of", txid, "rejected:", msg)
+                    self._done(txid, interface, self.network.transmogrify_broadcast_response_for_gui(msg), results)
+            elif response.get('result') != txid:
+                self.print_error("server replied with a mismatching txid:", response.get('result'))
+                self._done(txid, interface, "Server response does not match signed transaction ID.", results)
+            else:
+                self._done(txid, interface, None, results)
+        self._deliver(results)
+        self._pump()
+
+    # -- the below must be called with the lock held
+
+    def _pick_interface(self, entry):
+        interfaces = self.network.get_interfaces(interfaces=True)
+        if entry.interface is not None and entry.interface in interfaces and entry.interface not in entry.tried:
+            return entry.interface
+        if not entry.tried:
+            return None  # the main server
+        main = self.network.interface
+        for interface in ([main] if main else []) + interfaces:
+            if interface not in entry.tried:
+                return interface
+        return None
+
+    def _retry(self, txid, interface, error, results):
+        entry = self.entries[txid]
+        entry.tried.add(interface or self.network.interface)
+        if entry.tries >= self.max_tries:
+            self._done(txid, interface, error, results)
+        else:
+            self.ready.appendleft(txid)
+
+    def _done(self, txid, interface, error, results):
+        entry = self.entries.pop(txid)
+        results.append((txid, error, entry.waiters))
+        for child_txid in entry.children:
+            child = self.entries.get(child_txid)
+            if child is None:
+                continue
+            if error is None:
+                child.parents.discard(txid)
+                if child.interface is None:
+                    # Send it where its parent is known
+                    child.interface = interface or self.network.interface
+                if not child.parents:
+                    self.ready.append(child_txid)
+            else:
+                self._done(child_txid, None, 'Parent transaction {} was not broadcast: {}'.format(txid, error),
+                           results)
+
+    def _deliver(self, results):
+        for txid, error, waiters in results:
+            for req in waiters:
+                if req.cancelled:
+                    continue
+                req.pending.discard(txid)
+                try:
+                    req.callback(txid, error)
+                except Exception as e:
+                    self.print_error("callback for", txid, "raised", repr(e))
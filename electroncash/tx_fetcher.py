@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" Network-level fetching of transactions by txid.
+
+All code that needs a transaction it doesn't have (transaction dialogs
+looking up the prevouts of a tx, signing, token metadata lookups, etc) should
+go through the Network's TxFetcher, which:
+
+    - Serves transactions from the Transaction cache / RawTxStore when it can.
+    - Never has more than one request in flight for the same txid. Everybody
+      waiting on a txid is handed the result as soon as it arrives.
+    - Caps the number of requests in flight, so that e.g. a tx dialog for a
+      transaction with 1000 inputs doesn't flood the server.
+    - Sends requests for UI-visible work (PRIORITY_UI) ahead of the rest.
+
+Requests go out from the network thread, which runs the TxFetcher as one of
+its jobs, as Network.queue_request may only be called from there.
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Optional
+
+from . import util
+from .transaction import Transaction
+from .util import ThreadJob
+
+
+class TxFetcher(ThreadJob):
+
+    PRIORITY_UI = 0
+    PRIORITY_NORMAL = 1
+
+    class Request:
+        ''' Returned by fetch(). Pass it to cancel() once no longer interested. '''
+        __slots__ = ('callback', 'pending', 'cancelled', 'persist')
+
+        def __init__(self, callback, persist):
+            self.callback = callback
+            self.persist = persist
+            self.pending = set()
+            self.cancelled = False
+
+    def __init__(self, network, *, max_in_flight=8, request_timeout=60.0):
+        self.network = network
+        self.max_in_flight = max(1, max_in_flight)
+        # Requests the server hasn't answered after this long stop counting
+        # towards max_in_flight, and their waiters are told it failed
+        self.request_timeout = request_timeout
+        self.lock = threading.Lock()
+        self.waiters = defaultdict(list)  # txid -> [Request, ...]
+        self.queued = dict()  # txid -> priority, for txids not yet sent
+        self.heap = []  # (priority, seq, txid); may contain stale entries, see _pump()
+        self.seq = itertools.count()
+        self.in_flight = dict()  # txid -> time sent
+
+    def diagnostic_name(self):
+        return self.__class__.__name__
+
+    def fetch(self, txids: Iterable[str], callback: Callable[[str, Optional[Transaction], Optional[str]], None],
+              *, priority=PRIORITY_NORMAL, persist=False) -> 'TxFetcher.Request':
+        ''' Asynchronously fetches txids. `callback(txid, tx, error)` is called
+        once for each txid, as soon as its result is known: either with a tx
+        (a fresh, undeserialized copy for this caller), or with tx=None and an
+        error string. Cached txs are delivered from within this call; the rest
+        are requested and delivered from the network thread. May be called
+        from any thread.
+
+        Downloaded txs also go into the on-disk RawTxStore if any of their
+        waiters passed persist=True, see Transaction.tx_cache_put. '''
+        req = self.Request(callback, persist)
+        cached = []
+        to_fetch = []
+        for txid in dict.fromkeys(txids):
+            tx = Transaction.tx_cache_get(txid)
+            if tx:
+                cached.append((txid, tx))
+            else:
+                to_fetch.append(txid)
+        with self.lock:
+            for txid in to_fetch:
+                self.waiters[txid].append(req)
+                req.pending.add(txid)
+                if txid in self.in_flight:
+                    continue  # piggy-back on the request that is already out there
+                prio = self.queued.get(txid)
+                if prio is None or priority < prio:
+                    self.queued[txid] = priority
+                    heapq.heappush(self.heap, (priority, next(self.seq), txid))
+        for txid, tx in cached:
+            self._deliver(req, txid, tx, None)
+        return req
+
+    def cancel(self, req: 'TxFetcher.Request'):
+        ''' Stops delivering results to req. Requests that nobody is waiting
+        for any longer are dropped if they haven't been sent yet. '''
+        req.cancelled = True
+        with self.lock:
+            for txid in req.pending:
+                l = self.waiters.get(txid)
+                if l and req in l:
+                    l.remove(req)
+                if not l:
+                    self.waiters.pop(txid, None)
+                    self.queued.pop(txid, None)  # the heap entry is now stale
+            req.pending.clear()
+
+    def get(self, txid: str, *, timeout=30, priority=PRIORITY_NORMAL, persist=False) -> Transaction:
+        ''' Blocking version of fetch() for a single txid. Like
+        Network.synchronous_get, raises util.TimeoutException or
+        util.ServerError on failure. Do not call this from the network
+        thread. '''
+        q = queue.Queue()
+        req = self.fetch([txid], lambda *args: q.put(args), priority=priority, persist=persist)
+        try:
+            _, tx, error = q.get(timeout=timeout)
+        except queue.Empty:
+            raise util.TimeoutException('Server did not answer')
+        finally:
+            self.cancel(req)
+        if error:
+            raise util.ServerError(error)
+        return tx
+
+    def get_many(self, txids: Iterable[str], *, timeout=30, priority=PRIORITY_NORMAL,
+                 persist=False) -> Dict[str, Transaction]:
+        ''' Blocking version of fetch(). Returns a dict of txid -> tx for the
+        txids that could be retrieved within timeout seconds (in total). '''
+        txids = set(txids)
+        results = dict()
+        if not txids:
+            return results
+        q = queue.Queue()
+        req = self.fetch(txids, lambda *args: q.put(args), priority=priority, persist=persist)
+        deadline = time.time() + timeout
+        n_answered = 0
+        try:
+            while n_answered < len(txids):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    txid, tx, error = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                n_answered += 1
+                if tx:
+                    results[txid] = tx
+        finally:
+            self.cancel(req)
+        return results
+
+    def run(self):
+        # Called periodically from the network thread: sends what was
+        # fetched since, and gives up on requests that were never answered
+        if self.heap or self.in_flight:
+            self._pump()
+
+    def _pump(self):
+        ''' Sends as many queued requests as max_in_flight allows, most
+        important first, and fails those that went unanswered for too long.
+        Network thread only, as Network.queue_request is. '''
+        to_send, expired = [], []
+        now = time.time()
+        with self.lock:
+            for txid, ts in list(self.in_flight.items()):
+                if now - ts > self.request_timeout:
+                    del self.in_flight[txid]
+                    expired.append((txid, self.waiters.pop(txid, [])))
+            while self.heap and len(self.in_flight) < self.max_in_flight:
+                prio, _, txid = heapq.heappop(self.heap)
+                if self.queued.get(txid) != prio:
+                    continue  # stale entry: cancelled, or re-queued at a better priority
+                del self.queued[txid]
+                self.in_flight[txid] = now
+                to_send.append(txid)
+        for txid in to_send:
+            # The network spreads these out over all the healthy servers we are connected to
+            self.network.queue_request('blockchain.transaction.get', [txid], callback=self._on_response)
+        for txid, reqs in expired:
+            self.print_error("request for", txid, "timed out")
+            for req in reqs:
+                self._deliver(req, txid, None, 'Server did not answer')
+
+    def _on_response(self, response):
+        # Runs in the network thread
+        txid = (response.get('params') or [None])[0]
+        tx, error = None, response.get('error')
+        if not error:
+            try:
+                raw = response['result']
+                # Protection against phony responses. Note we don't deserialize
+                # here, so as not to eat up the network thread's CPU time.
+                if Transaction._txid(raw) != txid:
+                    raise ValueError('txid mismatch')
+                tx = Transaction(raw)
+                with self.lock:
+                    persist = any(req.persist for req in self.waiters.get(txid, ()))
+                Transaction.tx_cache_put(tx, txid, persist=persist)
+            except Exception as e:
+                tx, error = None, repr(e)
+        if isinstance(error, dict):
+            error = error.get('message') or 'unknown error'
+        with self.lock:
+            self.in_flight.pop(txid, None)
+            reqs = self.waiters.pop(txid, [])
+        self._pump()
+        for req in reqs:
+            self._deliver(req, txid, tx, error)
+
+    def _deliver(self, req, txid, tx, error):
+        if req.cancelled:
+            return
+        req.pending.discard(txid)
+        try:
+            # Each waiter gets its own copy, which it is free to deserialize
+            req.callback(txid, Transaction(tx.raw) if tx else None, error and str(error))
+        except Exception as e:
+            self.print_error("callback for", txid, "raised", repr(e))
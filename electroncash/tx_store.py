@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - A Bitcoin Cash SPV Wallet
+#
+# License: MIT License
+#
+""" A persistent, size-bounded store of raw transactions, keyed by txid.
+
+Transactions are immutable and addressed by their hash, so once we have
+downloaded one from a server there is no reason to ever download it again.
+This store keeps them on disk (in an sqlite database in the data directory),
+shared by every wallet in the process, so that they survive restarts.
+
+The store is off unless enabled with the 'tx_store' config key. Since it is
+plaintext and shared, transactions are only ever put into it on behalf of
+wallets whose files are not encrypted (see Abstract_Wallet.allows_tx_store),
+so it never reveals what an encrypted wallet holds.
+
+Every transaction is verified against its txid before it is stored. The store
+is bounded by the total number of bytes it holds, evicting the least recently
+used transactions first. """
+
+import os
+import threading
+import zlib
+from typing import Optional, Union
+
+from .bitcoin import Hash
+from .util import PrintError, print_error
+
+try:
+    import sqlite3
+except ImportError:  # Some stripped-down Python builds lack it; the store is then disabled
+    sqlite3 = None
+
+
+class RawTxStore(PrintError):
+
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    # On overflow, evict until we are this fraction of max_bytes, so that we
+    # don't end up evicting on every put() once full.
+    EVICT_TO = 0.9
+
+    def __init__(self, path: str, *, max_bytes: int = DEFAULT_MAX_BYTES, compress: bool = False):
+        assert sqlite3 is not None, "sqlite3 is not available"
+        self.path = path
+        self.max_bytes = max(0, int(max_bytes))
+        self.compress = bool(compress)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS txs (txid BLOB PRIMARY KEY, data BLOB NOT NULL,"
+                        " compressed INTEGER NOT NULL, size INTEGER NOT NULL, atime INTEGER NOT NULL)"
+                        " WITHOUT ROWID")
+        self.db.execute("CREATE INDEX IF NOT EXISTS txs_atime ON txs (atime)")
+        self.total_bytes, self.count, max_atime = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*), COALESCE(MAX(atime), 0) FROM txs").fetchone()
+        # A counter rather than the wall clock, so that clock adjustments can't disturb the LRU order
+        self.atime = max_atime
+        self.hits = self.misses = 0
+
+    def diagnostic_name(self):
+        return self.__class__.__name__
+
+    @staticmethod
+    def _txid_bytes(txid: str) -> Optional[bytes]:
+        try:
+            b = bytes.fromhex(txid)
+        except (TypeError, ValueError):
+            return None
+        return b if len(b) == 32 else None
+
+    def get(self, txid: str) -> Optional[str]:
+        """ Returns the raw tx hex for txid, or None if we don't have it. """
+        key = self._txid_bytes(txid)
+        if key is None:
+            return None
+        with self.lock:
+            try:
+                row = self.db.execute("SELECT data, compressed FROM txs WHERE txid = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.atime += 1
+                self.db.execute("UPDATE txs SET atime = ? WHERE txid = ?", (self.atime, key))
+            except sqlite3.Error as e:
+                self.print_error("get failed:", repr(e))
+                return None
+            self.hits += 1
+        data, compressed = row
+        try:
+            return (zlib.decompress(data) if compressed else bytes(data)).hex()
+        except zlib.error as e:
+            self.print_error("corrupt entry for", txid, repr(e))
+            self.discard(txid)
+            return None
+
+    def put(self, raw: Union[str, bytes], txid: Optional[str] = None) -> bool:
+        """ Stores raw (hex or bytes). If txid is specified, raw must hash to it,
+        otherwise nothing is stored. Returns True if raw is now in the store. """
+        if isinstance(raw, str):
+            try:
+                raw = bytes.fromhex(raw)
+            except ValueError:
+                return False
+        if not raw:
+            return False
+        key = Hash(raw)[::-1]
+        if txid is not None and self._txid_bytes(txid) != key:
+            self.print_error("refusing to store tx with mismatched txid", txid)
+            return False
+        data, compressed = raw, 0
+        if self.compress:
+            z = zlib.compress(raw, 6)
+            if len(z) < len(raw):
+                data, compressed = z, 1
+        size = len(data)
+        if size > self.max_bytes:
+            return False
+        with self.lock:
+            try:
+                self.atime += 1
+                cur = self.db.execute("INSERT OR IGNORE INTO txs (txid, data, compressed, size, atime)"
+                                      " VALUES (?, ?, ?, ?, ?)", (key, data, compressed, size, self.atime))
+                if cur.rowcount:
+                    self.total_bytes += size
+                    self.count += 1
+                    if self.total_bytes > self.max_bytes:
+                        self._evict(int(self.max_bytes * self.EVICT_TO))
+                else:
+                    # Already have it; just mark it as recently used
+                    self.db.execute("UPDATE txs SET atime = ? WHERE txid = ?", (self.atime, key))
+            except sqlite3.Error as e:
+                self.print_error("put failed:", repr(e))
+                return False
+        return True
+
+    def _evict(self, target_bytes):
+        # Called with the lock held
+        while self.total_bytes > target_bytes and self.count:
+            rows = self.db.execute("SELECT txid, size FROM txs ORDER BY atime LIMIT 256").fetchall()
+            if not rows:
+                break
+            to_delete = []
+            for key, size in rows:
+                to_delete.append((key,))
+                self.total_bytes -= size
+                self.count -= 1
+                if self.total_bytes <= target_bytes:
+                    break
+            self.db.executemany("DELETE FROM txs WHERE txid = ?", to_delete)
+
+    def discard(self, txid: str):
+        key = self._txid_bytes(txid)
+        if key is None:
+            return
+        with self.lock:
+            try:
+                row = self.db.execute("SELECT size FROM txs WHERE txid = ?", (key,)).fetchone()
+                if row:
+                    self.db.execute("DELETE FROM txs WHERE txid = ?", (key,))
+                    self.total_bytes -= row[0]
+                    self.count -= 1
+            except sqlite3.Error as e:
+                self.print_error("discard failed:", repr(e))
+
+    def __contains__(self, txid: str) -> bool:
+        key = self._txid_bytes(txid)
+        if key is None:
+            return False
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM txs WHERE txid = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+_store: Optional[RawTxStore] = None
+_store_failed_path: Optional[str] = None
+_store_lock = threading.Lock()
+
+
+def get_tx_store() -> Optional[RawTxStore]:
+    """ Returns the process-wide RawTxStore living in the data directory of the
+    current SimpleConfig, opening it on first use. Returns None if there is no
+    config yet, if the store was not enabled via the 'tx_store' config key, or
+    if it could not be opened. """
+    global _store, _store_failed_path
+    from .simple_config import get_config
+    config = get_config()
+    if config is None or not config.get('tx_store', False):
+        return None
+    path = os.path.join(config.path, 'tx_store.sqlite')
+    with _store_lock:
+        if _store is not None and _store.path == path:
+            return _store
+        if sqlite3 is None or path == _store_failed_path:
+            return None
+        if _store is not None:
+            # The config (data directory) changed. This only really happens in tests.
+            _store.close()
+            _store = None
+        try:
+            _store = RawTxStore(path, max_bytes=config.get('tx_store_max_bytes', RawTxStore.DEFAULT_MAX_BYTES),
+                                compress=config.get('tx_store_compress', False))
+        except (sqlite3.Error, OSError) as e:
+            print_error("[tx_store] unable to open", path, repr(e))
+            _store_failed_path = path
+            return None
+        return _store
@@ -518,14 +518,17 @@ def format_satoshis_plain(x, decimal_point = 8):
     return "{:.8f}".format(PyDecimal(x) / scale_factor).rstrip('0').rstrip('.')
 
 _cached_dp = None
-from .caches import ExpiringCache
 # This cache will eat about ~6MB of memory per 20,000 items, but it does make
-# format_satoshis() run over 3x faster.
-_fmt_sats_cache = ExpiringCache(maxlen=20000, name='format_satoshis cache')
+# format_satoshis() run over 3x faster. It is created on first use, as the
+# caches module itself imports this module.
+_fmt_sats_cache = None
 def format_satoshis(x, num_zeros=0, decimal_point=8, precision=None, is_diff=False, whitespaces=False):
-    global _cached_dp
+    global _cached_dp, _fmt_sats_cache
     if x is None:
         return _('Unknown')
+    if _fmt_sats_cache is None:
+        from .caches import ExpiringCache
+        _fmt_sats_cache = ExpiringCache(maxlen=20000, name='format_satoshis cache')
     if precision is None:
         precision = decimal_point
     cache_key = (x,num_zeros,decimal_point,precision,is_diff,whitespaces)
@@ -731,6 +734,7 @@ class JSONSocketPipe(PrintError):
         self.max_message_bytes = max_message_bytes
         self.recv_buf = bytearray()
         self.send_buf = bytearray()
+        self.bytes_received = 0
 
     def idle_time(self):
         return time.time() - self.recv_time
@@ -787,6 +791,7 @@ class JSONSocketPipe(PrintError):
 
             self.recv_buf.extend(data)
             self.recv_time = time.time()
+            self.bytes_received += len(data)
 
             if self.max_message_bytes > 0 and len(self.recv_buf) > self.max_message_bytes:
                 raise self.Closed(f"Message limit is: {self.max_message_bytes}; receive buffer exceeded this limit!")
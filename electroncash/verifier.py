@@ -20,13 +20,21 @@
 # ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import heapq
+import time
 from abc import ABC, abstractmethod
 from .util import ThreadJob, bh2u
 from .bitcoin import Hash, hash_decode, hash_encode
 from .blockchain import hash_header
+from . import metrics
 from . import networks
 from .transaction import Transaction
 
+_pending_proofs = metrics.gauge('electroncash_spv_pending_proofs',
+                                'Merkle proofs requested and not yet received', ('wallet',))
+_queued_txs = metrics.gauge('electroncash_spv_queued_txs',
+                            'Transactions waiting for their merkle proof to be requested', ('wallet',))
+
 class BadResponse(Exception): pass
 
 class SPVDelegate(ABC):
@@ -41,6 +49,13 @@ class SPVDelegate(ABC):
     def get_unverified_txs(self) -> dict:
         ''' Return a dict of tx_hash (hex encoded) -> height (int)'''
 
+    def get_unverified_txs_version(self):
+        ''' Optional. Return a value that changes whenever a tx is added to
+        get_unverified_txs() or changes height in it, so the verifier need
+        only re-read it then. The default, None, means it may change at any
+        time and must be re-read every time the verifier runs. '''
+        return None
+
     @abstractmethod
     def add_verified_tx(self, tx_hash : str, height_ts_pos_tup : tuple, header : dict) -> None:
         ''' Called when a verification is successful.
@@ -86,6 +101,11 @@ class SPVDelegate(ABC):
 class SPV(ThreadJob):
     """ Simple Payment Verification """
 
+    MAX_IN_FLIGHT = 100  # Have at most this many merkle requests outstanding at once ...
+    MAX_QLEN = 500  # ... and only make more while the network has fewer than this many requests outstanding
+    RESCAN_INTERVAL = 10.0  # Re-read the delegate's unverified txs at least this often (seconds)
+    SAVE_INTERVAL = 60.0  # While verifying a lot, save the verified txs this often (seconds)
+
     def __init__(self, network, wallet):
         assert isinstance(wallet, SPVDelegate), "Verifier instance needs to be passed a wallet that is an object implementing the SPVDelegate interface."
         self.wallet = wallet  # despite the name, might not always be a wallet instance, may be SPVDelete (CashAcct)
@@ -93,6 +113,11 @@ class SPV(ThreadJob):
         self.blockchain = network.blockchain()
         self.merkle_roots = {}  # txid -> merkle root (once it has been verified)
         self.requested_merkle = set()  # txid set of pending requests
+        self.in_flight = set()  # txids of requests we have not had a response to yet
+        self.queue = []  # heap of (height, txid) of unverified txs not yet requested
+        self._unverified_version = None
+        self._next_rescan = 0.0
+        self._next_save = time.time() + self.SAVE_INTERVAL
         self.qbusy = False
         self.cleaned_up = False
         self._need_release = False
@@ -109,6 +134,8 @@ class SPV(ThreadJob):
         self.cleaned_up = True
         self.network.cancel_requests(self.verify_merkle)
         self.network.remove_jobs([self])
+        _pending_proofs.remove(self.wallet.diagnostic_name())
+        _queued_txs.remove(self.wallet.diagnostic_name())
 
     def release(self):
         ''' Called from main thread, enqueues a 'release' to happen in the
@@ -136,18 +163,24 @@ class SPV(ThreadJob):
             return
 
         local_height = self.network.get_local_height()
-        unverified = self.wallet.get_unverified_txs()
-        for tx_hash, tx_height in unverified.items():
+        self._refresh_queue()
+        deferred = []
+        header_height = header = None
+        # Lowest heights first, so we can stop at the first one we have no
+        # header for yet, and txs in the same block share a header lookup.
+        while self.queue and len(self.in_flight) < self.MAX_IN_FLIGHT:
+            tx_height, tx_hash = self.queue[0]
+            if tx_height > local_height:
+                break
+            heapq.heappop(self.queue)
             # do not request merkle branch if we already requested it
             if tx_hash in self.requested_merkle or tx_hash in self.merkle_roots:
                 continue
-            # or before headers are available
-            if tx_height <= 0 or tx_height > local_height:
-                continue
-
+            if tx_height != header_height:
+                header_height, header = tx_height, blockchain.read_header(tx_height)
             # if it's in the checkpoint region, we still might not have the header
-            header = blockchain.read_header(tx_height)
             if header is None:
+                deferred.append((tx_height, tx_hash))
                 if tx_height <= networks.net.VERIFICATION_BLOCK_HEIGHT:
                     # Per-header requests might be a lot heavier.
                     # Also, they're not supported as header requests are
@@ -155,21 +188,41 @@ class SPV(ThreadJob):
                     index = tx_height // 2016
                     if self.network.request_chunk(interface, index):
                         interface.print_error("verifier requesting chunk {} for height {}".format(index, tx_height))
-                continue
+                break
             # enqueue request
             msg_id = self.network.get_merkle_for_transaction(tx_hash, tx_height,
-                                                             self.verify_merkle)
+                                                             self.verify_merkle, max_qlen=self.MAX_QLEN)
             self.qbusy = msg_id is None
             if self.qbusy:
                 # interface queue busy, will try again later
+                deferred.append((tx_height, tx_hash))
                 break
             self.print_error('requested merkle', tx_hash)
             self.requested_merkle.add(tx_hash)
+            self.in_flight.add(tx_hash)
+        for item in deferred:
+            heapq.heappush(self.queue, item)
+
+        _pending_proofs.labels(self.wallet.diagnostic_name()).set(len(self.requested_merkle))
+        _queued_txs.labels(self.wallet.diagnostic_name()).set(len(self.queue))
 
         if self.network.blockchain() != self.blockchain:
             self.blockchain = self.network.blockchain()
             self.undo_verifications()
 
+    def _refresh_queue(self):
+        ''' Rebuilds self.queue from the delegate's unverified txs, if they
+        may have changed since we last did. '''
+        version = self.wallet.get_unverified_txs_version()
+        now = time.time()
+        if version is not None and version == self._unverified_version and now < self._next_rescan:
+            return
+        self._unverified_version = version
+        self._next_rescan = now + self.RESCAN_INTERVAL
+        self.queue = [(tx_height, tx_hash) for tx_hash, tx_height in self.wallet.get_unverified_txs().items()
+                      if tx_height > 0 and tx_hash not in self.requested_merkle and tx_hash not in self.merkle_roots]
+        heapq.heapify(self.queue)
+
     failure_reasons = (
         'inner_node_tx', 'missing_header', 'merkle_mismatch', 'error_response',
         'misc_failure', 'tx_not_found'
@@ -181,6 +234,8 @@ class SPV(ThreadJob):
         try:
             params = response.get('params')
             tx_hash = params and params[0]
+            if isinstance(tx_hash, str):
+                self.in_flight.discard(tx_hash)
             if response.get('error'):
                 e = str(response.get('error'))
                 if 'not in block' in e.lower():
@@ -244,6 +299,12 @@ class SPV(ThreadJob):
         if self.is_up_to_date() and self.wallet.is_up_to_date() and not self.qbusy:
             self.wallet.save_verified_tx(write=True)
             self.network.trigger_callback('wallet_updated', self.wallet)  # This callback will happen very rarely.. mostly right as the last tx is verified. It's to ensure GUI is updated fully.
+            self._next_save = time.time() + self.SAVE_INTERVAL
+        elif time.time() >= self._next_save:
+            # Verifying everything after a restore can take a while; save what
+            # we have so far so it need not be requested again after a restart.
+            self.wallet.save_verified_tx(write=True)
+            self._next_save = time.time() + self.SAVE_INTERVAL
 
     @classmethod
     def hash_merkle_root(cls, merkle_s, target_hash, pos):
@@ -305,6 +366,8 @@ class SPV(ThreadJob):
     def remove_spv_proof_for_tx(self, tx_hash):
         self.merkle_roots.pop(tx_hash, None)
         self.requested_merkle.discard(tx_hash)
+        self.in_flight.discard(tx_hash)
+        self._next_rescan = 0.0  # it may need verifying again
 
     def is_up_to_date(self):
         return not self.requested_merkle
@@ -72,11 +72,14 @@ from .rpa.rpa_manager import RpaManager
 from . import schnorr
 from . import ecc_fast
 from .blockchain import NULL_HASH_HEX
+from . import metrics
 from . import token
+from .token_index import TokenBalance, TokenIndex
 
 
 from . import paymentrequest
-from .paymentrequest import InvoiceStore, PR_PAID, PR_UNCONFIRMED, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
+from .paymentrequest import InvoiceStore, PR_UNKNOWN
+from .request_index import Received, RequestStatusIndex, payment_status
 from .contacts import Contacts
 from . import cashacct
 from . import slp
@@ -99,6 +102,9 @@ from .i18n import _
 
 DEFAULT_CONFIRMED_ONLY = False
 
+_tx_added = metrics.counter('electroncash_wallet_transactions_added_total',
+                            'Transactions added to wallets (including re-adds)')
+
 
 def relayfee(network):
     RELAY_FEE = 1000
@@ -330,6 +336,10 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         # Python's GIL makes thread-safe implicitly).
         self._addr_bal_cache = {}
 
+        # Unspent CashToken outputs by category, kept in step with
+        # self.ct_txi and self.ct_txo. Built in load_transactions().
+        self.token_index = TokenIndex()
+
         # We keep a set of the wallet and receiving addresses so that is_mine()
         # checks are O(logN) rather than O(N). This creates/resets that cache.
         self.invalidate_address_set_cache()
@@ -347,17 +357,16 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         self.labels                = storage.get('labels', {})
         # Frozen addresses
         frozen_addresses = storage.get('frozen_addresses',[])
-        self.frozen_addresses = set(Address.from_string(addr)
-                                    for addr in frozen_addresses)
+        self.frozen_addresses = set(Address.from_strings(frozen_addresses))
         # Frozen coins (UTXOs) -- note that we have 2 independent levels of "freezing": address-level and coin-level.
         # The two types of freezing are flagged independently of each other and 'spendable' is defined as a coin that satisfies
         # BOTH levels of freezing.
         self.frozen_coins = set(storage.get('frozen_coins', []))
         self.frozen_coins_tmp = set()  # in-memory only
 
-        self.change_reserved = set(Address.from_string(a) for a in storage.get('change_reserved', ()))
-        self.change_reserved_default = [Address.from_string(a) for a in storage.get('change_reserved_default', ())]
-        self.change_unreserved = [Address.from_string(a) for a in storage.get('change_unreserved', ())]
+        self.change_reserved = set(Address.from_strings(storage.get('change_reserved', ())))
+        self.change_reserved_default = Address.from_strings(storage.get('change_reserved_default', ()))
+        self.change_unreserved = Address.from_strings(storage.get('change_unreserved', ()))
         self.change_reserved_tmp = set() # in-memory only
 
         # address -> list(txid, height)
@@ -382,11 +391,18 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             req['address'] = Address.from_string(key)
         self.receive_requests = {req['address']: req
                                  for req in requests.values()}
+        # Bumped whenever a request is added or removed
+        self.receive_requests_version = 0
+        # Their statuses, kept up to date as txs come in
+        self.request_index = RequestStatusIndex(self, self.storage.get('payment_requests_status'))
 
         # Transactions pending verification.  A map from tx hash to transaction
         # height.  Access is contended so a lock is needed. Client code should
         # use get_unverified_tx to get a thread-safe copy of this dict.
         self.unverified_tx = defaultdict(int)
+        # Bumped whenever a tx is added to unverified_tx or changes height in
+        # it, so the verifier knows when it needs to look at it again.
+        self._unverified_tx_version = 0
 
         # Verified transactions.  Each value is a (height, timestamp, block_pos, block_hash) tuple.  Access with self.lock.
         self.verified_tx = self._load_verified_tx()
@@ -413,9 +429,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         self.check_history()
 
         if self.slp.need_rebuild:
-            # load failed, must rebuild from self.transactions
-            self.slp.rebuild()
-            self.slp.save()  # commit changes to self.storage
+            # load failed or found inconsistent txs, must reprocess those from self.transactions (in the background
+            # if there are many)
+            self.slp.start_rebuild()
 
         # Print debug message on finalization
         finalization_print_error(self, "[{}/{}] finalized".format(type(self).__name__, self.diagnostic_name()))
@@ -441,13 +457,12 @@ class Abstract_Wallet(PrintError, SPVDelegate):
     @classmethod
     def to_Address_dict(cls, d):
         '''Convert a dict of strings to a dict of Adddress objects.'''
-        return {Address.from_string(text): value for text, value in d.items()}
+        return dict(zip(Address.from_strings(d.keys()), d.values()))
 
     @classmethod
     def from_Address_dict(cls, d):
         '''Convert a dict of Address objects to a dict of strings.'''
-        return {addr.to_storage_string(): value
-                for addr, value in d.items()}
+        return dict(zip(Address.to_strings(Address.FMT_LEGACY, d.keys()), d.values()))
 
     def diagnostic_name(self):
         return self.basename()
@@ -555,10 +570,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         self.pruned_txo_values = set(self.pruned_txo.values())
         tx_list = self.storage.get('transactions', {})
         self.transactions = {}
-        txid_hasher = hashlib.sha256() if not bad_ct_entry_ctr else None
+        txid_hasher = hashlib.sha256()
         for tx_hash, raw in sorted(tx_list.items(), key=lambda x: x[0]):
-            if txid_hasher:
-                txid_hasher.update(bytes.fromhex(tx_hash))
+            txid_hasher.update(bytes.fromhex(tx_hash))
             tx = Transaction(raw)
             self.transactions[tx_hash] = tx
             if (not self.txi.get(tx_hash) and not self.txo.get(tx_hash) and (tx_hash not in self.pruned_txo_values)
@@ -567,11 +581,17 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                 self.transactions.pop(tx_hash)
                 self.cashacct.remove_transaction_hook(tx_hash)
                 self.slp.rm_tx(tx_hash)
-        if txid_hasher is None or txid_hasher.digest().hex() != ct_txid_hash:
+        txid_hash = txid_hasher.digest().hex()
+        if bad_ct_entry_ctr or txid_hash != ct_txid_hash:
             # Need to rebuild ct_txi and ct_txo
             # This code is here to detect case where user opened same wallet in an older version of
             # electron cash which does not track CashTokens
             self.rebuild_ct_txi_txo()
+        self.token_index.rebuild(self.ct_txi, self.ct_txo)
+        if txid_hash != self.storage.get('payment_requests_txid_hash', None):
+            # The saved request statuses were worked out from another set of txs, e.g. the wallet was
+            # used by an older version of electron cash in the meantime. Look at them all again.
+            self.request_index.invalidate_all()
 
     @profiler
     def load_ct_txo(self) -> int:
@@ -771,6 +791,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self.save_ct_txo()
             ct_txid_hash = txid_hasher.digest().hex()
             self.storage.put('ct_txid_hash', ct_txid_hash)
+            if self.request_index.modified:
+                self.save_request_statuses(ct_txid_hash)
             if write:
                 self.storage.write()
 
@@ -783,10 +805,10 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
     def save_change_reservations(self):
         with self.lock:
-            self.storage.put('change_reserved_default', [a.to_storage_string() for a in self.change_reserved_default])
-            self.storage.put('change_reserved', [a.to_storage_string() for a in self.change_reserved])
+            self.storage.put('change_reserved_default', Address.to_strings(Address.FMT_LEGACY, self.change_reserved_default))
+            self.storage.put('change_reserved', Address.to_strings(Address.FMT_LEGACY, self.change_reserved))
             unreserved = self.change_unreserved + list(self.change_reserved_tmp)
-            self.storage.put('change_unreserved', [a.to_storage_string() for a in unreserved])
+            self.storage.put('change_unreserved', Address.to_strings(Address.FMT_LEGACY, unreserved))
 
     def clear_history(self):
         with self.lock:
@@ -794,6 +816,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self.txo = {}
             self.ct_txi = {}
             self.ct_txo = {}
+            self.token_index.clear()
+            self.request_index.invalidate_all()
             self.tx_fees = {}
             self.pruned_txo = {}
             self.pruned_txo_values = set()
@@ -839,10 +863,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
     def save_addresses(self):
         addr_dict = {
-            'receiving': [addr.to_storage_string()
-                          for addr in self.receiving_addresses],
-            'change': [addr.to_storage_string()
-                       for addr in self.change_addresses],
+            'receiving': Address.to_strings(Address.FMT_LEGACY, self.receiving_addresses),
+            'change': Address.to_strings(Address.FMT_LEGACY, self.change_addresses),
         }
         self.storage.put('addresses', addr_dict)
 
@@ -991,6 +1013,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
             # tx will be verified only if height > 0
             if tx_hash not in self.verified_tx:
+                if self.unverified_tx.get(tx_hash) != tx_height:
+                    self._unverified_tx_version += 1
                 self.unverified_tx[tx_hash] = tx_height
                 self.cashacct.add_unverified_tx_hook(tx_hash, tx_height)
 
@@ -1014,6 +1038,10 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         with self.lock:
             return self.unverified_tx.copy()
 
+    def get_unverified_txs_version(self):
+        with self.lock:
+            return self._unverified_tx_version
+
     def get_unverified_tx_pending_count(self):
         ''' Returns the number of unverified tx's that are confirmed and are
         still in process and should be verified soon.'''
@@ -1126,6 +1154,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         assert isinstance(address, Address)
         if tx_hash in self.pruned_txo_values:
             return None
+        if not self.token_index.has_address(address):
+            # Fast path: this address never had tokens
+            return {}
 
         # Nota bene: self.ct_txi is a nested dict of dicts keyed by:
         # tx_hash -> dict key: address -> dict key: prevout_hash -> dict key: prevout_n -> token_data (token.OutputData)
@@ -1472,6 +1503,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
         exclude_slp skips coins that also have SLP tokens on them.  This defaults
         to True in EC 4.0.10+ in order to prevent inadvertently burning tokens.
+        It also skips the coins of txs that an SLP rebuild in progress has yet
+        to process, as those may have tokens on them too.
 
         Optional kw-only arg `addr_set_out` specifies a set in which to add all
         addresses encountered in the utxos returned. """
@@ -1492,7 +1525,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                         continue
                     if tokens_only and not x['token_data']:
                         continue
-                    if exclude_slp and x['slp_token']:
+                    if exclude_slp and (x['slp_token'] or self.slp.txid_is_pending(x['prevout_hash'])):
                         continue
                     if exclude_frozen and x['is_frozen_coin']:
                         continue
@@ -1511,6 +1544,26 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     addr_set_out.add(addr)
             return coins
 
+    def get_token_utxos(self, category_id: Optional[str] = None, *, exclude_frozen=False, mature=False,
+                        confirmed_only=False) -> List[Dict[str, Any]]:
+        """Returns the same as get_utxos(tokens_only=True), optionally only for the CashToken category category_id,
+        but only looks at the addresses that the token index says hold tokens. """
+        with self.lock:
+            holders = self.token_index.get_addresses(category_id)
+            if not holders:
+                return []
+            coins = self.get_utxos(holders, exclude_frozen=exclude_frozen, mature=mature,
+                                   confirmed_only=confirmed_only, tokens_only=True)
+        if category_id is not None:
+            coins = [x for x in coins if x['token_data'].id_hex == category_id]
+        return coins
+
+    def get_token_balances(self) -> Dict[str, TokenBalance]:
+        """Returns token id hex -> TokenBalance for each CashToken category we hold unspent outputs of, including
+        unconfirmed and frozen ones. This comes straight from the token index, so it is O(categories). """
+        with self.lock:
+            return self.token_index.get_balances()
+
     def dummy_address(self):
         return self.get_receiving_addresses()[0]
 
@@ -1556,16 +1609,144 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         if exclude_frozen_addresses:
             domain = set(domain) - self.frozen_addresses
         cc = uu = xx = toks = 0
-        for addr in domain:
-            tup = self.get_addr_balance(addr, exclude_frozen_coins, tokens=tokens)
-            c, u, x = tup[:3]
-            tok = tup[3] if tokens else 0
+        for c, u, x, tok in self.get_addr_balances(domain, exclude_frozen_coins).values():
             cc += c
             uu += u
             xx += x
             toks += tok
         return (cc, uu, xx, toks)[:3 + int(tokens)]
 
+    def get_addr_balances(self, domain, exclude_frozen_coins=False) -> Dict[Address, Tuple[int, int, int, int]]:
+        """ Returns Address -> (confirmed_matured, unconfirmed, unmatured,
+        cashtoken_utxo_balance) for each address in domain, as
+        get_addr_balance(addr, exclude_frozen_coins, tokens=True) would.
+
+        Cached balances are used as they are. The others are worked out in one
+        pass over the tx maps, rather than one get_addr_io() per address, and
+        are cached like get_addr_balance() does. """
+        out = {}
+        todo = []
+        with self.lock:
+            for addr in domain:
+                cached = None if exclude_frozen_coins else self._addr_bal_cache.get(addr)
+                if cached is not None and len(cached) == 4:
+                    out[addr] = cached
+                else:
+                    todo.append(addr)
+            if not todo:
+                return out
+            history = self._history
+            heights = {}  # tx_hash -> height, of the txs of the addresses to do
+            for addr in todo:
+                for tx_hash, height in history.get(addr, ()):
+                    heights[tx_hash] = height
+            if len(heights) * 4 < len(self.txo):
+                # Few txs involved: looking them up is cheaper than the pass below
+                for addr in todo:
+                    out[addr] = self.get_addr_balance(addr, exclude_frozen_coins, tokens=True)
+                return out
+            todo_set = set(todo)
+            frozen = (self.frozen_coins | self.frozen_coins_tmp) if exclude_frozen_coins else set()
+            mempool_height = self.get_local_height() + 1
+            # Address -> [c, u, x, tok_locked, had_cb]
+            totals = {addr: [0, 0, 0, 0, False] for addr in todo}
+            tokens = []  # (addr, prevout, value) of the token outputs received
+            for tx_hash, addrmap in self.txo.items():
+                height = heights.get(tx_hash)
+                if height is None:
+                    continue
+                ct_addrmap = self.ct_txo.get(tx_hash)
+                for addr, outputs in addrmap.items():
+                    if addr not in todo_set:
+                        continue
+                    t = totals[addr]
+                    ct_outputs = ct_addrmap and ct_addrmap.get(addr)
+                    for n, v, is_cb in outputs:
+                        if frozen and tx_hash + ':%d' % n in frozen:
+                            continue
+                        if is_cb:
+                            t[4] = True
+                        if is_cb and height + COINBASE_MATURITY > mempool_height:
+                            t[2] += v
+                        elif height > 0:
+                            t[0] += v
+                        else:
+                            t[1] += v
+                        if ct_outputs and n in ct_outputs:
+                            tokens.append((addr, tx_hash + ':%d' % n, v))
+            spent = set()
+            for tx_hash, addrmap in self.txi.items():
+                height = heights.get(tx_hash)
+                if height is None:
+                    continue
+                for addr, inputs in addrmap.items():
+                    if addr not in todo_set:
+                        continue
+                    t = totals[addr]
+                    for txi, v in inputs:
+                        # Only what we count as received above, like get_addr_io()
+                        if txi in spent or txi[:64] not in heights or (frozen and txi in frozen):
+                            continue
+                        spent.add(txi)
+                        if height > 0:
+                            t[0] -= v
+                        else:
+                            t[1] -= v
+            for addr, txo, v in tokens:
+                if txo not in spent:
+                    totals[addr][3] += v
+            for addr, (c, u, x, tok_locked, had_cb) in totals.items():
+                result = out[addr] = (c, u, x, tok_locked)
+                if not exclude_frozen_coins and not had_cb:
+                    # See the comment on caching in get_addr_balance()
+                    self._addr_bal_cache[addr] = result
+        return out
+
+    AddressSummary = namedtuple("AddressSummary", "address, is_change, balance, num_txs, is_frozen, label")
+
+    def get_address_summaries(self, *, change: Optional[bool] = None, frozen: Optional[bool] = None,
+                              used: Optional[bool] = None, funded: Optional[bool] = None,
+                              offset=0, limit=None) -> List['Abstract_Wallet.AddressSummary']:
+        """ Returns an AddressSummary for the wallet's addresses, receiving
+        ones first, in one go. balance is (confirmed_matured, unconfirmed,
+        unmatured) and num_txs the length of the address's history.
+
+        Each of the filters keeps only the addresses for which it holds when
+        True, and those for which it does not when False: change means a
+        change address, frozen means frozen at the address level, used means
+        is_used() and funded means not is_empty(). offset and limit then page
+        through what is left. """
+        with self.lock:
+            addrs = []
+            if change is not True:
+                addrs += ((addr, False) for addr in self.get_receiving_addresses())
+            if change is not False:
+                addrs += ((addr, True) for addr in self.get_change_addresses())
+            if frozen is not None:
+                addrs = [(addr, is_change) for addr, is_change in addrs
+                         if (addr in self.frozen_addresses) == frozen]
+            if used is None and funded is None:
+                # The balances are not needed to filter, so only work out those of the page
+                addrs = addrs[offset:offset + limit if limit is not None else None]
+                offset, limit = 0, None
+            balances = self.get_addr_balances([addr for addr, _ in addrs])
+            out = []
+            for addr, is_change in addrs:
+                balance = balances[addr][:3]
+                num_txs = len(self._history.get(addr, ()))
+                if used is not None and (bool(num_txs) and not any(balance)) != used:
+                    continue
+                if funded is not None and any(balance) != funded:
+                    continue
+                if offset > 0:
+                    offset -= 1
+                    continue
+                if limit is not None and len(out) >= limit:
+                    break
+                out.append(self.AddressSummary(addr, is_change, balance, num_txs, addr in self.frozen_addresses,
+                                               self.labels.get(addr.to_storage_string(), '')))
+            return out
+
     def get_address_history(self, address):
         assert isinstance(address, Address)
         return self._history.get(address, [])
@@ -1670,7 +1851,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                             # .txid()) which ensures the tx from the server
                             # is not junk.
                             assert prevout_hash == tx.txid(), "txid mismatch"
-                            Transaction.tx_cache_put(tx, prevout_hash)  # will cache a copy
+                            Transaction.tx_cache_put(tx, prevout_hash, persist=self.allows_tx_store())  # will cache a copy
                     except Exception as e:
                         self.print_error(f"{fname}: Error retrieving txid", prevout_hash, ":", repr(e))
                         if not keep_running():  # in case we got a network timeout *and* the wallet was closed
@@ -1719,6 +1900,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self.print_error("add_transaction: WARNING a tx came in from the network with 0 inputs!"
                              " Bad server? Ignoring tx:", tx_hash)
             return
+        _tx_added.inc()
         is_coinbase = tx.inputs()[0]['type'] == 'coinbase'
         with self.lock:
             # HELPER FUNCTIONS
@@ -1745,6 +1927,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     if ddd is None:
                         dd[prevout_hash] = ddd = {}
                     ddd[prevout_n] = token_data
+                    self.token_index.add_spend(ser, tx_hash, addr)
                     self.print_error(f"Adding CashTokens txi: {tx_hash} -> {addr} -> {prevout_hash} -> {prevout_n} -> {token_data!r}")
 
             def find_in_self_txo(prevout_hash: str, prevout_n: int) -> tuple:
@@ -1782,6 +1965,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             # add inputs
             self.txi[tx_hash] = d = {}
             self.ct_txi[tx_hash] = ct_d = {}
+            self.token_index.remove_spends_by(tx_hash)
             for txi in tx.inputs():
                 if txi['type'] == 'coinbase':
                     continue
@@ -1840,6 +2024,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             # add outputs
             self.txo[tx_hash] = d = {}
             self.ct_txo[tx_hash] = ct_d = {}
+            self.token_index.remove_outputs_of(tx_hash)
             op_return_ct = 0
             deferred_cashacct_add = None
             for n, (txo, token_data) in enumerate(tx.outputs(tokens=True)):
@@ -1870,6 +2055,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                         if ct_dd is None:
                             ct_d[addr] = ct_dd = {}
                         ct_dd[n] = token_data
+                        self.token_index.add_output(ser, addr, token_data)
                         self.print_error(f"Adding CashTokens txo: {tx_hash} -> {addr} -> {n} -> {token_data!r}")
                     self._addr_bal_cache.pop(addr, None)  # invalidate cache entry
                 # give v to txi that spends me
@@ -1938,11 +2124,16 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             # undo the self.ct_txi addition
             empties = []
             for next_tx, addrmap in self.ct_txi.items():  # next_tx_hash -> Address -> tx_hash -> n -> tokenOutput
-                addrmap.pop(tx_hash, None)
+                for addr in list(addrmap):
+                    dd = addrmap[addr]
+                    dd.pop(tx_hash, None)
+                    if not dd:
+                        addrmap.pop(addr)
                 if not addrmap:
                     empties.append(next_tx)
             for next_tx in empties:
                 self.ct_txi.pop(next_tx, None)
+            self.token_index.remove_tx(tx_hash)
 
             # invalidate addr_bal_cache for outputs involving this tx
             d = self.txo.get(tx_hash, {})  # tx_hash -> Address -> List[Tuple[N, value, is_cb]]
@@ -1970,9 +2161,11 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         tx = self.transactions.get(tx_hash)
         if tx is None:
             return
-        if self.network and self.network.callback_listener_count("payment_received") > 0:
-            for _, addr, _ in tx.outputs():
-                status = self.get_request_status(addr)  # returns PR_UNKNOWN quickly if addr has no requests, otherwise returns tuple
+        with self.lock:
+            addrs = self.request_index.invalidate_tx(tx)
+        if addrs and self.network and self.network.callback_listener_count("payment_received") > 0:
+            for addr in addrs:
+                status = self.get_request_status(addr)
                 if status != PR_UNKNOWN:
                     status = status[0]  # unpack status from tuple
                     self.network.trigger_callback('payment_received', self, addr, status)
@@ -2022,6 +2215,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     self.remove_transaction(tx_hash)
                     removed_ct += 1
             self._addr_bal_cache.pop(addr, None)  # unconditionally invalidate cache entry
+            self.request_index.invalidate(addr)
             self._history[addr] = hist
 
             for tx_hash, tx_height in hist:
@@ -2210,7 +2404,6 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         self.tx_fees, which gets saved to wallet storage. This is not very
         demanding on storage as even for very large wallets with huge histories,
         tx_fees does not use more than a few hundred kb of space."""
-        from .util import timestamp_to_datetime
         # we save copies of tx's we deserialize to this temp dict because we do
         # *not* want to deserialize tx's in wallet.transactoins since that
         # wastes memory
@@ -2301,6 +2494,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         # grab history
         h = self.get_history(domain, reverse=True, receives_before_sends=receives_before_sends)
         out = []
+        fiat_rows = []  # (timestamp, value, balance, fee) for each item in out
 
         n, l = 0, max(1, float(len(h)))
         for tx_hash, height, conf, timestamp, value, balance in h:
@@ -2362,11 +2556,15 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                 item['input_addresses'] = input_addresses
                 item['output_addresses'] = output_addresses
             if fx is not None:
-                date = timestamp_to_datetime(timestamp_safe)
-                item['fiat_value'] = fx.historical_value_str(value, date)
-                item['fiat_balance'] = fx.historical_value_str(balance, date)
-                item['fiat_fee'] = fx.historical_value_str(fee, date)
+                fiat_rows.append((timestamp_safe, value, balance, fee))
             out.append(item)
+        if fx is not None:
+            # Look up all the rates in one go, which is much faster for big wallets
+            rates = fx.history_rates(row[0] for row in fiat_rows)
+            for item, (_ts, value, balance, fee), rate in zip(out, fiat_rows, rates):
+                item['fiat_value'] = fx.value_str(value, rate)
+                item['fiat_balance'] = fx.value_str(balance, rate)
+                item['fiat_fee'] = fx.value_str(fee, rate)
         if progress_callback:
             progress_callback(1.0)  # indicate done, just in case client code expects a 1.0 in order to detect completion
         if fee_calc_timeout_callback is not None and did_time_out_on_input_dl:
@@ -3172,8 +3370,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                 self.frozen_addresses |= set(addrs)
             else:
                 self.frozen_addresses -= set(addrs)
-            frozen_addresses = [addr.to_storage_string()
-                                for addr in self.frozen_addresses]
+            frozen_addresses = Address.to_strings(Address.FMT_LEGACY, self.frozen_addresses)
             self.storage.put('frozen_addresses', frozen_addresses)
             return True
         return False
@@ -3268,6 +3465,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self.verifier = None
             self.synchronizer = None
             self.rpa_manager = None
+        if self.slp.need_rebuild and not self.slp.rebuild_thread:
+            # A background SLP rebuild stopped by stop_threads() picks up where it left off
+            self.slp.start_rebuild()
 
     def stop_threads(self):
         if self.network:
@@ -3288,11 +3488,13 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self.verifier = None
             if self.rpa_manager:
                 self.network.remove_jobs([self.rpa_manager])
+                self.rpa_manager.stop()
             self.rpa_manager = None
             self.stop_pruned_txo_cleaner_thread()
             # Now no references to the syncronizer or verifier
             # remain so they will be GC-ed
             self.storage.put('stored_height', self.get_local_height())
+        self.slp.stop_rebuild()
         self.save_network_state()
 
     def save_network_state(self):
@@ -3441,6 +3643,12 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         while len(self._tx_cache) > self._tx_cache_max:
             self._tx_cache.popitem(last=False)
 
+    def allows_tx_store(self) -> bool:
+        ''' Whether txs fetched for this wallet may go into the on-disk
+        RawTxStore (see tx_store.py). That store is plaintext and shared by
+        all wallets, so we keep the txs of encrypted wallets out of it. '''
+        return not self.storage.is_encrypted()
+
     def try_to_get_tx(self, tx_hash, *, allow_network_lookup=True, timeout=30) -> Optional[Transaction]:
         # Try and find it in the wallet cache
         tx = self._get_tx_from_cache(tx_hash)
@@ -3460,11 +3668,11 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             # Next, try to get it from the Transaction "fetched input" cache (who knows, it might be there!)
             tx = Transaction.tx_cache_get(tx_hash)
             if not tx and self.network and allow_network_lookup:
-                # Not cached. Resort to network lookup.
-                request = ('blockchain.transaction.get', [tx_hash])
+                # Not cached. Resort to network lookup. The fetcher caches the
+                # result process-wide (and on disk, if we allow it) so that no
+                # wallet asks the network for it again.
                 try:
-                    raw = self.network.synchronous_get(request, timeout=timeout)
-                    tx = Transaction(raw) if raw else None
+                    tx = self.network.tx_fetcher.get(tx_hash, timeout=timeout, persist=self.allows_tx_store())
                 except util.ServerError:
                     return None
         if tx:
@@ -3480,6 +3688,15 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
     def add_input_values_to_tx(self, tx):
         """ add input values to the tx, for signing"""
+        if self.network:
+            # Fetch all the missing prevout txs in parallel up-front, rather
+            # than one round-trip at a time in the loop below
+            missing = {txin['prevout_hash'] for txin in tx.inputs()
+                       if ('value' not in txin or 'token_data' not in txin)
+                       and txin['prevout_hash'] not in self.transactions
+                       and not self._get_tx_from_cache(txin['prevout_hash'])}
+            if missing:
+                self.network.tx_fetcher.get_many(missing, persist=self.allows_tx_store())
         for txin in tx.inputs():
             if 'value' not in txin or 'token_data' not in txin:
                 inputtx = self.get_input_tx(txin['prevout_hash'])
@@ -3534,6 +3751,23 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             except UserCancelled:
                 continue
 
+    def sign_transactions(self, txs, password, *, max_workers=None):
+        """ Signs each of txs, like sign_transaction(tx, password,
+        use_cache=True). If all keystores are software keystores, the
+        transactions are signed in parallel by up to max_workers threads
+        (which only helps as far as the signing backend releases the GIL, as
+        libsecp256k1 does); otherwise they are signed one at a time. The txs
+        must not spend from one another's outputs. """
+        txs = list(txs)
+        if len(txs) <= 1 or max_workers == 1 or any(isinstance(k, Hardware_KeyStore) for k in self.get_keystores()):
+            for tx in txs:
+                self.sign_transaction(tx, password, use_cache=True)
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='Signer') as executor:
+            # list() so that an exception (such as InvalidPassword) is raised here
+            list(executor.map(lambda tx: self.sign_transaction(tx, password, use_cache=True), txs))
+
     def get_unused_addresses(self, *, for_change=False, frozen_ok=True, preferred=False):
         # fixme: use slots from expired requests
         with self.lock:
@@ -3565,7 +3799,12 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             return domain[0]
 
     def get_payment_status(self, address, amount, *, tokenreq=False, category_id=None):
-        local_height = self.get_local_height()
+        received = self._get_payment_received(address, tokenreq=tokenreq, category_id=category_id)
+        return payment_status(received, amount, self.get_local_height())
+
+    def _get_payment_received(self, address, *, tokenreq=False, category_id=None) -> Received:
+        """Returns [(height, value, txid)] of what address received that counts towards a payment request, with
+        height 0 for txs that are not verified. For token requests, value is the token amount."""
         received, sent = self.get_addr_io(address)
         l = []
         for txo, x in received.items():
@@ -3577,24 +3816,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     continue
             txid, n = txo.split(':')
             info = self.verified_tx.get(txid)
-            if info:
-                tx_height, timestamp, pos, _block_hash = info
-                conf = max(local_height - tx_height + 1, 0)
-            else:
-                conf = 0
-            l.append((conf, v, txid))
-        tx_hashes = []
-        vsum = 0
-        amount = amount or 0
-        is_paid = False
-        result_conf = None
-        for conf, v, tx_hash in reversed(sorted(l)):
-            vsum += v
-            tx_hashes.append(tx_hash)
-            if vsum >= amount:
-                is_paid = True
-                result_conf = conf
-        return is_paid, result_conf, tx_hashes
+            l.append((info[0] if info else 0, v, txid))
+        return l
 
     def has_payment_request(self, addr):
         ''' Returns True iff Address addr has any extant payment requests
@@ -3645,29 +3868,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         return out
 
     def get_request_status(self, key):
-        r = self.receive_requests.get(key)
-        if r is None:
-            return PR_UNKNOWN
-        address = r['address']
-        amount = r.get('amount')
-        timestamp = r.get('time', 0)
-        if timestamp and type(timestamp) != int:
-            timestamp = 0
-        expiration = r.get('exp')
-        if expiration and type(expiration) != int:
-            expiration = 0
-        conf = None
-        tx_hashes = []
-        paid, conf, tx_hashes = self.get_payment_status(address, amount, tokenreq=r.get('tokenreq', False), category_id=r.get('category_id'))
-        if not paid:
-            status = PR_UNPAID
-        elif conf == 0:
-            status = PR_UNCONFIRMED
-        else:
-            status = PR_PAID
-        if status == PR_UNPAID and expiration is not None and time.time() > timestamp + expiration:
-            status = PR_EXPIRED
-        return status, conf, tx_hashes
+        """Returns (status, conf, tx_hashes) of the request at Address key, or PR_UNKNOWN if there is none."""
+        with self.lock:
+            return self.request_index.get(key)
 
     def make_payment_request(self, addr, amount, message, expiration=None, *,
                              op_return=None, op_return_raw=None, payment_url=None, index_url=None, token_request=False, category_id=None):
@@ -3709,10 +3912,24 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         requests = {addr.to_storage_string() : delete_address(value.copy())
                     for addr, value in self.receive_requests.items()}
         self.storage.put('payment_requests', requests)
+        self.save_request_statuses()
         self.save_labels()  # In case address labels were set or cleared.
         if write:
             self.storage.write()
 
+    def save_request_statuses(self, txid_hash=None):
+        """ Saves the request statuses along with a hash of the txids they were worked out from (the same hash as
+        'ct_txid_hash'; pass it as txid_hash if already known). """
+        with self.lock:
+            if txid_hash is None:
+                txid_hasher = hashlib.sha256()
+                for tx_hash in sorted(self.transactions):
+                    txid_hasher.update(bytes.fromhex(tx_hash))
+                txid_hash = txid_hasher.digest().hex()
+            self.storage.put('payment_requests_status', self.request_index.dump())
+            self.storage.put('payment_requests_txid_hash', txid_hash)
+            self.request_index.modified = False
+
     def sign_payment_request(self, key, alias, alias_addr, password):
         req = self.receive_requests.get(key)
         alias_privkey = self.export_private_key(alias_addr, password)
@@ -3728,7 +3945,10 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         addr_text = addr.to_storage_string()
         amount = req['amount']
         message = req['memo']
-        self.receive_requests[addr] = req
+        with self.lock:
+            self.receive_requests[addr] = req
+            self.receive_requests_version += 1
+            self.request_index.add(addr)
         if save:
             self.save_payment_requests()
         if set_address_label:
@@ -3759,7 +3979,10 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             addr = Address.from_string(addr)
         if addr not in self.receive_requests:
             return False
-        r = self.receive_requests.pop(addr)
+        with self.lock:
+            r = self.receive_requests.pop(addr)
+            self.receive_requests_version += 1
+            self.request_index.remove(addr)
         if clear_address_label_if_no_tx and not self.get_address_history(addr):
             memo = r.get('memo')
             # clear it only if the user didn't overwrite it with something else
@@ -3777,30 +4000,20 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self.save_payment_requests()
         return True
 
-    def get_sorted_requests(self, config, *, filter_asset: Optional[str] = None):
-        # `filter_asset` may be either None to indicate no filter, 'token' to return only
-        # token requests, and any other value to return only BCH requests
-        m = map(lambda x: self.get_payment_request(x, config), self.receive_requests.keys())
-        if filter_asset is not None:
-            def is_request_for_asset(req, asset):
-                return (asset == 'token') == req.get('tokenreq', False)
-            m = filter(lambda x: is_request_for_asset(x, filter_asset), m)
-        try:
-            def f(x):
-                try:
-                    addr = x['address']
-                    return self.get_address_index(addr) or addr
-                except:
-                    return addr
-            return sorted(m, key=f)
-        except TypeError:
-            # See issue #1231 -- can get inhomogenous results in the above
-            # sorting function due to the 'or addr' possible return.
-            # This can happen if addresses for some reason drop out of wallet
-            # while, say, the history rescan is running and it can't yet find
-            # an address index for an address.  In that case we will
-            # return an unsorted list to the caller.
-            return list(m)
+    def get_sorted_requests(self, config, *, filter_asset: Optional[str] = None, statuses=None, offset=0,
+                            limit=None):
+        """Returns the payment requests, as from get_payment_request(), in address order.
+        `filter_asset` may be either None to indicate no filter, 'token' to return only token requests, and any other
+        value to return only BCH requests. If `statuses` is given, only requests with one of those statuses (PR_UNPAID,
+        PR_EXPIRED, ...) are returned. `offset` and `limit` select a page of the results."""
+        with self.lock:
+            addrs = self.request_index.query(statuses, filter_asset=filter_asset, offset=offset, limit=limit)
+        return [self.get_payment_request(addr, config) for addr in addrs]
+
+    def get_request_counts(self) -> Dict[int, int]:
+        """Returns status -> how many payment requests have it"""
+        with self.lock:
+            return self.request_index.counts()
 
     def get_fingerprint(self):
         raise NotImplementedError()
@@ -4139,11 +4352,10 @@ class ImportedAddressWallet(ImportedWalletBase):
 
     def load_addresses(self):
         addresses = self.storage.get('addresses', [])
-        self.addresses = [Address.from_string(addr) for addr in addresses]
+        self.addresses = Address.from_strings(addresses)
 
     def save_addresses(self):
-        self.storage.put('addresses', [addr.to_storage_string()
-                                       for addr in self.addresses])
+        self.storage.put('addresses', Address.to_strings(Address.FMT_LEGACY, self.addresses))
         self.storage.write()
 
     def can_change_password(self):
@@ -4392,6 +4604,23 @@ class RpaWallet(ImportedWalletBase):
         self.storage.write()  # no-op if above already wrote
         return pubkey.address.to_ui_string()
 
+    def import_private_keys(self, secs, pw):
+        """Bulk version of import_private_key, used by the RpaManager. Keys already in the keystore are skipped, and
+        the keystore is saved and storage written at most once for the whole batch. Returns the list of newly added
+        addresses."""
+        added = []
+        for sec in secs:
+            pubkey = self.keystore.import_privkey(sec, pw)
+            if pubkey.address not in self._history:
+                added.append(pubkey.address)
+                self.add_address(pubkey.address)
+        if added:
+            self.save_keystore()
+            self.cashacct.save()
+            self.save_addresses()
+            self.storage.write()
+        return added
+
     def export_private_key(self, address, password):
         '''Returned in WIF format.'''
         pubkey = self.keystore.address_to_pubkey(address)
@@ -4437,6 +4666,13 @@ class RpaWallet(ImportedWalletBase):
     def extract_private_keys_from_transaction(self, rawtx, password):
         return rpa.extract_private_keys_from_transaction(self, rawtx, password)
 
+    def get_rpa_scan_keys(self, password):
+        return rpa.get_rpa_scan_keys(self, password)
+
+    def extract_private_keys_from_transactions(self, rawtxs, password, *, scan_keys=None, executor=None):
+        return rpa.extract_private_keys_from_transactions(self, rawtxs, password, scan_keys=scan_keys,
+                                                          executor=executor)
+
     def rebuild_history(self):
         self.storage.put('rpa_height', rpa.determine_best_rpa_start_height())
         super(RpaWallet, self).rebuild_history()
@@ -22,123 +22,367 @@
 # ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import queue
-import threading, os, json
-from collections import defaultdict
+""" Websocket notifications for the payment requests of the daemon's wallets.
+
+A web page showing a payment request (see electrum-merchant) opens a
+websocket to us and sends "id:<request id>". From then on we push it the
+status of that request as JSON, each time it changes, and until the payment
+has `websocket_confirmations` confirmations. For the pages written against the
+old service, we also send "paid" once the request is paid.
+
+The statuses come from the wallets' request index, and we learn that they may
+have changed from the network's 'payment_received' and 'blockchain_updated'
+callbacks, so nothing here asks the server anything. Changes are collected as
+they come in and pushed in one go by the server thread, which looks at each
+request once no matter how many sockets wait on it. The server thread waits
+on all the sockets and on a wakeup socket with the selectors module, so it
+does not poll, and is not limited to the 1024 sockets of select(). """
+
+import json
+import selectors
+import socket
+import threading
+from typing import Dict, Optional, Set, Tuple
+
 try:
-    from SimpleWebSocketServer import WebSocket, SimpleSSLWebSocketServer
+    from SimpleWebSocketServer import WebSocket, SimpleWebSocketServer, SimpleSSLWebSocketServer
 except ImportError:
-    import sys
-    sys.exit("install SimpleWebSocketServer")
+    WebSocket = SimpleWebSocketServer = SimpleSSLWebSocketServer = None
 
 from . import util
 from .address import Address
+from .paymentrequest import PR_EXPIRED, PR_PAID, PR_UNCONFIRMED, PR_UNKNOWN, PR_UNPAID
 
-request_queue = queue.Queue()
+STATUS_NAMES = {
+    PR_UNKNOWN: 'Unknown',
+    PR_UNPAID: 'Pending',
+    PR_PAID: 'Paid',
+    PR_EXPIRED: 'Expired',
+    PR_UNCONFIRMED: 'Unconfirmed',
+}
 
-class ElectrumWebSocket(WebSocket, util.PrintError):
 
-    def handleMessage(self):
-        assert self.data[:3] == 'id:'
-        self.print_error("message received", self.data)
-        request_id = self.data[3:]
-        request_queue.put((self, request_id))
+class _Subscription:
+    __slots__ = ('wallet', 'addr', 'request_id', 'sockets', 'state', 'message')
 
-    def handleConnected(self):
-        self.print_error("connected", self.address)
+    def __init__(self, wallet, addr, request_id):
+        self.wallet = wallet
+        self.addr = addr
+        self.request_id = request_id
+        self.sockets = set()
+        self.state = None  # (status, conf) last pushed
+        self.message = None  # the JSON last pushed
 
-    def handleClose(self):
-        self.print_error("closed", self.address)
+    def is_paid(self):
+        return self.state is not None and self.state[0] in (PR_UNCONFIRMED, PR_PAID)
 
 
+class PaymentNotifier(util.PrintError):
+    """ Keeps track of which sockets wait on which requests, and pushes them
+    the changes. The network callbacks may come in on any thread; everything
+    else must be called from the server thread. Sockets only need a
+    sendMessage(str) method. """
 
-class WsClientThread(util.DaemonThread):
-
-    def __init__(self, config, network):
-        super().__init__()
+    def __init__(self, wallets: dict, network=None, *, depth=6, wakeup=None):
+        self.wallets = wallets  # path -> wallet, the daemon's, so it sees wallets loaded later
         self.network = network
-        self.config = config
-        self.response_queue = queue.Queue()
-        self.subscriptions = defaultdict(list)
-        self.sh2addr = dict()
-
-    def make_request(self, request_id):
-        # read json file
-        rdir = self.config.get('requests_dir')
-        n = os.path.join(rdir, 'req', request_id[0], request_id[1], request_id, request_id + '.json')
-        with open(n, encoding='utf-8') as f:
-            s = f.read()
-        d = json.loads(s)
-        addr = d.get('address')
-        amount = d.get('amount')
-        return addr, amount
-
-    def reading_thread(self):
-        while self.is_running():
-            try:
-                ws, request_id = request_queue.get()
-            except queue.Empty:
+        self.depth = depth  # confirmations after which a paid request is no longer updated
+        self.wakeup = wakeup or (lambda: None)
+        self._subs: Dict[Tuple[object, Address], _Subscription] = {}
+        self._by_socket: Dict[object, Set[Tuple[object, Address]]] = {}
+        self._ids: Dict[str, Tuple[object, Address]] = {}  # request id -> (wallet, addr)
+        self._ids_for = None  # what the wallets' requests looked like when _ids was made
+        self._lock = threading.Lock()  # guards the two below, which the network callbacks set
+        self._pending: Set[Tuple[object, Address]] = set()
+        self._new_block = False
+
+    def start(self):
+        if self.network:
+            self.network.register_callback(self._on_network, ['payment_received', 'blockchain_updated'])
+
+    def stop(self):
+        if self.network:
+            self.network.unregister_callback(self._on_network)
+
+    def _on_network(self, event, *args):
+        with self._lock:
+            if event == 'payment_received':
+                wallet, addr, _status = args
+                self._pending.add((wallet, addr))
+            else:
+                self._new_block = True
+        self.wakeup()
+
+    # -- the sockets
+
+    def on_message(self, ws, data):
+        if not isinstance(data, str) or not data.startswith('id:'):
+            self.print_error("bad message", repr(data)[:80])
+            return
+        self.subscribe(ws, data[3:])
+
+    def subscribe(self, ws, request_id: str):
+        key = self._find(request_id)
+        if key is None:
+            ws.sendMessage(json.dumps({'id': request_id, 'status': STATUS_NAMES[PR_UNKNOWN]}))
+            return
+        sub = self._subs.get(key)
+        if sub is None:
+            self._subs[key] = sub = _Subscription(*key, request_id)
+            self._update(sub)
+        sub.sockets.add(ws)
+        self._by_socket.setdefault(ws, set()).add(key)
+        ws.sendMessage(sub.message)
+        if sub.is_paid():
+            ws.sendMessage('paid')
+
+    def unsubscribe(self, ws):
+        for key in self._by_socket.pop(ws, ()):
+            sub = self._subs.get(key)
+            if sub is not None:
+                sub.sockets.discard(ws)
+                if not sub.sockets:
+                    del self._subs[key]
+
+    def num_sockets(self) -> int:
+        return len(self._by_socket)
+
+    # -- pushing
+
+    def flush(self) -> int:
+        """ Pushes what changed since the last call. Returns how many
+        requests changed. """
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            new_block, self._new_block = self._new_block, False
+        if new_block:
+            # The confirmations of paid requests went up, and unpaid ones may
+            # have expired
+            pending.update(key for key, sub in self._subs.items() if not self._is_done(sub))
+        changed = 0
+        for key in pending:
+            sub = self._subs.get(key)
+            if sub is None:
                 continue
-            try:
-                addr, amount = self.make_request(request_id)
-            except:
+            was_paid = sub.is_paid()
+            if not self._update(sub):
                 continue
+            changed += 1
+            paid = sub.is_paid() and not was_paid
+            for ws in sub.sockets:
+                ws.sendMessage(sub.message)
+                if paid:
+                    ws.sendMessage('paid')
+        return changed
+
+    def _update(self, sub) -> bool:
+        """ Looks at the status of the request. Returns True if it changed. """
+        ret = sub.wallet.get_request_status(sub.addr)
+        status, conf, tx_hashes = (PR_UNKNOWN, None, []) if ret == PR_UNKNOWN else ret
+        state = (status, conf)
+        if state == sub.state:
+            return False
+        sub.state = state
+        sub.message = json.dumps({'id': sub.request_id, 'status': STATUS_NAMES.get(status, 'Unknown'),
+                                  'confirmations': conf or 0, 'tx_hashes': tx_hashes})
+        return True
+
+    def _is_done(self, sub) -> bool:
+        return sub.state is not None and sub.state[0] == PR_PAID and (sub.state[1] or 0) >= self.depth
+
+    # -- finding requests
+
+    def _find(self, request_id: str) -> Optional[Tuple[object, Address]]:
+        """ Returns the (wallet, addr) of the request with request_id, which
+        may also be the request's address. """
+        key = self._ids.get(request_id)
+        if key is not None and key[0].receive_requests.get(key[1], {}).get('id') == request_id:
+            return key
+        wallets = list(self.wallets.values())
+        try:
+            addr = Address.from_string(request_id)
+        except Exception:
+            pass
+        else:
+            for wallet in wallets:
+                if addr in wallet.receive_requests:
+                    return wallet, addr
+        ids_for = tuple((id(w), w.receive_requests_version) for w in wallets)
+        if ids_for != self._ids_for:
+            # A request we did not know of, look at them all again
+            self._ids = {}
+            for wallet in wallets:
+                with wallet.lock:
+                    reqs = list(wallet.receive_requests.items())
+                for addr, req in reqs:
+                    if req.get('id'):
+                        self._ids[req['id']] = (wallet, addr)
+            self._ids_for = ids_for
+            return self._ids.get(request_id)
+        return None
+
+
+if WebSocket is not None:
+
+    class ElectrumWebSocket(WebSocket, util.PrintError):
+
+        def handleMessage(self):
+            self.server.notifier.on_message(self, self.data)
+
+        def handleConnected(self):
+            self.print_error("connected", self.address)
+
+        def handleClose(self):
+            self.server.notifier.unsubscribe(self)
+            self.print_error("closed", self.address)
+
+    class _SelectorServing:
+        """ SimpleWebSocketServer's serveonce(), over the selectors module and
+        with a socket to wake it up. """
+
+        def _setup_selector(self):
+            self.notifier = None
+            self._selector = selectors.DefaultSelector()
+            self.serversocket.listen(socket.SOMAXCONN)  # many pages may connect at once
+            self._selector.register(self.serversocket.fileno(), selectors.EVENT_READ)
+            self._wake_r, self._wake_w = socket.socketpair()
+            self._wake_r.setblocking(False)
+            self._wake_w.setblocking(False)
+            self._selector.register(self._wake_r.fileno(), selectors.EVENT_READ)
+            self._masks = {}  # client fileno -> the events we wait for
+
+        def wakeup(self):
             try:
-                addr = Address.from_string(addr)
-            except Exception as e:
-                self.print_error("Error parsing address", addr, repr(e))
-                continue
-            l = self.subscriptions[addr]  # defaultdict will create empty list if not already there.
-            l.append((ws, amount))
-            h = addr.to_scripthash_hex()
-            self.sh2addr[h] = addr  # remember this scripthash_hex -> addr mapping since run() below needs it.
-            self.network.send([('blockchain.scripthash.subscribe', [h])], self.response_queue.put)
+                self._wake_w.send(b'\0')
+            except OSError:
+                pass  # already has a byte waiting, or we are closed
 
+        def serveonce(self):
+            sel = self._selector
+            for fileno, client in self.connections.items():
+                mask = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.sendq else 0)
+                if self._masks.get(fileno) != mask:
+                    self._masks[fileno] = mask
+                    sel.modify(fileno, mask)
+            for key, events in sel.select(None):
+                fileno = key.fd
+                if fileno == self.serversocket.fileno():
+                    self._accept()
+                elif fileno == self._wake_r.fileno():
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                else:
+                    client = self.connections.get(fileno)
+                    if client is None:
+                        continue
+                    try:
+                        if events & selectors.EVENT_WRITE:
+                            self._send(client)
+                        if events & selectors.EVENT_READ:
+                            client._handleData()
+                    except Exception:
+                        self._drop(fileno)
 
-    def run(self):
-        threading.Thread(target=self.reading_thread).start()
-        while self.is_running():
+        def _accept(self):
+            sock = None
             try:
-                r = self.response_queue.get(timeout=0.1)
-            except queue.Empty:
-                continue
-            self.print_error('response', r)
-            method = r.get('method')
-            params = r.get('params')
-            result = r.get('result')
-            if result is None:
-                continue
-            if method == 'blockchain.scripthash.subscribe':
-                self.network.send([('blockchain.scripthash.get_balance', params)], self.response_queue.put)
-            elif method == 'blockchain.scripthash.get_balance':
-                h = params[0]
-                addr = self.sh2addr.get(h)
-                if addr is None:
-                    self.print_error("can't find address for scripthash:", h)
-                    continue
-                l = self.subscriptions.get(addr, [])
-                for ws, amount in l:
-                    if not ws.closed:
-                        if sum(result.values()) >= amount:
-                            ws.sendMessage('paid')
-
-
-
-class WebSocketServer(threading.Thread):
-
-    def __init__(self, config, ns):
-        threading.Thread.__init__(self)
+                sock, address = self.serversocket.accept()
+                newsock = self._decorateSocket(sock)
+                newsock.setblocking(0)
+                fileno = newsock.fileno()
+                self.connections[fileno] = self._constructWebSocket(newsock, address)
+                self._masks[fileno] = selectors.EVENT_READ
+                self._selector.register(fileno, selectors.EVENT_READ)
+            except Exception:
+                if sock is not None:
+                    sock.close()
+
+        @staticmethod
+        def _send(client):
+            while client.sendq:
+                opcode, payload = client.sendq.popleft()
+                remaining = client._sendBuffer(payload)
+                if remaining is not None:
+                    client.sendq.appendleft((opcode, remaining))
+                    break
+                if opcode == 0x8:  # CLOSE
+                    raise Exception('received client close')
+
+        def _drop(self, fileno):
+            client = self.connections.pop(fileno)
+            self._masks.pop(fileno, None)
+            self._selector.unregister(fileno)
+            self._handleClose(client)
+
+        def close(self):
+            super().close()
+            self._selector.close()
+            self._wake_r.close()
+            self._wake_w.close()
+
+    class _WebSocketServer(_SelectorServing, SimpleWebSocketServer):
+
+        def __init__(self, host, port):
+            super().__init__(host, port, ElectrumWebSocket)
+            self._setup_selector()
+
+    class _SSLWebSocketServer(_SelectorServing, SimpleSSLWebSocketServer):
+
+        def __init__(self, host, port, certfile, keyfile):
+            super().__init__(host, port, ElectrumWebSocket, certfile, keyfile)
+            self._setup_selector()
+
+
+class WebSocketServer(util.DaemonThread):
+    """ Serves websocket notifications for the requests of daemon's wallets,
+    on config's websocket_server:websocket_port, with TLS if ssl_chain and
+    ssl_privkey are set. """
+
+    def __init__(self, config, daemon):
+        super().__init__()
         self.config = config
-        self.net_server = ns
+        self.wallets = daemon.wallets
+        self.network = daemon.network
+        self.server = None
         self.daemon = True
 
-    def run(self):
-        t = WsClientThread(self.config, self.net_server)
-        t.start()
-
+    def make_server(self):
         host = self.config.get('websocket_server')
         port = self.config.get('websocket_port', 9999)
         certfile = self.config.get('ssl_chain')
         keyfile = self.config.get('ssl_privkey')
-        self.server = SimpleSSLWebSocketServer(host, port, ElectrumWebSocket, certfile, keyfile)
-        self.server.serveforever()
+        if certfile and keyfile:
+            server = _SSLWebSocketServer(host, port, certfile, keyfile)
+        else:
+            server = _WebSocketServer(host, port)
+        server.notifier = PaymentNotifier(self.wallets, self.network, wakeup=server.wakeup,
+                                          depth=self.config.get('websocket_confirmations', 6))
+        return server
+
+    def run(self):
+        if WebSocket is None:
+            self.print_error("install SimpleWebSocketServer to serve websocket notifications")
+            return
+        try:
+            self.server = self.make_server()
+        except Exception as e:
+            self.print_error("cannot start websocket server:", repr(e))
+            return
+        notifier = self.server.notifier
+        notifier.start()
+        try:
+            while self.is_running():
+                self.server.serveonce()
+                notifier.flush()
+        finally:
+            notifier.stop()
+            self.server.close()
+        self.on_stop()
+
+    def stop(self):
+        super().stop()
+        if self.server:
+            self.server.wakeup()
@@ -24,12 +24,12 @@
 # SOFTWARE.
 
 from functools import partial
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
-from .util import MyTreeWidget, MONOSPACE_FONT, SortableTreeWidgetItem, rate_limited, webopen, ColorScheme
+from .util import MyListModel, MyTreeView, MONOSPACE_FONT, rate_limited, webopen, ColorScheme
 from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QFont, QColor, QKeySequence, QCursor, QIcon
-from PyQt5.QtWidgets import QTreeWidgetItem, QAbstractItemView, QMenu, QToolTip
+from PyQt5.QtGui import QFont, QKeySequence, QCursor, QIcon
+from PyQt5.QtWidgets import QAbstractItemView, QComboBox, QMenu, QToolTip
 from electroncash.i18n import _
 from electroncash.address import Address
 from electroncash.plugins import run_hook
@@ -40,24 +40,114 @@ from enum import IntEnum
 from . import cashacctqt
 
 
-class AddressList(MyTreeWidget, PrintError):
-    filter_columns = [0, 1, 2]  # Address, Label, Balance
+class AddressModel(MyListModel):
+    ''' Model for the AddressList. Rows are keyed by Address, and are
+    AddressList.AddressRow tuples. Display strings are computed lazily, only
+    for the rows the view asks for. '''
+
+    def __init__(self, alist):
+        super().__init__()  # NB: the view takes ownership in MyTreeView.__init__
+        self.alist = alist
+        self.fx_rate = None  # set if the fiat balance column is shown
+        self.show_change = 0  # index of AddressList.change_button: all, receiving, change
+        self.show_used = 0  # index of AddressList.used_button: active, used/empty, all
+
+    def has_fiat(self):
+        return len(self.headers) > 5
+
+    def compute_display(self, key, row):
+        al = self.alist
+        address_text = key.to_ui_string()
+        if row.ca_info:
+            # Add Cash Account emoji -- the emoji used is the most
+            # recent cash account registration for said address
+            address_text = row.ca_info.emoji + " " + address_text
+        balance_text = al.parent.format_amount(row.balance, whitespaces=True)
+        columns = [address_text, str(row.index), row.label, balance_text, str(row.num_txs)]
+        if self.has_fiat():
+            fx = al.parent.fx
+            columns.insert(4, fx.value_str(row.balance, self.fx_rate) if fx else '')
+        return columns
+
+    def row_data(self, key, row, column, role):
+        al = self.alist
+        DataRoles = AddressList.DataRoles
+        amount_columns = (3, 4) if self.has_fiat() else (3,)
+        if role == Qt.FontRole:
+            if column == 0 or column in amount_columns:
+                return al.monospace_font
+        elif role == Qt.TextAlignmentRole:
+            if column in amount_columns:
+                return Qt.AlignRight | Qt.AlignVCenter
+        elif column != 0:
+            return None
+        elif role == Qt.ToolTipRole:
+            tool_tip = ''
+            if row.ca_info:
+                # Cash Accounts tool tip.. this will read the minimal_chash attribute we added to this object in compute_snapshot()
+                tool_tip = al._ca_tooltip(row.ca_info)
+            if row.is_frozen:
+                tool_tip = _("Address is frozen, right-click to unfreeze")
+            if row.is_retired:
+                tool_tip = (tool_tip + "\n" if tool_tip else '') + _("Change address is retired")
+            return tool_tip or None
+        elif role == Qt.BackgroundRole:
+            if row.is_frozen:
+                return ColorScheme.BLUE.as_color(True)
+        elif role == Qt.ForegroundRole:
+            if row.is_retired:
+                return ColorScheme.GRAY.as_color()
+        elif role == DataRoles.can_edit_label:
+            return True  # label can be edited
+        elif role == DataRoles.cash_accounts:
+            return row.ca_list
+        return None
+
+    def sort_key(self, key, row, column):
+        if column == 1:
+            # Index: receiving addresses first, then change
+            return (row.is_change, row.index)
+        if column == 3 or (column == 4 and self.has_fiat()):
+            return (row.balance,)
+        if column == len(self.headers) - 1:
+            return (row.num_txs,)
+        return super().sort_key(key, row, column)
+
+    def filter_match(self, key, row, text):
+        d = self._get_display(key, row)
+        return any(text in d[col].lower() for col in AddressList.filter_columns)
+
+    def row_visible(self, key, row):
+        if self.show_change == 1 and row.is_change or self.show_change == 2 and not row.is_change:
+            return False
+        if self.show_used == 0:
+            return not row.is_hidden
+        if self.show_used == 1:
+            return row.is_hidden
+        return True
+
+
+class AddressList(MyTreeView, PrintError):
+    filter_columns = [0, 1, 2]  # Address, Index, Label
+    default_sort = MyTreeView.SortSpec(1, Qt.AscendingOrder)
 
     _ca_minimal_chash_updated_signal = pyqtSignal(object, str)
     _cashacct_icon = None
 
     class DataRoles(IntEnum):
-        address        = Qt.UserRole + 0
+        ''' Data roles, available on column 0 '''
+        address        = Qt.UserRole + 0  # == MyListModel.KeyRole
         can_edit_label = Qt.UserRole + 1
         cash_accounts  = Qt.UserRole + 2
 
     def __init__(self, parent, *, picker=False):
-        super().__init__(parent, self.create_menu, [], 2, deferred_updates=True)
-        self.refresh_headers()
         self.picker = picker
+        self.amodel = AddressModel(self)
+        super().__init__(parent, self.create_menu, self.amodel, [], 2, [] if picker else None,
+                         deferred_updates=True)
+        self.refresh_headers()
         if self.picker:
             self.setSelectionMode(QAbstractItemView.SingleSelection)
-            self.editable_columns = []
         else:
             self.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.setSortingEnabled(True)
@@ -66,6 +156,16 @@ class AddressList(MyTreeWidget, PrintError):
         assert self.wallet
         self.cleaned_up = False
 
+        self.change_button = QComboBox(self)
+        self.change_button.addItems([_("All"), _("Receiving"), _("Change")])
+        self.change_button.currentIndexChanged.connect(self._on_show_change)
+        self.change_button.setVisible(False)  # shown by apply_snapshot() if the wallet has change addresses
+        # Used receiving addresses and empty change addresses are hidden by
+        # default, see AddressModel.row_visible()
+        self.used_button = QComboBox(self)
+        self.used_button.addItems([_("Active"), _("Used / Empty"), _("All")])
+        self.used_button.currentIndexChanged.connect(self._on_show_used)
+
         # Cash Accounts support
         self._ca_cb_registered = False
         self._ca_minimal_chash_updated_signal.connect(self._ca_update_chash)
@@ -77,6 +177,18 @@ class AddressList(MyTreeWidget, PrintError):
             # lazy init the icon
             __class__._cashacct_icon = QIcon(":icons/cashacct-logo.png")  # TODO: make this an SVG
 
+    def get_list_header(self):
+        ''' The filter combo boxes, to be shown above the list '''
+        return self.change_button, self.used_button
+
+    def _on_show_change(self, index):
+        self.amodel.show_change = index
+        self.amodel.refilter()
+
+    def _on_show_used(self, index):
+        self.amodel.show_used = index
+        self.amodel.refilter()
+
     def diagnostic_name(self):
         return f"{super().diagnostic_name()}/{self.wallet.diagnostic_name()}"
 
@@ -107,6 +219,7 @@ class AddressList(MyTreeWidget, PrintError):
         if fx and fx.get_fiat_address_config():
             headers.insert(4, '{} {}'.format(fx.get_currency(), _('Balance')))
         self.update_headers(headers)
+        self.amodel.refilter()  # the columns may have shifted, re-sort
 
     @rate_limited(1.0, ts_after=True) # We rate limit the address list refresh no more than once every second
     def update(self):
@@ -115,40 +228,17 @@ class AddressList(MyTreeWidget, PrintError):
             return
         super().update()
 
+    # The per-address wallet data is gathered in the window's SnapshotWorker
+    # thread, see compute_snapshot()
+    snapshot_updates = True
+
+    AddressRow = namedtuple("AddressRow", "address, index, is_change, is_hidden, num_txs, balance, label,"
+                                          " ca_list, ca_info, is_frozen, is_retired")
+    AddressSnapshot = namedtuple("AddressSnapshot", "receiving, change")
+
     @profiler
-    def on_update(self):
-        def item_path(item): # Recursively builds the path for an item eg 'parent_name/item_name'
-            return item.text(0) if not item.parent() else item_path(item.parent()) + "/" + item.text(0)
-        def remember_expanded_items(root):
-            # Save the set of expanded items... so that address list updates don't annoyingly collapse
-            # our tree list widget due to the update. This function recurses. Pass self.invisibleRootItem().
-            expanded_item_names = set()
-            for i in range(0, root.childCount()):
-                it = root.child(i)
-                if it and it.childCount():
-                    if it.isExpanded():
-                        expanded_item_names.add(item_path(it))
-                    expanded_item_names |= remember_expanded_items(it) # recurse
-            return expanded_item_names
-        def restore_expanded_items(root, expanded_item_names):
-            # Recursively restore the expanded state saved previously. Pass self.invisibleRootItem().
-            for i in range(0, root.childCount()):
-                it = root.child(i)
-                if it and it.childCount():
-                    restore_expanded_items(it, expanded_item_names) # recurse, do leaves first
-                    old = bool(it.isExpanded())
-                    new = bool(item_path(it) in expanded_item_names)
-                    if old != new:
-                        it.setExpanded(new)
-        if not self._ca_cb_registered and self.wallet.network:
-            self.wallet.network.register_callback(self._ca_updated_minimal_chash_callback, ['ca_updated_minimal_chash'])
-            self._ca_cb_registered = True
-        had_item_count = self.topLevelItemCount()
-        sels = self.selectedItems()
-        addresses_to_re_select = {item.data(0, self.DataRoles.address) for item in sels}
-        expanded_item_names = remember_expanded_items(self.invisibleRootItem())
-        del sels  # avoid keeping reference to about-to-be delete C++ objects
-        self.clear()
+    def compute_snapshot(self, is_stale):
+        wallet = self.wallet
         # Note we take a shallow list-copy because we want to avoid
         # race conditions with the wallet while iterating here. The wallet may
         # touch/grow the returned lists at any time if a history comes (it
@@ -161,112 +251,63 @@ class AddressList(MyTreeWidget, PrintError):
         # addresses even on huge wallets because, I suspect, internally CPython
         # does this type of operation extremely cheaply (probably returning
         # some copy-on-write-semantics handle to the same list).
-        receiving_addresses = list(self.wallet.get_receiving_addresses())
-        change_addresses = list(self.wallet.get_change_addresses())
-
-        if self.parent.fx and self.parent.fx.get_fiat_address_config():
-            fx = self.parent.fx
-        else:
-            fx = None
-        account_item = self
-        sequences = [0,1] if change_addresses else [0]
-        items_to_re_select = []
-        for is_change in sequences:
-            if len(sequences) > 1:
-                name = _("Receiving") if not is_change else _("Change")
-                seq_item = QTreeWidgetItem( [ name, '', '', '', '', ''] )
-                account_item.addChild(seq_item)
-                if not had_item_count: # first time we create this widget, auto-expand the default address list
-                    seq_item.setExpanded(True)
-                    expanded_item_names.add(item_path(seq_item))
-            else:
-                seq_item = account_item
-            hidden_item = QTreeWidgetItem( [ _("Empty") if is_change else _("Used"), '', '', '', '', ''] )
-            has_hidden = False
-            addr_list = change_addresses if is_change else receiving_addresses
+        receiving_addresses = list(wallet.get_receiving_addresses())
+        change_addresses = list(wallet.get_change_addresses())
+        seqs = []
+        for is_change, addr_list in enumerate((receiving_addresses, change_addresses)):
             # Cash Account support - we do this here with the already-prepared addr_list for performance reasons
-            ca_list_all = self.wallet.cashacct.get_cashaccounts(addr_list)
+            ca_list_all = wallet.cashacct.get_cashaccounts(addr_list)
             ca_by_addr = defaultdict(list)
             for info in ca_list_all:
                 ca_by_addr[info.address].append(info)
             del ca_list_all
             # / cash account
+            rows = []
             for n, address in enumerate(addr_list):
-                num = len(self.wallet.get_address_history(address))
+                if not n % 1000 and is_stale():
+                    return None
+                num = len(wallet.get_address_history(address))
                 if is_change:
-                    is_hidden = self.wallet.is_empty(address)
+                    is_hidden = wallet.is_empty(address)
                 else:
-                    is_hidden = self.wallet.is_used(address)
-                balance = sum(self.wallet.get_addr_balance(address))
-                address_text = address.to_ui_string()
+                    is_hidden = wallet.is_used(address)
+                balance = sum(wallet.get_addr_balance(address))
                 # Cash Accounts
                 ca_info, ca_list = None, ca_by_addr.get(address)
                 if ca_list:
-                    # Add Cash Account emoji -- the emoji used is the most
-                    # recent cash account registration for said address
                     ca_list.sort(key=lambda x: ((x.number or 0), str(x.collision_hash)))
                     for ca in ca_list:
                         # grab minimal_chash and stash in an attribute. this may kick off the network
-                        ca.minimal_chash = self.wallet.cashacct.get_minimal_chash(ca.name, ca.number, ca.collision_hash)
-                    ca_info = self._ca_get_default(ca_list)
-                    if ca_info:
-                        address_text = ca_info.emoji + " " + address_text
+                        ca.minimal_chash = wallet.cashacct.get_minimal_chash(ca.name, ca.number, ca.collision_hash)
+                    ca_info = wallet.cashacct.get_address_default(ca_list)
                 # /Cash Accounts
-                label = self.wallet.labels.get(address.to_storage_string(), '')
-                balance_text = self.parent.format_amount(balance, whitespaces=True)
-                columns = [address_text, str(n), label, balance_text, str(num)]
-                if fx:
-                    rate = fx.exchange_rate()
-                    fiat_balance = fx.value_str(balance, rate)
-                    columns.insert(4, fiat_balance)
-                address_item = SortableTreeWidgetItem(columns)
-                if ca_info:
-                    # Set Cash Accounts: tool tip.. this will read the minimal_chash attribute we added to this object above
-                    self._ca_set_item_tooltip(address_item, ca_info)
-                address_item.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)
-                address_item.setFont(3, self.monospace_font)
-                if fx:
-                    address_item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)
-                    address_item.setFont(4, self.monospace_font)
-
-                # Set col0 address font to monospace
-                address_item.setFont(0, self.monospace_font)
-
-                # Set UserRole data items:
-                address_item.setData(0, self.DataRoles.address, address)
-                address_item.setData(0, self.DataRoles.can_edit_label, True) # label can be edited
-                if ca_list:
-                    # Save the list of cashacct infos, if any
-                    address_item.setData(0, self.DataRoles.cash_accounts, ca_list)
-
-                if self.wallet.is_frozen(address):
-                    address_item.setBackground(0, ColorScheme.BLUE.as_color(True))
-                    address_item.setToolTip(0, _("Address is frozen, right-click to unfreeze"))
-                if is_change and self.wallet.is_retired_change_addr(address):
-                    address_item.setForeground(0, ColorScheme.GRAY.as_color())
-                    old_tt = address_item.toolTip(0)
-                    if old_tt:
-                        old_tt += "\n"
-                    address_item.setToolTip(0, old_tt + _("Change address is retired"))
-                if is_hidden:
-                    if not has_hidden:
-                        seq_item.insertChild(0, hidden_item)
-                        has_hidden = True
-                    hidden_item.addChild(address_item)
-                else:
-                    seq_item.addChild(address_item)
-                if address in addresses_to_re_select:
-                    items_to_re_select.append(address_item)
-
-        for item in items_to_re_select:
-            # NB: Need to select the item at the end becasue internally Qt does some index magic
-            # to pick out the selected item and the above code mutates the TreeList, invalidating indices
-            # and other craziness, which might produce UI glitches. See #1042
-            item.setSelected(True)
+                label = wallet.labels.get(address.to_storage_string(), '')
+                rows.append(self.AddressRow(address, n, bool(is_change), is_hidden, num, balance, label,
+                                            ca_list, ca_info, wallet.is_frozen(address),
+                                            bool(is_change) and wallet.is_retired_change_addr(address)))
+            seqs.append(tuple(rows))
+        return self.AddressSnapshot(*seqs)
 
-        # Now, at the very end, enforce previous UI state with respect to what was expanded or not. See #1042
-        restore_expanded_items(self.invisibleRootItem(), expanded_item_names)
+    @profiler
+    def apply_snapshot(self, snapshot):
+        if self.cleaned_up:
+            return
+        if not self._ca_cb_registered and self.wallet.network:
+            self.wallet.network.register_callback(self._ca_updated_minimal_chash_callback, ['ca_updated_minimal_chash'])
+            self._ca_cb_registered = True
+        prev_selection = self.selected_keys()
 
+        fx = self.parent.fx
+        self.amodel.fx_rate = fx.exchange_rate() if fx and fx.get_fiat_address_config() else None
+        self.change_button.setVisible(bool(snapshot.change))
+        # Display strings may be stale even for unchanged rows (e.g. the base
+        # unit changed), so invalidate them all. This is cheap as they are only
+        # recomputed for the rows that are on-screen.
+        self.amodel.invalidate_display()
+        self.amodel.set_rows((row.address, row) for seq in snapshot for row in seq)
+        if prev_selection and not self.selectionModel().hasSelection():
+            # set_rows() resets the model, and thus the selection, if many rows changed
+            self.select_keys(prev_selection)
 
     def create_menu(self, position):
         if self.picker:
@@ -276,12 +317,10 @@ class AddressList(MyTreeWidget, PrintError):
         is_multisig = isinstance(self.wallet, Multisig_Wallet)
         is_hw_no_tokens = self.wallet.is_hw_without_cashtoken_support()
         can_delete = self.wallet.can_delete_address()
-        selected = self.selectedItems()
-        multi_select = len(selected) > 1
-        addrs = [item.data(0, self.DataRoles.address) for item in selected]
+        addrs = self.selected_keys()
         if not addrs:
             return
-        addrs = [addr for addr in addrs if isinstance(addr, Address)]
+        multi_select = len(addrs) > 1
 
         menu = QMenu()
 
@@ -291,17 +330,14 @@ class AddressList(MyTreeWidget, PrintError):
             txt = txt.strip()
             self.parent.copy_to_clipboard(txt)
 
-        col = self.currentColumn()
-        column_title = self.headerItem().text(col)
+        col = self.currentIndex().column()
+        column_title = self.header_text(col)
 
         if not multi_select:
-            item = self.itemAt(position)
-            if not item:
-                return
-            if not addrs:
-                item.setExpanded(not item.isExpanded())
+            index = self.indexAt(position)
+            if not index.isValid():
                 return
-            addr = addrs[0]
+            addr = self.amodel.key_for_index(index)
 
             alt_copy_text, alt_column_title, token_text = None, None, None
             if col == 0:
@@ -314,7 +350,7 @@ class AddressList(MyTreeWidget, PrintError):
                 if token_text in (copy_text, alt_copy_text):
                     token_text = None
             else:
-                copy_text = item.text(col)
+                copy_text = self.amodel.data(index.sibling(index.row(), col)) or ''
             menu.addAction(_("Copy {}").format(column_title), lambda: doCopy(copy_text))
             if alt_copy_text and alt_column_title:
                 # Add 'Copy Legacy Address' and 'Copy Cash Address' alternates if right-click is on column 0
@@ -325,8 +361,8 @@ class AddressList(MyTreeWidget, PrintError):
             if col == 0:
                 where_to_insert_dupe_copy_cash_account = a
             if col in self.editable_columns:
-                menu.addAction(_("Edit {}").format(column_title), lambda: self.editItem(self.itemAt(position), # NB: C++ item may go away if this widget is refreshed while menu is up -- so need to re-grab and not store in lamba. See #953
-                                                                                        col))
+                # NB: the row may move if this widget is refreshed while the menu is up, so grab a fresh index. See #953
+                menu.addAction(_("Edit {}").format(column_title), lambda: self.edit_index(self.amodel.index_for_key(addr), col))
             a = menu.addAction(_("Request payment"), lambda: self.parent.receive_at(addr))
             if self.wallet.get_num_tx(addr) or self.wallet.has_payment_request(addr):
                 # This address cannot be used for a payment request because
@@ -356,7 +392,7 @@ class AddressList(MyTreeWidget, PrintError):
                     alt_copy_text = "\n".join([a.to_ui_string() + ", " + self.parent.format_amount(sum(self.wallet.get_addr_balance(a)))
                                               for a in addrs])
                 else:
-                    texts = [i.text(col).strip() for i in selected]
+                    texts = [(self.amodel.data(self.amodel.index_for_key(a, col)) or '').strip() for a in addrs]
                     texts = [t for t in texts if t]  # omit empty items
                 if texts:
                     copy_text = '\n'.join(texts)
@@ -379,7 +415,7 @@ class AddressList(MyTreeWidget, PrintError):
 
         # Add Cash Accounts section at the end, if relevant
         if not multi_select:
-            ca_list = item.data(0, self.DataRoles.cash_accounts)
+            ca_list = self.amodel.row_for_key(addr).ca_list
             menu.addSeparator()
             a1 = menu.addAction(_("Cash Accounts"), lambda: None)
             a1.setDisabled(True)
@@ -412,9 +448,9 @@ class AddressList(MyTreeWidget, PrintError):
         menu.exec_(self.viewport().mapToGlobal(position))
 
     def keyPressEvent(self, event):
-        if event.matches(QKeySequence.Copy) and self.currentColumn() == 0:
-            addrs = [i.data(0, self.DataRoles.address) for i in self.selectedItems()]
-            if addrs and isinstance(addrs[0], Address):
+        if event.matches(QKeySequence.Copy) and self.currentIndex().column() == 0:
+            addrs = self.selected_keys()
+            if addrs:
                 text = addrs[0].to_full_ui_string()
                 self.parent.app.clipboard().setText(text)
         else:
@@ -423,34 +459,28 @@ class AddressList(MyTreeWidget, PrintError):
     def update_labels(self):
         if self.should_defer_update_incr():
             return
-        def update_recurse(root):
-            child_count = root.childCount()
-            for i in range(child_count):
-                item = root.child(i)
-                addr = item.data(0, self.DataRoles.address)
-                if isinstance(addr, Address):
-                    label = self.wallet.labels.get(addr.to_storage_string(), '')
-                    item.setText(2, label)
-                if item.childCount():
-                    update_recurse(item)
-        update_recurse(self.invisibleRootItem())
-
-    def on_doubleclick(self, item, column):
-        if self.permit_edit(item, column):
-            super(AddressList, self).on_doubleclick(item, column)
+        for addr in list(self.amodel.keys()):
+            row = self.amodel.row_for_key(addr)
+            label = self.wallet.labels.get(addr.to_storage_string(), '')
+            if row.label != label:
+                self.amodel.update_row(addr, row._replace(label=label))
+
+    def on_doubleclick(self, index, column):
+        if self.permit_edit(index, column):
+            super(AddressList, self).on_doubleclick(index, column)
         else:
-            addr = item.data(0, self.DataRoles.address)
-            if isinstance(addr, Address):
+            addr = self.amodel.key_for_index(index)
+            if addr is not None:
                 self.parent.show_address(addr)
 
     #########################
     # Cash Accounts related #
     #########################
-    def _ca_set_item_tooltip(self, item, ca_info):
+    def _ca_tooltip(self, ca_info):
         minimal_chash = getattr(ca_info, 'minimal_chash', None)
         info_str = self.wallet.cashacct.fmt_info(ca_info, minimal_chash)
-        item.setToolTip(0, "<i>" + _("Cash Account:") + "</i><p>&nbsp;&nbsp;<b>"
-                           + f"{info_str}</b>")
+        return ("<i>" + _("Cash Account:") + "</i><p>&nbsp;&nbsp;<b>"
+                + f"{info_str}</b>")
 
     def _ca_update_chash(self, ca_info, minimal_chash):
         ''' Called in GUI thread as a result of the cash account subsystem
@@ -458,17 +488,16 @@ class AddressList(MyTreeWidget, PrintError):
         Kicked off by a get_minimal_chash() call that results in a cache miss. '''
         if self.cleaned_up:
             return
-        items = self.findItems(ca_info.address.to_ui_string(), Qt.MatchContains|Qt.MatchWrap|Qt.MatchRecursive, 0) or []
-        for item in items:  # really items should contain just 1 element...
-            ca_list = item.data(0, self.DataRoles.cash_accounts) or []
-            ca_info_default = self._ca_get_default(ca_list)
-            for ca_info_saved in ca_list:
-                if ( (ca_info_saved.name.lower(), ca_info_saved.number, ca_info_saved.collision_hash)
-                        == (ca_info.name.lower(), ca_info.number, ca_info.collision_hash) ):
-                    ca_info_saved.minimal_chash = minimal_chash  # save minimal_chash as a property
-                    if ca_info_saved == ca_info_default:
-                        # this was the default one, also set the tooltip
-                        self._ca_set_item_tooltip(item, ca_info)
+        row = self.amodel.row_for_key(ca_info.address)
+        if row is None or not row.ca_list:
+            return
+        for ca_info_saved in row.ca_list:
+            if ( (ca_info_saved.name.lower(), ca_info_saved.number, ca_info_saved.collision_hash)
+                    == (ca_info.name.lower(), ca_info.number, ca_info.collision_hash) ):
+                ca_info_saved.minimal_chash = minimal_chash  # save minimal_chash as a property
+                if ca_info_saved is row.ca_info:
+                    # this was the default one, also refresh the tooltip
+                    self.amodel.update_row(ca_info.address, row)
 
     def _ca_updated_minimal_chash_callback(self, event, *args):
         ''' Called from the cash accounts minimal_chash thread after a network
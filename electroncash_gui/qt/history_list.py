@@ -26,7 +26,7 @@
 from .util import *
 import electroncash.web as web
 from electroncash.i18n import _, ngettext
-from electroncash.util import timestamp_to_datetime, PrintError, profiler, Weak
+from electroncash.util import timestamp_to_datetime, PrintError, profiler
 from electroncash.plugins import run_hook
 
 
@@ -44,28 +44,124 @@ TX_ICONS = [
 ]
 
 
-class HistoryList(MyTreeWidget, PrintError):
+class HistoryModel(MyListModel):
+    ''' Model for the HistoryList. Rows are keyed by tx_hash, and are
+    HistoryRow tuples. Display strings, icons, fiat values etc are computed
+    lazily, only for the rows the view asks for. '''
+
+    class HistoryRow(namedtuple("HistoryRow", "h_item, label, order")):
+        ''' h_item: the 8-tuple from wallet.get_history()
+        label: the tx label
+        order: position of this tx in reverse chronological order, used to break sort ties. It is
+               negative so that it stays stable as new txs are added. '''
+        def __eq__(self, other):
+            # 'order' is deliberately excluded: it shifts for every row
+            # whenever a tx is added, but doesn't affect how a row displays
+            if not isinstance(other, HistoryModel.HistoryRow):
+                return NotImplemented
+            return self.h_item == other.h_item and self.label == other.label
+
+        def __ne__(self, other):
+            eq = self.__eq__(other)
+            return eq if eq is NotImplemented else not eq
+
+        __hash__ = tuple.__hash__
+
+    def __init__(self, hlist):
+        super().__init__()  # NB: the view takes ownership in MyTreeView.__init__
+        self.hlist = hlist
+
+    def compute_display(self, key, row):
+        hl = self.hlist
+        tx_hash, height, conf, timestamp, value, balance, token_deltas, token_balances = row.h_item
+        status, status_str = hl.wallet.get_tx_status(tx_hash, height, conf, timestamp)
+        v_str = hl.parent.format_amount(value, True, whitespaces=True)
+        balance_str = hl.parent.format_amount(balance, whitespaces=True)
+        entry = ['', tx_hash, status_str, row.label, v_str, balance_str]
+        fx = hl.parent.fx
+        if len(self.headers) > len(entry) and fx and fx.show_history():
+            date = timestamp_to_datetime(time.time() if conf <= 0 else timestamp)
+            for amount in [value, balance]:
+                entry.append(fx.historical_value_str(amount, date))
+        entry += [''] * (len(self.headers) - len(entry))
+        entry.append(status)  # not a column, used for the status icon
+        return entry
+
+    def row_data(self, key, row, column, role):
+        hl = self.hlist
+        tx_hash, height, conf, timestamp, value, balance, token_deltas, token_balances = row.h_item
+        if role == Qt.DecorationRole:
+            if column == 0:
+                return hl.get_icon_for_status(self._get_display(key, row)[-1])
+            if column == 3:
+                if hl.wallet.invoices.paid.get(tx_hash):
+                    return hl.invoiceIcon
+                if token_deltas:
+                    return hl.cashTokensIcon
+        elif role == Qt.ToolTipRole:
+            if column == 0:
+                return str(conf) + " confirmation" + ("s" if conf != 1 else "")
+            if column in (2, 3) and token_deltas and not hl.wallet.invoices.paid.get(tx_hash):
+                num = len(token_deltas)
+                return ngettext("Transaction contains {num} CashToken category involving this wallet",
+                                "Transaction contains {num} CashToken categories involving this wallet",
+                                num).format(num=num)
+        elif role == Qt.FontRole:
+            if column != 2:
+                return hl.monospaceFont
+        elif role == Qt.TextAlignmentRole:
+            if column > 3:
+                return Qt.AlignRight | Qt.AlignVCenter
+        elif role == Qt.ForegroundRole:
+            if value and value < 0 and column in (3, 4, 6):
+                return hl.withdrawalBrush
+        return None
+
+    def sort_key(self, key, row, column):
+        tx_hash, height, conf, timestamp, value, balance, token_deltas, token_balances = row.h_item
+        if column == 0:
+            if conf > 0:
+                # Fast path: avoid get_tx_status() which is only interesting for unconfirmed txs
+                return (3 + min(conf, 6), conf, row.order)
+            return (self._get_display(key, row)[-1], conf, row.order)
+        if column == 2:
+            # Unconfirmed txs sort as newest
+            return (timestamp if conf > 0 and timestamp else float('inf'), row.order)
+        if column == 3:
+            return (row.label, row.order)
+        if column in (4, 5):
+            amt = value if column == 4 else balance
+            return (amt is not None, amt or 0, row.order)
+        return super().sort_key(key, row, column) + (row.order,)
+
+    def filter_match(self, key, row, text):
+        # Search Date, Description, Amount columns (substring), and tx_hash (exact match)
+        if key == text:
+            return True
+        d = self._get_display(key, row)
+        return any(text in d[col].lower() for col in HistoryList.filter_columns)
+
+
+class HistoryList(MyTreeView, PrintError):
     filter_columns = [2, 3, 4]  # Date, Description, Amount
-    filter_data_columns = [0]  # Allow search on tx_hash (string)
     statusIcons = {}
-    default_sort = MyTreeWidget.SortSpec(0, Qt.AscendingOrder)
+    default_sort = MyTreeView.SortSpec(0, Qt.AscendingOrder)
 
     def __init__(self, parent):
-        super().__init__(parent, self.create_menu, [], 3, deferred_updates=True)
-        self.refresh_headers()
-        self.setColumnHidden(1, True)
         # force attributes to always be defined, even if None, at construction.
-        self.wallet = self.parent.wallet
+        self.wallet = parent.wallet
         self.cleaned_up = False
 
         self.monospaceFont = QFont(MONOSPACE_FONT)
         self.withdrawalBrush = QBrush(QColor("#BC1E1E"))
         self.invoiceIcon = QIcon(":icons/seal")
         self.cashTokensIcon = QIcon(":icons/tab_token.svg")
-        self._item_cache = Weak.ValueDictionary()
-        self.itemChanged.connect(self.item_changed)
 
         self.has_unknown_balances = False
+        self.hmodel = HistoryModel(self)
+        super().__init__(parent, self.create_menu, self.hmodel, [], 3, deferred_updates=True)
+        self.refresh_headers()
+        self.setColumnHidden(1, True)
 
     def diagnostic_name(self):
         return f"{super().diagnostic_name()}/{self.wallet.diagnostic_name()}"
@@ -91,22 +187,6 @@ class HistoryList(MyTreeWidget, PrintError):
             return
         super().update()
 
-    def clear(self):
-        self._item_cache.clear()
-        super().clear()
-
-    def insertTopLevelItem(self, index, item, tx_hash=None):
-        super().insertTopLevelItem(index, item)
-        tx_hash = tx_hash or item.data(0, Qt.UserRole)
-        if tx_hash:
-            self._item_cache[tx_hash] = item
-
-    def addTopLevelItem(self, item, tx_hash=None):
-        super().addTopLevelItem(item)
-        tx_hash = tx_hash or item.data(0, Qt.UserRole)
-        if tx_hash:
-            self._item_cache[tx_hash] = item
-
     @classmethod
     def get_icon_for_status(cls, status):
         ret = cls.statusIcons.get(status)
@@ -114,152 +194,113 @@ class HistoryList(MyTreeWidget, PrintError):
             cls.statusIcons[status] = ret = QIcon(":icons/" + TX_ICONS[status])
         return ret
 
+    def _should_skip(self, h_item, label):
+        # For implementation of fast plugin filters (such as CashShuffle
+        # shuffle tx filtering), we skip rows for which a plugin says so.
+        # NB: 'h_item' may be None due to performance reasons
+        should_skip = run_hook("history_list_filter", self, h_item, label, multi=True) or []
+        return any(should_skip)
+
+    # The rows are gathered in the window's SnapshotWorker thread, see compute_snapshot()
+    snapshot_updates = True
+
+    HistorySnapshot = namedtuple("HistorySnapshot", "rows, has_unknown_balances")
+
     @profiler
-    def on_update(self):
-        self.wallet = self.parent.wallet
-        h = self.wallet.get_history(self.get_domain(), reverse=True, receives_before_sends=True,
-                                    include_tokens=True, include_tokens_balances=False)
-        sels = self.selectedItems()
-        current_tx = sels[0].data(0, Qt.UserRole) if sels else None
-        del sels #  make sure not to hold stale ref to C++ list of items which will be deleted in clear() call below
-        self.clear()
-        self.has_unknown_balances = False
-        fx = self.parent.fx
-        if fx: fx.history_used_spot = False
-        for h_item in h:
-            tx_hash, height, conf, timestamp, value, balance, token_deltas, token_balances = h_item
-            label = self.wallet.get_label(tx_hash)
-            should_skip = run_hook("history_list_filter", self, h_item[:6], label, multi=True) or []
-            if any(should_skip):
-                # For implementation of fast plugin filters (such as CashShuffle
-                # shuffle tx filtering), we short-circuit return. This is
-                # faster than using the MyTreeWidget filter definted in .util
-                continue
+    def compute_snapshot(self, is_stale):
+        wallet = self.parent.wallet
+        h = wallet.get_history(self.get_domain(), reverse=True, receives_before_sends=True,
+                               include_tokens=True, include_tokens_balances=False)
+        has_unknown_balances = False
+        rows = []
+        n = len(h)
+        HistoryRow = HistoryModel.HistoryRow
+        for i, h_item in enumerate(h):
+            if not i % 1000 and is_stale():
+                return None
+            tx_hash, height, conf, timestamp, value, balance = h_item[:6]
             if value is None or balance is None:
                 # Workaround to the fact that sometimes the wallet doesn't
                 # know the actual balance for history items while it's
                 # downloading history, and we want to flag that situation
                 # and redraw the GUI sometime later when it finishes updating.
                 # This flag is checked in main_window.py, TxUpadteMgr class.
-                self.has_unknown_balances = True
-            status, status_str = self.wallet.get_tx_status(tx_hash, height, conf, timestamp)
-            has_invoice = self.wallet.invoices.paid.get(tx_hash)
-            icon = self.get_icon_for_status(status)
-            v_str = self.parent.format_amount(value, True, whitespaces=True)
-            balance_str = self.parent.format_amount(balance, whitespaces=True)
-            entry = ['', tx_hash, status_str, label, v_str, balance_str]
-            if fx and fx.show_history():
-                date = timestamp_to_datetime(time.time() if conf <= 0 else timestamp)
-                for amount in [value, balance]:
-                    text = fx.historical_value_str(amount, date)
-                    entry.append(text)
-            item = SortableTreeWidgetItem(entry)
-            if icon: item.setIcon(0, icon)
-            item.setToolTip(0, str(conf) + " confirmation" + ("s" if conf != 1 else ""))
-            item.setData(0, SortableTreeWidgetItem.DataRole, (status, conf))
-            if has_invoice:
-                item.setIcon(3, self.invoiceIcon)
-            elif token_deltas:
-                item.setIcon(3, self.cashTokensIcon)
-                num = len(token_deltas)
-                item.setToolTip(3, ngettext("Transaction contains {num} CashToken category involving this wallet",
-                                            "Transaction contains {num} CashToken categories involving this wallet",
-                                            num).format(num=num))
-                item.setToolTip(2, item.toolTip(3))
-            for i in range(len(entry)):
-                if i>3:
-                    item.setTextAlignment(i, Qt.AlignRight | Qt.AlignVCenter)
-                if i!=2:
-                    item.setFont(i, self.monospaceFont)
-            if value and value < 0:
-                item.setForeground(3, self.withdrawalBrush)
-                item.setForeground(4, self.withdrawalBrush)
-                item.setForeground(6, self.withdrawalBrush)
-            item.setData(0, Qt.UserRole, tx_hash)
-            self.addTopLevelItem(item, tx_hash)
-            if current_tx == tx_hash:
-                # Note that it's faster to setSelected once the item is in
-                # the tree. Also note that doing setSelected() on the item
-                # itself is much faster than doing setCurrentItem()
-                # which must do a linear search in the tree (wastefully)
-                item.setSelected(True)
-
-    def on_doubleclick(self, item, column):
-        if self.permit_edit(item, column):
-            super(HistoryList, self).on_doubleclick(item, column)
+                has_unknown_balances = True
+            rows.append((tx_hash, HistoryRow(h_item, wallet.get_label(tx_hash), i - n)))
+        return self.HistorySnapshot(tuple(rows), has_unknown_balances)
+
+    @profiler
+    def apply_snapshot(self, snapshot):
+        if self.cleaned_up:
+            return
+        self.wallet = self.parent.wallet
+        self.has_unknown_balances = snapshot.has_unknown_balances
+        fx = self.parent.fx
+        if fx: fx.history_used_spot = False
+        # The plugin filter hook must run in the GUI thread, so it's done here
+        # rather than in compute_snapshot()
+        rows = [(tx_hash, row) for tx_hash, row in snapshot.rows
+                if not self._should_skip(row.h_item[:6], row.label)]
+        # Display strings may be stale even for unchanged rows (e.g. the base
+        # unit or fiat currency changed), so invalidate them all. This is cheap
+        # as they are only recomputed for the rows that are on-screen.
+        self.hmodel.invalidate_display()
+        self.hmodel.set_rows(rows)
+
+    def on_doubleclick(self, index, column):
+        if self.permit_edit(index, column):
+            super(HistoryList, self).on_doubleclick(index, column)
         else:
-            tx_hash = item.data(0, Qt.UserRole)
+            tx_hash = self.hmodel.key_for_index(index)
             tx = self.wallet.transactions.get(tx_hash)
             if tx:
                 label = self.wallet.get_label(tx_hash) or None
                 self.parent.show_transaction(tx, label)
 
+    def on_edited(self, key, column, text):
+        super().on_edited(key, column, text)
+        self._update_label(key, self.wallet.get_label(key))
+
+    def _update_label(self, tx_hash, h_label):
+        row = self.hmodel.row_for_key(tx_hash)
+        if row is None or row.label == h_label:
+            return
+        if self._should_skip(None, h_label):
+            # Run the label of the changed item thru the filter hook
+            self.hmodel.remove_rows([tx_hash])
+        else:
+            self.hmodel.update_row(tx_hash, row._replace(label=h_label))
+
     def update_labels(self):
         if self.should_defer_update_incr():
             return
-        root = self.invisibleRootItem()
-        child_count = root.childCount()
-        for i in range(child_count):
-            item = root.child(i)
-            txid = item.data(0, Qt.UserRole)
-            h_label = self.wallet.get_label(txid)
-            current_label = item.text(3)
-            item.setText(3, h_label)
-            if current_label != h_label:
-                self.item_changed(item, 3)
-
-    def item_changed(self, item, column):
-        # Run the label of the changed item thru the filter hook
-        if column != 3:
-            return
-
-        label = item.text(3)
-        # NB: 'h_item' parameter is None due to performance reasons
-        should_skip = run_hook("history_list_filter", self, None, label, multi=True) or []
-        if any(should_skip):
-            item.setHidden(True)
+        for tx_hash in list(self.hmodel.keys()):
+            self._update_label(tx_hash, self.wallet.get_label(tx_hash))
 
     def update_item(self, tx_hash, height, conf, timestamp):
         if not self.wallet: return # can happen on startup if this is called before self.on_update()
-        item = self._item_cache.get(tx_hash)
-        if item:
-            idx = self.invisibleRootItem().indexOfChild(item)
-            was_cur = False
-            if idx > -1:
-                # We must take the child out of the view when updating.
-                # This is because otherwise for widgets with many thousands of
-                # items, this method becomes *horrendously* slow (500ms per
-                # call!)... but doing this hack makes it fast (~1ms per call).
-                was_cur = self.currentItem() is item
-                self.invisibleRootItem().takeChild(idx)
-            status, status_str = self.wallet.get_tx_status(tx_hash, height, conf, timestamp)
-            icon = self.get_icon_for_status(status)
-            if icon: item.setIcon(0, icon)
-            item.setData(0, SortableTreeWidgetItem.DataRole, (status, conf))
-            item.setText(2, status_str)
-            if idx > -1:
-                # Now, put the item back again
-                self.invisibleRootItem().insertChild(idx, item)
-                if was_cur:
-                    self.setCurrentItem(item)
+        row = self.hmodel.row_for_key(tx_hash)
+        if row:
+            h_item = (tx_hash, height, conf, timestamp) + tuple(row.h_item[4:])
+            self.hmodel.update_row(tx_hash, row._replace(h_item=h_item))
         elif self.should_defer_update_incr():
             return False
-        return bool(item)  # indicate to client code whether an actual update occurred
+        return bool(row)  # indicate to client code whether an actual update occurred
 
     def create_menu(self, position):
-        item = self.currentItem()
-        if not item:
+        index = self.currentIndex()
+        if not index.isValid():
             return
-        column = self.currentColumn()
-        tx_hash = item.data(0, Qt.UserRole)
+        column = index.column()
+        tx_hash = self.hmodel.key_for_index(index)
         if not tx_hash:
             return
         if column == 0:
             column_title = "ID"
             column_data = tx_hash
         else:
-            column_title = self.headerItem().text(column)
-            column_data = item.text(column)
+            column_title = self.header_text(column)
+            column_data = self.hmodel.data(index, Qt.DisplayRole)
 
         tx_URL = web.BE_URL(self.config, 'tx', tx_hash)
         height, conf, timestamp = self.wallet.get_tx_height(tx_hash)
@@ -272,9 +313,9 @@ class HistoryList(MyTreeWidget, PrintError):
 
         menu.addAction(_("&Copy {}").format(column_title), lambda: self.parent.app.clipboard().setText(column_data.strip()))
         if column in self.editable_columns:
-            # We grab a fresh reference to the current item, as it has been deleted in a reported issue.
+            # We grab a fresh index for the tx, as the row may have moved in the meantime.
             menu.addAction(_("&Edit {}").format(column_title),
-                lambda: self.currentItem() and self.editItem(self.currentItem(), column))
+                lambda: self.edit_index(self.hmodel.index_for_key(tx_hash), column))
         label = self.wallet.get_label(tx_hash) or None
         menu.addAction(_("&Details"), lambda: self.parent.show_transaction(tx, label))
         if pr_key:
@@ -282,6 +323,7 @@ class HistoryList(MyTreeWidget, PrintError):
         if tx_URL:
             menu.addAction(_("View on block explorer"), lambda: webopen(tx_URL))
 
-        run_hook("history_list_context_menu_setup", self, menu, item, tx_hash)  # Plugins can modify menu
+        # Plugins can modify menu. Note they get the QModelIndex of the row, not a QTreeWidgetItem.
+        run_hook("history_list_context_menu_setup", self, menu, index, tx_hash)
 
         menu.exec_(self.viewport().mapToGlobal(position))
@@ -181,6 +181,8 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
         self.create_status_bar()
         self.need_update = threading.Event()
         self.labels_need_update = threading.Event()
+        # Gathers the wallet data for the history, address and utxo tabs off the GUI thread
+        self.snapshot_worker = SnapshotWorker(self, name=self.wallet.diagnostic_name() + '/Snapshots')
 
         self.decimal_point = config.get('decimal_point', 8)
         self.fee_unit = config.get('fee_unit', 0)
@@ -1000,9 +1002,10 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
             server_lag = self.network.get_local_height() - server_height
             num_chains = len(self.network.get_blockchains())
             if self.wallet.rpa_manager is not None:
-                rpa_is_busy = not self.wallet.rpa_manager.up_to_date
+                rpa_error = self.wallet.rpa_manager.error
+                rpa_is_busy = not self.wallet.rpa_manager.up_to_date and rpa_error is None
             else:
-                rpa_is_busy = False
+                rpa_error, rpa_is_busy = None, False
             # Server height can be 0 after switching to a new server
             # until we get a headers subscription request response.
             # Display the synchronizing message in that case.
@@ -1010,6 +1013,10 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
                 text = _("Synchronizing...")
                 icon = icon_dict["status_waiting"]
                 status_tip = status_tip_dict["status_waiting"]
+            elif rpa_error:
+                text = _("RPA scan stopped")
+                icon = icon_dict["status_lagging"]
+                status_tip = status_tip_dict["status_lagging"] + rpa_error
             elif server_lag > 1:
                 text = _("Server is lagging ({} blocks)").format(server_lag)
                 if num_chains <= 1:
@@ -3157,7 +3164,7 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
     def create_addresses_tab(self):
         from .address_list import AddressList
         self.address_list = l = AddressList(self)
-        return self.create_list_tab(l)
+        return self.create_list_tab(l, l.get_list_header())
 
     def create_utxo_tab(self):
         from .utxo_list import UTXOList
@@ -5586,7 +5593,7 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
         # Reparent children to 'None' so python GC can clean them up sooner rather than later.
         # This also hopefully helps accelerate this window's GC.
         children = [c for c in self.children()
-                    if (isinstance(c, (QWidget, QAction, TaskThread))
+                    if (isinstance(c, (QWidget, QAction, TaskThread, SnapshotWorker))
                         and not isinstance(c, (QStatusBar, QMenuBar, QFocusFrame, QShortcut)))]
         for c in children:
             try: c.disconnect()
@@ -5600,6 +5607,8 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
         if self.wallet.thread:  # guard against window close before load_wallet was called (#1554)
             self.wallet.thread.stop()
             self.wallet.thread.wait() # Join the thread to make sure it's really dead.
+        self.snapshot_worker.stop()
+        self.snapshot_worker.wait()
 
         for w in [self.address_list, self.history_list, self.utxo_list, self.token_list, self.token_history_list,
                   self.cash_account_e, self.contact_list, self.tx_update_mgr]:
@@ -5877,21 +5886,22 @@ class ElectrumWindow(QMainWindow, MessageBoxMixin, PrintError):
             l.setObjectName("AddressList - " + d.windowTitle())
             destroyed_print_error(l)  # track object lifecycle
             l.update()
+            hbox = QHBoxLayout()
+            for b in l.get_list_header():
+                hbox.addWidget(b)
+            hbox.addStretch()
+            vbox.addLayout(hbox)
             vbox.addWidget(l)
 
             ok = OkButton(d)
             ok.setDisabled(True)
 
             addr = None
-            def on_item_changed(current, previous):
+            def on_current_changed(current, previous):
                 nonlocal addr
-                addr = current and current.data(0, l.DataRoles.address)
+                addr = l.amodel.key_for_index(current)
                 ok.setEnabled(addr is not None)
-            def on_selection_changed():
-                items = l.selectedItems()
-                if items: on_item_changed(items[0], None)
-                else: on_item_changed(None, None)
-            l.currentItemChanged.connect(on_item_changed)
+            l.selectionModel().currentChanged.connect(on_current_changed)
 
             cancel = CancelButton(d)
 
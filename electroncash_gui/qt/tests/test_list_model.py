@@ -0,0 +1,149 @@
+import unittest
+
+try:
+    from PyQt5.QtCore import Qt
+except ImportError:
+    raise unittest.SkipTest("PyQt5 not available")
+
+from ..util import MyListModel
+
+
+class NumberModel(MyListModel):
+    ''' Rows are ints, keyed by name. Records which rows had their display computed. '''
+
+    def __init__(self):
+        super().__init__()
+        self.computed = []
+        self.hidden = set()
+        self.set_headers(['Name', 'Value'])
+
+    def compute_display(self, key, row):
+        self.computed.append(key)
+        return [key, str(row)]
+
+    def sort_key(self, key, row, column):
+        if column == 1:
+            return (row,)
+        return super().sort_key(key, row, column)
+
+    def row_visible(self, key, row):
+        return key not in self.hidden
+
+
+class SignalRecorder:
+
+    def __init__(self, model):
+        self.events = []
+        model.rowsInserted.connect(lambda parent, first, last: self.events.append(('insert', first, last)))
+        model.rowsRemoved.connect(lambda parent, first, last: self.events.append(('remove', first, last)))
+        model.dataChanged.connect(lambda tl, br, roles=None: self.events.append(('change', tl.row(), br.row())))
+        model.modelReset.connect(lambda: self.events.append(('reset',)))
+
+
+def name(i):
+    return 'row%04d' % i
+
+
+class TestMyListModel(unittest.TestCase):
+
+    def setUp(self):
+        self.model = NumberModel()
+        self.model.set_rows((name(i), (i * 7) % 100) for i in range(100))
+
+    def keys_in_view_order(self):
+        m = self.model
+        return [m.key_for_index(m.index(r, 0)) for r in range(m.rowCount())]
+
+    def test_lazy_display(self):
+        m = self.model
+        self.assertEqual(m.rowCount(), 100)
+        self.assertEqual(m.computed, [])
+        index = m.index_for_key(name(42), 1)
+        self.assertEqual(m.data(index), str(42 * 7 % 100))
+        self.assertEqual(m.data(index.sibling(index.row(), 0)), name(42))
+        self.assertEqual(m.data(index, m.KeyRole), name(42))
+        self.assertEqual(m.computed, [name(42)])  # just the row asked for, once
+        # Changing the row drops its cached display, and only its
+        m.data(m.index_for_key(name(43)))
+        m.update_row(name(42), 5)
+        self.assertEqual(m.data(m.index_for_key(name(42), 1)), '5')
+        self.assertEqual(m.data(m.index_for_key(name(43), 1)), str(43 * 7 % 100))
+        self.assertEqual(m.computed, [name(42), name(43), name(42)])
+        m.invalidate_display()
+        m.data(m.index_for_key(name(43)))
+        self.assertEqual(m.computed[-1], name(43))
+
+    def test_sort(self):
+        m = self.model
+        m.sort(1, Qt.AscendingOrder)
+        values = [m.row_for_key(k) for k in self.keys_in_view_order()]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(m.computed, [])  # sort_key() didn't need the display text
+        m.sort(1, Qt.DescendingOrder)
+        values = [m.row_for_key(k) for k in self.keys_in_view_order()]
+        self.assertEqual(values, sorted(values, reverse=True))
+        for key in (name(0), name(50), name(99)):
+            self.assertEqual(m.key_for_index(m.index_for_key(key)), key)
+        m.sort(0, Qt.AscendingOrder)
+        self.assertEqual(self.keys_in_view_order(), [name(i) for i in range(100)])
+
+    def test_filter(self):
+        m = self.model
+        m.set_filter('ROW001')
+        self.assertEqual(self.keys_in_view_order(), [name(i) for i in range(10, 20)])
+        self.assertFalse(m.index_for_key(name(20)).isValid())
+        m.hidden = {name(11), name(12)}
+        m.refilter()
+        self.assertEqual(self.keys_in_view_order(), [name(i) for i in range(10, 20) if i not in (11, 12)])
+        m.set_filter('')
+        self.assertEqual(m.rowCount(), 98)
+        # Filtered-out rows are still in the model, and come back when updated to match
+        self.assertEqual(m.row_for_key(name(11)), 77)
+        m.set_filter('row001')
+        m.update_row(name(50), 1)  # doesn't match the filter
+        self.assertEqual(m.rowCount(), 8)
+        m.hidden = set()
+        m.refilter()
+        self.assertEqual(m.rowCount(), 10)
+
+    def test_incremental_updates(self):
+        m = self.model
+        m.sort(0, Qt.AscendingOrder)
+        rec = SignalRecorder(m)
+        rows = {k: m.row_for_key(k) for k in m.keys()}
+        # Unchanged: no signals at all
+        m.set_rows(rows.items())
+        self.assertEqual(rec.events, [])
+        # One changed in place, one removed, one added
+        rows[name(1)] = 1000
+        del rows[name(3)]
+        rows['zzz'] = 1
+        m.set_rows(rows.items())
+        self.assertEqual(sorted(rec.events), [('change', 1, 1), ('insert', 99, 99), ('remove', 3, 3)])
+        self.assertEqual(m.rowCount(), 100)
+        self.assertEqual(m.data(m.index(1, 1)), '1000')
+        self.assertEqual(m.key_for_index(m.index(99, 0)), 'zzz')
+        # When the row's sort key changes, it moves: a remove plus an insert
+        m.sort(1, Qt.AscendingOrder)
+        rec.events.clear()
+        m.update_row(name(4), -1)
+        self.assertEqual([e[0] for e in rec.events], ['remove', 'insert'])
+        self.assertEqual(rec.events[-1], ('insert', 0, 0))
+        self.assertEqual(self.keys_in_view_order()[0], name(4))
+        # Lots of changes at once: a reset is cheaper than fine-grained signals
+        rec.events.clear()
+        m.set_rows((name(i), i) for i in range(1000, 1000 + m.reset_threshold + 1))
+        self.assertEqual(rec.events, [('reset',)])
+        self.assertEqual(m.rowCount(), m.reset_threshold + 1)
+
+    def test_headers(self):
+        m = self.model
+        m.set_header_text(1, 'Amount')
+        self.assertEqual(m.headerData(1, Qt.Horizontal), 'Amount')
+        m.set_headers(['Name', 'Amount', 'Extra'])
+        self.assertEqual(m.columnCount(), 3)
+        self.assertIsNone(m.data(m.index(0, 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
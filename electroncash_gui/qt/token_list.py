@@ -33,6 +33,7 @@ from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import QAbstractItemView, QMenu
 
 from electroncash import token, util
+from electroncash.token_index import TokenBalance
 from electroncash.i18n import _, ngettext
 from .main_window import ElectrumWindow
 from .util import ColorScheme, MONOSPACE_FONT, MyTreeWidget, rate_limited, SortableTreeWidgetItem
@@ -237,24 +238,10 @@ class TokenList(MyTreeWidget, util.PrintError):
         # Pick up changes to the configured base_unit and update the amount column
         self.headerItem().setText(self.Col.bch_amount, self.amount_heading.format(unit=self.parent.base_unit()))
 
-        tok_utxos = self.wallet.get_utxos(tokens_only=True)
-
-        tokens: DefaultDict[List[Dict]] = defaultdict(list)  # key: token_id, value: List of utxo dicts
+        # The per-category totals come straight from the wallet's token index; only the utxos of each category
+        # are fetched to build its sub-items.
+        balances: Dict[str, TokenBalance] = self.wallet.get_token_balances()
         items_to_re_select: List[SortableTreeWidgetItem] = []
-        # token_id_hex -> <commitment_hex>|"ft_only" -> list of utxos
-        tokens_grouped: DefaultDict[DefaultDict[List[Dict]]] = defaultdict(lambda: defaultdict(list))
-
-        for utxo in tok_utxos:
-            td = utxo['token_data']
-            assert isinstance(td, token.OutputData)
-            token_id = td.id_hex
-            tokens[token_id].append(utxo)
-            if not td.has_nft():
-                # Special group -- fungible-only utxos
-                tokens_grouped[token_id]["ft_only"].append(utxo)
-            else:
-                # Otherwise group each token_id by the commitment bytes
-                tokens_grouped[token_id][td.commitment.hex()].append(utxo)
 
         def set_fonts(item: SortableTreeWidgetItem):
             for col in (self.Col.category, self.Col.quantity, self.Col.bch_amount):
@@ -362,19 +349,32 @@ class TokenList(MyTreeWidget, util.PrintError):
                 items_to_re_select.append(stwi)
             return stwi
 
-        for token_id, dd in tokens_grouped.items():
-            utxo_list = tokens[token_id]
+        for token_id, balance in balances.items():
+            utxo_list = self.wallet.get_token_utxos(token_id)
+            if not utxo_list:
+                continue
+            # <commitment_hex>|"ft_only" -> list of utxos
+            dd: DefaultDict[str, List[Dict]] = defaultdict(list)
+            for utxo in utxo_list:
+                td = utxo['token_data']
+                assert isinstance(td, token.OutputData)
+                if not td.has_nft():
+                    # Special group -- fungible-only utxos
+                    dd["ft_only"].append(utxo)
+                else:
+                    # Otherwise group by the commitment bytes
+                    dd[td.commitment.hex()].append(utxo)
             key_prefix = f'token_{token_id}'
             item_key = key_prefix
-            quantity = self.token_meta.format_amount(token_id, sum(u['token_data'].amount for u in utxo_list))
-            num_nfts = sum(1 for u in utxo_list if u['token_data'].has_nft())
+            quantity = self.token_meta.format_amount(token_id, balance.fungible)
+            num_nfts = len(balance.nfts)
             nfts = str(num_nfts)
             flags = {token.get_nft_flag_text(u['token_data']) for u in utxo_list}
-            num_minting = sum(1 for u in utxo_list if u['token_data'] and u['token_data'].is_minting_nft())
-            num_mutable = sum(1 for u in utxo_list if u['token_data'] and u['token_data'].is_mutable_nft())
+            num_minting = balance.minting
+            num_mutable = balance.mutable
             flags.discard(None)  # Non-nft's add "None" to this set. discard
             nft_flags = ', '.join(sorted(flags, key=token.nft_flag_text_sorter))
-            n_utxos = sum(len(ul) for ul in dd.values())
+            n_utxos = balance.num_utxos
             num_utxos = str(n_utxos)
             bch_amt = self.parent.format_amount(sum(x['value'] for x in utxo_list), is_diff=False, whitespaces=True)
 
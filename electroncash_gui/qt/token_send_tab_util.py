@@ -54,7 +54,7 @@ class TokenSendUtil(PrintError):
         tokens: DefaultDict[List[Dict]] = defaultdict(list)
         tokens_grouped: DefaultDict[DefaultDict[List[Dict]]] = defaultdict(lambda: defaultdict(list))
 
-        token_utxos = self.wallet.get_utxos(exclude_frozen=exclude_frozen, tokens_only=True)
+        token_utxos = self.wallet.get_token_utxos(exclude_frozen=exclude_frozen)
 
         # Setup data source; iterate over a sorted list of utxos
         def sort_func(u):
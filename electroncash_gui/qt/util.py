@@ -1,9 +1,11 @@
+import bisect
 import os.path
 import time
 import sys
 import platform
 import queue
 import threading
+import traceback
 import os
 import weakref
 import webbrowser
@@ -604,6 +606,12 @@ class MyTreeWidget(QTreeWidget):
     # the QTreeWidgetItem data role to use when searching data columns
     filter_data_role : int = Qt.UserRole
 
+    # Set this to True in subclasses that implement compute_snapshot() and
+    # apply_snapshot(). update() will then gather the wallet data in the
+    # parent window's SnapshotWorker thread (if it has one), and only the
+    # cheap apply_snapshot() step runs in the GUI thread.
+    snapshot_updates = False
+
     def __init__(self, parent, create_menu, headers, stretch_column=None,
                  editable_columns=None, *, deferred_updates=False, save_sort_settings=False,
                  save_column_visual_order_settings=True, save_column_widths_setting=False):
@@ -871,24 +879,64 @@ class MyTreeWidget(QTreeWidget):
             # on initial synch or when new TX's arrive.
             if self.should_defer_update_incr():
                 return
-            self.setUpdatesEnabled(False)
-            scroll_pos_val = self.verticalScrollBar().value() # save previous scroll bar position
-            self.on_update()
-            self.deferred_update_ct = 0
-            weakSelf = Weak.ref(self)
-            def restoreScrollBar():
-                slf = weakSelf()
-                if slf:
-                    slf.updateGeometry()
-                    slf.verticalScrollBar().setValue(scroll_pos_val) # restore scroll bar to previous
-                    slf.setUpdatesEnabled(True)
-            QTimer.singleShot(0, restoreScrollBar) # need to do this from a timer some time later due to Qt quirks
+            if self.submit_snapshot():
+                # _on_snapshot() will do the rest, later, in the GUI thread
+                self.deferred_update_ct = 0
+                return
+            self._update_with(self.on_update)
+        if self.current_filter:
+            self.filter(self.current_filter)
+
+    def _update_with(self, func):
+        self.setUpdatesEnabled(False)
+        scroll_pos_val = self.verticalScrollBar().value() # save previous scroll bar position
+        func()
+        self.deferred_update_ct = 0
+        weakSelf = Weak.ref(self)
+        def restoreScrollBar():
+            slf = weakSelf()
+            if slf:
+                slf.updateGeometry()
+                slf.verticalScrollBar().setValue(scroll_pos_val) # restore scroll bar to previous
+                slf.setUpdatesEnabled(True)
+        QTimer.singleShot(0, restoreScrollBar) # need to do this from a timer some time later due to Qt quirks
+
+    def submit_snapshot(self):
+        ''' Hands this widget's compute_snapshot() to the parent window's
+        SnapshotWorker. Returns False if snapshots aren't in use, in which case
+        the caller should just call on_update(). '''
+        worker = getattr(self.parent, 'snapshot_worker', None)
+        if not self.snapshot_updates or not worker:
+            return False
+        worker.submit(self, self.compute_snapshot, self._on_snapshot)
+        return True
+
+    def _on_snapshot(self, snapshot):
+        if self.editor:
+            # Don't yank the rows out from under the editor; closing it will
+            # trigger a fresh update.
+            self.pending_update = True
+            return
+        self._update_with(lambda: self.apply_snapshot(snapshot))
         if self.current_filter:
             self.filter(self.current_filter)
 
     def on_update(self):
         # Reimplemented in subclasses
-        pass
+        if self.snapshot_updates:
+            self.apply_snapshot(self.compute_snapshot(lambda: False))
+
+    def compute_snapshot(self, is_stale):
+        ''' Reimplemented in subclasses that set snapshot_updates. Runs in
+        the SnapshotWorker thread: gather whatever is needed from the wallet
+        and return it as an immutable object. Must not touch Qt. '''
+        raise NotImplementedError
+
+    def apply_snapshot(self, snapshot):
+        ''' Reimplemented in subclasses that set snapshot_updates. Runs in
+        the GUI thread, populating the widget from a compute_snapshot()
+        result. '''
+        raise NotImplementedError
 
     def showEvent(self, e):
         super().showEvent(e)
@@ -1121,6 +1169,117 @@ class TaskThread(PrintError, QThread):
                 self.print_error(f"wait timed out after {waitTime} seconds")
 
 
+class SnapshotWorker(PrintError, QThread):
+    ''' Computes view-model snapshots of wallet data for the wallet tabs on a
+    background thread, and hands them back to the GUI thread.
+
+    Jobs are submitted per key (typically the widget being refreshed):
+
+        compute(is_stale) -> snapshot  runs in this thread. It must not touch
+                                       any Qt objects and should return an
+                                       immutable result (tuples, namedtuples).
+                                       It may poll is_stale() and return early
+                                       (with anything) if it returns True.
+        apply(snapshot)                runs in the GUI thread.
+
+    Bursts of submissions for the same key are coalesced: a job still waiting
+    in the queue is simply replaced by the newer one. A job that is already
+    computing when a newer one for the same key arrives is considered stale;
+    its result is discarded rather than applied. '''
+
+    resultSig = pyqtSignal(object, int, object, object)
+
+    def __init__(self, parent, *, name=None):
+        QThread.__init__(self, parent)
+        if name is not None:
+            self.setObjectName(name)
+        self.lock = threading.Lock()
+        self.q = queue.Queue()
+        self._gens = weakref.WeakKeyDictionary()  # key -> latest generation submitted
+        self._pending = weakref.WeakKeyDictionary()  # key -> (gen, compute, apply)
+        self._stopping = False
+        self.resultSig.connect(self._on_result)
+        Weak.finalization_print_error(self)
+        self.start()
+
+    def diagnostic_name(self):
+        return TaskThread.diagnostic_name(self)
+
+    def submit(self, key, compute, apply):
+        ''' Enqueue (or replace) the snapshot job for `key`. Call this from
+        the GUI thread. `key` must be hashable and weak-referenceable. '''
+        with self.lock:
+            if self._stopping:
+                return
+            gen = self._gens.get(key, 0) + 1
+            self._gens[key] = gen
+            already_queued = key in self._pending
+            self._pending[key] = (gen, compute, apply)
+        if not already_queued:
+            self.q.put(weakref.ref(key))
+
+    def cancel(self, key):
+        ''' Forget any queued job for `key` and discard the result of any
+        job for it that is currently computing. '''
+        with self.lock:
+            self._pending.pop(key, None)
+            if key in self._gens:
+                self._gens[key] += 1
+
+    def _is_stale(self, key, gen):
+        with self.lock:
+            return self._stopping or self._gens.get(key) != gen
+
+    def run(self):
+        self.print_error("started")
+        try:
+            while True:
+                ref = self.q.get()
+                if ref is None:
+                    break
+                self._process(ref)
+        finally:
+            self.print_error("exiting")
+
+    def _process(self, ref):
+        # NB: done in its own function so that no strong reference to the
+        # key outlives the job while run() is blocked on the queue.
+        key = ref()
+        if key is None:
+            return
+        with self.lock:
+            job = self._pending.pop(key, None)
+        if not job:
+            return
+        gen, compute, apply = job
+        try:
+            result = compute(lambda: self._is_stale(key, gen))
+        except Exception:
+            self.print_error("error computing snapshot for", repr(key))
+            traceback.print_exc(file=sys.stderr)
+            return
+        if not self._is_stale(key, gen):
+            self.resultSig.emit(key, gen, apply, result)
+
+    def _on_result(self, key, gen, apply, result):
+        # This runs in the GUI thread.
+        if self._is_stale(key, gen):
+            # A newer job was submitted after this one finished computing
+            return
+        apply(result)
+
+    def stop(self, *, waitTime = None):
+        ''' Discards all pending work and asks the thread to exit. Pass
+        optional time to wait in seconds (float). '''
+        with self.lock:
+            self._stopping = True
+            self._pending.clear()
+        self.q.put(None)
+        if waitTime is not None and self.isRunning():
+            if not self.wait(int(waitTime * 1e3)):  # secs -> msec
+                self.print_error(f"wait timed out after {waitTime} seconds")
+
+
 class ColorSchemeItem:
     def __init__(self, fg_color, bg_color):
         self.colors = (fg_color, bg_color)
@@ -1204,6 +1363,519 @@ class SortableTreeWidgetItem(QTreeWidgetItem):
             # If not, we will just do string comparison
             return self.text(column) < other.text(column)
 
+
+class MyListModel(QAbstractItemModel):
+    ''' A flat (list) item model which does its own sorting and filtering, and
+    only computes the display data for the rows the view actually asks for.
+
+    Rows are arbitrary objects keyed by a unique, hashable key (e.g. a
+    txid). Client code feeds them in with set_rows() (which diffs against
+    what's already in the model and emits fine-grained insert/remove/change
+    signals), update_row() and remove_rows(). Subclasses implement
+    compute_display() and optionally row_data(), sort_key() and
+    filter_match().
+
+    This is intended for lists that can get too large for MyTreeWidget,
+    which must create a QTreeWidgetItem per row up-front. '''
+
+    KeyRole = Qt.UserRole  # data role to get at the row's key
+    SortRole = SortableTreeWidgetItem.DataRole  # optional: per-column sort data if the display text won't do
+
+    # If a set_rows() call would insert and/or remove more than this many
+    # rows, we just reset the model since that's faster than fine-grained
+    # signals.
+    reset_threshold = 250
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.headers = []
+        self.editable_columns = set()
+        self.on_edited = None  # callback: f(key, column, text), set by the view
+        self._rows = dict()  # key -> row, all rows (including filtered-out ones)
+        self._order = []  # keys of the rows that pass the filter, sorted ascending by sort key
+        self._sort_keys = []  # the sort key for each entry in _order, for bisecting
+        self._row_sort_key = dict()  # key -> sort key, for each key in _order
+        self._display = dict()  # key -> list of DisplayRole data, lazily computed by compute_display()
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._filter_text = ''
+
+    # --- Subclass interface
+    def compute_display(self, key, row) -> list:
+        ''' Return a list of display strings, one per column. Called lazily and cached until the row changes. '''
+        raise NotImplementedError
+
+    def row_data(self, key, row, column, role):
+        ''' Reimplement to return data for roles other than DisplayRole / KeyRole. '''
+        return None
+
+    def sort_key(self, key, row, column):
+        ''' Reimplement to sort on something other than the display text. '''
+        data = self.row_data(key, row, column, self.SortRole)
+        if data is not None:
+            return data
+        text = self._get_display(key, row)[column]
+        try:
+            return (0, atof(text), '')
+        except (ValueError, TypeError):
+            return (1, 0.0, str(text))
+
+    def filter_match(self, key, row, text) -> bool:
+        ''' Reimplement to specify which rows match the (lower-cased) filter text. '''
+        return any(text in str(s).lower() for s in self._get_display(key, row))
+
+    def row_visible(self, key, row) -> bool:
+        ''' Reimplement to hide rows regardless of the filter text (e.g. for a
+        combo box filter). Call refilter() whenever the outcome may have changed. '''
+        return True
+    # --- /Subclass interface
+
+    def _get_display(self, key, row):
+        d = self._display.get(key)
+        if d is None:
+            self._display[key] = d = self.compute_display(key, row)
+        return d
+
+    def _full_sort_key(self, key, row):
+        if self._sort_column < 0:
+            return (0, key)
+        return (self.sort_key(key, row, self._sort_column), key)
+
+    def _accepts(self, key, row):
+        return (self.row_visible(key, row)
+                and (not self._filter_text or self.filter_match(key, row, self._filter_text)))
+
+    def _to_internal(self, r):
+        return r if self._sort_order == Qt.AscendingOrder else len(self._order) - 1 - r
+
+    def _internal_pos(self, key):
+        ''' Returns the position of key in self._order, or -1 '''
+        sk = self._row_sort_key.get(key)
+        if sk is None:
+            return -1
+        return bisect.bisect_left(self._sort_keys, sk)
+
+    def _rebuild_order(self):
+        items = sorted((self._full_sort_key(key, row), key) for key, row in self._rows.items() if self._accepts(key, row))
+        self._sort_keys = [sk for sk, _ in items]
+        self._order = [key for _, key in items]
+        self._row_sort_key = {key: sk for sk, key in items}
+
+    # --- Public interface
+    @property
+    def sort_column(self):
+        return self._sort_column
+
+    @property
+    def sort_order(self):
+        return self._sort_order
+
+    def row_count(self):
+        return len(self._order)
+
+    def key_for_index(self, index):
+        if not index.isValid() or not 0 <= index.row() < len(self._order):
+            return None
+        return self._order[self._to_internal(index.row())]
+
+    def row_for_key(self, key):
+        return self._rows.get(key)
+
+    def index_for_key(self, key, column=0):
+        pos = self._internal_pos(key)
+        if pos < 0:
+            return QModelIndex()
+        row = pos if self._sort_order == Qt.AscendingOrder else len(self._order) - 1 - pos
+        return self.index(row, column)
+
+    def keys(self):
+        return self._rows.keys()
+
+    def set_headers(self, headers):
+        old_ct, new_ct = len(self.headers), len(headers)
+        if new_ct > old_ct:
+            self.beginInsertColumns(QModelIndex(), old_ct, new_ct - 1)
+            self.headers = list(headers)
+            self.endInsertColumns()
+        elif new_ct < old_ct:
+            self.beginRemoveColumns(QModelIndex(), new_ct, old_ct - 1)
+            self.headers = list(headers)
+            self.endRemoveColumns()
+        else:
+            self.headers = list(headers)
+        if new_ct:
+            self.headerDataChanged.emit(Qt.Horizontal, 0, new_ct - 1)
+        self.invalidate_display()
+
+    def set_header_text(self, column, text):
+        ''' Change the text of a single header, without touching the rows. '''
+        if 0 <= column < len(self.headers) and self.headers[column] != text:
+            self.headers[column] = text
+            self.headerDataChanged.emit(Qt.Horizontal, column, column)
+
+    def invalidate_display(self):
+        ''' Call this if the way rows are displayed changed (e.g. the amount
+        format). Only the rows actually on-screen are recomputed. '''
+        self._display.clear()
+        if self._order and self.headers:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self._order) - 1, len(self.headers) - 1))
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows.clear()
+        self._order, self._sort_keys = [], []
+        self._row_sort_key.clear()
+        self._display.clear()
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        ''' Replace the model's contents with `rows`, an iterable of (key, row)
+        tuples. Unchanged rows are left alone, changed rows are updated in
+        place, and the rest are inserted/removed incrementally. '''
+        new_rows = dict(rows)
+        removed = [k for k in self._rows if k not in new_rows]
+        added = [k for k in new_rows if k not in self._rows]
+        if len(added) + len(removed) > self.reset_threshold:
+            self.beginResetModel()
+            self._rows = new_rows
+            self._display.clear()
+            self._rebuild_order()
+            self.endResetModel()
+            return
+        self.remove_rows(removed)
+        for key, row in new_rows.items():
+            if self._rows.get(key, None) != row:
+                self.update_row(key, row)
+
+    def update_row(self, key, row):
+        ''' Add or update a single row. '''
+        self._rows[key] = row
+        self._display.pop(key, None)
+        pos = self._internal_pos(key)
+        accepts = self._accepts(key, row)
+        new_sk = self._full_sort_key(key, row) if accepts else None
+        if pos >= 0 and new_sk == self._sort_keys[pos]:
+            # Row didn't move, just tell the view it changed
+            r = pos if self._sort_order == Qt.AscendingOrder else len(self._order) - 1 - pos
+            self.dataChanged.emit(self.index(r, 0), self.index(r, max(0, len(self.headers) - 1)))
+            return
+        if pos >= 0:
+            self._remove_at(pos)
+        if accepts:
+            pos = bisect.bisect_left(self._sort_keys, new_sk)
+            r = pos if self._sort_order == Qt.AscendingOrder else len(self._order) - pos
+            self.beginInsertRows(QModelIndex(), r, r)
+            self._order.insert(pos, key)
+            self._sort_keys.insert(pos, new_sk)
+            self._row_sort_key[key] = new_sk
+            self.endInsertRows()
+
+    def remove_rows(self, keys):
+        positions = []
+        for key in keys:
+            pos = self._internal_pos(key)
+            if pos >= 0:
+                positions.append(pos)
+            self._rows.pop(key, None)
+            self._display.pop(key, None)
+        for pos in sorted(positions, reverse=True):
+            self._remove_at(pos)
+
+    def _remove_at(self, pos):
+        r = pos if self._sort_order == Qt.AscendingOrder else len(self._order) - 1 - pos
+        self.beginRemoveRows(QModelIndex(), r, r)
+        key = self._order.pop(pos)
+        del self._sort_keys[pos]
+        self._row_sort_key.pop(key, None)
+        self.endRemoveRows()
+
+    def set_filter(self, text):
+        text = text.lower()
+        if text == self._filter_text:
+            return
+        self._filter_text = text
+        self._relayout()
+
+    def refilter(self):
+        ''' Re-apply row_visible() to all rows. '''
+        self._relayout()
+
+    def _relayout(self):
+        ''' Re-filter and re-sort, preserving persistent indexes (and thus the
+        view's selection) for rows that remain. '''
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        old_keys = [(self.key_for_index(i), i.column()) for i in old_indexes]
+        self._rebuild_order()
+        self.changePersistentIndexList(old_indexes, [self.index_for_key(k, c) if k is not None else QModelIndex()
+                                                     for k, c in old_keys])
+        self.layoutChanged.emit()
+    # --- /Public interface
+
+    # --- QAbstractItemModel interface
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < len(self._order) or not 0 <= column < len(self.headers):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        if index is None:
+            # QObject.parent() overload
+            return super().parent()
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(self.headers):
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        key = self.key_for_index(index)
+        if key is None:
+            return None
+        if role == self.KeyRole:
+            return key
+        row = self._rows[key]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._get_display(key, row)[index.column()]
+        return self.row_data(key, row, index.column(), role)
+
+    # NB: ItemNeverHasChildren saves QTreeView from asking every row for its child count when laying out
+    _flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemNeverHasChildren
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if index.column() in self.editable_columns:
+            return self._flags | Qt.ItemIsEditable
+        return self._flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        key = self.key_for_index(index)
+        if key is None or role != Qt.EditRole or index.column() not in self.editable_columns:
+            return False
+        if value != self.data(index, Qt.DisplayRole) and self.on_edited:
+            self.on_edited(key, index.column(), value)
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if (column, order) == (self._sort_column, self._sort_order):
+            return
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        old_keys = [(self.key_for_index(i), i.column()) for i in old_indexes]
+        if column != self._sort_column:
+            self._sort_column = column
+            self._rebuild_order()
+        self._sort_order = order  # just flips the mapping of rows -> self._order, no need to re-sort
+        self.changePersistentIndexList(old_indexes, [self.index_for_key(k, c) if k is not None else QModelIndex()
+                                                     for k, c in old_keys])
+        self.layoutChanged.emit()
+    # --- /QAbstractItemModel interface
+
+
+class MyTreeView(QTreeView):
+    ''' Model/view counterpart to MyTreeWidget, for use with a MyListModel.
+    Offers the same deferred update, Ctrl+F filter, label editing and
+    header (sort, column visibility & order) persistence facilities. '''
+
+    column_visibility_changed_signal = pyqtSignal()
+
+    SortSpec = MyTreeWidget.SortSpec
+    default_sort : SortSpec = None
+
+    def __init__(self, parent, create_menu, model : MyListModel, headers, stretch_column=None,
+                 editable_columns=None, *, deferred_updates=False, save_sort_settings=False,
+                 save_column_visual_order_settings=True):
+        QTreeView.__init__(self, parent)
+        self.parent = parent
+        self.config = self.parent.config
+        self.stretch_column = stretch_column
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(create_menu)
+        self.column_visibility = list()
+        self.header().setContextMenuPolicy(Qt.CustomContextMenu)
+        self.header().customContextMenuRequested.connect(self.create_header_context_menu)
+        self.setUniformRowHeights(True)
+        self.setRootIsDecorated(False)
+        self.setAllColumnsShowFocus(True)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)  # we call self.edit() explicitly
+        self.deferred_updates = deferred_updates
+        self.deferred_update_ct, self._forced_update = 0, False
+        self._save_sort_settings = save_sort_settings
+        self._save_column_visual_order_settings = save_column_visual_order_settings
+        self.pending_update = False
+        if editable_columns is None:
+            editable_columns = [stretch_column]
+        self.editable_columns = editable_columns
+        model.editable_columns = set(editable_columns)
+        model.on_edited = self.on_edited
+        if model.parent() is None:
+            model.setParent(self)
+        self.setModel(model)
+        self.doubleClicked.connect(lambda index: self.on_doubleclick(index, index.column()))
+        self.update_headers(headers)
+        self.current_filter = ""
+
+        self._setup_save_sort_mechanism()
+
+    # Share the settings-persistence code with MyTreeWidget. These only use
+    # the parts of the QTreeWidget API that QTreeView also has.
+    _setup_save_sort_mechanism = MyTreeWidget._setup_save_sort_mechanism
+    toggle_column = MyTreeWidget.toggle_column
+    _setup_save_column_visibility_mechanism = MyTreeWidget._setup_save_column_visibility_mechanism
+    _setup_save_column_visual_order_mechanism = MyTreeWidget._setup_save_column_visual_order_mechanism
+
+    def columnCount(self):
+        return self.model().columnCount()
+
+    def header_text(self, column):
+        return self.model().headerData(column, Qt.Horizontal)
+
+    def create_header_context_menu(self, position):
+        menu = QMenu()
+        for col in range(self.columnCount()):
+            action = QAction(self.header_text(col), parent=self)
+            action.setCheckable(True)
+            checked = self.column_visibility[col]
+            action.setChecked(checked)
+            action.triggered.connect(lambda checked, index=col: self.toggle_column(index, checked, emit_signal=True))
+            if self.column_visibility.count(True) == 1 and checked:
+                action.setDisabled(True)
+            menu.addAction(action)
+
+        menu.exec_(self.header().viewport().mapToGlobal(position))
+
+    def _set_default_column_visibility(self):
+        self.column_visibility = [not self.isColumnHidden(col) for col in range(self.columnCount())]
+        return self.column_visibility
+
+    def update_headers(self, headers):
+        model = self.model()
+        model.set_headers(headers)
+        if self.isSortingEnabled() and 0 <= model.sort_column < len(headers):
+            # Inserting columns may have shifted the header's sort indicator; put it back
+            self.header().setSortIndicator(model.sort_column, model.sort_order)
+        self.header().setStretchLastSection(False)
+        for col in range(len(headers)):
+            sm = QHeaderView.Stretch if col == self.stretch_column else QHeaderView.ResizeToContents
+            self.header().setSectionResizeMode(col, sm)
+        self._set_default_column_visibility()
+        self._setup_save_column_visibility_mechanism()
+        self._setup_save_column_visual_order_mechanism()
+
+    def keyPressEvent(self, event):
+        if event.key() in {Qt.Key_F2, Qt.Key_Return} and self.state() != QAbstractItemView.EditingState:
+            index = self.currentIndex()
+            if index.isValid():
+                self.on_activated(index, index.column())
+        else:
+            super().keyPressEvent(event)
+
+    def permit_edit(self, index, column):
+        return (column in self.editable_columns
+                and self.on_permit_edit(index, column))
+
+    def on_permit_edit(self, index, column):
+        return True
+
+    def edit_index(self, index, column):
+        index = index.sibling(index.row(), column)
+        if index.isValid() and column in self.editable_columns:
+            self.edit(index)
+
+    def on_doubleclick(self, index, column):
+        if self.permit_edit(index, column):
+            self.edit_index(index, column)
+
+    def on_activated(self, index, column):
+        # on 'enter' we show the menu
+        pt = self.visualRect(index).bottomLeft()
+        pt.setX(50)
+        self.customContextMenuRequested.emit(pt)
+
+    def on_edited(self, key, column, text):
+        '''Called only when the text actually changes'''
+        self.parent.wallet.set_label(key, text)
+        self.parent.update_labels()
+
+    def is_editing(self):
+        return self.state() == QAbstractItemView.EditingState
+
+    def selected_keys(self):
+        model = self.model()
+        return [model.key_for_index(index) for index in self.selectionModel().selectedRows()]
+
+    def select_keys(self, keys):
+        ''' Select the rows for `keys`. Keys not in the model (or filtered out) are ignored. '''
+        model = self.model()
+        selection = QItemSelection()
+        for key in keys:
+            index = model.index_for_key(key)
+            if index.isValid():
+                selection.select(index, index)
+        if not selection.isEmpty():
+            self.selectionModel().select(selection, QItemSelectionModel.Select | QItemSelectionModel.Rows)
+
+    def should_defer_update_incr(self):
+        return MyTreeWidget.should_defer_update_incr(self)
+
+    def update(self):
+        # Defer updates if editing
+        if self.is_editing():
+            self.pending_update = True
+            return
+        # Deferred update mode won't actually update the GUI if it's
+        # not on-screen, and will instead update it the next time it is
+        # shown.
+        if self.should_defer_update_incr():
+            return
+        if not self.submit_snapshot():
+            self.on_update()
+        self.deferred_update_ct = 0
+
+    def closeEditor(self, editor, hint):
+        super().closeEditor(editor, hint)
+        if self.pending_update:
+            self.pending_update = False
+            self.update()
+
+    snapshot_updates = False
+
+    def submit_snapshot(self):
+        return MyTreeWidget.submit_snapshot(self)
+
+    def _on_snapshot(self, snapshot):
+        if self.is_editing():
+            self.pending_update = True
+            return
+        self.apply_snapshot(snapshot)
+
+    def on_update(self):
+        # Reimplemented in subclasses
+        if self.snapshot_updates:
+            self.apply_snapshot(self.compute_snapshot(lambda: False))
+
+    compute_snapshot = MyTreeWidget.compute_snapshot
+    apply_snapshot = MyTreeWidget.apply_snapshot
+
+    def showEvent(self, e):
+        super().showEvent(e)
+        if e.isAccepted() and self.deferred_update_ct:
+            self._forced_update = True
+            self.update()
+            self._forced_update = False
+
+    def filter(self, p):
+        self.current_filter = p.lower()
+        self.model().set_filter(p)
+
 class RateLimiter(PrintError):
     ''' Manages the state of a @rate_limited decorated function, collating
     multiple invocations. This class is not intented to be used directly. Instead,
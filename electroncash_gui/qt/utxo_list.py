@@ -31,45 +31,210 @@ from electroncash.bitcoin import COINBASE_MATURITY
 from electroncash.i18n import _, ngettext
 from electroncash.plugins import run_hook
 from electroncash.util import profiler, PrintError
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from functools import wraps
 from enum import IntEnum
 
 
-class UTXOList(MyTreeWidget, PrintError):
+class _UtxoItem:
+    ''' Stands in for the QTreeWidgetItem the "utxo_list_item_setup" plugin
+    hook used to get. Whatever the plugin sets on it is recorded, and served
+    by UtxoModel.row_data(). '''
+
+    def __init__(self, model, key, row, texts):
+        self._model, self._key, self._row = model, key, row
+        self.texts = texts
+        self.roles = dict()  # (column, role) -> data
+
+    def text(self, column):
+        return self.texts[column]
+
+    def setText(self, column, text):
+        self.texts[column] = text
+
+    def data(self, column, role):
+        if role == Qt.DisplayRole:
+            return self.texts[column]
+        if (column, role) in self.roles:
+            return self.roles[(column, role)]
+        return self._model.base_data(self._key, self._row, column, role)
+
+    def setData(self, column, role, value):
+        if role == Qt.DisplayRole:
+            self.texts[column] = value
+        else:
+            self.roles[(column, role)] = value
+
+    def toolTip(self, column):
+        return self.data(column, Qt.ToolTipRole)
+
+    def setToolTip(self, column, text):
+        self.roles[(column, Qt.ToolTipRole)] = text
+
+    def setIcon(self, column, icon):
+        self.roles[(column, Qt.DecorationRole)] = icon
+
+    def setFont(self, column, font):
+        self.roles[(column, Qt.FontRole)] = font
+
+    def setBackground(self, column, brush):
+        self.roles[(column, Qt.BackgroundRole)] = brush
+
+    def setForeground(self, column, brush):
+        self.roles[(column, Qt.ForegroundRole)] = brush
+
+
+class UtxoModel(MyListModel):
+    ''' Model for the UTXOList. Rows are keyed by the coin's "prevout_hash:n"
+    name, and are UTXOList.UtxoRow tuples. Display data (including whatever
+    plugins add via the "utxo_list_item_setup" hook) is computed lazily, only
+    for the rows the view asks for. '''
+
+    def __init__(self, ulist):
+        super().__init__()  # NB: the view takes ownership in MyTreeView.__init__
+        self.ulist = ulist
+        self.local_maturity_height = 0
+
+    def is_immature(self, row):
+        x = row.utxo
+        return bool(x['coinbase'] and x['height'] > self.local_maturity_height)
+
+    def frozen_flags(self, row):
+        ''' The address-level-frozen, coin-level-frozen, etc flags, eg "ac". See UTXOList.create_menu(). '''
+        x = row.utxo
+        return "{}{}{}{}{}".format(
+            ("a" if row.a_frozen else ""), ("c" if x['is_frozen_coin'] else ""), ("s" if x['slp_token'] else ""),
+            ("i" if self.is_immature(row) else ""), ("t" if x['token_data'] else ""))
+
+    def compute_display(self, key, row):
+        ul = self.ulist
+        x = row.utxo
+        address_text = x['address'].to_ui_string()
+        if row.ca_info:
+            address_text = f'{row.ca_info.emoji} {address_text}'  # prepend the address emoji char
+        amount = ul.parent.format_amount(x['value'], is_diff=False, whitespaces=True)
+        texts = [address_text, row.label, amount, str(x['height']), ul.get_name_short(x)]
+        texts += [''] * (len(self.headers) - len(texts))
+        item = _UtxoItem(self, key, row, texts)
+        run_hook("utxo_list_item_setup", ul, item, x, key)
+        return texts + [item.roles]  # the last entry is not a column
+
+    def row_data(self, key, row, column, role):
+        roles = self._get_display(key, row)[-1]
+        if (column, role) in roles:
+            return roles[(column, role)]
+        return self.base_data(key, row, column, role)
+
+    def _coin_look(self, row):
+        ''' Returns the (tool tip, background, foreground) for the coin's address column '''
+        ul = self.ulist
+        x = row.utxo
+        a_frozen, c_frozen = row.a_frozen, x['is_frozen_coin']
+        if self.is_immature(row):
+            return _('Coin is not yet mature'), None, ul.immatureColor
+        if x['slp_token']:
+            return _('Coin contains an SLP token'), ul.slpBG, None
+        if a_frozen and not c_frozen:
+            # address is frozen, coin is not frozen
+            # emulate the "Look" off the address_list .py's frozen entry
+            return _("Address is frozen"), ul.lightBlue, None
+        if c_frozen and not a_frozen:
+            # coin is frozen, address is not frozen
+            return _("Coin is frozen"), ul.blue, None
+        if c_frozen and a_frozen:
+            # both coin and address are frozen so color-code it to indicate that.
+            return _("Coin & Address are frozen"), ul.lightBlue, ul.cyanBlue
+        if x['token_data']:
+            return _('Coin contains a CashToken'), ul.cashTokenBG, None
+        return None, None, None
+
+    def base_data(self, key, row, column, role):
+        ''' The data for roles other than DisplayRole, before plugins had a say '''
+        ul = self.ulist
+        Col, DataRoles = UTXOList.Col, UTXOList.DataRoles
+        x = row.utxo
+        if role == Qt.ToolTipRole:
+            if column == Col.address:
+                return self._coin_look(row)[0] or row.ca_tool_tip
+            if column == Col.label:
+                return row.label or None  # just in case it doesn't fit horizontally
+            if column == Col.output_point:
+                return key  # just in case they like to see lots of hex digits :)
+        elif role == Qt.FontRole:
+            if column in (Col.address, Col.amount, Col.output_point):
+                return ul.monospaceFont
+        elif role == Qt.BackgroundRole:
+            if column == Col.address:
+                return self._coin_look(row)[1]
+        elif role == Qt.ForegroundRole:
+            if column == Col.address:
+                return self._coin_look(row)[2]
+            if column != Col.label and self.is_immature(row):
+                return ul.immatureColor  # don't color the label column
+        elif column == Col.address:
+            if role == DataRoles.name:
+                return key
+            if role == DataRoles.frozen_flags:
+                return self.frozen_flags(row)
+            if role == DataRoles.address:
+                return x['address']
+            if role == DataRoles.cash_account:
+                return row.ca_info
+            if role == DataRoles.slp_token:
+                return x['slp_token']
+            if role == DataRoles.cash_token:
+                return x['token_data']
+        return None
+
+    def sort_key(self, key, row, column):
+        if column == UTXOList.Col.amount:
+            return (row.utxo['value'],)
+        if column == UTXOList.Col.height:
+            return (row.utxo['height'],)
+        if column == UTXOList.Col.output_point:
+            return (key,)
+        return super().sort_key(key, row, column)
+
+    def filter_match(self, key, row, text):
+        d = self._get_display(key, row)
+        return any(text in d[col].lower() for col in UTXOList.filter_columns)
+
+
+class UTXOList(MyTreeView, PrintError):
     class Col(IntEnum):
-        '''Column numbers. This is to make code in on_update easier to read.
+        '''Column numbers. This is to make code in UtxoModel easier to read.
         If you modify these, make sure to modify the column header names in
-        the MyTreeWidget constructor.'''
+        the MyTreeView constructor.'''
         address = 0
         label   = 1
         amount  = 2
         height  = 3
         output_point = 4
     class DataRoles(IntEnum):
-        '''Data roles. Again, to make code in on_update easier to read.'''
-        name         = Qt.UserRole + 0
+        '''Data roles, available on column 0. Again, to make code in UtxoModel easier to read.'''
+        name         = Qt.UserRole + 0  # == MyListModel.KeyRole
         frozen_flags = Qt.UserRole + 1
         address      = Qt.UserRole + 2
-        cash_account = Qt.UserRole + 3  # this may not always be there for a particular item
+        cash_account = Qt.UserRole + 3  # this is None if the address has no cash account
         slp_token    = Qt.UserRole + 4  # this is either a tuple of (token_id, qty) or None
         cash_token   = Qt.UserRole + 5  # this is either a token.OutputData or None
 
     filter_columns = [Col.address, Col.label]
-    default_sort = MyTreeWidget.SortSpec(Col.amount, Qt.DescendingOrder)  # sort by amount, descending
+    default_sort = MyTreeView.SortSpec(Col.amount, Qt.DescendingOrder)  # sort by amount, descending
 
     def __init__(self, parent=None):
         columns = [ _('Address'), _('Label'), _('Amount'), _('Height'), _('Output point') ]
-        MyTreeWidget.__init__(self, parent, self.create_menu, columns,
-                              stretch_column = UTXOList.Col.label,
-                              deferred_updates = True, save_sort_settings = True)
+        self.umodel = UtxoModel(self)
+        MyTreeView.__init__(self, parent, self.create_menu, self.umodel, columns,
+                            stretch_column = UTXOList.Col.label,
+                            deferred_updates = True, save_sort_settings = True)
         self.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.setSortingEnabled(True)
         self.wallet = self.parent.wallet
         self.parent.ca_address_default_changed_signal.connect(self._ca_on_address_default_change)
         self.parent.gui_object.cashaddr_toggled_signal.connect(self.update)
         self.utxos = list()
-        # cache some values to avoid constructing Qt objects for every pass through self.on_update (this is important for large wallets)
+        # cache some values to avoid constructing Qt objects for every row (this is important for large wallets)
         self.monospaceFont = QFont(MONOSPACE_FONT)
         self.lightBlue = QColor('lightblue') if not ColorScheme.dark_scheme else QColor('blue')
         self.blue = ColorScheme.BLUE.as_color(True)
@@ -115,18 +280,22 @@ class UTXOList(MyTreeWidget, PrintError):
             return
         super().update()
 
-    @if_not_dead
+    # The coins are gathered in the window's SnapshotWorker thread, see compute_snapshot()
+    snapshot_updates = True
+
+    UtxoRow = namedtuple("UtxoRow", "utxo, label, ca_info, ca_tool_tip, a_frozen")
+    UtxoSnapshot = namedtuple("UtxoSnapshot", "rows, local_maturity_height")
+
     @profiler
-    def on_update(self):
-        local_maturity_height = (self.wallet.get_local_height()+1) - COINBASE_MATURITY
-        prev_selection = self.get_selected() # cache previous selection, if any
-        self.clear()
+    def compute_snapshot(self, is_stale):
+        wallet = self.wallet
+        local_maturity_height = (wallet.get_local_height()+1) - COINBASE_MATURITY
         ca_by_addr = defaultdict(list)
         if self.show_cash_accounts:
             addr_set = set()
-            self.utxos = self.wallet.get_utxos(addr_set_out=addr_set, exclude_slp=False, exclude_tokens=False)
+            utxos = wallet.get_utxos(addr_set_out=addr_set, exclude_slp=False, exclude_tokens=False)
             # grab all cash accounts so that we may add the emoji char
-            for info in self.wallet.cashacct.get_cashaccounts(addr_set):
+            for info in wallet.cashacct.get_cashaccounts(addr_set):
                 ca_by_addr[info.address].append(info)
                 del info
             for ca_list in ca_by_addr.values():
@@ -134,101 +303,48 @@ class UTXOList(MyTreeWidget, PrintError):
                 del ca_list  # reference still exists inside ca_by_addr dict, this is just deleted here because we re-use this name below.
             del addr_set  # clean-up. We don't want the below code to ever depend on the existence of this cell.
         else:
-            self.utxos = self.wallet.get_utxos(exclude_slp=False, exclude_tokens=False)
-        self._update_utxo_count_display(len(self.utxos))
-        for x in self.utxos:
+            utxos = wallet.get_utxos(exclude_slp=False, exclude_tokens=False)
+        rows = []
+        for i, x in enumerate(utxos):
+            if not i % 1000 and is_stale():
+                return None
             address = x['address']
-            address_text = address.to_ui_string()
-            ca_info = None
+            ca_info = ca_tool_tip = None
             ca_list = ca_by_addr.get(address)
-            tool_tip0 = None
             if ca_list:
-                ca_info = self.wallet.cashacct.get_address_default(ca_list)
-                address_text = f'{ca_info.emoji} {address_text}'  # prepend the address emoji char
-                tool_tip0 = self.wallet.cashacct.fmt_info(ca_info, emoji=True)
-            height = x['height']
-            is_immature = x['coinbase'] and height > local_maturity_height
-            name = self.get_name(x)
-            name_short = self.get_name_short(x)
-            label = self.wallet.get_label(x['prevout_hash'])
-            amount = self.parent.format_amount(x['value'], is_diff=False, whitespaces=True)
-            utxo_item = SortableTreeWidgetItem([address_text, label, amount,
-                                                str(height), name_short])
-            if label:
-                utxo_item.setToolTip(1, label)  # just in case it doesn't fit horizontally, we also provide it as a tool tip where hopefully it won't be elided
-            if tool_tip0:
-                utxo_item.setToolTip(0, tool_tip0)
-            utxo_item.setToolTip(4, name)  # just in case they like to see lots of hex digits :)
-            utxo_item.DataRole = Qt.UserRole+100 # set this here to avoid sorting based on Qt.UserRole+1
-            utxo_item.setFont(0, self.monospaceFont)
-            utxo_item.setFont(2, self.monospaceFont)
-            utxo_item.setFont(4, self.monospaceFont)
-            utxo_item.setData(0, self.DataRoles.name, name)
-            a_frozen = self.wallet.is_frozen(address)
-            c_frozen = x['is_frozen_coin']
-            toolTipMisc = ''
-            slp_token = x['slp_token']
-            cash_token = x['token_data']
-            if is_immature:
-                for colNum in range(self.columnCount()):
-                    if colNum == self.Col.label:
-                        continue  # don't color the label column
-                    utxo_item.setForeground(colNum, self.immatureColor)
-                toolTipMisc = _('Coin is not yet mature')
-            elif slp_token:
-                utxo_item.setBackground(0, self.slpBG)
-                toolTipMisc = _('Coin contains an SLP token')
-            elif a_frozen and not c_frozen:
-                # address is frozen, coin is not frozen
-                # emulate the "Look" off the address_list .py's frozen entry
-                utxo_item.setBackground(0, self.lightBlue)
-                toolTipMisc = _("Address is frozen")
-            elif c_frozen and not a_frozen:
-                # coin is frozen, address is not frozen
-                utxo_item.setBackground(0, self.blue)
-                toolTipMisc = _("Coin is frozen")
-            elif c_frozen and a_frozen:
-                # both coin and address are frozen so color-code it to indicate that.
-                utxo_item.setBackground(0, self.lightBlue)
-                utxo_item.setForeground(0, self.cyanBlue)
-                toolTipMisc = _("Coin & Address are frozen")
-            elif cash_token:
-                utxo_item.setBackground(0, self.cashTokenBG)
-                toolTipMisc = _('Coin contains a CashToken')
-            # save the address-level-frozen and coin-level-frozen flags to the data item for retrieval later in create_menu() below.
-            utxo_item.setData(0, self.DataRoles.frozen_flags, "{}{}{}{}{}".format(
-                ("a" if a_frozen else ""), ("c" if c_frozen else ""), ("s" if slp_token else ""),
-                ("i" if is_immature else ""), ("t" if cash_token else "")))
-            # store the address
-            utxo_item.setData(0, self.DataRoles.address, address)
-            # store the ca_info for this address -- if any
-            if ca_info:
-                utxo_item.setData(0, self.DataRoles.cash_account, ca_info)
-            # store the slp_token
-            utxo_item.setData(0, self.DataRoles.slp_token, slp_token)
-            # store the cash token
-            utxo_item.setData(0, self.DataRoles.cash_token, cash_token)
-            if toolTipMisc:
-                utxo_item.setToolTip(0, toolTipMisc)
-            run_hook("utxo_list_item_setup", self, utxo_item, x, name)
-            self.addChild(utxo_item)
-            if name in prev_selection:
-                # NB: This needs to be here after the item is added to the widget. See #979.
-                utxo_item.setSelected(True) # restore previous selection
+                ca_info = wallet.cashacct.get_address_default(ca_list)
+                ca_tool_tip = wallet.cashacct.fmt_info(ca_info, emoji=True)
+            rows.append(self.UtxoRow(x, wallet.get_label(x['prevout_hash']), ca_info, ca_tool_tip,
+                                     wallet.is_frozen(address)))
+        return self.UtxoSnapshot(tuple(rows), local_maturity_height)
+
+    @if_not_dead
+    @profiler
+    def apply_snapshot(self, snapshot):
+        prev_selection = self.selected_keys()  # cache previous selection, if any
+        self.utxos = [row.utxo for row in snapshot.rows]
+        self._update_utxo_count_display(len(self.utxos))
+        self.umodel.local_maturity_height = snapshot.local_maturity_height
+        # Display data may be stale even for unchanged rows (e.g. the base unit
+        # changed, or a plugin's column), so invalidate it all. This is cheap as
+        # it is only recomputed for the rows that are on-screen.
+        self.umodel.invalidate_display()
+        self.umodel.set_rows((self.get_name(row.utxo), row) for row in snapshot.rows)
+        if prev_selection and not self.selectionModel().hasSelection():
+            # set_rows() resets the model, and thus the selection, if many rows changed
+            self.select_keys(prev_selection)
 
     def _update_utxo_count_display(self, num_utxos: int):
-        headerItem = self.headerItem()
-        if headerItem:
-            if num_utxos:
-                output_point_text = self.output_point_prefix_text + f" ({num_utxos})"
-            else:
-                output_point_text = self.output_point_prefix_text
-            headerItem.setText(self.Col.output_point, output_point_text)
+        if num_utxos:
+            output_point_text = self.output_point_prefix_text + f" ({num_utxos})"
+        else:
+            output_point_text = self.output_point_prefix_text
+        self.umodel.set_header_text(self.Col.output_point, output_point_text)
 
     def get_selected(self):
         # dict of "name" -> frozen flags string (eg: "ac")
-        return {x.data(0, self.DataRoles.name): x.data(0, self.DataRoles.frozen_flags)
-                for x in self.selectedItems()}
+        umodel = self.umodel
+        return {name: umodel.frozen_flags(umodel.row_for_key(name)) for name in self.selected_keys()}
 
     @if_not_dead
     def create_menu(self, position):
@@ -257,34 +373,35 @@ class UTXOList(MyTreeWidget, PrintError):
 
             if len(selected) == 1:
                 # "Copy ..."
-                item = self.itemAt(position)
-                if not item:
+                index = self.indexAt(position)
+                name = self.umodel.key_for_index(index)
+                if not name:
                     return
+                row = self.umodel.row_for_key(name)
 
-                col = self.currentColumn()
-                column_title = self.headerItem().text(col)
+                col = self.currentIndex().column()
+                column_title = self.header_text(col)
                 alt_column_title, alt_copy_text = None, None
-                slp_token = item.data(0, self.DataRoles.slp_token)
-                cash_token = item.data(0, self.DataRoles.cash_token)
+                slp_token = row.utxo['slp_token']
                 ca_info = None
                 token_text = None
                 if col == self.Col.output_point:
-                    copy_text = item.data(0, self.DataRoles.name)
+                    copy_text = name
                 elif col == self.Col.address:
-                    addr = item.data(0, self.DataRoles.address)
+                    addr = row.utxo['address']
                     # Determine the "alt copy text" "Legacy Address" or "Cash Address"
                     copy_text = addr.to_full_ui_string()
                     if Address.FMT_UI == Address.FMT_LEGACY:
                         alt_copy_text, alt_column_title = addr.to_full_string(Address.FMT_CASHADDR), _('Cash Address')
                     else:
                         alt_copy_text, alt_column_title = addr.to_full_string(Address.FMT_LEGACY), _('Legacy Address')
-                    ca_info = item.data(0, self.DataRoles.cash_account)  # may be None
+                    ca_info = row.ca_info  # may be None
                     token_text = addr.to_full_token_string()
                     if token_text in (copy_text, alt_copy_text):
                         token_text = None
                     del addr
                 else:
-                    copy_text = item.text(col)
+                    copy_text = self.umodel.data(index.sibling(index.row(), col))
                 if copy_text:
                     copy_text = copy_text.strip()  # make sure formatted amount is not whitespaced
                 menu.addAction(_("Copy {}").format(column_title), lambda: QApplication.instance().clipboard().setText(copy_text))
@@ -354,7 +471,7 @@ class UTXOList(MyTreeWidget, PrintError):
 
         menu.exec_(self.viewport().mapToGlobal(position))
 
-    def on_permit_edit(self, item, column):
+    def on_permit_edit(self, index, column):
         # disable editing fields in this tab (labels)
         return False
 
@@ -376,16 +493,11 @@ class UTXOList(MyTreeWidget, PrintError):
     def update_labels(self):
         if self.should_defer_update_incr():
             return
-        root = self.invisibleRootItem()
-        child_count = root.childCount()
-        for i in range(child_count):
-            item = root.child(i)
-            try:
-                txid = item.data(0, self.DataRoles.name).split(':', 1)[0]
-            except IndexError:
-                continue # name is iinvalid. should be txid:prevout_n
-            label = self.wallet.get_label(txid)
-            item.setText(1, label)
+        for name in list(self.umodel.keys()):
+            row = self.umodel.row_for_key(name)
+            label = self.wallet.get_label(name.split(':', 1)[0])
+            if row.label != label:
+                self.umodel.update_row(name, row._replace(label=label))
 
     def _ca_on_address_default_change(self, info):
         if self.show_cash_accounts:
@@ -251,8 +251,7 @@ class Plugin(FusionPlugin, QObject):
     def patch_utxo_list(utxo_list):
         if getattr(utxo_list, '_fusion_patched_', None) is not None:
             return
-        header = utxo_list.headerItem()
-        header_labels = [header.text(i) for i in range(header.columnCount())]
+        header_labels = [utxo_list.header_text(i) for i in range(utxo_list.columnCount())]
         header_labels.append(_("Fusion Status"))
         utxo_list.update_headers(header_labels)
         utxo_list._fusion_patched_ = header_labels[-1]  # save the text to be able to find the column later
@@ -263,32 +262,31 @@ class Plugin(FusionPlugin, QObject):
         label_text = getattr(utxo_list, '_fusion_patched_', None)
         if label_text is None:
             return
-        header = utxo_list.headerItem()
         if just_column:
             # fast path, query just the column
-            col_ct = header.columnCount()
+            col_ct = utxo_list.columnCount()
             if not col_ct:
                 return None
             # iterate in reverse (it's likely last)
             for i in range(col_ct - 1, -1, -1):
-                if header.text(i) == label_text:
+                if utxo_list.header_text(i) == label_text:
                     return i
         else:
-            header_labels = [header.text(i) for i in range(header.columnCount())]
+            header_labels = [utxo_list.header_text(i) for i in range(utxo_list.columnCount())]
             col = len(header_labels) - 1
             # find the column, iterate in reverse since it's likely last
             for i, lbl in enumerate(reversed(header_labels)):
                 if lbl == label_text:
                     col = len(header_labels) - 1 - i
                     break
-            return col, header, header_labels
+            return col, header_labels
 
     @staticmethod
     def unpatch_utxo_list(utxo_list):
         tup = Plugin.find_utxo_list_fusion_column(utxo_list)
         if tup is None:
             return
-        col, header, header_labels = tup
+        col, header_labels = tup
         del header_labels[col]
         utxo_list.update_headers(header_labels)
         delattr(utxo_list, '_fusion_patched_')
@@ -628,7 +626,9 @@ class Plugin(FusionPlugin, QObject):
         return None
 
     @hook
-    def history_list_context_menu_setup(self, history_list, menu, item, tx_hash):
+    def history_list_context_menu_setup(self, history_list, menu, index, tx_hash):
+        # NB: 'index' is the QModelIndex of the row clicked (the history list
+        # is a model/view QTreeView, so there is no QTreeWidgetItem for it)
         # NB: We unconditionally create this menu if the plugin is loaded because
         # it's possible for any wallet, even a watching-only wallet to have
         # fusion tx's with the correct labels (if the user uses has imported labels).
@@ -70,25 +70,24 @@ def find_utxo_list_shuffle_column(utxo_list, *, just_column=False):
     label_text = getattr(utxo_list, '_shuffle_patched_', None)
     if label_text is None:
         return
-    header = utxo_list.headerItem()
     if just_column:
         # fast path, query just the column
-        col_ct = header.columnCount()
+        col_ct = utxo_list.columnCount()
         if not col_ct:
             return
         # iterate in reverse (it's likely last)
         for i in range(col_ct - 1, -1, -1):
-            if header.text(i) == label_text:
+            if utxo_list.header_text(i) == label_text:
                 return i
     else:
-        header_labels = [header.text(i) for i in range(header.columnCount())]
+        header_labels = [utxo_list.header_text(i) for i in range(utxo_list.columnCount())]
         col = len(header_labels) - 1
         # find the column, iterate in reverse since it's likely last
         for i, lbl in enumerate(reversed(header_labels)):
             if lbl == label_text:
                 col = len(header_labels) - 1 - i
                 break
-        return col, header, header_labels
+        return col, header_labels
 
 def my_custom_item_setup(utxo_list, item, utxo, name):
     col = find_utxo_list_shuffle_column(utxo_list, just_column=True)
@@ -456,8 +455,7 @@ def monkey_patches_apply(window):
     def patch_utxo_list(utxo_list):
         if getattr(utxo_list, '_shuffle_patched_', None) is not None:
             return
-        header = utxo_list.headerItem()
-        header_labels = [header.text(i) for i in range(header.columnCount())]
+        header_labels = [utxo_list.header_text(i) for i in range(utxo_list.columnCount())]
         header_labels.append(_("Shuffle status"))
         utxo_list.update_headers(header_labels)
         utxo_list.in_progress = dict()
@@ -522,7 +520,7 @@ def monkey_patches_remove(window):
         tup = find_utxo_list_shuffle_column(utxo_list)
         if not tup:
             return
-        col, header, header_labels = tup
+        col, header_labels = tup
         del header_labels[col]
         utxo_list.update_headers(header_labels)
         utxo_list.in_progress = None
@@ -794,7 +792,9 @@ class Plugin(BasePlugin):
         return None
 
     @hook
-    def history_list_context_menu_setup(self, history_list, menu, item, tx_hash):
+    def history_list_context_menu_setup(self, history_list, menu, index, tx_hash):
+        # NB: 'index' is the QModelIndex of the row clicked (the history list
+        # is a model/view QTreeView, so there is no QTreeWidgetItem for it)
         # NB: We unconditionally create this menu if the plugin is loaded because
         # it's possible for any wallet, even a watching-only wallet to have
         # shuffle tx's with the correct labels (if the user has imported labels).